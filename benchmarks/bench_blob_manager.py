@@ -0,0 +1,79 @@
+import random
+
+from twisted.internet import defer
+
+from harness import TempDirs, Timer, benchmark, make_blob_manager, random_blob_hash
+
+BATCH_SIZE = 1000
+LOOKUP_COUNT = 10000
+
+
+class CompletedBlob(object):
+    def __init__(self, blob_hash, length):
+        self.blob_hash = blob_hash
+        self.length = length
+
+
+def batches(items, size=BATCH_SIZE):
+    return [items[i:i + size] for i in xrange(0, len(items), size)]
+
+
+@benchmark('disk_blob_manager', insert='blobs/s', load='blobs/s', lookup='blobs/s',
+           forget='blobs/s')
+@defer.inlineCallbacks
+def bench_disk_blob_manager(options):
+    """
+    DiskBlobManager with --blobs blobs in its database: adding them, loading them at start up,
+    looking up which of a set of blobs it has, and forgetting a tenth of them
+    """
+    count = options.blobs
+    temp_dirs = TempDirs()
+    blob_dir, db_dir = temp_dirs.make(), temp_dirs.make()
+    blob_hashes = [random_blob_hash() for _ in xrange(count)]
+    blob_manager = None
+    try:
+        blob_manager = make_blob_manager(blob_dir, db_dir)
+        yield blob_manager.setup()
+        insert_timer = Timer()
+        insert_timer.start()
+        for batch in batches(blob_hashes):
+            yield blob_manager.blobs_completed([CompletedBlob(h, 2 ** 21) for h in batch])
+        insert_timer.stop()
+        yield blob_manager.stop()
+        blob_manager = None
+
+        blob_manager = make_blob_manager(blob_dir, db_dir)
+        load_timer = Timer()
+        load_timer.start()
+        yield blob_manager.setup()
+        load_timer.stop()
+        assert len(blob_manager.verified_blobs) == count
+
+        # half of the blobs being looked up are ones the blob manager doesn't have
+        lookup_count = min(LOOKUP_COUNT, count)
+        to_look_up = random.sample(blob_hashes, lookup_count / 2)
+        to_look_up.extend(random_blob_hash() for _ in xrange(lookup_count - len(to_look_up)))
+        lookup_timer = Timer()
+        lookup_timer.start()
+        for batch in batches(to_look_up):
+            yield blob_manager.completed_blobs(batch)
+            yield blob_manager.missing_blobs(batch)
+        lookup_timer.stop()
+
+        to_forget = blob_hashes[:count / 10]
+        forget_timer = Timer()
+        forget_timer.start()
+        for batch in batches(to_forget):
+            yield blob_manager.forget_blobs(batch)
+        forget_timer.stop()
+    finally:
+        if blob_manager is not None:
+            yield blob_manager.stop()
+        temp_dirs.clean_up()
+    defer.returnValue({
+        'insert': insert_timer.rate(count),
+        'load': load_timer.rate(count),
+        'lookup': lookup_timer.rate(2 * lookup_count),
+        'forget': forget_timer.rate(len(to_forget)),
+        'blobs': count,
+    })
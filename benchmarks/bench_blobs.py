@@ -0,0 +1,57 @@
+from twisted.internet import defer
+
+from lbrynet.blob import BlobFileCreator, HashBlobWriter
+
+from harness import BLOB_DATA_SIZE, MB, TempDirs, Timer, benchmark, random_data, scale
+
+# about what a peer connection hands to a blob writer at a time
+CHUNK_SIZE = 2 ** 16
+
+
+def chunks(data, size=CHUNK_SIZE):
+    return [data[i:i + size] for i in xrange(0, len(data), size)]
+
+
+def writer_finished(writer, reason=None):
+    if reason is not None:
+        return defer.fail(reason)
+    return defer.succeed(writer.blob_hash)
+
+
+@benchmark('hash_blob_writer', write='MB/s')
+def bench_hash_blob_writer(options):
+    """Writing downloaded blobs to HashBlobWriter, which hashes and buffers them"""
+    count = scale(options, 64, 8)
+    data = chunks(random_data(BLOB_DATA_SIZE))
+    timer = Timer()
+    for _ in xrange(count):
+        writer = HashBlobWriter(lambda: BLOB_DATA_SIZE, writer_finished)
+        with timer:
+            for chunk in data:
+                writer.write(chunk)
+        assert writer.finished_cb_d.result == writer.blob_hash
+        writer.close_handle()
+    return {'write': timer.rate(count * BLOB_DATA_SIZE / float(MB))}
+
+
+@benchmark('blob_file_creator', write='MB/s')
+@defer.inlineCallbacks
+def bench_blob_file_creator(options):
+    """Creating blob files with BlobFileCreator, including writing them to disk"""
+    count = scale(options, 32, 4)
+    temp_dirs = TempDirs()
+    blob_dir = temp_dirs.make()
+    timer = Timer()
+    try:
+        for _ in xrange(count):
+            # a different blob each time, so each one is written
+            data = chunks(random_data(BLOB_DATA_SIZE))
+            creator = BlobFileCreator(blob_dir)
+            timer.start()
+            for chunk in data:
+                creator.write(chunk)
+            yield creator.close()
+            timer.stop()
+    finally:
+        temp_dirs.clean_up()
+    defer.returnValue({'write': timer.rate(count * BLOB_DATA_SIZE / float(MB))})
@@ -0,0 +1,71 @@
+import binascii
+
+from twisted.internet import defer
+
+from lbrynet.cryptstream.CryptBlob import StreamBlobDecryptor
+from lbrynet.cryptstream.CryptStreamCreator import CryptStreamCreator
+
+from harness import BLOB_DATA_SIZE, MB, MemoryBlob, Timer, benchmark, random_data, scale
+
+WRITE_SIZE = 2 ** 16
+
+
+class MemoryBlobManager(object):
+    def __init__(self):
+        self.blobs = []
+
+    def get_blob_creator(self):
+        blob = MemoryBlob()
+        self.blobs.append(blob)
+        return blob
+
+    def creator_finished(self, blob_info, should_announce):
+        return defer.succeed(blob_info)
+
+
+class BenchmarkStreamCreator(CryptStreamCreator):
+    def __init__(self, *args, **kwargs):
+        CryptStreamCreator.__init__(self, *args, **kwargs)
+        self.blob_infos = []
+
+    def _blob_finished(self, blob_info):
+        self.blob_infos.append(blob_info)
+        return blob_info
+
+    def _finished(self):
+        return self.blob_infos
+
+
+@benchmark('crypt_stream', encrypt='MB/s', decrypt='MB/s')
+@defer.inlineCallbacks
+def bench_crypt_stream(options):
+    """Encrypting a stream into blobs with CryptStreamCreator and decrypting them"""
+    blob_count = scale(options, 16, 2)
+    size = blob_count * BLOB_DATA_SIZE
+    data = random_data(size)
+    blob_manager = MemoryBlobManager()
+    creator = BenchmarkStreamCreator(blob_manager, 'benchmark')
+    yield creator.setup()
+    encrypt_timer = Timer()
+    encrypt_timer.start()
+    for i in xrange(0, size, WRITE_SIZE):
+        creator.write(data[i:i + WRITE_SIZE])
+    yield creator.stop()
+    encrypt_timer.stop()
+
+    blobs = {blob.blob_hash: blob for blob in blob_manager.blobs}
+    decrypted = []
+    decrypt_timer = Timer()
+    for blob_info in creator.blob_infos:
+        if not blob_info.length:
+            continue
+        decryptor = StreamBlobDecryptor(blobs[blob_info.blob_hash], creator.key,
+                                        binascii.unhexlify(blob_info.iv), blob_info.length)
+        decrypt_timer.start()
+        yield decryptor.decrypt(decrypted.append)
+        decrypt_timer.stop()
+    assert b''.join(decrypted) == data
+    defer.returnValue({
+        'encrypt': encrypt_timer.rate(size / float(MB)),
+        'decrypt': decrypt_timer.rate(size / float(MB)),
+    })
@@ -0,0 +1,135 @@
+from lbrynet.core import metrics
+from lbrynet.dht import constants
+from lbrynet.dht.simulation import SimulatedNetwork
+
+from harness import Timer, benchmark, random_blob_hash, scale
+
+PEER_PORT = 3333
+# the share of the nodes replaced by new ones in dht_churn
+CHURN = 0.25
+
+
+class Hops(object):
+    """The mean of the lookup hops observed for an rpc since it was made"""
+
+    def __init__(self, rpc):
+        self.histogram = metrics.DHT_LOOKUP_HOPS.labels(rpc)
+        self.count = self.histogram.count
+        self.sum = self.histogram.sum
+
+    def mean(self):
+        count = self.histogram.count - self.count
+        if not count:
+            return 0.0
+        return float(self.histogram.sum - self.sum) / count
+
+
+def make_network(options):
+    network = SimulatedNetwork(loss=options.loss, seed=options.seed)
+    timer = Timer()
+    with timer:
+        nodes = network.bootstrap(options.nodes)
+    return network, nodes, timer
+
+
+def find_peers(network, nodes, blob_hashes):
+    """Look up the peers of each blob from a random node, returns how many were found"""
+    found = 0
+    for blob_hash in blob_hashes:
+        node = network.random.choice(nodes)
+        peers = network.run(node.getPeersForBlob(blob_hash))
+        found += bool(peers)
+    return found
+
+
+@benchmark('dht_iterative_find', join='nodes/s', lookup='lookups/s', hops='hops',
+           datagrams_per_lookup='datagrams', lookup_time='s')
+def bench_dht_iterative_find(options):
+    """Iterative node lookups in a simulated network of --nodes nodes"""
+    lookups = scale(options, 500, 50)
+    network, nodes, join_timer = make_network(options)
+    datagrams = network.datagrams_sent
+    started = network.clock.seconds()
+    hops = Hops('findNode')
+    found = 0
+    timer = Timer()
+    with timer:
+        for i in xrange(lookups):
+            contacts = network.run(nodes[i % len(nodes)].iterativeFindNode(
+                random_blob_hash().decode('hex')))
+            found += len(contacts)
+    return {
+        'join': join_timer.rate(options.nodes),
+        'lookup': timer.rate(lookups),
+        'hops': hops.mean(),
+        'datagrams_per_lookup': float(network.datagrams_sent - datagrams) / lookups,
+        'lookup_time': (network.clock.seconds() - started) / lookups,
+        'contacts_per_lookup': float(found) / lookups,
+        'nodes': options.nodes,
+        'k': constants.k,
+    }
+
+
+@benchmark('dht_announce', announce='announces/s', datagrams_per_announce='datagrams',
+           announce_time='s', find_value_hops='hops')
+def bench_dht_announce(options):
+    """Announcing blobs to a simulated network of --nodes nodes, then finding their peers"""
+    announces = scale(options, 500, 50)
+    network, nodes, _ = make_network(options)
+    for node in nodes:
+        node.peerPort = PEER_PORT
+    blob_hashes = [random_blob_hash().decode('hex') for _ in xrange(announces)]
+    datagrams = network.datagrams_sent
+    started = network.clock.seconds()
+    timer = Timer()
+    with timer:
+        for blob_hash in blob_hashes:
+            network.run(network.random.choice(nodes).announceHaveBlob(blob_hash))
+    announce_time = (network.clock.seconds() - started) / announces
+    datagrams_per_announce = float(network.datagrams_sent - datagrams) / announces
+    hops = Hops('findValue')
+    found = find_peers(network, nodes, blob_hashes)
+    return {
+        'announce': timer.rate(announces),
+        'datagrams_per_announce': datagrams_per_announce,
+        'announce_time': announce_time,
+        'find_value_hops': hops.mean(),
+        'found': float(found) / announces,
+        'nodes': options.nodes,
+    }
+
+
+@benchmark('dht_churn', lookup='lookups/s', hops='hops', lookup_time='s',
+           undeliverable_per_lookup='datagrams')
+def bench_dht_churn(options):
+    """Finding the peers of announced blobs after a quarter of the nodes were replaced"""
+    announces = scale(options, 200, 20)
+    network, nodes, _ = make_network(options)
+    for node in nodes:
+        node.peerPort = PEER_PORT
+    blob_hashes = [random_blob_hash().decode('hex') for _ in xrange(announces)]
+    for blob_hash in blob_hashes:
+        network.run(network.random.choice(nodes).announceHaveBlob(blob_hash))
+
+    departed = set(network.random.sample(xrange(len(nodes)), int(len(nodes) * CHURN)))
+    for i in departed:
+        network.remove_node(nodes[i])
+    remaining = [node for i, node in enumerate(nodes) if i not in departed]
+    remaining.extend(network.bootstrap(len(departed)))
+
+    undeliverable = network.datagrams_undeliverable
+    started = network.clock.seconds()
+    hops = Hops('findValue')
+    timer = Timer()
+    with timer:
+        found = find_peers(network, remaining, blob_hashes)
+    return {
+        'lookup': timer.rate(announces),
+        'hops': hops.mean(),
+        'lookup_time': (network.clock.seconds() - started) / announces,
+        'undeliverable_per_lookup':
+            float(network.datagrams_undeliverable - undeliverable) / announces,
+        'found': float(found) / announces,
+        'nodes': options.nodes,
+        'replaced': len(departed),
+    }
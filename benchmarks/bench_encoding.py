@@ -0,0 +1,36 @@
+from lbrynet.dht import constants, encoding, msgformat, msgtypes
+
+from harness import Timer, benchmark, random_blob_hash, scale
+
+
+def find_value_response():
+    """The bencoded primitive of a findValue response listing k contacts"""
+    node_id = random_blob_hash().decode('hex')
+    contacts = [(random_blob_hash().decode('hex'), '10.0.0.%i' % i, 4444)
+                for i in range(constants.k)]
+    message = msgtypes.ResponseMessage(random_blob_hash().decode('hex')[:constants.rpc_id_length],
+                                       node_id, {'contacts': contacts, 'token': node_id})
+    return msgformat.DefaultFormat().toPrimitive(message)
+
+
+@benchmark('bencode', encode='messages/s', decode='messages/s')
+def bench_bencode(options):
+    """Bencode encoding and decoding of dht findValue responses"""
+    count = scale(options, 20000, 2000)
+    encoder = encoding.Bencode()
+    primitive = find_value_response()
+    datagram = encoder.encode(primitive)
+    assert encoder.encode(encoder.decode(datagram)) == datagram
+    encode_timer = Timer()
+    with encode_timer:
+        for _ in xrange(count):
+            encoder.encode(primitive)
+    decode_timer = Timer()
+    with decode_timer:
+        for _ in xrange(count):
+            encoder.decode(datagram)
+    return {
+        'encode': encode_timer.rate(count),
+        'decode': decode_timer.rate(count),
+        'message_size': len(datagram),
+    }
@@ -0,0 +1,55 @@
+import json
+
+from lbrynet.core.client.ClientProtocol import ClientProtocol
+
+from harness import Timer, benchmark, random_blob_hash, random_data, scale
+
+# the payload of a tcp segment, responses arrive in pieces of about this size
+SEGMENT_SIZE = 1448
+
+
+def blob_response():
+    """A response to a blob request, followed by the start of the blob"""
+    response = {
+        'blob_data_payment_rate': 'RATE_ACCEPTED',
+        'incoming_blob': {'blob_hash': random_blob_hash(), 'length': 2 ** 21},
+    }
+    return json.dumps(response) + random_data(SEGMENT_SIZE)
+
+
+def availability_response():
+    """A response listing many available blobs, which takes several segments to arrive"""
+    response = {
+        'available_blobs': [random_blob_hash() for _ in range(100)],
+        'lbrycrd_address': {'address': 'bHvyq2cQ3QAzyh2eH3dW9MPy6UU3YMHpDx'},
+        'blob_data_payment_rate': 'RATE_ACCEPTED',
+    }
+    return json.dumps(response)
+
+
+def parse_in_segments(protocol, message):
+    buff = ''
+    for i in xrange(0, len(message), SEGMENT_SIZE):
+        buff += message[i:i + SEGMENT_SIZE]
+        response, extra_data = protocol._get_valid_response(buff)
+        if response is not None:
+            return response
+    raise ValueError("Couldn't parse the response")
+
+
+@benchmark('client_protocol_framing', blob_response='responses/s',
+           availability_response='responses/s')
+def bench_client_protocol_framing(options):
+    """Finding the end of peer protocol responses which arrive in tcp segment sized pieces"""
+    count = scale(options, 5000, 500)
+    protocol = ClientProtocol()
+    results = {}
+    for name, message in (('blob_response', blob_response()),
+                          ('availability_response', availability_response())):
+        parse_in_segments(protocol, message)
+        timer = Timer()
+        with timer:
+            for _ in xrange(count):
+                parse_in_segments(protocol, message)
+        results[name] = timer.rate(count)
+    return results
@@ -0,0 +1,65 @@
+from twisted.internet import defer, reactor
+
+from lbrynet import reflector
+from lbrynet.core.PeerManager import PeerManager
+from lbrynet.lbry_file.EncryptedFileMetadataManager import DBEncryptedFileMetadataManager
+
+from harness import (BLOB_DATA_SIZE, MB, TempDirs, Timer, benchmark, make_blob_manager,
+                     random_data, scale)
+
+
+@defer.inlineCallbacks
+def make_blobs(blob_manager, count):
+    blob_hashes = []
+    for _ in xrange(count):
+        creator = blob_manager.get_blob_creator()
+        creator.write(random_data(BLOB_DATA_SIZE))
+        blob_hash = yield creator.close()
+        yield blob_manager.creator_finished(creator, False)
+        blob_hashes.append(blob_hash)
+    defer.returnValue(blob_hashes)
+
+
+@defer.inlineCallbacks
+def reflect(blob_manager, blob_hashes, temp_dirs):
+    """Send the blobs to a new reflector server listening on loopback"""
+    blob_dir, db_dir = temp_dirs.make(), temp_dirs.make()
+    server_blob_manager = make_blob_manager(blob_dir, db_dir)
+    stream_info_manager = DBEncryptedFileMetadataManager(db_dir)
+    yield server_blob_manager.setup()
+    yield stream_info_manager.setup()
+    server_factory = reflector.ServerFactory(PeerManager(), server_blob_manager,
+                                             stream_info_manager, None)
+    port = reactor.listenTCP(0, server_factory, interface='127.0.0.1')
+    try:
+        client_factory = reflector.BlobClientFactory(blob_manager, blob_hashes)
+        timer = Timer()
+        timer.start()
+        reactor.connectTCP('127.0.0.1', port.getHost().port, client_factory)
+        yield client_factory.finished_deferred
+        timer.stop()
+        missing = yield server_blob_manager.missing_blobs(blob_hashes)
+        assert not missing, "the reflector server is missing %i blobs" % len(missing)
+        yield server_factory.bookkeeper.wait_for_empty()
+    finally:
+        yield port.stopListening()
+        yield server_blob_manager.stop()
+        yield stream_info_manager.stop()
+    defer.returnValue(timer)
+
+
+@benchmark('reflector_ingest', ingest='MB/s')
+@defer.inlineCallbacks
+def bench_reflector_ingest(options):
+    """Reflecting blobs to a reflector server over loopback"""
+    count = scale(options, 32, 4)
+    temp_dirs = TempDirs()
+    blob_manager = make_blob_manager(temp_dirs.make(), temp_dirs.make())
+    try:
+        yield blob_manager.setup()
+        blob_hashes = yield make_blobs(blob_manager, count)
+        timer = yield reflect(blob_manager, blob_hashes, temp_dirs)
+    finally:
+        yield blob_manager.stop()
+        temp_dirs.clean_up()
+    defer.returnValue({'ingest': timer.rate(count * BLOB_DATA_SIZE / float(MB))})
@@ -0,0 +1,140 @@
+"""
+Shared code for the benchmarks
+
+A benchmark is a function decorated with @benchmark, which is given the command line options
+and returns (or returns a deferred which fires with) a dict of the values it measured. The
+units of the values are given to the decorator, a unit ending in /s is a rate where higher is
+better, for any other unit lower is better. Other items in the dict are recorded with the
+results without being compared.
+"""
+
+import os
+import shutil
+import tempfile
+import time
+from collections import OrderedDict
+from io import BytesIO
+
+from twisted.internet import defer
+
+from lbrynet.blob.blob_file import MAX_BLOB_SIZE
+from lbrynet.core.BlobManager import DiskBlobManager
+from lbrynet.core.server.DHTHashAnnouncer import DHTHashAnnouncer
+from lbrynet.core.cryptoutils import get_lbry_hash_obj
+
+BENCHMARKS = OrderedDict()
+MB = 2 ** 20
+# the largest amount of data which fits in one encrypted blob
+BLOB_DATA_SIZE = MAX_BLOB_SIZE - 1
+
+
+class Benchmark(object):
+    def __init__(self, name, f, units):
+        self.name = name
+        self.f = f
+        self.units = units
+        self.description = (f.__doc__ or '').strip()
+
+    @staticmethod
+    def higher_is_better(unit):
+        return unit.endswith('/s')
+
+    @defer.inlineCallbacks
+    def run(self, options):
+        result = yield defer.maybeDeferred(self.f, options)
+        missing = set(self.units) - set(result)
+        if missing:
+            raise ValueError("%s didn't measure %s" % (self.name, ', '.join(sorted(missing))))
+        defer.returnValue(result)
+
+
+def benchmark(name, **units):
+    """Register a benchmark measuring values in the given units, keyed by value name"""
+    def wrapper(f):
+        if name in BENCHMARKS:
+            raise ValueError("There is already a benchmark named %s" % name)
+        BENCHMARKS[name] = Benchmark(name, f, units)
+        return f
+    return wrapper
+
+
+class Timer(object):
+    """Measures the time spent in with blocks, or between start and stop for deferreds"""
+
+    def __init__(self):
+        self.elapsed = 0.0
+        self._started = None
+
+    def start(self):
+        self._started = time.time()
+
+    def stop(self):
+        self.elapsed += time.time() - self._started
+        self._started = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def rate(self, amount):
+        return amount / self.elapsed if self.elapsed else float('inf')
+
+
+class MemoryBlob(object):
+    """A blob kept in memory, for measuring encryption without the disk"""
+
+    def __init__(self):
+        self.chunks = []
+        self.data = None
+        self.blob_hash = None
+
+    def write(self, data):
+        self.chunks.append(data)
+
+    def close(self):
+        self.data = b''.join(self.chunks)
+        self.chunks = []
+        hashsum = get_lbry_hash_obj()
+        hashsum.update(self.data)
+        self.blob_hash = hashsum.hexdigest()
+        return defer.succeed(self.blob_hash)
+
+    def open_for_reading(self):
+        return BytesIO(self.data)
+
+
+class TempDirs(object):
+    """Makes temporary directories and removes them all when cleaned up"""
+
+    def __init__(self):
+        self.dirs = []
+
+    def make(self):
+        path = tempfile.mkdtemp(prefix='lbrynet-bench-')
+        self.dirs.append(path)
+        return path
+
+    def clean_up(self):
+        for path in self.dirs:
+            shutil.rmtree(path, ignore_errors=True)
+        self.dirs = []
+
+
+def make_blob_manager(blob_dir, db_dir):
+    # without a peer port the announcer doesn't announce anything
+    return DiskBlobManager(DHTHashAnnouncer(None, None), blob_dir, db_dir)
+
+
+def random_data(size):
+    return os.urandom(size)
+
+
+def random_blob_hash():
+    return os.urandom(48).encode('hex')
+
+
+def scale(options, full, quick):
+    return quick if options.quick else full
@@ -0,0 +1,185 @@
+#!/usr/bin/env python
+"""
+Run the lbrynet benchmarks
+
+Everything runs in this process against temporary directories, loopback connections and a
+simulated dht, no network access is needed. The results are printed as JSON, or saved with
+--output, so they can be kept and compared with the results of a later version with --compare:
+
+    python benchmarks/run.py --output results-0.19.0.json
+    python benchmarks/run.py --compare results-0.19.0.json
+
+--compare exits with status 1 if a value got worse by more than --tolerance.
+"""
+
+import argparse
+import fnmatch
+import json
+import logging
+import platform
+import sys
+import time
+
+from twisted.internet import defer, task
+
+from lbrynet import __version__ as lbrynet_version
+from lbrynet import conf
+# log_support sets the Logger class lbrynet uses, so it has to be imported before the code
+# being benchmarked
+from lbrynet.core import log_support  # pylint: disable=unused-import
+
+from harness import BENCHMARKS
+
+import bench_blob_manager  # pylint: disable=unused-import
+import bench_blobs  # pylint: disable=unused-import
+import bench_crypt  # pylint: disable=unused-import
+import bench_dht  # pylint: disable=unused-import
+import bench_encoding  # pylint: disable=unused-import
+import bench_protocol  # pylint: disable=unused-import
+import bench_reflector  # pylint: disable=unused-import
+
+log = logging.getLogger('benchmarks')
+
+
+def median(values):
+    values = sorted(values)
+    middle = len(values) / 2
+    if len(values) % 2:
+        return values[middle]
+    return (values[middle - 1] + values[middle]) / 2.0
+
+
+def summarize(bench, runs):
+    results = []
+    for name, unit in sorted(bench.units.iteritems()):
+        values = [run[name] for run in runs]
+        higher_is_better = bench.higher_is_better(unit)
+        results.append({
+            'name': '%s.%s' % (bench.name, name),
+            'unit': unit,
+            'higher_is_better': higher_is_better,
+            'values': values,
+            'best': max(values) if higher_is_better else min(values),
+            'median': median(values),
+        })
+    info = {k: v for k, v in runs[-1].iteritems() if k not in bench.units}
+    if info:
+        for result in results:
+            result['info'] = info
+    return results
+
+
+def compare(results, previous, tolerance):
+    """Add the change from the previous results to each result, returns the regressed ones"""
+    previous = {result['name']: result for result in previous['results']}
+    regressions = []
+    for result in results:
+        old = previous.get(result['name'])
+        if old is None or old['unit'] != result['unit'] or not old['median']:
+            continue
+        change = (result['median'] - old['median']) / float(old['median'])
+        result['change'] = round(change, 4)
+        if (change if result['higher_is_better'] else -change) < -tolerance:
+            regressions.append(result)
+    return regressions
+
+
+def print_summary(results):
+    for result in results:
+        change = ''
+        if 'change' in result:
+            change = '%+.1f%%' % (result['change'] * 100)
+        sys.stderr.write('%-50s %14.2f %-14s %s\n' % (result['name'], result['median'],
+                                                     result['unit'], change))
+
+
+@defer.inlineCallbacks
+def run(reactor, options):
+    names = [name for name in BENCHMARKS
+             if not options.benchmarks or
+             any(fnmatch.fnmatch(name, pattern) for pattern in options.benchmarks)]
+    if not names:
+        raise ValueError("No benchmarks match %s" % ' '.join(options.benchmarks))
+    results = []
+    for name in names:
+        bench = BENCHMARKS[name]
+        log.info("Running %s", name)
+        runs = []
+        for _ in range(options.repeat):
+            result = yield bench.run(options)
+            runs.append(result)
+        results.extend(summarize(bench, runs))
+
+    regressions = []
+    if options.compare:
+        with open(options.compare) as previous:
+            regressions = compare(results, json.load(previous), options.tolerance)
+
+    output = json.dumps({
+        'lbrynet_version': lbrynet_version,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'time': int(time.time()),
+        'quick': options.quick,
+        'repeat': options.repeat,
+        'results': results,
+    }, indent=2, sort_keys=True, separators=(',', ': '))
+    if options.output:
+        with open(options.output, 'w') as output_file:
+            output_file.write(output + '\n')
+    else:
+        print output
+    print_summary(results)
+    if regressions:
+        sys.stderr.write("Regressed by more than %i%%: %s\n" % (
+            options.tolerance * 100, ', '.join(result['name'] for result in regressions)))
+        raise SystemExit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the lbrynet benchmarks")
+    parser.add_argument('benchmarks', nargs='*',
+                        help="Names of the benchmarks to run, shell style wildcards can be used. "
+                             "All of them are run by default")
+    parser.add_argument('--list', action='store_true', help="List the benchmarks and exit")
+    parser.add_argument('--repeat', type=int, default=3,
+                        help="How many times to run each benchmark, the best and median values "
+                             "are reported")
+    parser.add_argument('--quick', action='store_true',
+                        help="Run smaller versions of the benchmarks, to check they work")
+    parser.add_argument('--blobs', type=int, default=None,
+                        help="Blobs in the blob manager database, 100000 by default (10000 "
+                             "with --quick)")
+    parser.add_argument('--nodes', type=int, default=None,
+                        help="Nodes in the simulated dht, 1000 by default (100 with --quick)")
+    parser.add_argument('--loss', type=float, default=0.0,
+                        help="Fraction of the datagrams lost by the simulated dht")
+    parser.add_argument('--seed', type=int, default=0,
+                        help="Seed of the simulated dht's node ids, latencies and losses")
+    parser.add_argument('--output', help="Save the results to this file instead of printing "
+                                         "them")
+    parser.add_argument('--compare', help="Results file of an earlier run to compare with")
+    parser.add_argument('--tolerance', type=float, default=0.1,
+                        help="How much worse a value can get before --compare fails, as a "
+                             "fraction")
+    options = parser.parse_args()
+    if options.list:
+        for name, bench in BENCHMARKS.iteritems():
+            print '%-30s %s' % (name, bench.description.splitlines()[0])
+        return
+    if options.blobs is None:
+        options.blobs = 10000 if options.quick else 100000
+    if options.nodes is None:
+        options.nodes = 100 if options.quick else 1000
+
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr,
+                        format="%(asctime)s %(levelname)-8s %(name)s: %(message)s")
+    # only the log messages of the benchmarks themselves, not of what they measure
+    logging.getLogger('lbrynet').setLevel(logging.ERROR)
+    # the default settings, without reading a conf file or the data directory
+    conf.settings = conf.Config(conf.FIXED_SETTINGS, conf.ADJUSTABLE_SETTINGS)
+    task.react(run, [options])
+
+
+if __name__ == '__main__':
+    main()
@@ -7,6 +7,7 @@ from lbrynet.core.Error import DownloadCanceledError, InvalidDataError, InvalidB
 from lbrynet.core.utils import is_valid_blobhash
 from lbrynet.blob.writer import HashBlobWriter
 from lbrynet.blob.reader import HashBlobReader
+from lbrynet.blob.layout import BlobDirLayout
 
 log = logging.getLogger(__name__)
 
@@ -27,7 +28,7 @@ class BlobFile(object):
     def __repr__(self):
         return '<{}({})>'.format(self.__class__.__name__, str(self))
 
-    def __init__(self, blob_dir, blob_hash, length=None):
+    def __init__(self, blob_dir, blob_hash, length=None, layout=None):
         if not is_valid_blobhash(blob_hash):
             raise InvalidBlobHashError(blob_hash)
         self.blob_hash = blob_hash
@@ -36,10 +37,12 @@ class BlobFile(object):
         self._verified = False
         self.readers = 0
         self.blob_dir = blob_dir
-        self.file_path = os.path.join(blob_dir, self.blob_hash)
+        self.layout = layout or BlobDirLayout(blob_dir)
+        existing_path = self.layout.find(self.blob_hash)
+        self.file_path = existing_path or self.layout.path(self.blob_hash)
         self.blob_write_lock = defer.DeferredLock()
         self.saved_verified_blob = False
-        if os.path.isfile(self.file_path):
+        if existing_path is not None:
             self.set_length(os.path.getsize(self.file_path))
             # This assumes that the hash of the blob has already been
             # checked as part of the blob creation process. It might
@@ -76,6 +79,7 @@ class BlobFile(object):
         finished
         """
         if self._verified is True:
+            self._update_file_path()
             f = open(self.file_path, 'rb')
             reader = HashBlobReader(f, self.reader_finished)
             self.readers += 1
@@ -94,6 +98,7 @@ class BlobFile(object):
             self.saved_verified_blob = False
 
             def delete_from_file_system():
+                self._update_file_path()
                 if os.path.isfile(self.file_path):
                     os.remove(self.file_path)
 
@@ -110,6 +115,36 @@ class BlobFile(object):
             return defer.fail(Failure(
                 ValueError("File is currently being read or written and cannot be deleted")))
 
+    def sync(self):
+        """
+        Flush a verified blob file and the directory entry for it to disk
+
+        returns a deferred that fires once the blob will survive a crash
+        """
+        def sync_to_disk():
+            self._update_file_path()
+            fd = os.open(self.file_path, os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+            try:
+                fd = os.open(os.path.dirname(self.file_path), os.O_RDONLY)
+            except OSError:
+                # directories can't be opened on windows, where the entry is synced with the file
+                return
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+        return threads.deferToThread(sync_to_disk)
+
+    def _update_file_path(self):
+        # the file may have been moved by a blob dir layout migration, which can have finished
+        # since this blob was made
+        if not os.path.isfile(self.file_path):
+            self.file_path = self.layout.find(self.blob_hash) or self.layout.path(self.blob_hash)
+
     @property
     def verified(self):
         """
@@ -198,9 +233,11 @@ class BlobFile(object):
     def _save_verified_blob(self, writer):
         if self.saved_verified_blob is False:
             writer.write_handle.seek(0)
-            out_path = os.path.join(self.blob_dir, self.blob_hash)
+            out_path = self.layout.prepare(self.blob_hash)
             producer = FileBodyProducer(writer.write_handle)
-            yield producer.startProducing(open(out_path, 'wb'))
+            with open(out_path, 'wb') as out_file:
+                yield producer.startProducing(out_file)
+            self.file_path = out_path
             self.saved_verified_blob = True
             defer.returnValue(True)
         else:
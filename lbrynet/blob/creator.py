@@ -1,9 +1,9 @@
-import os
 import logging
 from io import BytesIO
 from twisted.internet import defer
 from twisted.web.client import FileBodyProducer
 from lbrynet.core.cryptoutils import get_lbry_hash_obj
+from lbrynet.blob.layout import BlobDirLayout
 
 log = logging.getLogger(__name__)
 
@@ -14,8 +14,9 @@ class BlobFileCreator(object):
     when we do not know the blob hash beforehand (i.e, when creating
     a new stream)
     """
-    def __init__(self, blob_dir):
+    def __init__(self, blob_dir, layout=None):
         self.blob_dir = blob_dir
+        self.layout = layout or BlobDirLayout(blob_dir)
         self.buffer = BytesIO()
         self._is_open = True
         self._hashsum = get_lbry_hash_obj()
@@ -31,7 +32,7 @@ class BlobFileCreator(object):
             # do not save 0 length files (empty tail blob in streams)
             # or if its been closed already
             self.buffer.seek(0)
-            out_path = os.path.join(self.blob_dir, self.blob_hash)
+            out_path = self.layout.prepare(self.blob_hash)
             producer = FileBodyProducer(self.buffer)
             yield producer.startProducing(open(out_path, 'wb'))
             self._is_open = False
@@ -0,0 +1,119 @@
+import errno
+import logging
+import os
+
+from lbrynet.core.utils import is_valid_blobhash, is_valid_hashcharacter
+
+try:
+    from os import scandir
+except ImportError:
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
+
+log = logging.getLogger(__name__)
+
+# records the shard depth the blobs in a blob directory are stored with
+LAYOUT_FILE_NAME = ".layout"
+SHARD_NAME_LENGTH = 2
+MAX_SHARD_DEPTH = 4
+
+
+def is_shard_name(name):
+    return len(name) == SHARD_NAME_LENGTH and all(is_valid_hashcharacter(c) for c in name)
+
+
+def read_shard_depth(blob_dir):
+    """Returns the shard depth recorded in blob_dir, 0 (flat) if none was recorded"""
+    layout_file = os.path.join(blob_dir, LAYOUT_FILE_NAME)
+    if not os.path.isfile(layout_file):
+        return 0
+    with open(layout_file) as f:
+        return int(f.read().strip() or 0)
+
+
+def write_shard_depth(blob_dir, shard_depth):
+    layout_file = os.path.join(blob_dir, LAYOUT_FILE_NAME)
+    with open(layout_file + ".tmp", 'w') as f:
+        f.write(str(shard_depth))
+    os.rename(layout_file + ".tmp", layout_file)
+
+
+def _list_dir(path):
+    """Yields (name, is_file, is_dir, size) for the entries of path"""
+    if scandir is not None:
+        for entry in scandir(path):
+            is_file = entry.is_file()
+            yield (entry.name, is_file, entry.is_dir(), entry.stat().st_size if is_file else 0)
+    else:
+        for name in os.listdir(path):
+            entry_path = os.path.join(path, name)
+            is_file = os.path.isfile(entry_path)
+            yield (name, is_file, os.path.isdir(entry_path),
+                   os.path.getsize(entry_path) if is_file else 0)
+
+
+class BlobDirLayout(object):
+    """Maps blob hashes to files in a blob directory
+
+    With a shard depth of 0 blobs are stored flat in the blob directory, with a depth of 2
+    the blob abcd...ef is stored at ab/cd/abcd...ef, which keeps every directory small no
+    matter how many blobs there are. While a blob directory is being migrated from one
+    depth to another `legacy_shard_depth` is set, and blobs which aren't at their new path
+    yet are looked up at their old one.
+    """
+
+    def __init__(self, blob_dir, shard_depth=0, legacy_shard_depth=None):
+        if not 0 <= shard_depth <= MAX_SHARD_DEPTH:
+            raise ValueError("invalid blob dir shard depth: %s" % shard_depth)
+        self.blob_dir = blob_dir
+        self.shard_depth = shard_depth
+        self.legacy_shard_depth = legacy_shard_depth
+
+    def _path(self, blob_hash, shard_depth):
+        shards = [blob_hash[i * SHARD_NAME_LENGTH:(i + 1) * SHARD_NAME_LENGTH]
+                  for i in range(shard_depth)]
+        return os.path.join(self.blob_dir, *(shards + [blob_hash]))
+
+    def path(self, blob_hash):
+        """The path new blob files are written to"""
+        return self._path(blob_hash, self.shard_depth)
+
+    def find(self, blob_hash):
+        """The path of the existing file for the blob, or None if there isn't one"""
+        path = self.path(blob_hash)
+        if os.path.isfile(path):
+            return path
+        legacy_shard_depth = self.legacy_shard_depth
+        if legacy_shard_depth is not None and legacy_shard_depth != self.shard_depth:
+            legacy_path = self._path(blob_hash, legacy_shard_depth)
+            if os.path.isfile(legacy_path):
+                return legacy_path
+        return None
+
+    def prepare(self, blob_hash):
+        """Create the shard directories for a blob and return the path to write it to"""
+        path = self.path(blob_hash)
+        if self.shard_depth:
+            try:
+                os.makedirs(os.path.dirname(path))
+            except OSError as err:
+                if err.errno != errno.EEXIST:
+                    raise
+        return path
+
+    def iter_blob_files(self):
+        """Yields (blob_hash, path, size) for every blob file, at any shard depth"""
+        pending = [(self.blob_dir, 0)]
+        while pending:
+            path, depth = pending.pop()
+            for name, is_file, is_dir, size in _list_dir(path):
+                if is_file and is_valid_blobhash(name):
+                    yield name, os.path.join(path, name), size
+                elif is_dir and depth < MAX_SHARD_DEPTH and is_shard_name(name):
+                    pending.append((os.path.join(path, name), depth + 1))
+
+    def scan(self):
+        """Returns {blob_hash: file size} for the blob files in the blob directory"""
+        return {blob_hash: size for blob_hash, _, size in self.iter_blob_files()}
@@ -255,6 +255,8 @@ ADJUSTABLE_SETTINGS = {
     # will not be made automatically)
     'auto_renew_claim_height_delta': (int, 0),
     'cache_time': (int, 150),
+    # number of decoded claims kept in memory, each for up to cache_time seconds
+    'claim_cache_size': (int, 5000),
     'data_dir': (str, default_data_dir),
     'data_rate': (float, .0001),  # points/megabyte
     'delete_blobs_on_remove': (bool, True),
@@ -263,9 +265,24 @@ ADJUSTABLE_SETTINGS = {
     'download_timeout': (int, 180),
     'is_generous_host': (bool, True),
     'announce_head_blobs_only': (bool, True),
+    # store blobs in nested sub directories named after the first bytes of the blob hash,
+    # 2 means ab/cd/abcd..., 0 stores blobs directly in the blob directory
+    'blob_dir_shard_depth': (int, 0),
+    # bytes per second read while re-hashing blobs in the background, 0 disables the scrubber
+    'blob_scrub_rate': (int, 4 * 2 ** 20),
+    # re-hash blobs which were last verified longer ago than this many seconds
+    'blob_reverify_interval': (int, 30 * 24 * 60 * 60),
     'known_dht_nodes': (list, DEFAULT_DHT_NODES, server_list),
     'lbryum_wallet_dir': (str, default_lbryum_dir),
     'max_connections_per_stream': (int, 5),
+    # bandwidth caps in bytes per second, 0 means unlimited
+    'max_download_rate': (int, 0),
+    'max_upload_rate': (int, 0),
+    'max_peer_download_rate': (int, 0),
+    'max_peer_upload_rate': (int, 0),
+    'max_stream_download_rate': (int, 0),
+    # fraction of new peer connections made to a random peer rather than the fastest known
+    'peer_exploration_rate': (float, 0.1),
     'seek_head_blob_first': (bool, True),
     # TODO: writing json on the cmd line is a pain, come up with a nicer
     # parser for this data structure. maybe 'USD:25'
@@ -281,12 +298,37 @@ ADJUSTABLE_SETTINGS = {
     # periodic check in the event the initial upload failed or was disconnected part way through
     'reflect_uploads': (bool, True),
     'auto_re_reflect_interval': (int, 3600),
+    # seconds after a reflector confirmed it has a whole stream, or a blob, before it is asked
+    # about it again
+    'auto_re_reflect_reverify_age': (int, 7 * 24 * 3600),
     'reflector_servers': (list, [('reflector2.lbry.io', 5566)], server_list),
     'run_reflector_server': (bool, False),
+    # reflector server capacity: clients served at once, clients waiting for a turn before more
+    # are told to retry later, clients served at once from one host, bytes of blobs buffered in
+    # memory while being received and bytes per second received. 0 means unlimited, except for
+    # the queue.
+    'reflector_server_max_connections': (int, 64),
+    'reflector_server_max_queued_connections': (int, 256),
+    'reflector_server_max_connections_per_host': (int, 4),
+    'reflector_server_max_inflight_bytes': (int, 256 * 2 ** 20),
+    'reflector_server_max_write_rate': (int, 0),
     'sd_download_timeout': (int, 3),
+    # blobs after the one being read that are decrypted ahead of time for http streams
+    'streaming_read_ahead': (int, 2),
+    # save a decrypted copy of downloaded streams, otherwise they are only kept as blobs and can
+    # be exported with file_export or streamed
+    'save_files': (bool, True),
     'share_usage_data': (bool, True),  # whether to share usage stats and diagnostic info with LBRY
     'peer_search_timeout': (int, 3),
     'use_auth_http': (bool, False),
+    # also serve the api over a websocket at /ws, this needs autobahn
+    'use_api_websocket': (bool, False),
+    # serve counters and histograms of what the daemon is doing at /metrics
+    'serve_metrics': (bool, True),
+    # time every callback run by the reactor and keep the ones which take longer than
+    # slow_call_threshold seconds, see the debug_profile command
+    'debug_reactor': (bool, False),
+    'slow_call_threshold': (float, 0.1),
     'use_upnp': (bool, True),
     'use_keyring': (bool, False),
     'wallet': (str, LBRYUM_WALLET),
@@ -0,0 +1,29 @@
+class VerifiedBlobIndex(object):
+    """In memory index of the hashes of the verified blobs in the blob directory"""
+
+    def __init__(self):
+        self.blob_hashes = set()
+
+    def __len__(self):
+        return len(self.blob_hashes)
+
+    def __contains__(self, blob_hash):
+        return blob_hash in self.blob_hashes
+
+    def __iter__(self):
+        return iter(self.blob_hashes)
+
+    def load(self, blob_hashes):
+        self.blob_hashes = set(blob_hashes)
+
+    def add(self, blob_hash):
+        self.blob_hashes.add(blob_hash)
+
+    def remove(self, blob_hash):
+        self.blob_hashes.discard(blob_hash)
+
+    def filter_verified(self, blob_hashes):
+        return [blob_hash for blob_hash in blob_hashes if blob_hash in self.blob_hashes]
+
+    def filter_missing(self, blob_hashes):
+        return [blob_hash for blob_hash in blob_hashes if blob_hash not in self.blob_hashes]
@@ -8,8 +8,14 @@ from twisted.enterprise import adbapi
 from lbrynet import conf
 from lbrynet.blob.blob_file import BlobFile
 from lbrynet.blob.creator import BlobFileCreator
+from lbrynet.blob.layout import BlobDirLayout, read_shard_depth
+from lbrynet.core.BlobIndex import VerifiedBlobIndex
+from lbrynet.core.BlobScrubber import BlobScrubber
+from lbrynet.core import metrics
 from lbrynet.core.server.DHTHashAnnouncer import DHTHashSupplier
-from lbrynet.core.sqlite_helpers import rerun_if_locked
+from lbrynet.core.sqlite_helpers import rerun_if_locked, in_chunks, placeholders
+from lbrynet.core.sqlite_helpers import MAX_QUERY_PARAMETERS
+from lbrynet.db_migrator.migrate_blob_dir import migrate_blob_dir
 
 log = logging.getLogger(__name__)
 
@@ -28,6 +34,9 @@ class DiskBlobManager(DHTHashSupplier):
         self.announce_head_blobs_only = conf.settings['announce_head_blobs_only']
 
         self.blob_dir = blob_dir
+        self.layout = BlobDirLayout(blob_dir, conf.settings['blob_dir_shard_depth'])
+        self._layout_migration = None
+        self._stopping = False
         self.db_file = os.path.join(db_dir, "blobs.db")
         self.db_conn = adbapi.ConnectionPool('sqlite3', self.db_file, check_same_thread=False)
         self.blob_creator_type = BlobFileCreator
@@ -35,17 +44,71 @@ class DiskBlobManager(DHTHashSupplier):
         #       be thousands of blobs loaded up, many stale
         self.blobs = {}
         self.blob_hashes_to_delete = {}  # {blob_hash: being_deleted (True/False)}
+        # hashes of the completed blobs, used to answer availability queries without
+        # touching the file system
+        self.verified_blobs = VerifiedBlobIndex()
+        self._blobs_changed_callbacks = []
+        self.scrubber = BlobScrubber(self, conf.settings['blob_scrub_rate'],
+                                     conf.settings['blob_reverify_interval'])
 
     @defer.inlineCallbacks
     def setup(self):
         log.info("Starting disk blob manager. blob_dir: %s, db_file: %s", str(self.blob_dir),
                  str(self.db_file))
         yield self._open_db()
+        yield self._start_layout_migration()
+        blob_hashes = yield self._get_all_blob_hashes()
+        self.verified_blobs.load(blob_hash for blob_hash, in blob_hashes)
+        log.info("Loaded %i verified blob hashes", len(self.verified_blobs))
 
+    @defer.inlineCallbacks
+    def _start_layout_migration(self):
+        shard_depth = yield threads.deferToThread(read_shard_depth, self.blob_dir)
+        if shard_depth == self.layout.shard_depth:
+            return
+        # blobs are looked up at their old path too until every blob has been moved
+        self.layout.legacy_shard_depth = shard_depth
+
+        def finished(_):
+            self._layout_migration = None
+            if not self._stopping:
+                self.layout.legacy_shard_depth = None
+
+        def failed(err):
+            log.error("Failed to migrate the blob dir layout: %s", err.getErrorMessage())
+
+        self._layout_migration = threads.deferToThread(migrate_blob_dir, self.blob_dir,
+                                                       self.layout.shard_depth,
+                                                       lambda: self._stopping)
+        self._layout_migration.addErrback(failed)
+        self._layout_migration.addCallback(finished)
+
+    def wait_for_layout_migration(self):
+        """Returns a deferred which fires once blob files aren't being moved to a new layout"""
+        if self._layout_migration is None:
+            return defer.succeed(None)
+        d = defer.Deferred()
+
+        def finished(result):
+            d.callback(None)
+            return result
+
+        self._layout_migration.addBoth(finished)
+        return d
+
+    def start_scrubber(self):
+        if conf.settings['blob_scrub_rate']:
+            self.scrubber.start()
+
+    @defer.inlineCallbacks
     def stop(self):
         log.info("Stopping disk blob manager.")
+        self._stopping = True
+        yield self.scrubber.stop()
+        if self._layout_migration is not None:
+            yield self._layout_migration
         self.db_conn.close()
-        return defer.succeed(True)
+        defer.returnValue(True)
 
     def get_blob(self, blob_hash, length=None):
         """Return a blob identified by blob_hash, which may be a new blob or a
@@ -54,15 +117,17 @@ class DiskBlobManager(DHTHashSupplier):
         if length is not None and not isinstance(length, int):
             raise Exception("invalid length type: %s (%s)" % (length, str(type(length))))
         if blob_hash in self.blobs:
+            metrics.BLOB_LOOKUPS.labels('hit').inc()
             return defer.succeed(self.blobs[blob_hash])
+        metrics.BLOB_LOOKUPS.labels('miss').inc()
         return self._make_new_blob(blob_hash, length)
 
     def get_blob_creator(self):
-        return self.blob_creator_type(self.blob_dir)
+        return self.blob_creator_type(self.blob_dir, self.layout)
 
     def _make_new_blob(self, blob_hash, length=None):
         log.debug('Making a new blob for %s', blob_hash)
-        blob = BlobFile(self.blob_dir, blob_hash, length)
+        blob = BlobFile(self.blob_dir, blob_hash, length, self.layout)
         self.blobs[blob_hash] = blob
         return defer.succeed(blob)
 
@@ -77,13 +142,48 @@ class DiskBlobManager(DHTHashSupplier):
             next_announce_time = self.get_next_announce_time()
         yield self._add_completed_blob(blob.blob_hash, blob.length,
                                        next_announce_time, should_announce)
+        self.verified_blobs.add(blob.blob_hash)
+        self._blobs_changed([blob.blob_hash])
         # we announce all blobs immediately, if announce_head_blob_only is False
         # otherwise, announce only if marked as should_announce
         if not self.announce_head_blobs_only or should_announce:
             reactor.callLater(0, self._immediate_announce, [blob.blob_hash])
 
+    @defer.inlineCallbacks
+    def blobs_completed(self, blobs, should_announce=()):
+        """Add many completed blobs at once, the ones in should_announce are announced"""
+        next_announce_time = self.get_next_announce_time()
+        yield self._add_completed_blobs([
+            (blob.blob_hash, blob.length, next_announce_time,
+             1 if blob.blob_hash in should_announce else 0) for blob in blobs])
+        for blob in blobs:
+            self.verified_blobs.add(blob.blob_hash)
+        self._blobs_changed([blob.blob_hash for blob in blobs])
+        to_announce = [blob.blob_hash for blob in blobs
+                       if not self.announce_head_blobs_only or blob.blob_hash in should_announce]
+        if to_announce:
+            reactor.callLater(0, self._immediate_announce, to_announce)
+
+    def add_blobs_changed_callback(self, callback):
+        """Call callback(blob_hashes) each time blobs are completed or deleted"""
+        self._blobs_changed_callbacks.append(callback)
+
+    def remove_blobs_changed_callback(self, callback):
+        if callback in self._blobs_changed_callbacks:
+            self._blobs_changed_callbacks.remove(callback)
+
+    def _blobs_changed(self, blob_hashes):
+        for callback in self._blobs_changed_callbacks:
+            callback(blob_hashes)
+
     def completed_blobs(self, blobhashes_to_check):
-        return self._completed_blobs(blobhashes_to_check)
+        return defer.succeed(self.verified_blobs.filter_verified(blobhashes_to_check))
+
+    def missing_blobs(self, blobhashes_to_check):
+        return defer.succeed(self.verified_blobs.filter_missing(blobhashes_to_check))
+
+    def is_blob_verified(self, blob_hash):
+        return blob_hash in self.verified_blobs
 
     def hashes_to_announce(self):
         return self._get_blobs_to_announce()
@@ -111,7 +211,8 @@ class DiskBlobManager(DHTHashSupplier):
             raise Exception("Creator finished for blob that is already marked as completed")
         if blob_creator.length is None:
             raise Exception("Blob has a length of 0")
-        new_blob = BlobFile(self.blob_dir, blob_creator.blob_hash, blob_creator.length)
+        new_blob = BlobFile(self.blob_dir, blob_creator.blob_hash, blob_creator.length,
+                            self.layout)
         self.blobs[blob_creator.blob_hash] = new_blob
         next_announce_time = self.get_next_announce_time()
         d = self.blob_completed(new_blob, next_announce_time, should_announce)
@@ -153,11 +254,45 @@ class DiskBlobManager(DHTHashSupplier):
                 blob = yield self.get_blob(blob_hash)
                 yield blob.delete()
                 bh_to_delete_from_db.append(blob_hash)
+                self.verified_blobs.remove(blob_hash)
                 del self.blobs[blob_hash]
             except Exception as e:
                 log.warning("Failed to delete blob file. Reason: %s", e)
+        self._blobs_changed(bh_to_delete_from_db)
         yield self._delete_blobs_from_db(bh_to_delete_from_db)
 
+    def forget_blobs(self, blob_hashes):
+        """Remove blobs whose files have disappeared from the database"""
+        for blob_hash in blob_hashes:
+            self.verified_blobs.remove(blob_hash)
+            self.blobs.pop(blob_hash, None)
+        self._blobs_changed(blob_hashes)
+        return self._delete_blobs_from_db(blob_hashes)
+
+    @defer.inlineCallbacks
+    def adopt_blob(self, blob_hash, length):
+        """Add a verified blob file that is missing from the database"""
+        yield self._add_completed_blob(blob_hash, length, self.get_next_announce_time(), False)
+        yield self._update_blob_verified_timestamp(blob_hash, time.time())
+        self.verified_blobs.add(blob_hash)
+
+    def get_all_blob_lengths(self):
+        return self._get_all_blob_lengths()
+
+    def get_blobs_to_verify(self, verified_before=None):
+        return self._get_blobs_to_verify(verified_before)
+
+    def update_blobs_verified_timestamp(self, blob_hashes, timestamp):
+        return self._update_blobs_verified_timestamp(blob_hashes, timestamp)
+
+    def save_reflected_blobs(self, blob_hashes, reflector, timestamp):
+        """Remember that a reflector has the given blobs"""
+        return self._save_reflected_blobs(blob_hashes, reflector, timestamp)
+
+    def get_reflected_blobs(self, blob_hashes, reflector, reflected_after=None):
+        """Returns the set of the given blobs the reflector had since reflected_after"""
+        return self._get_reflected_blobs(blob_hashes, reflector, reflected_after)
+
     ######### database calls #########
 
     def _open_db(self):
@@ -190,6 +325,12 @@ class DiskBlobManager(DHTHashSupplier):
                                 "    rate float, " +
                                 "    ts integer)")
 
+            transaction.execute("create table if not exists reflected_blobs (" +
+                                "    blob_hash text, " +
+                                "    reflector text, " +
+                                "    timestamp integer, " +
+                                "    primary key (blob_hash, reflector))")
+
         return self.db_conn.runInteraction(create_tables)
 
     @rerun_if_locked
@@ -204,6 +345,14 @@ class DiskBlobManager(DHTHashSupplier):
         d.addErrback(lambda err: err.trap(sqlite3.IntegrityError))
         return d
 
+    @rerun_if_locked
+    def _add_completed_blobs(self, blob_infos):
+        def add_blobs(transaction):
+            transaction.executemany("insert or ignore into blobs (blob_hash, blob_length, "
+                                    "next_announce_time, should_announce) values (?, ?, ?, ?)",
+                                    blob_infos)
+        return self.db_conn.runInteraction(add_blobs)
+
     @rerun_if_locked
     @defer.inlineCallbacks
     def _set_should_announce(self, blob_hash, next_announce_time, should_announce):
@@ -225,17 +374,37 @@ class DiskBlobManager(DHTHashSupplier):
         result = yield self.db_conn.runQuery("select count(*) from blobs where should_announce=1")
         defer.returnValue(result[0][0])
 
-    @defer.inlineCallbacks
-    def _completed_blobs(self, blobhashes_to_check):
-        """Returns of the blobhashes_to_check, which are valid"""
-        blobs = yield defer.DeferredList([self.get_blob(b) for b in blobhashes_to_check])
-        blob_hashes = [b.blob_hash for success, b in blobs if success and b.verified]
-        defer.returnValue(blob_hashes)
-
     @rerun_if_locked
     def _update_blob_verified_timestamp(self, blob, timestamp):
         return self.db_conn.runQuery("update blobs set last_verified_time = ? where blob_hash = ?",
-                                     (blob, timestamp))
+                                     (timestamp, blob))
+
+    @rerun_if_locked
+    def _update_blobs_verified_timestamp(self, blob_hashes, timestamp):
+        def update_timestamps(transaction):
+            transaction.executemany("update blobs set last_verified_time = ? where blob_hash = ?",
+                                    [(timestamp, blob_hash) for blob_hash in blob_hashes])
+
+        return self.db_conn.runInteraction(update_timestamps)
+
+    @rerun_if_locked
+    @defer.inlineCallbacks
+    def _get_blobs_to_verify(self, verified_before=None):
+        # blobs which have never been verified sort first
+        if verified_before is None:
+            blob_hashes = yield self.db_conn.runQuery(
+                "select blob_hash from blobs order by last_verified_time")
+        else:
+            blob_hashes = yield self.db_conn.runQuery(
+                "select blob_hash from blobs where last_verified_time is null "
+                "or last_verified_time < ? order by last_verified_time", (verified_before,))
+        defer.returnValue([blob_hash for blob_hash, in blob_hashes])
+
+    @rerun_if_locked
+    @defer.inlineCallbacks
+    def _get_all_blob_lengths(self):
+        blob_lengths = yield self.db_conn.runQuery("select blob_hash, blob_length from blobs")
+        defer.returnValue({blob_hash: length for blob_hash, length in blob_lengths})
 
     @rerun_if_locked
     def _get_blobs_to_announce(self):
@@ -268,9 +437,32 @@ class DiskBlobManager(DHTHashSupplier):
         def delete_blobs(transaction):
             for b in blob_hashes:
                 transaction.execute("delete from blobs where blob_hash = ?", (b,))
+                transaction.execute("delete from reflected_blobs where blob_hash = ?", (b,))
 
         return self.db_conn.runInteraction(delete_blobs)
 
+    @rerun_if_locked
+    def _save_reflected_blobs(self, blob_hashes, reflector, timestamp):
+        def save(transaction):
+            transaction.executemany("insert or replace into reflected_blobs values (?, ?, ?)",
+                                    [(blob_hash, reflector, timestamp)
+                                     for blob_hash in blob_hashes])
+        return self.db_conn.runInteraction(save)
+
+    @rerun_if_locked
+    def _get_reflected_blobs(self, blob_hashes, reflector, reflected_after=None):
+        def get_reflected(transaction):
+            reflected = set()
+            # leave room for the reflector parameter
+            for chunk in in_chunks(blob_hashes, MAX_QUERY_PARAMETERS - 1):
+                rows = transaction.execute(
+                    "select blob_hash, timestamp from reflected_blobs where reflector = ? and "
+                    "blob_hash in (%s)" % placeholders(chunk), [reflector] + chunk).fetchall()
+                reflected.update(blob_hash for blob_hash, timestamp in rows
+                                 if reflected_after is None or timestamp > reflected_after)
+            return reflected
+        return self.db_conn.runInteraction(get_reflected)
+
     @rerun_if_locked
     def _get_all_blob_hashes(self):
         d = self.db_conn.runQuery("select blob_hash from blobs")
@@ -289,12 +481,8 @@ class DiskBlobManager(DHTHashSupplier):
         d = self._get_all_blob_hashes()
 
         def get_verified_blobs(blobs):
-            verified_blobs = []
-            for blob_hash, in blobs:
-                file_path = os.path.join(self.blob_dir, blob_hash)
-                if os.path.isfile(file_path):
-                    verified_blobs.append(blob_hash)
-            return verified_blobs
+            blob_files = self.layout.scan()
+            return [blob_hash for blob_hash, in blobs if blob_hash in blob_files]
 
         d.addCallback(lambda blobs: threads.deferToThread(get_verified_blobs, blobs))
         return d
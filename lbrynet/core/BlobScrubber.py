@@ -0,0 +1,188 @@
+import logging
+import os
+import time
+
+from twisted.internet import defer, threads
+from lbrynet.core import utils
+from lbrynet.core.cryptoutils import get_lbry_hash_obj
+
+log = logging.getLogger(__name__)
+
+
+def hash_blob_file(file_path, chunk_size=2 ** 16):
+    hashsum = get_lbry_hash_obj()
+    with open(file_path, 'rb') as blob_file:
+        chunk = blob_file.read(chunk_size)
+        while chunk:
+            hashsum.update(chunk)
+            chunk = blob_file.read(chunk_size)
+    return hashsum.hexdigest()
+
+
+class BlobScrubber(object):
+    """Reconciles the blob directory with blobs.db and re-hashes blobs in the background
+
+    Each pass scans the blob directory once, forgets blobs whose files are gone, deletes
+    files with the wrong length, adopts valid files which are missing from the database
+    and then re-hashes the blobs which have never been verified, or were last verified
+    more than `reverify_interval` seconds ago, oldest first. Hashing happens in the
+    thread pool and is paced to read at most `max_bytes_per_second`.
+    """
+
+    def __init__(self, blob_manager, max_bytes_per_second=None, reverify_interval=None,
+                 batch_size=20, start_delay=60, pass_interval=60 * 60):
+        self.blob_manager = blob_manager
+        self.max_bytes_per_second = max_bytes_per_second
+        self.reverify_interval = reverify_interval
+        self.batch_size = batch_size
+        self.start_delay = start_delay
+        self.pass_interval = pass_interval
+        self.stopped = False
+        self._next_pass = None
+        self._sleep = None
+        self._sleep_call = None
+        self._scrubbing = None
+
+    def start(self):
+        self.stopped = False
+        self._schedule(self.start_delay)
+
+    def stop(self):
+        self.stopped = True
+        if self._next_pass is not None and self._next_pass.active():
+            self._next_pass.cancel()
+        self._next_pass = None
+        if self._sleep_call is not None and self._sleep_call.active():
+            self._sleep_call.cancel()
+            self._sleep_call = None
+            self._sleep.callback(None)
+        if self._scrubbing is not None:
+            return self._scrubbing
+        return defer.succeed(None)
+
+    def _schedule(self, delay):
+        self._next_pass = utils.call_later(delay, self._run)
+
+    def _run(self):
+        self._next_pass = None
+        self._scrubbing = self.scrub()
+        self._scrubbing.addErrback(lambda err: log.error("Blob scrubber failed: %s",
+                                                         err.getTraceback()))
+
+        def finished(_):
+            self._scrubbing = None
+            if not self.stopped:
+                self._schedule(self.pass_interval)
+
+        self._scrubbing.addCallback(finished)
+
+    def _is_in_use(self, blob_hash):
+        blob = self.blob_manager.blobs.get(blob_hash)
+        return blob is not None and (blob.writers or blob.readers)
+
+    def _pause(self, seconds):
+        self._sleep = defer.Deferred()
+        self._sleep_call = utils.call_later(seconds, self._sleep.callback, None)
+        return self._sleep
+
+    @defer.inlineCallbacks
+    def scrub(self):
+        start = time.time()
+        yield self.reconcile()
+        verified, corrupted = yield self.verify_blobs()
+        log.info("Blob scrubber finished in %f seconds, verified %i blobs and removed %i "
+                 "corrupted blobs", time.time() - start, verified, corrupted)
+
+    @defer.inlineCallbacks
+    def reconcile(self):
+        # a blob being moved to its new path may be missed by the scan, so the blob directory
+        # is only scanned once it has its final layout
+        yield self.blob_manager.wait_for_layout_migration()
+        if self.stopped:
+            defer.returnValue(([], [], []))
+        # blob files are written before their rows are added, so reading the database first
+        # means every blob in it was already in the blob directory when it is scanned, and a
+        # blob completed in between is only seen as a file, which is adopted
+        blob_lengths = yield self.blob_manager.get_all_blob_lengths()
+        blob_files = yield threads.deferToThread(self.blob_manager.layout.scan)
+        missing, wrong_length = [], []
+        for blob_hash, length in blob_lengths.iteritems():
+            if self._is_in_use(blob_hash):
+                continue
+            if blob_hash not in blob_files:
+                missing.append(blob_hash)
+            elif length is not None and blob_files[blob_hash] != length:
+                wrong_length.append(blob_hash)
+        if missing:
+            log.warning("%i blobs are missing from the blob directory", len(missing))
+            yield self.blob_manager.forget_blobs(missing)
+        if wrong_length:
+            log.warning("Deleting %i blobs with the wrong length", len(wrong_length))
+            yield self.blob_manager.delete_blobs(wrong_length)
+        orphans = [blob_hash for blob_hash in blob_files
+                   if blob_hash not in blob_lengths and not self._is_in_use(blob_hash)]
+        if orphans:
+            log.info("Found %i blob files which aren't in the database", len(orphans))
+            for blob_hash in orphans:
+                valid = yield self._verify_blob(blob_hash, blob_files[blob_hash])
+                if self.stopped:
+                    break
+                if valid:
+                    yield self.blob_manager.adopt_blob(blob_hash, blob_files[blob_hash])
+                elif valid is False:
+                    yield self.blob_manager.delete_blobs([blob_hash])
+        defer.returnValue((missing, wrong_length, orphans))
+
+    @defer.inlineCallbacks
+    def verify_blobs(self):
+        verified_before = None
+        if self.reverify_interval is not None:
+            verified_before = time.time() - self.reverify_interval
+        blob_hashes = yield self.blob_manager.get_blobs_to_verify(verified_before)
+        num_verified, num_corrupted = 0, 0
+        for i in xrange(0, len(blob_hashes), self.batch_size):
+            verified, corrupted = [], []
+            for blob_hash in blob_hashes[i:i + self.batch_size]:
+                if self.stopped:
+                    break
+                if self._is_in_use(blob_hash):
+                    continue
+                valid = yield self._verify_blob(blob_hash)
+                if valid:
+                    verified.append(blob_hash)
+                elif valid is False:
+                    corrupted.append(blob_hash)
+            if corrupted:
+                log.warning("Deleting %i corrupted blobs", len(corrupted))
+                yield self.blob_manager.delete_blobs(corrupted)
+            if verified:
+                yield self.blob_manager.update_blobs_verified_timestamp(verified, time.time())
+            num_verified += len(verified)
+            num_corrupted += len(corrupted)
+            if self.stopped:
+                break
+        defer.returnValue((num_verified, num_corrupted))
+
+    @defer.inlineCallbacks
+    def _verify_blob(self, blob_hash, length=None):
+        """Returns True if the blob file hashes to its name, False if it doesn't and None if
+        the file couldn't be read"""
+        file_path = self.blob_manager.layout.find(blob_hash)
+        if file_path is None:
+            defer.returnValue(None)
+        start = time.time()
+        try:
+            if length is None:
+                length = os.path.getsize(file_path)
+            file_hash = yield threads.deferToThread(hash_blob_file, file_path)
+        except (IOError, OSError) as err:
+            log.warning("Failed to verify blob %s: %s", blob_hash[:16], err)
+            defer.returnValue(None)
+        if self.max_bytes_per_second:
+            delay = float(length) / self.max_bytes_per_second - (time.time() - start)
+            if delay > 0 and not self.stopped:
+                yield self._pause(delay)
+        if file_hash != blob_hash:
+            log.warning("Blob %s is corrupted", blob_hash[:16])
+            defer.returnValue(False)
+        defer.returnValue(True)
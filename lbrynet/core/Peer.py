@@ -1,9 +1,50 @@
 import datetime
+import time
 from collections import defaultdict
 from lbrynet.core import utils
 
+
+class DecayingAverage(object):
+    """An exponentially weighted moving average whose history also decays with age
+
+    Each new sample replaces `alpha` of the current value, and the weight of the
+    current value is halved for every `half_life` seconds since the last sample, so
+    measurements taken long ago count for little against a fresh one.
+    """
+
+    def __init__(self, half_life, alpha=0.3, value=None, last_update=None):
+        self.half_life = half_life
+        self.alpha = alpha
+        self.value = value
+        self.last_update = last_update
+
+    def update(self, sample, now=None):
+        now = now if now is not None else time.time()
+        if self.value is None or self.last_update is None:
+            self.value = float(sample)
+        else:
+            elapsed = max(0.0, now - self.last_update)
+            retain = (1.0 - self.alpha) * 0.5 ** (elapsed / self.half_life)
+            self.value = retain * self.value + (1.0 - retain) * sample
+        self.last_update = now
+        return self.value
+
+    def get(self, default=None):
+        if self.value is None:
+            return default
+        return self.value
+
+
 # Do not create this object except through PeerManager
 class Peer(object):
+    # measurements older than this count half as much as a fresh sample
+    MEASUREMENT_HALF_LIFE = 60 * 60
+    # the first failure backs off for this long, doubling for each consecutive failure
+    BASE_BACKOFF = 60
+    MAX_BACKOFF = 60 * 60
+    # transfers smaller than this are dominated by latency and say little about throughput
+    MIN_THROUGHPUT_SAMPLE_BYTES = 2 ** 16
+
     def __init__(self, host, port):
         self.host = host
         self.port = port
@@ -15,6 +56,13 @@ class Peer(object):
         self.success_count = 0
         self.score = 0
         self.stats = defaultdict(float)  # {string stat_type, float count}
+        # seconds from starting a tcp connection to it being established
+        self.connect_latency = DecayingAverage(self.MEASUREMENT_HALF_LIFE)
+        # seconds from sending a request to receiving the first byte of the response
+        self.first_byte_latency = DecayingAverage(self.MEASUREMENT_HALF_LIFE)
+        # bytes per second sustained while receiving blob data
+        self.throughput = DecayingAverage(self.MEASUREMENT_HALF_LIFE)
+        self.last_seen = None
 
     def is_available(self):
         if self.attempt_connection_at is None or utils.today() > self.attempt_connection_at:
@@ -24,15 +72,45 @@ class Peer(object):
     def report_up(self):
         self.down_count = 0
         self.attempt_connection_at = None
+        self.last_seen = time.time()
 
     def report_success(self):
         self.success_count += 1
 
     def report_down(self):
         self.down_count += 1
-        timeout_time = datetime.timedelta(seconds=60 * self.down_count)
+        backoff = min(self.BASE_BACKOFF * 2 ** (self.down_count - 1), self.MAX_BACKOFF)
+        timeout_time = datetime.timedelta(seconds=backoff)
         self.attempt_connection_at = utils.today() + timeout_time
 
+    def report_connect_latency(self, seconds):
+        self.connect_latency.update(seconds)
+
+    def report_first_byte_latency(self, seconds):
+        self.first_byte_latency.update(seconds)
+
+    def report_transfer(self, num_bytes, seconds):
+        if num_bytes < self.MIN_THROUGHPUT_SAMPLE_BYTES or seconds <= 0:
+            return
+        self.throughput.update(num_bytes / seconds)
+
+    def has_measurements(self):
+        return self.throughput.value is not None or self.connect_latency.value is not None
+
+    def expected_throughput(self, default_throughput, transfer_size=2 ** 21):
+        """Estimate the effective bytes per second of downloading a blob from this peer
+
+        The estimate includes the time spent connecting and waiting for the first byte,
+        so that a fast but distant peer is weighed against a slower nearby one. Peers
+        which have been failing are discounted by their consecutive failure count.
+        """
+        throughput = self.throughput.get(default_throughput)
+        if not throughput:
+            return 0.0
+        overhead = self.connect_latency.get(0.0) + self.first_byte_latency.get(0.0)
+        expected = transfer_size / (overhead + float(transfer_size) / throughput)
+        return expected / (1 + self.down_count)
+
     def update_score(self, score_change):
         self.score += score_change
 
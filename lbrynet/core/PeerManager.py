@@ -1,14 +1,117 @@
+import datetime
+import logging
+import os
+import time
+
+from twisted.internet import defer
+from twisted.enterprise import adbapi
 from lbrynet.core.Peer import Peer
+from lbrynet.core.sqlite_helpers import rerun_if_locked
+
+log = logging.getLogger(__name__)
 
 
 class PeerManager(object):
-    def __init__(self):
-        self.peers = []
+    # forget about peers we haven't heard from in this long
+    PEER_EXPIRATION_TIME = 30 * 24 * 60 * 60
+
+    def __init__(self, db_dir=None):
+        """
+        db_dir - directory where the sqlite database of peer measurements is stored,
+                 if None the measurements are only kept in memory
+        """
+        self.peers = {}  # {(host, port): Peer}
+        self.db_dir = db_dir
+        self.db_conn = None
+
+    @defer.inlineCallbacks
+    def setup(self):
+        if self.db_dir is None:
+            defer.returnValue(None)
+        db_file = os.path.join(self.db_dir, "peers.db")
+        self.db_conn = adbapi.ConnectionPool('sqlite3', db_file, check_same_thread=False)
+        yield self._open_db()
+        yield self._load_peers()
+
+    @defer.inlineCallbacks
+    def stop(self):
+        if self.db_conn is not None:
+            try:
+                yield self._save_peers()
+            except Exception as err:
+                log.warning("Failed to save peer measurements: %s", err)
+            self.db_conn.close()
+            self.db_conn = None
 
     def get_peer(self, host, port):
-        for peer in self.peers:
-            if peer.host == host and peer.port == port:
-                return peer
-        peer = Peer(host, port)
-        self.peers.append(peer)
-        return peer
+        key = (host, port)
+        if key not in self.peers:
+            self.peers[key] = Peer(host, port)
+        return self.peers[key]
+
+    ######### database calls #########
+
+    def _open_db(self):
+        def create_tables(transaction):
+            transaction.execute('PRAGMA journal_mode=WAL')
+            transaction.execute("create table if not exists peers (" +
+                                "    host text, " +
+                                "    port integer, " +
+                                "    connect_latency real, " +
+                                "    first_byte_latency real, " +
+                                "    throughput real, " +
+                                "    measured_time real, " +
+                                "    down_count integer, " +
+                                "    success_count integer, " +
+                                "    attempt_connection_at real, " +
+                                "    last_seen real, " +
+                                "    primary key (host, port))")
+
+        return self.db_conn.runInteraction(create_tables)
+
+    @rerun_if_locked
+    @defer.inlineCallbacks
+    def _load_peers(self):
+        expiration = time.time() - self.PEER_EXPIRATION_TIME
+        yield self.db_conn.runOperation("delete from peers where last_seen < ?", (expiration,))
+        rows = yield self.db_conn.runQuery(
+            "select host, port, connect_latency, first_byte_latency, throughput, measured_time, "
+            "down_count, success_count, attempt_connection_at, last_seen from peers")
+        for (host, port, connect_latency, first_byte_latency, throughput, measured_time,
+             down_count, success_count, attempt_connection_at, last_seen) in rows:
+            peer = self.get_peer(str(host), port)
+            peer.connect_latency.value = connect_latency
+            peer.first_byte_latency.value = first_byte_latency
+            peer.throughput.value = throughput
+            for average in (peer.connect_latency, peer.first_byte_latency, peer.throughput):
+                average.last_update = measured_time
+            peer.down_count = down_count or 0
+            peer.success_count = success_count or 0
+            if attempt_connection_at is not None:
+                peer.attempt_connection_at = datetime.datetime.fromtimestamp(
+                    attempt_connection_at)
+            peer.last_seen = last_seen
+        log.info("Loaded measurements for %i peers", len(rows))
+
+    @rerun_if_locked
+    def _save_peers(self):
+        rows = []
+        for peer in self.peers.itervalues():
+            if not peer.has_measurements() and not peer.down_count:
+                continue
+            attempt_connection_at = None
+            if peer.attempt_connection_at is not None:
+                attempt_connection_at = time.mktime(peer.attempt_connection_at.timetuple())
+            measured_time = max(peer.connect_latency.last_update,
+                                peer.first_byte_latency.last_update,
+                                peer.throughput.last_update)
+            rows.append((peer.host, peer.port, peer.connect_latency.value,
+                         peer.first_byte_latency.value, peer.throughput.value, measured_time,
+                         peer.down_count, peer.success_count, attempt_connection_at,
+                         peer.last_seen or time.time()))
+
+        def save_peers(transaction):
+            transaction.executemany("insert or replace into peers values "
+                                    "(?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+        return self.db_conn.runInteraction(save_peers)
@@ -7,6 +7,10 @@ from twisted.internet import task
 
 log = logging.getLogger(__name__)
 
+# traffic classes, protocols may set a `rate_limit_class` attribute to one of these
+PEER_TRAFFIC = 'peer'
+REFLECTOR_TRAFFIC = 'reflector'
+
 
 class DummyRateLimiter(object):
     def __init__(self):
@@ -37,47 +41,273 @@ class DummyRateLimiter(object):
     def set_ul_limit(self, limit):
         pass
 
-    def report_dl_bytes(self, num_bytes):
+    def report_dl_bytes(self, num_bytes, protocol=None):
         self.dl_bytes_this_second += num_bytes
         self.total_dl_bytes += num_bytes
 
-    def report_ul_bytes(self, num_bytes):
+    def report_ul_bytes(self, num_bytes, protocol=None):
         self.ul_bytes_this_second += num_bytes
         self.total_ul_bytes += num_bytes
 
+    def register_protocol(self, protocol):
+        pass
+
+    def unregister_protocol(self, protocol):
+        pass
+
+
+class TokenBucket(object):
+    """Tokens (bytes) accumulate at `rate` per second up to `burst_seconds` worth of rate
+
+    A rate of None means the bucket is unlimited and never runs out. The bucket is
+    charged after the bytes have been transferred, so it can go negative, in which
+    case the owner should stay throttled until the refills pay off the debt.
+    """
+
+    def __init__(self, rate=None, burst_seconds=0.5):
+        self.burst_seconds = burst_seconds
+        self.rate = None
+        self.capacity = None
+        self.tokens = None
+        self.set_rate(rate)
+
+    def set_rate(self, rate):
+        if rate is None:
+            self.rate = self.capacity = self.tokens = None
+            return
+        capacity = max(rate * self.burst_seconds, 1.0)
+        if self.tokens is None:
+            self.tokens = capacity
+        else:
+            self.tokens = min(self.tokens, capacity)
+        self.rate = rate
+        self.capacity = capacity
+
+    def refill(self, elapsed):
+        if self.rate is not None:
+            self.tokens = min(self.capacity, self.tokens + self.rate * elapsed)
+
+    def consume(self, num_bytes):
+        if self.rate is not None:
+            self.tokens -= num_bytes
+
+    def is_empty(self):
+        return self.rate is not None and self.tokens <= 0
+
+
+class BandwidthScheduler(object):
+    """Hierarchical token buckets for one direction of traffic
+
+    Bytes reported by a protocol are charged to the global bucket, to the bucket of the
+    peer and the stream the protocol belongs to (if those are limited) and to the
+    protocol's own share. Every tick the global rate is split between the protocols that
+    are using bandwidth in proportion to their traffic class weight, so a single busy
+    connection can't starve the others. Only the protocols which ran out of tokens are
+    throttled, and they are resumed on the first tick after they can send again.
+    """
+
+    def __init__(self, throttle_method, unthrottle_method, max_bytes=None,
+                 max_peer_bytes=None, max_stream_bytes=None, weights=None, burst_seconds=0.5):
+        self._throttle_method = throttle_method
+        self._unthrottle_method = unthrottle_method
+        self.burst_seconds = burst_seconds
+        self.global_bucket = TokenBucket(max_bytes, burst_seconds)
+        self.max_peer_bytes = max_peer_bytes
+        self.max_stream_bytes = max_stream_bytes
+        self.weights = weights or {}
+        self.shares = {}  # {protocol: TokenBucket}
+        self.peer_buckets = {}  # {peer host: [TokenBucket, number of protocols]}
+        self.stream_buckets = {}  # {stream key: [TokenBucket, number of protocols]}
+        self.active = set()  # protocols which used bandwidth since the last tick
+        self.throttled = set()
+        self.bytes_this_interval = 0
+        self.total_bytes = 0
+
+    @property
+    def max_bytes(self):
+        return self.global_bucket.rate
+
+    def set_limit(self, max_bytes):
+        self.global_bucket.set_rate(max_bytes)
+        if max_bytes is None:
+            for share in self.shares.itervalues():
+                share.set_rate(None)
+
+    def weight(self, protocol):
+        return self.weights.get(getattr(protocol, 'rate_limit_class', PEER_TRAFFIC), 1)
+
+    @staticmethod
+    def _peer_key(protocol):
+        peer = getattr(protocol, 'peer', None)
+        if peer is None:
+            return None
+        return peer.host
+
+    @staticmethod
+    def _stream_key(protocol):
+        return getattr(protocol, 'rate_limit_stream', None)
+
+    @staticmethod
+    def _add_ref(buckets, key, rate, burst_seconds):
+        if key is None or rate is None:
+            return
+        if key not in buckets:
+            buckets[key] = [TokenBucket(rate, burst_seconds), 0]
+        buckets[key][1] += 1
+
+    @staticmethod
+    def _remove_ref(buckets, key):
+        if key in buckets:
+            buckets[key][1] -= 1
+            if buckets[key][1] <= 0:
+                del buckets[key]
+
+    def _buckets(self, protocol):
+        buckets = [self.global_bucket]
+        if protocol in self.shares:
+            buckets.append(self.shares[protocol])
+            peer_key = self._peer_key(protocol)
+            if peer_key in self.peer_buckets:
+                buckets.append(self.peer_buckets[peer_key][0])
+            stream_key = self._stream_key(protocol)
+            if stream_key in self.stream_buckets:
+                buckets.append(self.stream_buckets[stream_key][0])
+        return buckets
+
+    def _can_send(self, protocol):
+        return not any(bucket.is_empty() for bucket in self._buckets(protocol))
+
+    def _throttle(self, protocol):
+        if protocol not in self.throttled:
+            self.throttled.add(protocol)
+            getattr(protocol, self._throttle_method)()
+
+    def _unthrottle(self, protocol):
+        if protocol in self.throttled:
+            self.throttled.remove(protocol)
+            getattr(protocol, self._unthrottle_method)()
+
+    def register(self, protocol):
+        if protocol in self.shares:
+            return
+        self.shares[protocol] = TokenBucket(None, self.burst_seconds)
+        self._add_ref(self.peer_buckets, self._peer_key(protocol), self.max_peer_bytes,
+                      self.burst_seconds)
+        self._add_ref(self.stream_buckets, self._stream_key(protocol), self.max_stream_bytes,
+                      self.burst_seconds)
+        if not self._can_send(protocol):
+            self._throttle(protocol)
+
+    def unregister(self, protocol):
+        if protocol not in self.shares:
+            return
+        del self.shares[protocol]
+        self._remove_ref(self.peer_buckets, self._peer_key(protocol))
+        self._remove_ref(self.stream_buckets, self._stream_key(protocol))
+        self.active.discard(protocol)
+        self.throttled.discard(protocol)
+
+    def report(self, num_bytes, protocol=None):
+        self.bytes_this_interval += num_bytes
+        self.total_bytes += num_bytes
+        for bucket in self._buckets(protocol):
+            bucket.consume(num_bytes)
+        if protocol in self.shares:
+            self.active.add(protocol)
+            if not self._can_send(protocol):
+                self._throttle(protocol)
+
+    def _update_shares(self):
+        competing = [p for p in self.shares if p in self.active or p in self.throttled]
+        total_weight = sum(self.weight(p) for p in competing)
+        for protocol, share in self.shares.iteritems():
+            if self.global_bucket.rate is None or protocol not in competing:
+                share.set_rate(None)
+            else:
+                share.set_rate(1.0 * self.global_bucket.rate * self.weight(protocol) /
+                               total_weight)
+
+    def tick(self, elapsed):
+        self.bytes_this_interval = 0
+        self.global_bucket.refill(elapsed)
+        for bucket, _ in self.peer_buckets.itervalues():
+            bucket.refill(elapsed)
+        for bucket, _ in self.stream_buckets.itervalues():
+            bucket.refill(elapsed)
+        self._update_shares()
+        for share in self.shares.itervalues():
+            share.refill(elapsed)
+        self.active = set()
+        for protocol in list(self.throttled):
+            if self._can_send(protocol):
+                self._unthrottle(protocol)
+
 
 class RateLimiter(object):
     """This class ensures that upload and download rates don't exceed specified maximums"""
 
     implements(IRateLimiter)
 
+    # relative share of the upload limit given to each traffic class when both are busy
+    UPLOAD_WEIGHTS = {PEER_TRAFFIC: 3, REFLECTOR_TRAFFIC: 1}
+
     #called by main application
 
-    def __init__(self, max_dl_bytes=None, max_ul_bytes=None):
-        self.max_dl_bytes = max_dl_bytes
-        self.max_ul_bytes = max_ul_bytes
-        self.dl_bytes_this_interval = 0
-        self.ul_bytes_this_interval = 0
-        self.total_dl_bytes = 0
-        self.total_ul_bytes = 0
+    def __init__(self, max_dl_bytes=None, max_ul_bytes=None, max_peer_dl_bytes=None,
+                 max_peer_ul_bytes=None, max_stream_dl_bytes=None, burst_seconds=0.5):
         self.tick_call = None
         self.tick_interval = 0.1
-
-        self.dl_throttled = False
-        self.ul_throttled = False
-
-        self.protocols = []
+        self._last_tick = None
+        self.download = BandwidthScheduler('throttle_download', 'unthrottle_download',
+                                           max_dl_bytes, max_peer_dl_bytes, max_stream_dl_bytes,
+                                           burst_seconds=burst_seconds)
+        self.upload = BandwidthScheduler('throttle_upload', 'unthrottle_upload',
+                                         max_ul_bytes, max_peer_ul_bytes,
+                                         weights=self.UPLOAD_WEIGHTS,
+                                         burst_seconds=burst_seconds)
+
+    @property
+    def max_dl_bytes(self):
+        return self.download.max_bytes
+
+    @property
+    def max_ul_bytes(self):
+        return self.upload.max_bytes
+
+    @property
+    def total_dl_bytes(self):
+        return self.download.total_bytes
+
+    @property
+    def total_ul_bytes(self):
+        return self.upload.total_bytes
+
+    @property
+    def dl_bytes_this_interval(self):
+        return self.download.bytes_this_interval
+
+    @property
+    def ul_bytes_this_interval(self):
+        return self.upload.bytes_this_interval
+
+    @property
+    def protocols(self):
+        return self.download.shares.keys()
 
     def start(self):
         log.info("Starting rate limiter.")
+        from twisted.internet import reactor
+        self._last_tick = reactor.seconds()
         self.tick_call = task.LoopingCall(self.tick)
         self.tick_call.start(self.tick_interval)
 
     def tick(self):
-        self.dl_bytes_this_interval = 0
-        self.ul_bytes_this_interval = 0
-        self.unthrottle_dl()
-        self.unthrottle_ul()
+        from twisted.internet import reactor
+        now = reactor.seconds()
+        elapsed = self.tick_interval if self._last_tick is None else now - self._last_tick
+        self._last_tick = now
+        self.download.tick(elapsed)
+        self.upload.tick(elapsed)
 
     def stop(self):
         log.info("Stopping rate limiter.")
@@ -86,71 +316,23 @@ class RateLimiter(object):
             self.tick_call = None
 
     def set_dl_limit(self, limit):
-        self.max_dl_bytes = limit
+        self.download.set_limit(limit)
 
     def set_ul_limit(self, limit):
-        self.max_ul_bytes = limit
-
-    #throttling
-
-    def check_dl(self):
-        need_throttle = (self.max_dl_bytes is not None and
-                         self.dl_bytes_this_interval > self.max_dl_bytes * self.tick_interval)
-        if need_throttle:
-            from twisted.internet import reactor
-            reactor.callLater(0, self.throttle_dl)
-
-    def check_ul(self):
-        need_throttle = (self.max_ul_bytes is not None and
-                         self.ul_bytes_this_interval > self.max_ul_bytes * self.tick_interval)
-        if need_throttle:
-            from twisted.internet import reactor
-            reactor.callLater(0, self.throttle_ul)
-
-    def throttle_dl(self):
-        if self.dl_throttled is False:
-            for protocol in self.protocols:
-                protocol.throttle_download()
-            self.dl_throttled = True
-
-    def throttle_ul(self):
-        if self.ul_throttled is False:
-            for protocol in self.protocols:
-                protocol.throttle_upload()
-            self.ul_throttled = True
-
-    def unthrottle_dl(self):
-        if self.dl_throttled is True:
-            for protocol in self.protocols:
-                protocol.unthrottle_download()
-            self.dl_throttled = False
-
-    def unthrottle_ul(self):
-        if self.ul_throttled is True:
-            for protocol in self.protocols:
-                protocol.unthrottle_upload()
-            self.ul_throttled = False
+        self.upload.set_limit(limit)
 
     #called by protocols
 
-    def report_dl_bytes(self, num_bytes):
-        self.dl_bytes_this_interval += num_bytes
-        self.total_dl_bytes += num_bytes
-        self.check_dl()
+    def report_dl_bytes(self, num_bytes, protocol=None):
+        self.download.report(num_bytes, protocol)
 
-    def report_ul_bytes(self, num_bytes):
-        self.ul_bytes_this_interval += num_bytes
-        self.total_ul_bytes += num_bytes
-        self.check_ul()
+    def report_ul_bytes(self, num_bytes, protocol=None):
+        self.upload.report(num_bytes, protocol)
 
     def register_protocol(self, protocol):
-        if protocol not in self.protocols:
-            self.protocols.append(protocol)
-            if self.dl_throttled is True:
-                protocol.throttle_download()
-            if self.ul_throttled is True:
-                protocol.throttle_upload()
+        self.download.register(protocol)
+        self.upload.register(protocol)
 
     def unregister_protocol(self, protocol):
-        if protocol in self.protocols:
-            self.protocols.remove(protocol)
+        self.download.unregister(protocol)
+        self.upload.unregister(protocol)
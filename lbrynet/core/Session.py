@@ -1,5 +1,6 @@
 import logging
 import miniupnpc
+from lbrynet import conf
 from lbrynet.core.BlobManager import DiskBlobManager
 from lbrynet.dht import node
 from lbrynet.core.PeerManager import PeerManager
@@ -150,7 +151,7 @@ class Session(object):
             self.wallet = PTCWallet(self.db_dir)
 
         if self.peer_manager is None:
-            self.peer_manager = PeerManager()
+            self.peer_manager = PeerManager(self.db_dir)
 
         if self.use_upnp is True:
             d = self._try_upnp()
@@ -185,6 +186,8 @@ class Session(object):
             ds.append(defer.maybeDeferred(self.wallet.stop))
         if self.blob_manager is not None:
             ds.append(defer.maybeDeferred(self.blob_manager.stop))
+        if self.peer_manager is not None:
+            ds.append(defer.maybeDeferred(self.peer_manager.stop))
         if self.use_upnp is True:
             ds.append(defer.maybeDeferred(self._unset_upnp))
         return defer.DeferredList(ds)
@@ -306,7 +309,12 @@ class Session(object):
         log.debug("Setting up the rest of the components")
 
         if self.rate_limiter is None:
-            self.rate_limiter = RateLimiter()
+            self.rate_limiter = RateLimiter(
+                max_dl_bytes=conf.settings['max_download_rate'] or None,
+                max_ul_bytes=conf.settings['max_upload_rate'] or None,
+                max_peer_dl_bytes=conf.settings['max_peer_download_rate'] or None,
+                max_peer_ul_bytes=conf.settings['max_peer_upload_rate'] or None,
+                max_stream_dl_bytes=conf.settings['max_stream_download_rate'] or None)
 
         if self.blob_manager is None:
             if self.blob_dir is None:
@@ -330,9 +338,11 @@ class Session(object):
         self.rate_limiter.start()
         d1 = self.blob_manager.setup()
         d2 = self.wallet.start()
+        d3 = self.peer_manager.setup()
 
-        dl = defer.DeferredList([d1, d2], fireOnOneErrback=True, consumeErrors=True)
+        dl = defer.DeferredList([d1, d2, d3], fireOnOneErrback=True, consumeErrors=True)
         dl.addCallback(lambda _: self.blob_tracker.start())
+        dl.addCallback(lambda _: self.blob_manager.start_scrubber())
         return dl
 
     def _unset_upnp(self):
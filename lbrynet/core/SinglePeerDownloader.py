@@ -27,8 +27,8 @@ class SinglePeerFinder(DummyPeerFinder):
 
 
 class BlobCallback(BlobFile):
-    def __init__(self, blob_dir, blob_hash, timeout):
-        BlobFile.__init__(self, blob_dir, blob_hash)
+    def __init__(self, blob_dir, blob_hash, timeout, layout=None):
+        BlobFile.__init__(self, blob_dir, blob_hash, layout=layout)
         self.callback = defer.Deferred()
         reactor.callLater(timeout, self._cancel)
 
@@ -75,7 +75,7 @@ class SinglePeerDownloader(object):
     def download_blob_from_peer(self, peer, timeout, blob_hash, blob_manager):
         log.debug("Try to download %s from %s", blob_hash, peer.host)
         blob_manager = blob_manager
-        blob = BlobCallback(blob_manager.blob_dir, blob_hash, timeout)
+        blob = BlobCallback(blob_manager.blob_dir, blob_hash, timeout, blob_manager.layout)
         download_manager = SingleBlobDownloadManager(blob)
         peer_finder = SinglePeerFinder(peer)
         requester = BlobRequester(blob_manager, peer_finder, self._payment_rate_manager,
@@ -1,6 +1,6 @@
 import os
 from future_builtins import zip
-from collections import defaultdict, deque
+from collections import defaultdict, deque, OrderedDict
 import datetime
 import logging
 import json
@@ -112,6 +112,46 @@ class CachedClaim(object):
         return claim
 
 
+class DecodedClaimCache(object):
+    """
+    The cache infos of the most recently used claims, with their values already decoded, by
+    claim id. Entries are dropped once they are older than `ttl` seconds, and the least recently
+    used ones once there are more than `max_size`.
+    """
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._claims = OrderedDict()  # {claim_id: (time added, cache info)}
+
+    def __len__(self):
+        return len(self._claims)
+
+    def __contains__(self, claim_id):
+        return claim_id in self._claims
+
+    def __iter__(self):
+        return iter(list(self._claims))
+
+    def get(self, claim_id):
+        if claim_id not in self._claims:
+            return None
+        added, cache_info = self._claims.pop(claim_id)
+        if time.time() - added > self.ttl:
+            return None
+        self._claims[claim_id] = (added, cache_info)
+        return cache_info
+
+    def add(self, claim_id, cache_info):
+        self._claims.pop(claim_id, None)
+        self._claims[claim_id] = (time.time(), cache_info)
+        while len(self._claims) > self.max_size:
+            self._claims.popitem(last=False)
+
+    def remove(self, claim_id):
+        self._claims.pop(claim_id, None)
+
+
 class MetaDataStorage(object):
     def load(self):
         return defer.succeed(True)
@@ -147,9 +187,39 @@ class MetaDataStorage(object):
     def save_claim_to_uri_cache(self, uri, claim_id, certificate_id=None):
         return defer.succeed(None)
 
+    @defer.inlineCallbacks
+    def save_claims_to_cache(self, claims, uri_claims=()):
+        """
+        Save claims and the uris they were resolved from
+
+        @param claims: list of (claim_id, name, claim_outpoint, claim_sequence, claim,
+            claim_address, height, amount, supports, channel_name, signature_is_valid)
+
+        @param uri_claims: list of (uri, claim_id, certificate_id)
+        """
+        for (claim_id, name, claim_outpoint, claim_sequence, claim, claim_address, height,
+             amount, supports, channel_name, signature_is_valid) in claims:
+            if claim.is_stream:
+                yield self.save_name_metadata(name, claim_outpoint, claim.source_hash)
+            yield self.update_claimid(claim_id, name, claim_outpoint)
+            yield self.save_claim_to_cache(claim_id, claim_sequence, claim, claim_address, height,
+                                           amount, supports, channel_name, signature_is_valid)
+        for uri, claim_id, certificate_id in uri_claims:
+            yield self.save_claim_to_uri_cache(uri, claim_id, certificate_id)
+
     def get_cached_claim_for_uri(self, uri, check_expire=True):
         return defer.succeed(None)
 
+    @defer.inlineCallbacks
+    def get_cached_claims_for_uris(self, uris, check_expire=True):
+        """Returns {uri: cached resolve result} for the uris with unexpired cached results"""
+        results = {}
+        for uri in uris:
+            result = yield self.get_cached_claim_for_uri(uri, check_expire)
+            if result:
+                results[uri] = result
+        defer.returnValue(results)
+
 
 class InMemoryStorage(MetaDataStorage):
     def __init__(self):
@@ -220,10 +290,15 @@ class InMemoryStorage(MetaDataStorage):
 
 
 class SqliteStorage(MetaDataStorage):
+    # sqlite allows up to 999 parameters in a query
+    MAX_QUERY_PARAMETERS = 900
+
     def __init__(self, db_dir):
         self.db_dir = db_dir
         self.db = adbapi.ConnectionPool('sqlite3', os.path.join(self.db_dir, "blockchainname.db"),
                                         check_same_thread=False)
+        self.claim_cache = DecodedClaimCache(conf.settings['claim_cache_size'],
+                                             conf.settings['cache_time'])
         MetaDataStorage.__init__(self)
 
     def load(self):
@@ -298,58 +373,52 @@ class SqliteStorage(MetaDataStorage):
         defer.returnValue(response)
 
 
-    @rerun_if_locked
-    @defer.inlineCallbacks
-    def _fix_malformed_supports_amount(self, row_id, supports, amount):
-        """
-        this fixes malformed supports and amounts that were entering the cache
-        support list of [txid, nout, amount in deweys] instead of list of
-        {'txid':,'nout':,'amount':}, with amount specified in dewey
-
-        and also supports could be "[]" (brackets enclosed by double quotes)
-        This code can eventually be removed, as new versions should not have this problem
-        """
-        fixed_supports = None
-        fixed_amount = None
-        supports = [] if not supports else json.loads(supports)
-        if isinstance(supports, (str, unicode)) and supports == '[]':
-            fixed_supports = []
-        elif len(supports) > 0 and not isinstance(supports[0], dict):
-            fixed_supports = []
-            fixed_amount = amount / 100000000.0
-            for support in supports:
-                fixed_supports.append(
-                    {'txid':support[0], 'nout':support[1], 'amount':support[2]/100000000.0})
-        if fixed_supports is not None:
-            log.warn("Malformed support found, fixing it")
-            r = yield self.db.runOperation('UPDATE claim_cache SET supports=? WHERE row_id=?',
-                                        (json.dumps(fixed_supports), row_id))
-            supports = fixed_supports
-        if fixed_amount is not None:
-            log.warn("Malformed amount found, fixing it")
-            r = yield self.db.runOperation('UPDATE claim_cache SET amount=? WHERE row_id=?',
-                                        (fixed_amount, row_id))
-            amount = fixed_amount
-
-        defer.returnValue((json.dumps(supports), amount))
-
-    @rerun_if_locked
     @defer.inlineCallbacks
     def _get_cached_claim(self, claim_id, check_expire=True):
-        r = yield self.db.runQuery("SELECT * FROM claim_cache WHERE claim_id=?", (claim_id, ))
-        claim_tx_info = yield self.db.runQuery("SELECT name, txid, n FROM claim_ids "
-                                               "WHERE claimId=?", (claim_id, ))
-        response = None
-        if r and claim_tx_info and r[0]:
-            rid, _, seq, claim_address, height, amount, supports, raw, chan_name, valid, ts = r[0]
-            supports, amount = yield self._fix_malformed_supports_amount(rid, supports, amount)
-            last_modified = int(ts)
-            name, txid, nout = claim_tx_info[0]
-            claim = ClaimDict.deserialize(raw.decode('hex'))
-            response = (claim, seq, claim_address, height, amount, supports,
-                        chan_name, valid, last_modified, name, txid, nout)
+        response = self.claim_cache.get(claim_id)
+        if response is None:
+            rows = yield self._get_cached_claim_rows_for_id(claim_id)
+            if rows is not None:
+                response = self._decode_cached_claim(claim_id, *rows)
         defer.returnValue(response)
 
+    @rerun_if_locked
+    def _get_cached_claim_rows_for_id(self, claim_id):
+        def _get_rows(transaction):
+            return self._get_cached_claim_rows(transaction, [claim_id]).get(claim_id)
+        return self.db.runInteraction(_get_rows)
+
+    def _decode_cached_claim(self, claim_id, claim_row, claim_tx_info):
+        rid, _, seq, claim_address, height, amount, supports, raw, chan_name, valid, ts = claim_row
+        last_modified = int(ts)
+        name, txid, nout = claim_tx_info
+        claim = ClaimDict.deserialize(raw.decode('hex'))
+        cache_info = (claim, seq, claim_address, height, amount, supports,
+                      chan_name, valid, last_modified, name, txid, nout)
+        self.claim_cache.add(claim_id, cache_info)
+        return cache_info
+
+    def _select_in(self, transaction, query, values):
+        """Run a query with a "%s" for an IN clause over values, in as few queries as possible"""
+        values = list(values)
+        rows = []
+        for i in range(0, len(values), self.MAX_QUERY_PARAMETERS):
+            chunk = values[i:i + self.MAX_QUERY_PARAMETERS]
+            rows.extend(transaction.execute(query % ", ".join("?" * len(chunk)), chunk).fetchall())
+        return rows
+
+    def _get_cached_claim_rows(self, transaction, claim_ids):
+        """Returns {claim_id: (claim_cache row, (name, txid, nout))} for the cached claims"""
+        claim_rows = {row[1]: row for row in self._select_in(
+            transaction, "SELECT * FROM claim_cache WHERE claim_id IN (%s)", claim_ids)}
+        tx_infos = {}
+        for claim_id, name, txid, nout in self._select_in(
+                transaction, "SELECT claimId, name, txid, n FROM claim_ids "
+                             "WHERE claimId IN (%s) ORDER BY rowid", claim_ids):
+            tx_infos.setdefault(claim_id, (name, txid, nout))
+        return {claim_id: (claim_rows[claim_id], tx_infos[claim_id]) for claim_id in claim_rows
+                if claim_id in tx_infos}
+
     @rerun_if_locked
     @defer.inlineCallbacks
     def save_claim_to_cache(self, claim_id, claim_sequence, claim, claim_address, height, amount,
@@ -357,6 +426,7 @@ class SqliteStorage(MetaDataStorage):
         serialized = claim.serialized.encode("hex")
         supports = json.dumps([] or supports)
         now = str(int(time.time()))
+        self.claim_cache.remove(claim_id)
 
         yield self.db.runOperation("INSERT OR REPLACE INTO claim_cache(claim_sequence, "
                                    "                        claim_id, claim_address, height, "
@@ -395,6 +465,100 @@ class SqliteStorage(MetaDataStorage):
             log.warning("Claim is not in cache")
         defer.returnValue(None)
 
+    @rerun_if_locked
+    def save_claims_to_cache(self, claims, uri_claims=()):
+        for claim in claims:
+            self.claim_cache.remove(claim[0])
+
+        def _save_claims(transaction):
+            now = str(int(time.time()))
+            for (claim_id, name, claim_outpoint, claim_sequence, claim, claim_address, height,
+                 amount, supports, channel_name, signature_is_valid) in claims:
+                txid, nout = claim_outpoint['txid'], claim_outpoint['nout']
+                if claim.is_stream:
+                    transaction.execute("INSERT OR REPLACE INTO name_metadata VALUES (?, ?, ?, ?)",
+                                        (name, txid, nout, claim.source_hash))
+                transaction.execute("INSERT OR IGNORE INTO claim_ids VALUES (?, ?, ?, ?)",
+                                    (claim_id, name, txid, nout))
+                transaction.execute("INSERT OR REPLACE INTO claim_cache(claim_sequence, "
+                                    "                        claim_id, claim_address, height, "
+                                    "                        amount, supports, claim_pb, "
+                                    "                        channel_name, signature_is_valid, "
+                                    "                        last_modified)"
+                                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                    (claim_sequence, claim_id, claim_address, height, amount,
+                                     json.dumps([] or supports), claim.serialized.encode("hex"),
+                                     channel_name, signature_is_valid, now))
+            if not uri_claims:
+                return
+            claim_ids = set()
+            for _, claim_id, certificate_id in uri_claims:
+                claim_ids.add(claim_id)
+                if certificate_id:
+                    claim_ids.add(certificate_id)
+            cache_rows = dict((claim_id, row_id) for row_id, claim_id in self._select_in(
+                transaction, "SELECT row_id, claim_id FROM claim_cache WHERE claim_id IN (%s)",
+                claim_ids))
+            for uri, claim_id, certificate_id in uri_claims:
+                if claim_id not in cache_rows:
+                    log.warning("Claim is not in cache")
+                    continue
+                if certificate_id and certificate_id not in cache_rows:
+                    log.warning("Certificate is not in cache")
+                transaction.execute("INSERT OR REPLACE INTO uri_cache(uri, cache_row, "
+                                    "                      certificate_row, last_modified) "
+                                    "VALUES (?, ?, ?, ?)",
+                                    (uri, cache_rows[claim_id], cache_rows.get(certificate_id),
+                                     now))
+        return self.db.runInteraction(_save_claims)
+
+    @rerun_if_locked
+    @defer.inlineCallbacks
+    def get_cached_claims_for_uris(self, uris, check_expire=True):
+        decoded = set(self.claim_cache)
+
+        def _get_cached_claims(transaction):
+            uri_rows = self._select_in(transaction,
+                                       "SELECT uri_cache.uri, claim.claim_id, cert.claim_id, "
+                                       "uri_cache.last_modified "
+                                       "FROM uri_cache "
+                                       "INNER JOIN claim_cache as claim "
+                                       "ON uri_cache.cache_row=claim.row_id "
+                                       "LEFT OUTER JOIN claim_cache as cert "
+                                       "ON uri_cache.certificate_row=cert.row_id "
+                                       "WHERE uri_cache.uri IN (%s)", set(uris))
+            claim_ids = set()
+            for _, claim_id, certificate_id, _ in uri_rows:
+                claim_ids.add(claim_id)
+                if certificate_id is not None:
+                    claim_ids.add(certificate_id)
+            # claims which were already decoded don't need to be read again
+            return uri_rows, self._get_cached_claim_rows(transaction, claim_ids - decoded)
+
+        uri_rows, claim_rows = yield self.db.runInteraction(_get_cached_claims)
+
+        @defer.inlineCallbacks
+        def get_cached_claim(claim_id):
+            if claim_id in claim_rows:
+                cache_info = self._decode_cached_claim(claim_id, *claim_rows.pop(claim_id))
+            else:
+                cache_info = yield self._get_cached_claim(claim_id)
+            if cache_info is None:
+                defer.returnValue(None)
+            defer.returnValue(CachedClaim(claim_id, *cache_info).response_dict())
+
+        results = {}
+        for uri, claim_id, certificate_id, last_modified in uri_rows:
+            if check_expire and time.time() - int(last_modified) > conf.settings['cache_time']:
+                continue
+            claim = yield get_cached_claim(claim_id)
+            if not claim:
+                continue
+            results[uri] = {"claim": claim}
+            if certificate_id is not None:
+                results[uri]['certificate'] = yield get_cached_claim(certificate_id)
+        defer.returnValue(results)
+
     @rerun_if_locked
     @defer.inlineCallbacks
     def get_cached_claim_for_uri(self, uri, check_expire=True):
@@ -427,6 +591,9 @@ class Wallet(object):
     """This class implements the Wallet interface for the LBRYcrd payment system"""
     implements(IWallet)
 
+    # uris resolved by lbryum in one request
+    RESOLVE_BATCH_SIZE = 100
+
     def __init__(self, storage):
         if not isinstance(storage, MetaDataStorage):
             raise ValueError('storage must be an instance of MetaDataStorage')
@@ -448,6 +615,7 @@ class Wallet(object):
         self._manage_count = 0
         self._balance_refresh_time = 3
         self._batch_count = 20
+        self._resolving = {}  # {(uri, page, page_size): [deferreds waiting for the result]}
 
     def start(self):
         log.info("Starting wallet.")
@@ -727,39 +895,38 @@ class Wallet(object):
                 break
         defer.returnValue(my_claim)
 
-    @defer.inlineCallbacks
-    def _decode_and_cache_claim_result(self, claim, update_caches):
+    @staticmethod
+    def _decode_claim_result(claim):
+        """Decode the value of a claim in place, returns the ClaimDict or None if it is invalid"""
         if 'has_signature' in claim and claim['has_signature']:
             if not claim['signature_is_valid']:
                 log.warning("lbry://%s#%s has an invalid signature",
                             claim['name'], claim['claim_id'])
         try:
             decoded = smart_decode(claim['value'])
-            claim_dict = decoded.claim_dict
-            outpoint = ClaimOutpoint(claim['txid'], claim['nout'])
-            name = claim['name']
-            claim['value'] = claim_dict
-            claim['hex'] = decoded.serialized.encode('hex')
-            if update_caches:
-                if decoded.is_stream:
-                    yield self._save_name_metadata(name, outpoint, decoded.source_hash)
-                yield self._update_claimid(claim['claim_id'], name, outpoint)
-                yield self._storage.save_claim_to_cache(claim['claim_id'],
-                                                        claim['claim_sequence'],
-                                                        decoded, claim['address'],
-                                                        claim['height'],
-                                                        claim['amount'], claim['supports'],
-                                                        claim.get('channel_name', None),
-                                                        claim.get('signature_is_valid', None))
         except DecodeError:
             claim['hex'] = claim['value']
             claim['value'] = None
             claim['error'] = "Failed to decode value"
+            return None
+        claim['value'] = decoded.claim_dict
+        claim['hex'] = decoded.serialized.encode('hex')
+        return decoded
 
-        defer.returnValue(claim)
+    @staticmethod
+    def _get_claim_cache_info(claim, decoded):
+        return (claim['claim_id'], claim['name'], ClaimOutpoint(claim['txid'], claim['nout']),
+                claim['claim_sequence'], decoded, claim['address'], claim['height'],
+                claim['amount'], claim['supports'], claim.get('channel_name', None),
+                claim.get('signature_is_valid', None))
 
-    @defer.inlineCallbacks
-    def _handle_claim_result(self, results, update_caches=True):
+    def _decode_claim_results(self, results):
+        """
+        Decode the claims in a result from lbryum
+
+        @return: the decoded results and a list of the storage.save_claims_to_cache infos of its
+            claims, which are only given for name resolution results
+        """
         if not results:
             #TODO: cannot determine what name we searched for here
             # we should fix lbryum commands that return None
@@ -777,17 +944,19 @@ class Wallet(object):
                     raise UnknownOutpoint(results['outpoint'])
             raise Exception(results['error'])
 
+        cache_infos = []
+
         # case where return value is {'certificate':{'txid', 'value',...},...}
         if 'certificate' in results:
-            results['certificate'] = yield self._decode_and_cache_claim_result(
-                                                                        results['certificate'],
-                                                                        update_caches)
+            decoded = self._decode_claim_result(results['certificate'])
+            if decoded is not None:
+                cache_infos.append(self._get_claim_cache_info(results['certificate'], decoded))
 
         # case where return value is {'claim':{'txid','value',...},...}
         if 'claim' in results:
-            results['claim'] = yield self._decode_and_cache_claim_result(
-                                                                     results['claim'],
-                                                                     update_caches)
+            decoded = self._decode_claim_result(results['claim'])
+            if decoded is not None:
+                cache_infos.append(self._get_claim_cache_info(results['claim'], decoded))
 
         # case where return value is {'txid','value',...}
         # returned by queries that are not name resolve related
@@ -795,13 +964,20 @@ class Wallet(object):
         # we do not update caches here because it should be missing
         # some values such as claim_sequence, and supports
         elif 'value' in results:
-            results = yield self._decode_and_cache_claim_result(results, update_caches=False)
+            self._decode_claim_result(results)
 
         # case where there is no 'certificate', 'value', or 'claim' key
         elif 'certificate' not in results:
             msg = 'result in unexpected format:{}'.format(results)
             assert False, msg
 
+        return results, cache_infos
+
+    @defer.inlineCallbacks
+    def _handle_claim_result(self, results, update_caches=True):
+        results, cache_infos = self._decode_claim_results(results)
+        if update_caches and cache_infos:
+            yield self._storage.save_claims_to_cache(cache_infos)
         defer.returnValue(results)
 
     @defer.inlineCallbacks
@@ -811,36 +987,88 @@ class Wallet(object):
         page_size = kwargs.get('page_size', 10)
 
         result = {}
+        cached_claims = {}
+        if check_cache:
+            cached_claims = yield self._storage.get_cached_claims_for_uris(uris)
         needed = []
         for uri in uris:
-            cached_claim = None
-            if check_cache:
-                cached_claim = yield self._storage.get_cached_claim_for_uri(uri, check_cache)
-            if cached_claim:
+            if uri in cached_claims:
                 log.debug("Using cached results for %s", uri)
-                result[uri] = yield self._handle_claim_result(cached_claim, update_caches=False)
-            else:
+                result[uri] = yield self._handle_claim_result(cached_claims[uri],
+                                                              update_caches=False)
+            elif uri not in needed:
                 log.info("Resolving %s", uri)
                 needed.append(uri)
 
-        batch_results = yield self._get_values_for_uris(page, page_size, *uris)
-
-        for uri, resolve_results in batch_results.iteritems():
-            claim_id = None
-            if resolve_results and 'claim' in resolve_results:
-                claim_id = resolve_results['claim']['claim_id']
-            certificate_id = None
-            if resolve_results and 'certificate' in resolve_results:
-                certificate_id = resolve_results['certificate']['claim_id']
-            try:
-                result[uri] = yield self._handle_claim_result(resolve_results, update_caches=True)
-                if claim_id:
-                    yield self._storage.save_claim_to_uri_cache(uri, claim_id, certificate_id)
-            except (UnknownNameError, UnknownClaimID, UnknownURI) as err:
-                result[uri] = {'error': err.message}
+        if needed:
+            resolved = yield self._resolve_uris(needed, page, page_size)
+            for uri, resolve_result in resolved.iteritems():
+                if resolve_result is not None:
+                    result[uri] = resolve_result
 
         defer.returnValue(result)
 
+    def _resolve_uris(self, uris, page, page_size):
+        """
+        Resolve uris with lbryum, RESOLVE_BATCH_SIZE at a time. Uris that are already being
+        resolved wait for those results instead of being asked for again.
+
+        @return: deferred that fires with {uri: result}, result is None if lbryum didn't
+            return one for the uri
+        """
+        to_resolve = []
+        waiting = []
+        for uri in uris:
+            key = (uri, page, page_size)
+            if key not in self._resolving:
+                self._resolving[key] = []
+                to_resolve.append(uri)
+            d = defer.Deferred()
+            self._resolving[key].append(d)
+            waiting.append(d)
+        for i in range(0, len(to_resolve), self.RESOLVE_BATCH_SIZE):
+            self._resolve_batch(to_resolve[i:i + self.RESOLVE_BATCH_SIZE], page, page_size)
+        d = defer.gatherResults(waiting, consumeErrors=True)
+        d.addCallbacks(lambda results: dict(zip(uris, results)),
+                       lambda err: err.value.subFailure)
+        return d
+
+    @defer.inlineCallbacks
+    def _resolve_batch(self, uris, page, page_size):
+        results = {}
+        try:
+            batch_results = yield self._get_values_for_uris(page, page_size, *uris)
+            cache_infos = []
+            uri_claims = []
+            for uri in uris:
+                if uri not in batch_results:
+                    results[uri] = None
+                    continue
+                resolve_results = batch_results[uri]
+                try:
+                    results[uri], claim_cache_infos = self._decode_claim_results(resolve_results)
+                except (UnknownNameError, UnknownClaimID, UnknownURI) as err:
+                    results[uri] = {'error': err.message}
+                    continue
+                cache_infos.extend(claim_cache_infos)
+                if 'claim' in resolve_results:
+                    certificate_id = None
+                    if 'certificate' in resolve_results:
+                        certificate_id = resolve_results['certificate']['claim_id']
+                    uri_claims.append((uri, resolve_results['claim']['claim_id'],
+                                       certificate_id))
+            if cache_infos:
+                yield self._storage.save_claims_to_cache(cache_infos, uri_claims)
+        except Exception:
+            err = Failure()
+            for uri in uris:
+                for d in self._resolving.pop((uri, page, page_size)):
+                    d.errback(err)
+        else:
+            for uri in uris:
+                for d in self._resolving.pop((uri, page, page_size)):
+                    d.callback(results[uri])
+
     @defer.inlineCallbacks
     def get_claim_by_outpoint(self, claim_outpoint, check_expire=True):
         claim_id = yield self._storage.get_claimid_for_tx(claim_outpoint)
@@ -568,6 +568,7 @@ class DownloadRequest(RequestHelper):
         d = self.requestor.blob_manager.blob_completed(blob, should_announce=should_announce)
         d.addCallback(lambda _: self.requestor.blob_manager.add_blob_to_download_history(
             blob.blob_hash, self.peer.host, self.protocol_prices[self.protocol]))
+        d.addCallback(lambda _: self.requestor._download_manager.blob_downloaded(blob))
         d.addCallback(lambda _: arg)
         return d
 
@@ -1,12 +1,13 @@
 import json
 import logging
+import time
 from decimal import Decimal
 from twisted.internet import error, defer
 from twisted.internet.protocol import Protocol, ClientFactory
 from twisted.protocols.policies import TimeoutMixin
 from twisted.python import failure
 from lbrynet import conf
-from lbrynet.core import utils
+from lbrynet.core import metrics, utils
 from lbrynet.core.Error import ConnectionClosedBeforeResponseError, NoResponseError
 from lbrynet.core.Error import DownloadCanceledError, MisbehavingPeerError
 from lbrynet.core.Error import RequestCanceledError
@@ -33,6 +34,8 @@ class ClientProtocol(Protocol, TimeoutMixin):
         self._connection_manager = self.factory.connection_manager
         self._rate_limiter = self.factory.rate_limiter
         self.peer = self.factory.peer
+        # connections for the same stream share its download limit
+        self.rate_limit_stream = self._connection_manager
         self._response_deferreds = {}
         self._response_buff = ''
         self._downloading_blob = False
@@ -40,18 +43,31 @@ class ClientProtocol(Protocol, TimeoutMixin):
         self._next_request = {}
         self.connection_closed = False
         self.connection_closing = False
+        # timestamps used to measure the peer, see Peer.report_* methods
+        self._request_sent_at = None
+        self._blob_download_started_at = None
+        self._blob_bytes_received = 0
         # This needs to be set for TimeoutMixin
         self.callLater = utils.call_later
         self.peer.report_up()
+        if self.factory.connect_started_at is not None:
+            self.peer.report_connect_latency(time.time() - self.factory.connect_started_at)
+        self._rate_limiter.register_protocol(self)
 
         self._ask_for_request()
 
     def dataReceived(self, data):
         log.debug("Received %d bytes from %s", len(data), self.peer)
         self.setTimeout(None)
-        self._rate_limiter.report_dl_bytes(len(data))
+        self._rate_limiter.report_dl_bytes(len(data), self)
+        if self._request_sent_at is not None:
+            latency = time.time() - self._request_sent_at
+            self.peer.report_first_byte_latency(latency)
+            metrics.BLOB_REQUEST_LATENCY.observe(latency)
+            self._request_sent_at = None
 
         if self._downloading_blob is True:
+            self._blob_bytes_received += len(data)
             self._blob_download_request.write(data)
         else:
             self._response_buff += data
@@ -64,6 +80,7 @@ class ClientProtocol(Protocol, TimeoutMixin):
                 self._response_buff = ''
                 self._handle_response(response)
                 if self._downloading_blob is True and len(extra_data) != 0:
+                    self._blob_bytes_received += len(extra_data)
                     self._blob_download_request.write(extra_data)
 
     def timeoutConnection(self):
@@ -74,6 +91,7 @@ class ClientProtocol(Protocol, TimeoutMixin):
     def connectionLost(self, reason):
         log.debug("Connection lost to %s: %s", self.peer, reason)
         self.setTimeout(None)
+        self._rate_limiter.unregister_protocol(self)
         self.connection_closed = True
         if reason.check(error.ConnectionDone):
             err = failure.Failure(ConnectionClosedBeforeResponseError())
@@ -153,6 +171,7 @@ class ClientProtocol(Protocol, TimeoutMixin):
         # TODO: compare this message to the last one. If they're the same,
         # TODO: incrementally delay this message.
         m = json.dumps(request_msg, default=encode_decimal)
+        self._request_sent_at = time.time()
         self.transport.write(m)
 
     def _get_valid_response(self, response_msg):
@@ -212,6 +231,8 @@ class ClientProtocol(Protocol, TimeoutMixin):
 
         if self._blob_download_request is not None:
             self._downloading_blob = True
+            self._blob_download_started_at = time.time()
+            self._blob_bytes_received = 0
             d = self._blob_download_request.finished_deferred
             d.addErrback(self._handle_response_error)
             ds.append(d)
@@ -241,6 +262,10 @@ class ClientProtocol(Protocol, TimeoutMixin):
 
     def _downloading_finished(self, arg):
         log.debug("The blob has finished downloading from %s", self.peer)
+        if self._blob_download_started_at is not None:
+            self.peer.report_transfer(self._blob_bytes_received,
+                                      time.time() - self._blob_download_started_at)
+            self._blob_download_started_at = None
         self._blob_download_request = None
         self._downloading_blob = False
         return arg
@@ -268,6 +293,8 @@ class ClientProtocolFactory(ClientFactory):
         self.rate_limiter = rate_limiter
         self.connection_manager = connection_manager
         self.p = None
+        # set by the connection manager when the tcp connection is started
+        self.connect_started_at = None
         # This defer fires and returns True when connection was
         # made and completed, or fires and returns False if
         # connection failed
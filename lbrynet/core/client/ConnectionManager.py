@@ -1,5 +1,6 @@
 import random
 import logging
+import time
 from twisted.internet import defer, reactor
 from zope.interface import implements
 from lbrynet import interfaces
@@ -28,6 +29,7 @@ class ConnectionManager(object):
 
         self.seek_head_blob_first = conf.settings['seek_head_blob_first']
         self.max_connections_per_stream = conf.settings['max_connections_per_stream']
+        self.peer_exploration_rate = conf.settings['peer_exploration_rate']
 
         self.downloader = downloader
         self.rate_limiter = rate_limiter
@@ -162,10 +164,26 @@ class ConnectionManager(object):
         if not self.stopped and schedule_next_call:
             self._next_manage_call = utils.call_later(self.MANAGE_CALL_INTERVAL_SEC, self.manage)
 
-    def return_shuffled_peers_not_connected_to(self, peers, new_conns_needed):
-        out = [peer for peer in peers if peer not in self._peer_connections]
-        random.shuffle(out)
-        return out[0:new_conns_needed]
+    def return_best_peers_not_connected_to(self, peers, new_conns_needed):
+        """Choose peers to connect to, preferring those with the best expected throughput
+
+        Peers which haven't been measured yet are assumed to perform as well as the median
+        measured peer. Each connection slot is, with probability `peer_exploration_rate`,
+        given to a random candidate instead so that new and recovering peers get measured.
+        """
+        candidates = [peer for peer in peers if peer not in self._peer_connections]
+        random.shuffle(candidates)
+        measured = sorted(p.throughput.value for p in candidates
+                          if p.throughput.value is not None)
+        default_throughput = measured[len(measured) / 2] if measured else 1.0
+        candidates.sort(key=lambda p: p.expected_throughput(default_throughput), reverse=True)
+        out = []
+        while candidates and len(out) < new_conns_needed:
+            if random.random() < self.peer_exploration_rate:
+                out.append(candidates.pop(random.randrange(len(candidates))))
+            else:
+                out.append(candidates.pop(0))
+        return out
 
     @defer.inlineCallbacks
     def _get_new_peers(self):
@@ -181,7 +199,7 @@ class ConnectionManager(object):
         if self.seek_head_blob_first:
             try:
                 peers = yield request_creator.get_new_peers_for_head_blob()
-                peers = self.return_shuffled_peers_not_connected_to(peers, new_conns_needed)
+                peers = self.return_best_peers_not_connected_to(peers, new_conns_needed)
             except KeyError:
                 log.warning("%s does not have a head blob", self._get_log_name())
                 peers = []
@@ -192,7 +210,7 @@ class ConnectionManager(object):
         # we have to look for the first unavailable blob
         if not peers:
             peers = yield request_creator.get_new_peers_for_next_unavailable()
-            peers = self.return_shuffled_peers_not_connected_to(peers, new_conns_needed)
+            peers = self.return_best_peers_not_connected_to(peers, new_conns_needed)
 
         log.debug("%s Got a list of peers to choose from: %s",
                     self._get_log_name(), peers)
@@ -212,6 +230,7 @@ class ConnectionManager(object):
                 lambda c_was_made: self._peer_disconnected(c_was_made, peer))
         self._peer_connections[peer] = PeerConnectionHandler(self._primary_request_creators[:],
                                                              factory)
+        factory.connect_started_at = time.time()
         connection = reactor.connectTCP(peer.host, peer.port, factory,
                                         timeout=self.TCP_CONNECT_TIMEOUT)
         self._peer_connections[peer].connection = connection
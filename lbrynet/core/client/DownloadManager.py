@@ -18,6 +18,11 @@ class DownloadManager(object):
         self.connection_manager = None
         self.blobs = {}
         self.blob_infos = {}
+        self.blob_nums = {}  # {blob_hash: blob_num}
+        self.completed_blob_nums = set()
+        self._blob_completed_callbacks = []
+        self._started_callbacks = []
+        self.priority_blob_num = None
 
     ######### IDownloadManager #########
 
@@ -32,6 +37,8 @@ class DownloadManager(object):
     def resume_downloading(self):
         yield self.connection_manager.start()
         yield self.progress_manager.start()
+        for callback in self._started_callbacks:
+            callback()
         defer.returnValue(True)
 
     @defer.inlineCallbacks
@@ -46,8 +53,11 @@ class DownloadManager(object):
 
         def add_blob_to_list(blob, blob_num):
             self.blobs[blob_num] = blob
+            self.blob_nums[blob.blob_hash] = blob_num
             log.debug(
                 "Added blob (hash: %s, number %s) to the list", blob.blob_hash, blob_num)
+            if blob.get_is_verified():
+                self.blob_completed(blob_num)
 
         def error_during_add(err):
             log.warning(
@@ -71,8 +81,55 @@ class DownloadManager(object):
     def stream_position(self):
         return self.progress_manager.stream_position()
 
+    def add_started_callback(self, callback):
+        """Call callback() once the download has started"""
+        self._started_callbacks.append(callback)
+
+    def add_blob_completed_callback(self, callback):
+        """
+        Call callback(blob_num) once for each blob of the stream, when it has been downloaded or,
+        for blobs that were already complete, when it is added to the download
+        """
+        self._blob_completed_callbacks.append(callback)
+
+    def remove_started_callback(self, callback):
+        if callback in self._started_callbacks:
+            self._started_callbacks.remove(callback)
+
+    def remove_blob_completed_callback(self, callback):
+        if callback in self._blob_completed_callbacks:
+            self._blob_completed_callbacks.remove(callback)
+
+    def prioritize_blob(self, blob_num):
+        """
+        Download the blobs from blob_num onwards before the ones ahead of it, so that a reader
+        seeking into the stream doesn't have to wait for the rest of the stream to download
+        """
+        self.priority_blob_num = blob_num
+
+    def blob_downloaded(self, blob):
+        """Called by the blob requester when it has finished downloading a blob"""
+        blob_num = self.blob_nums.get(blob.blob_hash)
+        if blob_num is None:
+            return
+        if self.progress_manager is not None:
+            self.progress_manager.blob_downloaded(blob, blob_num)
+        self.blob_completed(blob_num)
+
+    def blob_completed(self, blob_num):
+        if blob_num in self.completed_blob_nums:
+            return
+        self.completed_blob_nums.add(blob_num)
+        for callback in self._blob_completed_callbacks:
+            callback(blob_num)
+
     def needed_blobs(self):
-        return self.progress_manager.needed_blobs()
+        needed = self.progress_manager.needed_blobs()
+        if self.priority_blob_num is None:
+            return needed
+        priority = self.priority_blob_num
+        return sorted(needed, key=lambda b: (self.blob_nums.get(b.blob_hash) < priority,
+                                             self.blob_nums.get(b.blob_hash)))
 
     def final_blob_num(self):
         return self.blob_info_finder.final_blob_num()
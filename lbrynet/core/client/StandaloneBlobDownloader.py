@@ -49,13 +49,20 @@ class SingleProgressManager(object):
         safe_stop_looping_call(self.checker)
         return defer.succeed(True)
 
+    def blob_downloaded(self, blob, blob_num):
+        if self.checker.running:
+            self._finish()
+
+    def _finish(self):
+        blob_downloaded = self.download_manager.blobs[0]
+        log.debug("The blob %s has been downloaded. Calling the finished callback",
+                    str(blob_downloaded))
+        safe_stop_looping_call(self.checker)
+        self.finished_callback(blob_downloaded)
+
     def _check_if_finished(self):
         if self.stream_position() == 1:
-            blob_downloaded = self.download_manager.blobs[0]
-            log.debug("The blob %s has been downloaded. Calling the finished callback",
-                        str(blob_downloaded))
-            safe_stop_looping_call(self.checker)
-            self.finished_callback(blob_downloaded)
+            self._finish()
         elif self.timeout is not None:
             self.timeout_counter += 1
             if self.timeout_counter >= self.timeout:
@@ -0,0 +1,272 @@
+"""
+Counters, gauges and histograms of what lbrynet is doing, served at /metrics by the daemon in the
+prometheus text format.
+
+Recording a value is a dict lookup and some arithmetic, so the code being measured updates the
+metrics below directly. Values which are already kept somewhere else, like the size of the dht
+datastore, are read by collectors when the metrics are rendered rather than tracked as they change.
+"""
+
+import bisect
+import logging
+
+log = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and not value.is_integer():
+        return repr(value)
+    return str(int(value))
+
+
+def _format_labels(names, values):
+    if not names:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+               for v in values)
+    return '{%s}' % ','.join('%s="%s"' % (n, v) for n, v in zip(names, escaped))
+
+
+class CounterValue(object):
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def set(self, value):
+        """For counters of totals kept by something else, set by a collector"""
+        self.value = value
+
+    def samples(self, name, label_names, label_values):
+        yield name + _format_labels(label_names, label_values), self.value
+
+
+class GaugeValue(CounterValue):
+    def dec(self, amount=1):
+        self.value -= amount
+
+
+class HistogramValue(object):
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self, name, label_names, label_values):
+        label_names = tuple(label_names) + ('le',)
+        cumulative = 0
+        for upper_bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            cumulative += count
+            le = _format_value(upper_bound)
+            yield name + '_bucket' + _format_labels(label_names, label_values + (le,)), cumulative
+        labels = _format_labels(label_names[:-1], label_values)
+        yield name + '_sum' + labels, self.sum
+        yield name + '_count' + labels, self.count
+
+
+class Metric(object):
+    metric_type = None
+
+    def __init__(self, name, description, labels=(), registry=None):
+        self.name = name
+        self.description = description
+        self.label_names = tuple(labels)
+        self._values = {}  # {label values: value}
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def _new_value(self):
+        raise NotImplementedError()
+
+    def labels(self, *values):
+        if len(values) != len(self.label_names):
+            raise ValueError("%s needs the labels %s" % (self.name, self.label_names))
+        value = self._values.get(values)
+        if value is None:
+            value = self._values[values] = self._new_value()
+        return value
+
+    def clear(self):
+        """Forget the labelled values, for gauges of things which come and go"""
+        self._values.clear()
+
+    def render(self):
+        lines = ['# HELP %s %s' % (self.name, self.description),
+                 '# TYPE %s %s' % (self.name, self.metric_type)]
+        if not self.label_names and not self._values:
+            self.labels()
+        for label_values in sorted(self._values):
+            for sample, value in self._values[label_values].samples(self.name, self.label_names,
+                                                                    label_values):
+                lines.append('%s %s' % (sample, _format_value(value)))
+        return lines
+
+
+class Counter(Metric):
+    metric_type = 'counter'
+
+    def _new_value(self):
+        return CounterValue()
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def set(self, value):
+        self.labels().set(value)
+
+
+class Gauge(Metric):
+    metric_type = 'gauge'
+
+    def _new_value(self):
+        return GaugeValue()
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def dec(self, amount=1):
+        self.labels().dec(amount)
+
+    def set(self, value):
+        self.labels().set(value)
+
+
+class Histogram(Metric):
+    metric_type = 'histogram'
+
+    def __init__(self, name, description, labels=(), buckets=DEFAULT_BUCKETS, registry=None):
+        self.buckets = tuple(sorted(buckets))
+        Metric.__init__(self, name, description, labels, registry)
+
+    def _new_value(self):
+        return HistogramValue(self.buckets)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+
+class Registry(object):
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+
+    def add_collector(self, collector):
+        """Add a function to be called to update the metrics before they are rendered"""
+        self.collectors.append(collector)
+
+    def remove_collector(self, collector):
+        if collector in self.collectors:
+            self.collectors.remove(collector)
+
+    def render(self):
+        for collector in self.collectors:
+            try:
+                collector()
+            except Exception:
+                log.exception("Failed to collect metrics")
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+#  dht
+
+DHT_RPC_LATENCY = Histogram('lbrynet_dht_rpc_latency_seconds',
+                            'Seconds from sending a dht rpc to getting its response',
+                            labels=('method',))
+DHT_RPC_TIMEOUTS = Counter('lbrynet_dht_rpc_timeouts_total', 'Dht rpcs which timed out',
+                           labels=('method',))
+DHT_LOOKUP_HOPS = Histogram('lbrynet_dht_lookup_hops',
+                            'Rpcs in a row it took iterative lookups to reach the closest node they '
+                            'found, or the value they were looking for', labels=('rpc',),
+                            buckets=(1, 2, 3, 4, 5, 6, 8, 10, 15))
+DHT_CONTACTS = Gauge('lbrynet_dht_contacts', 'Contacts in the dht routing table')
+DHT_DATASTORE_KEYS = Gauge('lbrynet_dht_datastore_keys', 'Keys stored for other dht nodes')
+DHT_ANNOUNCE_QUEUE = Gauge('lbrynet_dht_announce_queue', 'Blob hashes waiting to be announced')
+DHT_BYTES = Counter('lbrynet_dht_bytes_total', 'Bytes of dht datagrams',
+                    labels=('direction',))
+
+#  peers
+
+PEER_CONNECTIONS = Gauge('lbrynet_peer_connections', 'Open connections to and from peers')
+PEER_BYTES = Counter('lbrynet_peer_bytes_total', 'Bytes of peer protocol traffic',
+                     labels=('direction',))
+PEER_THROUGHPUT = Gauge('lbrynet_peer_throughput_bytes_per_second',
+                        'Measured blob download speed of the peers with open connections',
+                        labels=('peer',))
+BLOB_REQUEST_LATENCY = Histogram('lbrynet_blob_request_latency_seconds',
+                                 'Seconds from sending a request to a peer to the first byte of '
+                                 'its response')
+
+#  storage
+
+BLOB_LOOKUPS = Counter('lbrynet_blob_lookups_total',
+                       'Blobs asked for from the blob manager, by whether they were loaded',
+                       labels=('result',))
+SQLITE_QUERY_LATENCY = Histogram('lbrynet_sqlite_query_seconds',
+                                 'Seconds taken by database queries, including waiting for a '
+                                 'thread', labels=('query',))
+
+#  reactor
+
+REACTOR_LAG = Histogram('lbrynet_reactor_lag_seconds',
+                        'How late timed calls run because the reactor was busy',
+                        buckets=(.001, .005, .01, .05, .1, .25, .5, 1, 2.5, 5))
+
+#  reflector
+
+REFLECTOR_CONNECTIONS = Gauge('lbrynet_reflector_connections',
+                              'Connections being served by the reflector server')
+REFLECTOR_INGEST_BYTES = Counter('lbrynet_reflector_ingest_bytes_total',
+                                 'Bytes of blobs received by the reflector server')
+REFLECTOR_INGEST_RATE = Gauge('lbrynet_reflector_ingest_bytes_per_second',
+                              'Recent rate of blobs being received by the reflector server')
+
+
+class ReactorLagMonitor(object):
+    """Measures the reactor loop lag by how late a timed call, rescheduled every interval, runs"""
+
+    def __init__(self, interval=1.0, clock=None):
+        self.interval = interval
+        self.clock = clock
+        self._expected = None
+        self._call = None
+
+    def start(self):
+        if self.clock is None:
+            from twisted.internet import reactor
+            self.clock = reactor
+        self._schedule()
+
+    def stop(self):
+        if self._call is not None and self._call.active():
+            self._call.cancel()
+        self._call = None
+
+    def _schedule(self):
+        self._expected = self.clock.seconds() + self.interval
+        self._call = self.clock.callLater(self.interval, self._check)
+
+    def _check(self):
+        REACTOR_LAG.observe(max(0.0, self.clock.seconds() - self._expected))
+        self._schedule()
+
+
+def render():
+    return REGISTRY.render()
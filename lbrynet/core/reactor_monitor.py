@@ -0,0 +1,191 @@
+"""
+Find what is blocking the reactor
+
+SlowCallMonitor times every Deferred callback and reactor.callLater function and keeps the ones
+which take longer than a threshold, along with a sample of the reactor thread's stack taken
+while they were running. profile_reactor runs cProfile on the reactor thread for a while.
+"""
+
+import cProfile
+import functools
+import logging
+import pstats
+import sys
+import thread
+import threading
+import time
+import traceback
+from collections import deque
+from StringIO import StringIO
+
+from twisted.internet import defer, task
+
+from lbrynet.core import metrics
+
+log = logging.getLogger(__name__)
+
+SLOW_CALLS = metrics.Counter('lbrynet_slow_calls_total',
+                             'Callbacks which blocked the reactor for longer than the slow call '
+                             'threshold, only counted when debug_reactor is on')
+
+
+def qualified_name(f):
+    """Get a name for a callable which says where it is defined"""
+    if isinstance(f, functools.partial):
+        return qualified_name(f.func)
+    im_class = getattr(f, 'im_class', None)
+    name = getattr(f, '__name__', None) or type(f).__name__
+    if im_class is not None:
+        name = '%s.%s' % (im_class.__name__, name)
+    module = getattr(f, '__module__', None)
+    if module:
+        name = '%s.%s' % (module, name)
+    code = getattr(f, 'func_code', None)
+    if code is not None:
+        name = '%s (%s:%i)' % (name, code.co_filename, code.co_firstlineno)
+    return name
+
+
+class SlowCallMonitor(object):
+    """
+    Records the Deferred callbacks and timed calls which block the reactor for longer than
+    threshold seconds.
+
+    While installed every callback added to a Deferred and every function passed to
+    reactor.callLater is wrapped to time it, and a thread samples the stack of the reactor
+    thread when a call has been running for longer than the threshold. Only the outermost call
+    is timed when callbacks run each other, the stack sample shows where the time went.
+    """
+
+    MAX_STACK_DEPTH = 20
+
+    def __init__(self, threshold=0.1, max_slow_calls=100):
+        self.threshold = threshold
+        self.slow_calls = deque(maxlen=max_slow_calls)
+        self._running = None  # (function, started) of the call being timed
+        self._stack_sample = None  # (started, stack) of the last sampled call
+        self._reactor_thread_id = None
+        self._original_add_callbacks = None
+        self._original_call_later = None
+        self._reactor = None
+        self._stopped = None  # event set to stop the sampler thread of this install
+        self._sampler = None
+
+    @property
+    def installed(self):
+        return self._original_add_callbacks is not None
+
+    def install(self, reactor=None):
+        """Start timing calls, this must be called from the reactor thread"""
+        if self.installed:
+            return
+        if reactor is None:
+            from twisted.internet import reactor
+        monitor = self
+        original_add_callbacks = self._original_add_callbacks = defer.Deferred.addCallbacks
+
+        def addCallbacks(d, callback, errback=None, callbackArgs=None, callbackKeywords=None,
+                         errbackArgs=None, errbackKeywords=None):
+            return original_add_callbacks(d, monitor.wrap(callback), monitor.wrap(errback),
+                                          callbackArgs, callbackKeywords, errbackArgs,
+                                          errbackKeywords)
+
+        original_call_later = self._original_call_later = reactor.callLater
+
+        def callLater(delay, f, *args, **kwargs):
+            return original_call_later(delay, monitor.wrap(f), *args, **kwargs)
+
+        defer.Deferred.addCallbacks = addCallbacks
+        reactor.callLater = callLater
+        self._reactor = reactor
+        self._reactor_thread_id = thread.get_ident()
+        # each install has its own event, so a sampler that hasn't noticed it was stopped
+        # can't be kept running by a reinstall
+        self._stopped = threading.Event()
+        self._sampler = threading.Thread(target=self._sample_stacks, args=(self._stopped,),
+                                         name='slow call sampler')
+        self._sampler.daemon = True
+        self._sampler.start()
+        log.info("Recording reactor calls taking longer than %.3f seconds", self.threshold)
+
+    def uninstall(self):
+        if not self.installed:
+            return
+        defer.Deferred.addCallbacks = self._original_add_callbacks
+        self._reactor.callLater = self._original_call_later
+        self._original_add_callbacks = self._original_call_later = self._reactor = None
+        self._stopped.set()
+        self._sampler.join(self.threshold)
+        self._stopped = self._sampler = None
+
+    def wrap(self, f):
+        if f is None or f is defer.passthru:
+            return f
+        monitor = self
+
+        def timed(*args, **kwargs):
+            if monitor._running is not None:
+                return f(*args, **kwargs)
+            started = time.time()
+            monitor._running = (f, started)
+            try:
+                return f(*args, **kwargs)
+            finally:
+                monitor._running = None
+                elapsed = time.time() - started
+                if elapsed > monitor.threshold:
+                    monitor._record(f, started, elapsed)
+        return timed
+
+    def _record(self, f, started, elapsed):
+        stack = None
+        if self._stack_sample is not None and self._stack_sample[0] == started:
+            stack = self._stack_sample[1]
+        name = qualified_name(f)
+        self.slow_calls.append({
+            'name': name,
+            'seconds': round(elapsed, 4),
+            'time': started,
+            'stack': stack,
+        })
+        SLOW_CALLS.inc()
+        log.warning("%s blocked the reactor for %.3f seconds", name, elapsed)
+
+    def _sample_stacks(self, stopped):
+        while not stopped.wait(self.threshold / 2.0):
+            self.sample_stack()
+
+    def sample_stack(self):
+        """Sample the stack of the reactor thread if the call being timed has become slow"""
+        running = self._running
+        if running is None or time.time() - running[1] < self.threshold:
+            return
+        if self._stack_sample is not None and self._stack_sample[0] == running[1]:
+            return
+        frame = sys._current_frames().get(self._reactor_thread_id)
+        if frame is None:
+            return
+        stack = traceback.format_stack(frame)[-self.MAX_STACK_DEPTH:]
+        self._stack_sample = (running[1], [line.rstrip() for line in stack])
+
+
+@defer.inlineCallbacks
+def profile_reactor(duration, sort='cumulative', limit=30, path=None):
+    """
+    Run cProfile on the reactor thread for duration seconds, returns the stats of the limit
+    functions which took the most time, sorted by sort. The full stats are saved at path if
+    it is given, they can be opened with pstats or a viewer like snakeviz.
+    """
+    from twisted.internet import reactor
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield task.deferLater(reactor, duration, lambda: None)
+    finally:
+        profiler.disable()
+    if path:
+        profiler.dump_stats(path)
+    output = StringIO()
+    stats = pstats.Stats(profiler, stream=output)
+    stats.sort_stats(sort).print_stats(limit)
+    defer.returnValue(output.getvalue())
@@ -1,10 +1,28 @@
 import sqlite3
+import time
 from twisted.internet import task, reactor
 import logging
 
+from lbrynet.core import metrics
+
 
 log = logging.getLogger(__name__)
 
+# the most host parameters sqlite allows in a query before version 3.32
+MAX_QUERY_PARAMETERS = 999
+
+
+def in_chunks(values, size=MAX_QUERY_PARAMETERS):
+    """Split values into lists small enough to query for with an 'in (?, ...)' clause"""
+    values = list(values)
+    for i in xrange(0, len(values), size):
+        yield values[i:i + size]
+
+
+def placeholders(values):
+    """The '?, ?, ...' to put in an 'in (...)' clause for values"""
+    return ", ".join("?" * len(values))
+
 
 def rerun_if_locked(f):
 
@@ -15,8 +33,14 @@ def rerun_if_locked(f):
             return task.deferLater(reactor, 0, wrapper, *args, **kwargs)
         return err
 
+    def record_latency(result, started):
+        metrics.SQLITE_QUERY_LATENCY.labels(f.__name__).observe(time.time() - started)
+        return result
+
     def wrapper(*args, **kwargs):
+        started = time.time()
         d = f(*args, **kwargs)
+        d.addBoth(record_latency, started)
         d.addErrback(rerun, *args, **kwargs)
         return d
 
@@ -49,9 +49,9 @@ def call_later(delay, func, *args, **kwargs):
     from twisted.internet import reactor
     return reactor.callLater(delay, func, *args, **kwargs)
 
-def safe_start_looping_call(looping_call, interval_sec):
+def safe_start_looping_call(looping_call, interval_sec, now=True):
     if not looping_call.running:
-        looping_call.start(interval_sec)
+        looping_call.start(interval_sec, now)
 
 def safe_stop_looping_call(looping_call):
     if looping_call.running:
@@ -72,6 +72,8 @@ class CryptStreamDownloader(object):
         self.finished_deferred = None
         self.points_paid = 0.0
         self.blob_requester = None
+        self._blob_completed_callbacks = []
+        self._started_callbacks = []
 
     def __str__(self):
         return str(self.stream_name)
@@ -82,7 +84,37 @@ class CryptStreamDownloader(object):
         else:
             return self.stop()
 
+    def add_blob_completed_callback(self, callback):
+        """Call callback(blob_num) as blobs are completed, each time the stream is downloading"""
+        self._blob_completed_callbacks.append(callback)
+        if self.download_manager is not None:
+            self.download_manager.add_blob_completed_callback(callback)
+
+    def add_started_callback(self, callback):
+        """Call callback() each time the stream starts downloading"""
+        self._started_callbacks.append(callback)
+        if self.download_manager is not None:
+            self.download_manager.add_started_callback(callback)
+
+    def remove_blob_completed_callback(self, callback):
+        if callback in self._blob_completed_callbacks:
+            self._blob_completed_callbacks.remove(callback)
+        if self.download_manager is not None:
+            self.download_manager.remove_blob_completed_callback(callback)
+
+    def remove_started_callback(self, callback):
+        if callback in self._started_callbacks:
+            self._started_callbacks.remove(callback)
+        if self.download_manager is not None:
+            self.download_manager.remove_started_callback(callback)
+
     def start(self):
+        d = self.start_downloading()
+        d.addCallback(lambda _: self.finished_deferred)
+        return d
+
+    def start_downloading(self):
+        """Like start, but fires once the download has started rather than when it's finished"""
         if self.starting is True:
             raise CurrentlyStartingError()
         if self.stopping is True:
@@ -93,9 +125,7 @@ class CryptStreamDownloader(object):
         self.starting = True
         self.completed = False
         self.finished_deferred = defer.Deferred()
-        d = self._start()
-        d.addCallback(lambda _: self.finished_deferred)
-        return d
+        return self._start()
 
     @defer.inlineCallbacks
     def stop(self, err=None):
@@ -158,6 +188,10 @@ class CryptStreamDownloader(object):
         # blob_requester needs to be set before the connection manager is setup
         self.blob_requester = self._get_blob_requester(download_manager)
         download_manager.connection_manager = self._get_connection_manager(download_manager)
+        for callback in self._blob_completed_callbacks:
+            download_manager.add_blob_completed_callback(callback)
+        for callback in self._started_callbacks:
+            download_manager.add_started_callback(callback)
         return download_manager
 
     def _remove_download_manager(self):
@@ -11,7 +11,7 @@ import signal
 from copy import deepcopy
 from twisted.web import server
 from twisted.internet import defer, threads, error, reactor
-from twisted.internet.task import LoopingCall
+from twisted.internet.task import LoopingCall, deferLater
 from twisted.python.failure import Failure
 
 from lbryschema.claim import ClaimDict
@@ -39,6 +39,8 @@ from lbrynet.daemon.ExchangeRateManager import ExchangeRateManager
 from lbrynet.daemon.auth.server import AuthJSONRPCServer
 from lbrynet.core.PaymentRateManager import OnlyFreePaymentsManager
 from lbrynet.core import utils, system_info
+from lbrynet.core.metrics import ReactorLagMonitor
+from lbrynet.core.reactor_monitor import SlowCallMonitor, profile_reactor
 from lbrynet.core.StreamDescriptor import StreamDescriptorIdentifier, download_sd_blob
 from lbrynet.core.Session import Session
 from lbrynet.core.Wallet import LBRYumWallet, SqliteStorage, ClaimOutpoint
@@ -94,6 +96,9 @@ CONNECTION_MESSAGES = {
 
 SHORT_ID_LEN = 20
 
+# contacts listed by routing_table_get between returning control to the reactor
+ROUTING_TABLE_CHUNK_SIZE = 50
+
 
 class IterableContainer(object):
     def __iter__(self):
@@ -120,10 +125,14 @@ class _FileID(IterableContainer):
     FILE_NAME = 'file_name'
     STREAM_HASH = 'stream_hash'
     ROWID = "rowid"
+    OUTPOINT = 'outpoint'
 
 
 FileID = _FileID()
 
+# fields of a file_list result which are only filled in with its full status
+FULL_STATUS_FIELDS = {'total_bytes', 'blobs_completed', 'blobs_in_stream', 'status', 'outpoint'}
+
 
 # TODO add login credentials in a conf file
 # TODO alert if your copy of a lbry file is out of date with the name record
@@ -190,6 +199,7 @@ class Daemon(AuthJSONRPCServer):
         self.delete_blobs_on_remove = conf.settings['delete_blobs_on_remove']
         self.peer_port = conf.settings['peer_port']
         self.reflector_port = conf.settings['reflector_port']
+        self.reflector_server_port = None
         self.dht_node_port = conf.settings['dht_node_port']
         self.use_upnp = conf.settings['use_upnp']
         self.auto_renew_claim_height_delta = conf.settings['auto_renew_claim_height_delta']
@@ -198,7 +208,7 @@ class Daemon(AuthJSONRPCServer):
         self.connected_to_internet = True
         self.connection_status_code = None
         self.platform = None
-        self.current_db_revision = 5
+        self.current_db_revision = 6
         self.db_revision_file = conf.settings.get_db_revision_filename()
         self.session = None
         self._session_id = conf.settings.get_session_id()
@@ -220,6 +230,9 @@ class Daemon(AuthJSONRPCServer):
             Checker.CONNECTION_STATUS: LoopingCall(self._update_connection_status),
         }
         self.looping_call_manager = LoopingCallManager(calls)
+        self.reactor_lag_monitor = ReactorLagMonitor()
+        self.slow_call_monitor = SlowCallMonitor(conf.settings['slow_call_threshold'])
+        self._profiling = False
         self.sd_identifier = StreamDescriptorIdentifier()
         self.stream_info_manager = None
         self.lbry_file_manager = None
@@ -244,6 +257,10 @@ class Daemon(AuthJSONRPCServer):
 
         self.looping_call_manager.start(Checker.INTERNET_CONNECTION, 3600)
         self.looping_call_manager.start(Checker.CONNECTION_STATUS, 30)
+        if conf.settings['serve_metrics']:
+            self.reactor_lag_monitor.start()
+        if conf.settings['debug_reactor']:
+            self.slow_call_monitor.install()
         self.exchange_rate_manager.start()
 
         yield self._initial_setup()
@@ -346,7 +363,10 @@ class Daemon(AuthJSONRPCServer):
             try:
                 if self.reflector_server_port is not None:
                     self.reflector_server_port, p = None, self.reflector_server_port
-                    return defer.maybeDeferred(p.stopListening)
+                    d = defer.maybeDeferred(p.stopListening)
+                    # finish recording the blobs that have already been received
+                    d.addCallback(lambda _: p.factory.bookkeeper.wait_for_empty())
+                    return d
             except AttributeError:
                 return defer.succeed(True)
         return defer.succeed(True)
@@ -411,6 +431,8 @@ class Daemon(AuthJSONRPCServer):
         self._stop_streams()
 
         self.looping_call_manager.shutdown()
+        self.reactor_lag_monitor.stop()
+        self.slow_call_monitor.uninstall()
         if self.analytics_manager:
             self.analytics_manager.shutdown()
 
@@ -418,6 +440,7 @@ class Daemon(AuthJSONRPCServer):
         d.addErrback(log.fail(), 'Failure while shutting down')
         d.addCallback(lambda _: self._stop_reflector())
         d.addErrback(log.fail(), 'Failure while shutting down')
+        d.addCallback(lambda _: reupload.close_connection_pools())
         d.addCallback(lambda _: self._stop_file_manager())
         d.addErrback(log.fail(), 'Failure while shutting down')
         if self.session is not None:
@@ -689,7 +712,7 @@ class Daemon(AuthJSONRPCServer):
                                               conf.settings['data_rate'], timeout)
             try:
                 lbry_file, finished_deferred = yield self.streams[sd_hash].start(claim_dict, name)
-                yield self.stream_info_manager.save_outpoint_to_file(lbry_file.rowid, txid, nout)
+                yield self.lbry_file_manager.save_outpoint(lbry_file, txid, nout)
                 finished_deferred.addCallbacks(lambda _: _download_finished(download_id, name,
                                                                             claim_dict),
                                                lambda e: _download_failed(e, download_id, name,
@@ -724,12 +747,12 @@ class Daemon(AuthJSONRPCServer):
             claim_out = yield publisher.create_and_publish_stream(name, bid, claim_dict, file_path,
                                                                   claim_address, change_address)
             if conf.settings['reflect_uploads']:
-                d = reupload.reflect_stream(publisher.lbry_file)
+                d = reupload.reflect_stream(publisher.lbry_file,
+                                            rate_limiter=self.session.rate_limiter)
                 d.addCallbacks(lambda _: log.info("Reflected new publication to lbry://%s", name),
                                log.exception)
-        yield self.stream_info_manager.save_outpoint_to_file(publisher.lbry_file.rowid,
-                                                             claim_out['txid'],
-                                                             int(claim_out['nout']))
+        yield self.lbry_file_manager.save_outpoint(publisher.lbry_file, claim_out['txid'],
+                                                   int(claim_out['nout']))
         self.analytics_manager.send_claim_action('publish')
         log.info("Success! Published to lbry://%s txid: %s nout: %d", name, claim_out['txid'],
                  claim_out['nout'])
@@ -873,27 +896,40 @@ class Daemon(AuthJSONRPCServer):
             return self.get_est_cost_using_known_size(uri, size)
         return self.get_est_cost_from_uri(uri)
 
-    @defer.inlineCallbacks
     def _get_lbry_file_dict(self, lbry_file, full_status=False):
+        d = self._get_lbry_file_dicts([lbry_file], full_status=full_status)
+        d.addCallback(lambda file_dicts: file_dicts[0])
+        return d
+
+    @defer.inlineCallbacks
+    def _get_lbry_file_dicts(self, lbry_files, full_status=False, fields=None):
+        progress = {}
+        if full_status and (fields is None or FULL_STATUS_FIELDS.intersection(fields)):
+            # blob counts and sizes for every file at once, from the file manager's cache
+            progress = yield self.lbry_file_manager.get_blob_progress(lbry_files)
+        defer.returnValue([self._make_lbry_file_dict(lbry_file,
+                                                     progress.get(lbry_file.stream_hash), fields)
+                           for lbry_file in lbry_files])
+
+    def _make_lbry_file_dict(self, lbry_file, progress=None, fields=None):
         key = binascii.b2a_hex(lbry_file.key) if lbry_file.key else None
         full_path = os.path.join(lbry_file.download_directory, lbry_file.file_name)
         mime_type = mimetypes.guess_type(full_path)[0]
-        if os.path.isfile(full_path):
-            with open(full_path) as written_file:
-                written_file.seek(0, os.SEEK_END)
-                written_bytes = written_file.tell()
-        else:
-            written_bytes = 0
+        written_bytes = None
+        if fields is None or 'written_bytes' in fields:
+            written_bytes = os.path.getsize(full_path) if os.path.isfile(full_path) else 0
 
         size = outpoint = num_completed = num_known = status = None
 
-        if full_status:
-            size = yield lbry_file.get_total_bytes()
-            file_status = yield lbry_file.status()
-            num_completed = file_status.num_completed
-            num_known = file_status.num_known
-            status = file_status.running_status
-            outpoint = yield self.stream_info_manager.get_file_outpoint(lbry_file.rowid)
+        if progress is not None:
+            size, num_known, num_completed = progress
+            if lbry_file.completed:
+                status = "completed"
+            elif lbry_file.stopped:
+                status = "stopped"
+            else:
+                status = "running"
+            outpoint = self.lbry_file_manager.get_outpoint(lbry_file)
 
         result = {
             'completed': lbry_file.completed,
@@ -915,16 +951,17 @@ class Daemon(AuthJSONRPCServer):
             'status': status,
             'outpoint': outpoint
         }
-        defer.returnValue(result)
+        if fields is not None:
+            result = {field: result[field] for field in fields if field in result}
+        return result
 
     @defer.inlineCallbacks
     def _get_lbry_file(self, search_by, val, return_json=False, full_status=False):
         lbry_file = None
         if search_by in FileID:
-            for l_f in self.lbry_file_manager.lbry_files:
-                if l_f.__dict__.get(search_by) == val:
-                    lbry_file = l_f
-                    break
+            lbry_files = self.lbry_file_manager.find_lbry_files(search_by, val)
+            if lbry_files:
+                lbry_file = lbry_files[0]
         else:
             raise NoValidSearch('{} is not a valid search operation'.format(search_by))
         if return_json and lbry_file:
@@ -932,17 +969,14 @@ class Daemon(AuthJSONRPCServer):
         defer.returnValue(lbry_file)
 
     @defer.inlineCallbacks
-    def _get_lbry_files(self, return_json=False, full_status=True, **kwargs):
-        lbry_files = list(self.lbry_file_manager.lbry_files)
-        if kwargs:
-            for search_type, value in iter_lbry_file_search_values(kwargs):
-                lbry_files = [l_f for l_f in lbry_files if l_f.__dict__[search_type] == value]
+    def _get_lbry_files(self, return_json=False, full_status=True, sort=None, reverse=False,
+                        page=None, page_size=None, fields=None, **kwargs):
+        searches = list(iter_lbry_file_search_values(kwargs))
+        lbry_files = self.lbry_file_manager.get_lbry_files(searches, sort, reverse, page,
+                                                           page_size)
         if return_json:
-            file_dicts = []
-            for lbry_file in lbry_files:
-                lbry_file_dict = yield self._get_lbry_file_dict(lbry_file, full_status=full_status)
-                file_dicts.append(lbry_file_dict)
-            lbry_files = file_dicts
+            lbry_files = yield self._get_lbry_file_dicts(lbry_files, full_status=full_status,
+                                                         fields=fields)
         log.debug("Collected %i lbry files", len(lbry_files))
         defer.returnValue(lbry_files)
 
@@ -1019,6 +1053,7 @@ class Daemon(AuthJSONRPCServer):
     #                                                                          #
     ############################################################################
 
+    @AuthJSONRPCServer.cached(1)
     @defer.inlineCallbacks
     @AuthJSONRPCServer.flags(session_status="-s", dht_status="-d")
     def jsonrpc_status(self, session_status=False, dht_status=False):
@@ -1060,6 +1095,17 @@ class Daemon(AuthJSONRPCServer):
                         'managed_streams': count of streams in the file manager
                         'announce_queue_size': number of blobs currently queued to be announced
                         'should_announce_blobs': number of blobs that should be announced
+                        'reflector_server': (only if running a reflector server) {
+                            'active_connections': clients being served,
+                            'queued_connections': clients waiting for a turn,
+                            'rejected_connections': clients told to retry later,
+                            'active_uploads': clients currently sending a blob,
+                            'inflight_bytes': bytes of blobs received but not written yet,
+                            'paused_connections': clients not being read from,
+                            'ingest_bytes_per_second': rate blobs are being received,
+                            'total_ingest_bytes': bytes of blobs received,
+                            'bookkeeping_queue': received blobs not yet recorded,
+                        }
                     }
 
                 If given the dht status option:
@@ -1115,10 +1161,13 @@ class Daemon(AuthJSONRPCServer):
             should_announce_blobs = yield self.session.blob_manager.count_should_announce_blobs()
             response['session_status'] = {
                 'managed_blobs': len(blobs),
-                'managed_streams': len(self.lbry_file_manager.lbry_files),
+                'managed_streams': len(self.lbry_file_manager.registry),
                 'announce_queue_size': announce_queue_size,
                 'should_announce_blobs': should_announce_blobs,
             }
+            if self.reflector_server_port is not None:
+                response['session_status']['reflector_server'] = \
+                    self.reflector_server_port.factory.get_metrics()
         if dht_status:
             response['dht_status'] = self.session.dht_node.get_bandwidth_stats()
         defer.returnValue(response)
@@ -1378,16 +1427,19 @@ class Daemon(AuthJSONRPCServer):
         reactor.callLater(0.1, reactor.fireSystemEvent, "shutdown")
         defer.returnValue(response)
 
+    @AuthJSONRPCServer.cached(2, invalidated_by=('files',))
     @defer.inlineCallbacks
-    @AuthJSONRPCServer.flags(full_status='-f')
-    def jsonrpc_file_list(self, **kwargs):
+    @AuthJSONRPCServer.flags(full_status='-f', reverse='--reverse')
+    def jsonrpc_file_list(self, sort=None, reverse=False, page=None, page_size=None, fields=None,
+                          **kwargs):
         """
         List files limited by optional filters
 
         Usage:
             file_list [--sd_hash=<sd_hash>] [--file_name=<file_name>] [--stream_hash=<stream_hash>]
-                      [--rowid=<rowid>]
-                      [-f]
+                      [--rowid=<rowid>] [--outpoint=<outpoint>]
+                      [--sort=<sort>] [--reverse] [--page=<page>] [--page_size=<page_size>]
+                      [--fields=<fields>] [-f]
 
         Options:
             --sd_hash=<sd_hash>          : get file with matching sd hash
@@ -1395,6 +1447,14 @@ class Daemon(AuthJSONRPCServer):
                                            downloads folder
             --stream_hash=<stream_hash>  : get file with matching stream hash
             --rowid=<rowid>              : get file with matching row id
+            --outpoint=<outpoint>        : get file with matching claim outpoint (txid:nout)
+            --sort=<sort>                : sort files by rowid (the default), stream_hash,
+                                           sd_hash, file_name or outpoint
+            --reverse                    : reverse the sort order
+            --page=<page>                : page of results to return, starting from 0
+            --page_size=<page_size>      : results page size, defaults to every file
+            --fields=<fields>            : comma separated list of the fields to return,
+                                           defaults to all of them
             -f                           : full status, populate the 'message' and 'size' fields
 
         Returns:
@@ -1424,7 +1484,11 @@ class Daemon(AuthJSONRPCServer):
             ]
         """
 
-        result = yield self._get_lbry_files(return_json=True, **kwargs)
+        if isinstance(fields, basestring):
+            fields = fields.split(',')
+        result = yield self._get_lbry_files(return_json=True, sort=sort, reverse=reverse,
+                                            page=page, page_size=page_size, fields=fields,
+                                            **kwargs)
         response = yield self._render_response(result)
         defer.returnValue(response)
 
@@ -1652,7 +1716,8 @@ class Daemon(AuthJSONRPCServer):
         lbry_file = yield self._get_lbry_file(FileID.SD_HASH, sd_hash, return_json=False)
 
         if lbry_file:
-            if not os.path.isfile(os.path.join(lbry_file.download_directory, lbry_file.file_name)):
+            if lbry_file.save_file and not os.path.isfile(os.path.join(
+                    lbry_file.download_directory, lbry_file.file_name)):
                 log.info("Already have lbry file but missing file in %s, rebuilding it",
                          lbry_file.download_directory)
                 yield lbry_file.start()
@@ -1662,6 +1727,7 @@ class Daemon(AuthJSONRPCServer):
         else:
             result = yield self._download_name(name, claim_dict, sd_hash, txid, nout,
                                                timeout=timeout, file_name=file_name)
+            self.invalidate_cache('files', 'blobs')
         response = yield self._render_response(result)
         defer.returnValue(response)
 
@@ -1673,7 +1739,7 @@ class Daemon(AuthJSONRPCServer):
 
         Usage:
             file_set_status <status> [--sd_hash=<sd_hash>] [--file_name=<file_name>]
-                      [--stream_hash=<stream_hash>] [--rowid=<rowid>]
+                      [--stream_hash=<stream_hash>] [--rowid=<rowid>] [--outpoint=<outpoint>]
 
         Options:
             --sd_hash=<sd_hash>          : set status of file with matching sd hash
@@ -1681,6 +1747,7 @@ class Daemon(AuthJSONRPCServer):
                                            downloads folder
             --stream_hash=<stream_hash>  : set status of file with matching stream hash
             --rowid=<rowid>              : set status of file with matching row id
+            --outpoint=<outpoint>        : set status of file with matching claim outpoint
 
         Returns:
             (str) Confirmation message
@@ -1696,6 +1763,7 @@ class Daemon(AuthJSONRPCServer):
 
         if status == 'start' and lbry_file.stopped or status == 'stop' and not lbry_file.stopped:
             yield self.lbry_file_manager.toggle_lbry_file_running(lbry_file)
+            self.invalidate_cache('files')
             msg = "Started downloading file" if status == 'start' else "Stopped downloading file"
         else:
             msg = (
@@ -1715,6 +1783,7 @@ class Daemon(AuthJSONRPCServer):
         Usage:
             file_delete [-f] [--delete_all] [--sd_hash=<sd_hash>] [--file_name=<file_name>]
                         [--stream_hash=<stream_hash>] [--rowid=<rowid>]
+                        [--outpoint=<outpoint>]
 
         Options:
             -f, --delete_from_download_dir  : delete file from download directory,
@@ -1726,6 +1795,7 @@ class Daemon(AuthJSONRPCServer):
             --file_name<file_name>          : delete by file name in downloads folder
             --stream_hash=<stream_hash>     : delete by file stream hash
             --rowid=<rowid>                 : delete by file row id
+            --outpoint=<outpoint>           : delete by claim outpoint
 
         Returns:
             (bool) true if deletion was successful
@@ -1754,11 +1824,45 @@ class Daemon(AuthJSONRPCServer):
                 yield self.lbry_file_manager.delete_lbry_file(lbry_file,
                                                               delete_file=delete_from_download_dir)
                 log.info("Deleted file: %s", file_name)
+            self.invalidate_cache('files', 'blobs')
             result = True
 
         response = yield self._render_response(result)
         defer.returnValue(response)
 
+    @AuthJSONRPCServer.auth_required
+    @defer.inlineCallbacks
+    def jsonrpc_file_export(self, download_directory=None, **kwargs):
+        """
+        Write a completed file to the download directory, for files which were only kept as
+        blobs because save_files is off
+
+        Usage:
+            file_export [--download_directory=<download_directory>] [--sd_hash=<sd_hash>]
+                        [--file_name=<file_name>] [--stream_hash=<stream_hash>]
+                        [--rowid=<rowid>] [--outpoint=<outpoint>]
+
+        Options:
+            --download_directory=<download_directory>  : directory to write the file to,
+                                                          defaults to the download directory
+            --sd_hash=<sd_hash>                        : export file with matching sd hash
+            --file_name=<file_name>                    : export file with matching file name
+            --stream_hash=<stream_hash>                : export file with matching stream hash
+            --rowid=<rowid>                            : export file with matching row id
+            --outpoint=<outpoint>                      : export file with matching claim outpoint
+
+        Returns:
+            (str) path of the exported file
+        """
+
+        search_type, value = get_lbry_file_search_value(kwargs)
+        lbry_file = yield self._get_lbry_file(search_type, value, return_json=False)
+        if not lbry_file:
+            raise Exception('Unable to find a file for {}:{}'.format(search_type, value))
+        path = yield self.lbry_file_manager.export_lbry_file(lbry_file, download_directory)
+        response = yield self._render_response(path)
+        defer.returnValue(response)
+
     @defer.inlineCallbacks
     def jsonrpc_stream_cost_estimate(self, uri, size=None):
         """
@@ -2077,6 +2181,7 @@ class Daemon(AuthJSONRPCServer):
 
         result = yield self._publish_stream(name, bid, claim_dict, file_path, certificate_id,
                                             claim_address, change_address)
+        self.invalidate_cache('files', 'blobs', 'claims')
         response = yield self._render_response(result)
         defer.returnValue(response)
 
@@ -2105,6 +2210,7 @@ class Daemon(AuthJSONRPCServer):
             raise Exception('Must specify nout')
 
         result = yield self.session.wallet.abandon_claim(claim_id, txid, nout)
+        self.invalidate_cache('claims')
         self.analytics_manager.send_claim_action('abandon')
         defer.returnValue(result)
 
@@ -2128,6 +2234,7 @@ class Daemon(AuthJSONRPCServer):
         """
 
         result = yield self.session.wallet.support_claim(name, claim_id, amount)
+        self.invalidate_cache('claims')
         self.analytics_manager.send_claim_action('new_support')
         defer.returnValue(result)
 
@@ -2168,6 +2275,7 @@ class Daemon(AuthJSONRPCServer):
         else:
             height = int(height)
             result = yield self.session.wallet.claim_renew_all_before_expiration(height)
+        self.invalidate_cache('claims')
         defer.returnValue(result)
 
     @AuthJSONRPCServer.auth_required
@@ -2186,6 +2294,7 @@ class Daemon(AuthJSONRPCServer):
                         on the claim
         """
         result = yield self.session.wallet.send_claim_to_address(claim_id, address, amount)
+        self.invalidate_cache('claims')
         response = yield self._render_response(result)
         defer.returnValue(response)
 
@@ -2225,6 +2334,7 @@ class Daemon(AuthJSONRPCServer):
         d.addCallback(lambda claims: self._render_response(claims))
         return d
 
+    @AuthJSONRPCServer.cached(30, invalidated_by=('claims',))
     @defer.inlineCallbacks
     def jsonrpc_claim_list(self, name):
         """
@@ -2707,6 +2817,7 @@ class Daemon(AuthJSONRPCServer):
         payment_rate_manager = get_blob_payment_rate_manager(self.session, payment_rate_manager)
         blob = yield self._download_blob(blob_hash, rate_manager=payment_rate_manager,
                                          timeout=timeout)
+        self.invalidate_cache('blobs')
         if encoding and encoding in decoders:
             blob_file = blob.open_for_reading()
             result = decoders[encoding](blob_file.read())
@@ -2739,6 +2850,7 @@ class Daemon(AuthJSONRPCServer):
         except Exception as err:
             pass
         yield self.session.blob_manager.delete_blobs([blob_hash])
+        self.invalidate_cache('blobs')
         response = yield self._render_response("Deleted %s" % blob_hash)
         defer.returnValue(response)
 
@@ -2850,9 +2962,11 @@ class Daemon(AuthJSONRPCServer):
             raise Exception('No file found')
         lbry_file = lbry_files[0]
 
-        results = yield reupload.reflect_stream(lbry_file, reflector_server=reflector_server)
+        results = yield reupload.reflect_stream(lbry_file, reflector_server=reflector_server,
+                                                rate_limiter=self.session.rate_limiter)
         defer.returnValue(results)
 
+    @AuthJSONRPCServer.cached(5, invalidated_by=('blobs',))
     @defer.inlineCallbacks
     @AuthJSONRPCServer.flags(needed="-n", finished="-f")
     def jsonrpc_blob_list(self, uri=None, stream_hash=None, sd_hash=None, needed=None,
@@ -2924,16 +3038,26 @@ class Daemon(AuthJSONRPCServer):
         """
 
         d = self.session.blob_manager.get_all_verified_blobs()
-        d.addCallback(reupload.reflect_blob_hashes, self.session.blob_manager)
+        d.addCallback(reupload.reflect_blob_hashes, self.session.blob_manager,
+                      rate_limiter=self.session.rate_limiter)
         d.addCallback(lambda r: self._render_response(r))
         return d
 
-    def jsonrpc_routing_table_get(self):
+    @AuthJSONRPCServer.cached(10)
+    @defer.inlineCallbacks
+    def jsonrpc_routing_table_get(self, bucket=None, node_id=None, page=None, page_size=None):
         """
         Get DHT routing information
 
         Usage:
-            routing_table_get
+            routing_table_get [<bucket> | --bucket=<bucket>] [<node_id> | --node_id=<node_id>]
+                              [<page> | --page=<page>] [<page_size> | --page_size=<page_size>]
+
+        Options:
+            <bucket>, --bucket=<bucket>           : only include the contacts in this bucket
+            <node_id>, --node_id=<node_id>        : only include the contact with this node id
+            <page>, --page=<page>                 : page of contacts to return, starting from 0
+            <page_size>, --page_size=<page_size>  : contacts per page, defaults to every contact
 
         Returns:
             (dict) dictionary containing routing and contact information
@@ -2953,55 +3077,40 @@ class Daemon(AuthJSONRPCServer):
             }
         """
 
-        result = {}
-        data_store = deepcopy(self.session.dht_node._dataStore._dict)
-        datastore_len = len(data_store)
-        hosts = {}
+        dht_node = self.session.dht_node
+        contacts = []
+        for i, kbucket in enumerate(dht_node._routingTable._buckets):
+            if bucket is not None and i != int(bucket):
+                continue
+            for contact in kbucket._contacts:
+                if node_id is None or contact.id.encode('hex') == node_id:
+                    contacts.append((i, contact))
+        if page_size:
+            start_index = (page or 0) * page_size
+            contacts = contacts[start_index:start_index + page_size]
 
-        if datastore_len:
-            for k, v in data_store.iteritems():
-                for value, lastPublished, originallyPublished, originalPublisherID in v:
-                    try:
-                        contact = self.session.dht_node._routingTable.getContact(
-                            originalPublisherID)
-                    except ValueError:
-                        continue
-                    if contact in hosts:
-                        blobs = hosts[contact]
-                    else:
-                        blobs = []
-                    blobs.append(k.encode('hex'))
-                    hosts[contact] = blobs
-
-        contact_set = []
-        blob_hashes = []
-        result['buckets'] = {}
-
-        for i in range(len(self.session.dht_node._routingTable._buckets)):
-            for contact in self.session.dht_node._routingTable._buckets[i]._contacts:
-                contacts = result['buckets'].get(i, [])
-                if contact in hosts:
-                    blobs = hosts[contact]
-                    del hosts[contact]
-                else:
-                    blobs = []
-                host = {
-                    "address": contact.address,
-                    "node_id": contact.id.encode("hex"),
-                    "blobs": blobs,
-                }
-                for blob_hash in blobs:
-                    if blob_hash not in blob_hashes:
-                        blob_hashes.append(blob_hash)
-                contacts.append(host)
-                result['buckets'][i] = contacts
-                if contact.id.encode('hex') not in contact_set:
-                    contact_set.append(contact.id.encode("hex"))
-
-        result['contacts'] = contact_set
-        result['blob_hashes'] = blob_hashes
-        result['node_id'] = self.session.dht_node.node_id.encode('hex')
-        return self._render_response(result)
+        result = {
+            'buckets': {},
+            'contacts': [],
+            'node_id': dht_node.node_id.encode('hex'),
+        }
+        blob_hashes = set()
+        for n, (i, contact) in enumerate(contacts):
+            if n and not n % ROUTING_TABLE_CHUNK_SIZE:
+                # let the dht node answer requests while a big table is being listed
+                yield deferLater(reactor, 0, lambda: None)
+            blobs = [blob_hash.encode('hex') for blob_hash in
+                     dht_node._dataStore.getBlobsForPublisher(contact.id)]
+            blob_hashes.update(blobs)
+            result['buckets'].setdefault(i, []).append({
+                "address": contact.address,
+                "node_id": contact.id.encode("hex"),
+                "blobs": blobs,
+            })
+            result['contacts'].append(contact.id.encode("hex"))
+        result['blob_hashes'] = list(blob_hashes)
+        response = yield self._render_response(result)
+        defer.returnValue(response)
 
     def jsonrpc_blob_availability(self, blob_hash, search_timeout=None, blob_timeout=None):
         """
@@ -3143,6 +3252,59 @@ class Daemon(AuthJSONRPCServer):
                                    response['head_blob_availability'].get('is_available')
         defer.returnValue(response)
 
+    @AuthJSONRPCServer.auth_required
+    @defer.inlineCallbacks
+    def jsonrpc_debug_profile(self, duration=10, sort='cumulative', limit=30, file_name=None):
+        """
+        Profile the reactor for a while, and get the calls which recently blocked it for longer
+        than slow_call_threshold seconds. Slow calls are only recorded when the debug_reactor
+        setting is on.
+
+        Usage:
+            debug_profile [<duration> | --duration=<duration>] [<sort> | --sort=<sort>]
+                          [<limit> | --limit=<limit>] [<file_name> | --file_name=<file_name>]
+
+        Options:
+            <duration>, --duration=<duration>     : seconds to run cProfile for, defaults to 10,
+                                                    use 0 to only get the slow calls
+            <sort>, --sort=<sort>                 : pstats sort order, defaults to cumulative
+            <limit>, --limit=<limit>              : number of functions to list, defaults to 30
+            <file_name>, --file_name=<file_name>  : also save the full profile stats to this
+                                                    file in the data directory
+
+        Returns:
+            (dict) {
+                "profile": (str) the profile stats, if a duration was given,
+                "slow_calls": (list) [
+                    {
+                        "name": (str) the callback or timed call,
+                        "seconds": (float) how long it blocked the reactor,
+                        "time": (float) when it started,
+                        "stack": (list) the reactor thread's stack while it ran, if it was
+                                 sampled
+                    }
+                ]
+            }
+        """
+
+        path = None
+        if file_name is not None:
+            if os.path.basename(file_name) != file_name or file_name in ('', os.curdir, os.pardir):
+                raise Exception("The profile can only be saved to a file in the data directory")
+            path = os.path.join(conf.settings['data_dir'], file_name)
+        result = {'slow_calls': list(self.slow_call_monitor.slow_calls)}
+        if duration:
+            if self._profiling:
+                raise Exception("The reactor is already being profiled")
+            self._profiling = True
+            try:
+                result['profile'] = yield profile_reactor(float(duration), sort, int(limit),
+                                                          path)
+            finally:
+                self._profiling = False
+        response = yield self._render_response(result)
+        defer.returnValue(response)
+
     @defer.inlineCallbacks
     @AuthJSONRPCServer.flags(a_arg='-a', b_arg='-b')
     def jsonrpc_cli_test_command(self, pos_arg, pos_args=[], pos_arg2=None, pos_arg3=None,
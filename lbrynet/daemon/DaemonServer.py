@@ -7,8 +7,11 @@ from twisted.cred import portal
 
 from lbrynet import conf
 from lbrynet.daemon.Daemon import Daemon
+from lbrynet.daemon.MetricsResource import MetricsResource
+from lbrynet.daemon.StreamResource import StreamResource
 from lbrynet.daemon.auth.auth import PasswordChecker, HttpPasswordRealm
 from lbrynet.daemon.auth.util import initialize_api_key_file
+from lbrynet.daemon.auth.websocket import get_websocket_resource, websocket_available
 
 log = logging.getLogger(__name__)
 
@@ -33,6 +36,14 @@ class DaemonServer(object):
         self.root.putChild("", self._daemon)
         # TODO: DEPRECATED, remove this and just serve the API at the root
         self.root.putChild(conf.settings['API_ADDRESS'], self._daemon)
+        self.root.putChild("stream", StreamResource(self._daemon))
+        if conf.settings['serve_metrics']:
+            self.root.putChild("metrics", MetricsResource(self._daemon))
+        if conf.settings['use_api_websocket']:
+            if websocket_available():
+                self.root.putChild("ws", get_websocket_resource(self._daemon))
+            else:
+                log.warning("autobahn is needed for the api websocket, it won't be available")
 
         lbrynet_server = get_site_base(use_auth, self.root)
 
@@ -58,30 +58,32 @@ class GetStream(object):
     def download_path(self):
         return os.path.join(self.download_directory, self.downloader.file_name)
 
-    def _check_status(self, status):
-        if status.num_completed > 0 and not self.data_downloading_deferred.called:
+    def _data_downloading(self):
+        if not self.data_downloading_deferred.called:
             self.data_downloading_deferred.callback(True)
-        if self.data_downloading_deferred.called:
-            safe_stop_looping_call(self.checker)
-        else:
-            log.debug("Waiting for stream data (%i seconds)", self.timeout_counter)
+        safe_stop_looping_call(self.checker)
+
+    def _blob_completed(self, blob_num):
+        # the downloader tells us as soon as it has a data blob, so there's nothing to poll
+        self._data_downloading()
 
     def check_status(self):
         """
-        Check if we've got the first data blob in the stream yet
+        Time out the download if we haven't got the first data blob in the stream yet
         """
+        if self.data_downloading_deferred.called:
+            safe_stop_looping_call(self.checker)
+            return
         self.timeout_counter += 1
         if self.timeout_counter > self.timeout:
-            if not self.data_downloading_deferred.called:
-                if self.downloader:
-                    err = DownloadDataTimeout(self.sd_hash)
-                else:
-                    err = DownloadSDTimeout(self.sd_hash)
-                self.data_downloading_deferred.errback(err)
+            if self.downloader:
+                err = DownloadDataTimeout(self.sd_hash)
+            else:
+                err = DownloadSDTimeout(self.sd_hash)
+            self.data_downloading_deferred.errback(err)
             safe_stop_looping_call(self.checker)
         elif self.downloader:
-            d = self.downloader.status()
-            d.addCallback(self._check_status)
+            log.debug("Waiting for stream data (%i seconds)", self.timeout_counter)
         else:
             log.debug("Waiting for stream descriptor (%i seconds)", self.timeout_counter)
 
@@ -141,15 +143,12 @@ class GetStream(object):
         else:
             defer.returnValue(None)
 
-    @defer.inlineCallbacks
     def finish(self, results, name):
         self.set_status(DOWNLOAD_STOPPED_CODE, name)
         log.info("Finished downloading lbry://%s (%s) --> %s", name, self.sd_hash[:6],
                  self.download_path)
-        safe_stop_looping_call(self.checker)
-        status = yield self.downloader.status()
-        self._check_status(status)
-        defer.returnValue(self.download_path)
+        self._data_downloading()
+        return self.download_path
 
     def fail(self, err):
         safe_stop_looping_call(self.checker)
@@ -180,6 +179,8 @@ class GetStream(object):
     @defer.inlineCallbacks
     def _download(self, sd_blob, name, key_fee):
         self.downloader = yield self._create_downloader(sd_blob)
+        self.downloader.add_blob_completed_callback(self._blob_completed)
+        self.downloader.add_started_callback(lambda: self.set_status(DOWNLOAD_RUNNING_CODE, name))
         yield self.pay_key_fee(key_fee, name)
         log.info("Downloading lbry://%s (%s) --> %s", name, self.sd_hash[:6], self.download_path)
         self.finished_deferred = self.downloader.start()
@@ -204,7 +205,6 @@ class GetStream(object):
         sd_blob = yield self._download_sd_blob()
 
         yield self._download(sd_blob, name, key_fee)
-        self.set_status(DOWNLOAD_RUNNING_CODE, name)
 
         try:
             yield self.data_downloading_deferred
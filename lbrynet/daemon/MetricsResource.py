@@ -0,0 +1,63 @@
+import logging
+
+from twisted.web import resource
+
+from lbrynet.core import metrics
+
+log = logging.getLogger(__name__)
+
+
+class MetricsResource(resource.Resource):
+    """Serves the metrics of the daemon at /metrics in the prometheus text format"""
+
+    isLeaf = True
+
+    def __init__(self, daemon):
+        resource.Resource.__init__(self)
+        self.daemon = daemon
+        metrics.REGISTRY.add_collector(self.collect)
+
+    def render_GET(self, request):
+        request.setHeader('content-type', 'text/plain; version=0.0.4; charset=utf-8')
+        return metrics.render()
+
+    def collect(self):
+        session = self.daemon.session
+        if session is not None:
+            self._collect_dht(session)
+            self._collect_peers(session)
+        reflector_server_port = self.daemon.reflector_server_port
+        if reflector_server_port is not None:
+            reflector_metrics = reflector_server_port.factory.get_metrics()
+            metrics.REFLECTOR_CONNECTIONS.set(reflector_metrics['active_connections'])
+            metrics.REFLECTOR_INGEST_BYTES.set(reflector_metrics['total_ingest_bytes'])
+            metrics.REFLECTOR_INGEST_RATE.set(reflector_metrics['ingest_bytes_per_second'])
+
+    @staticmethod
+    def _collect_dht(session):
+        dht_node = session.dht_node
+        if dht_node is not None:
+            metrics.DHT_CONTACTS.set(sum(len(bucket._contacts)
+                                         for bucket in dht_node._routingTable._buckets))
+            metrics.DHT_DATASTORE_KEYS.set(len(dht_node._dataStore.keys()))
+            bandwidth_stats = dht_node.get_bandwidth_stats()
+            metrics.DHT_BYTES.labels('received').set(bandwidth_stats['total_bytes_received'])
+            metrics.DHT_BYTES.labels('sent').set(bandwidth_stats['total_bytes_sent'])
+        if session.hash_announcer is not None:
+            metrics.DHT_ANNOUNCE_QUEUE.set(session.hash_announcer.hash_queue_size())
+
+    @staticmethod
+    def _collect_peers(session):
+        rate_limiter = session.rate_limiter
+        if rate_limiter is None:
+            return
+        protocols = rate_limiter.protocols
+        metrics.PEER_CONNECTIONS.set(len(protocols))
+        metrics.PEER_BYTES.labels('received').set(rate_limiter.total_dl_bytes)
+        metrics.PEER_BYTES.labels('sent').set(rate_limiter.total_ul_bytes)
+        metrics.PEER_THROUGHPUT.clear()
+        for protocol in protocols:
+            peer = getattr(protocol, 'peer', None)
+            throughput = peer.throughput.get() if peer is not None else None
+            if throughput is not None:
+                metrics.PEER_THROUGHPUT.labels(str(peer)).set(throughput)
@@ -0,0 +1,226 @@
+import logging
+import mimetypes
+from collections import OrderedDict
+
+from zope.interface import implements
+from twisted.internet import defer
+from twisted.internet.interfaces import IPushProducer
+from twisted.web import resource, server, http
+
+from lbrynet import conf
+from lbrynet.file_manager.EncryptedFileStreamer import EncryptedFileStreamer
+
+log = logging.getLogger(__name__)
+
+
+def parse_byte_range(header, size):
+    """
+    Get the (start, end) bytes, inclusive, asked for by a Range header of a file of the given
+    size, or None if the whole file should be sent. Raises ValueError if the range can't be
+    satisfied. Only a single range is supported, for more than one the whole file is sent.
+    """
+    if not header or not header.startswith('bytes=') or ',' in header:
+        return None
+    first, sep, last = header[len('bytes='):].strip().partition('-')
+    if not sep:
+        return None
+    try:
+        if first:
+            start = int(first)
+            end = int(last) if last else size - 1
+        else:
+            # the last bytes of the file
+            start, end = size - int(last), size - 1
+    except ValueError:
+        return None
+    if start >= size or end < start or end < 0:
+        raise ValueError("Range %s can't be satisfied for %i bytes" % (header, size))
+    return max(start, 0), min(end, size - 1)
+
+
+class StreamProducer(object):
+    """Stops writing a stream while the client isn't reading it, or once it has disconnected"""
+    implements(IPushProducer)
+
+    def __init__(self):
+        self.stopped = False
+        self.paused = False
+        self._waiting = []
+
+    def pauseProducing(self):
+        self.paused = True
+
+    def resumeProducing(self):
+        self.paused = False
+        waiting, self._waiting = self._waiting, []
+        for d in waiting:
+            d.callback(None)
+
+    def stopProducing(self):
+        self.stopped = True
+        self.resumeProducing()
+
+    def wait(self):
+        """Returns a deferred which fires once the client wants more data"""
+        if not self.paused:
+            return defer.succeed(None)
+        d = defer.Deferred()
+        self._waiting.append(d)
+        return d
+
+
+class StreamResource(resource.Resource):
+    """
+    Serves the managed lbry files at /stream/<sd hash>, supporting single range requests so
+    that players can seek. Files are read from their blobs, so they can be streamed while they
+    download.
+
+    Until the last blob of a file has been downloaded its exact size isn't known, so the whole
+    file is sent without a content length. Range and HEAD requests wait for the last blob.
+
+    Like api calls, files are only served to requests from the origins the api accepts.
+
+    The streamers of the most recently streamed files are kept, ones which are still being read
+    by a request are never stopped to make room for another.
+    """
+
+    isLeaf = True
+    MAX_STREAMERS = 4
+
+    def __init__(self, daemon):
+        resource.Resource.__init__(self)
+        self.daemon = daemon
+        self.streamers = OrderedDict()  # {sd_hash: EncryptedFileStreamer}, least recent first
+        self.requests = {}  # {sd_hash: number of requests reading its streamer}
+
+    def render_GET(self, request):
+        if len(request.postpath) != 1 or not request.postpath[0]:
+            request.setResponseCode(http.NOT_FOUND)
+            return ''
+        if not self.daemon._check_headers(request):
+            # otherwise any web page could start downloads with a media tag
+            request.setResponseCode(http.FORBIDDEN)
+            return ''
+        producer = StreamProducer()
+        request.notifyFinish().addErrback(lambda _: producer.stopProducing())
+        d = self._stream(request, producer, request.postpath[0])
+        d.addErrback(self._stream_failed, request, producer)
+        return server.NOT_DONE_YET
+
+    @defer.inlineCallbacks
+    def _get_streamer(self, sd_hash):
+        """Get the streamer of a file, _release_streamer has to be called once it's been read"""
+        if sd_hash in self.streamers:
+            streamer = self.streamers.pop(sd_hash)
+            self.streamers[sd_hash] = streamer
+            defer.returnValue(self._use_streamer(sd_hash))
+        if self.daemon.lbry_file_manager is None:
+            defer.returnValue(None)
+        lbry_files = self.daemon.lbry_file_manager.find_lbry_files('sd_hash', sd_hash)
+        if not lbry_files:
+            defer.returnValue(None)
+        streamer = EncryptedFileStreamer(lbry_files[0], conf.settings['streaming_read_ahead'],
+                                         conf.settings['download_timeout'])
+        try:
+            yield streamer.start()
+        except Exception:
+            streamer.stop()
+            raise
+        if sd_hash in self.streamers:
+            # another request made one while this one was starting
+            streamer.stop()
+            defer.returnValue(self._use_streamer(sd_hash))
+        self.streamers[sd_hash] = streamer
+        streamer = self._use_streamer(sd_hash)
+        self._stop_idle_streamers()
+        defer.returnValue(streamer)
+
+    def _use_streamer(self, sd_hash):
+        self.requests[sd_hash] = self.requests.get(sd_hash, 0) + 1
+        return self.streamers[sd_hash]
+
+    def _release_streamer(self, sd_hash):
+        self.requests[sd_hash] -= 1
+        if not self.requests[sd_hash]:
+            del self.requests[sd_hash]
+            self._stop_idle_streamers()
+
+    def _stop_idle_streamers(self):
+        """Stop the least recently used streamers which aren't being read, until at most
+        MAX_STREAMERS are left"""
+        idle = [sd_hash for sd_hash in self.streamers if sd_hash not in self.requests]
+        for sd_hash in idle[:max(len(self.streamers) - self.MAX_STREAMERS, 0)]:
+            self.streamers.pop(sd_hash).stop()
+
+    @defer.inlineCallbacks
+    def _stream(self, request, producer, sd_hash):
+        streamer = yield self._get_streamer(sd_hash)
+        if streamer is None:
+            if not producer.stopped:
+                request.setResponseCode(http.NOT_FOUND)
+                request.finish()
+            return
+        try:
+            yield self._write_stream(request, producer, streamer)
+        finally:
+            self._release_streamer(sd_hash)
+
+    @defer.inlineCallbacks
+    def _write_stream(self, request, producer, streamer):
+        if producer.stopped:
+            return
+        if streamer.size is None and (request.getHeader('range') or request.method == 'HEAD'):
+            yield streamer.get_size()
+            if producer.stopped:
+                return
+        if streamer.size is None:
+            byte_range = None
+        else:
+            try:
+                byte_range = parse_byte_range(request.getHeader('range'), streamer.size)
+            except ValueError:
+                request.setResponseCode(http.REQUESTED_RANGE_NOT_SATISFIABLE)
+                request.setHeader('content-range', 'bytes */%i' % streamer.size)
+                request.finish()
+                return
+        request.setHeader('accept-ranges', 'bytes')
+        request.setHeader('content-type', mimetypes.guess_type(streamer.lbry_file.file_name)[0]
+                          or 'application/octet-stream')
+        if byte_range is None:
+            start, end = 0, (streamer.max_size if streamer.size is None else streamer.size) - 1
+        else:
+            start, end = byte_range
+            request.setResponseCode(http.PARTIAL_CONTENT)
+            request.setHeader('content-range', 'bytes %i-%i/%i' % (start, end, streamer.size))
+        if streamer.size is not None:
+            request.setHeader('content-length', str(max(end - start + 1, 0)))
+        if request.method == 'HEAD' or end < start:
+            request.finish()
+            return
+
+        request.registerProducer(producer, True)
+        for i, blob_start, blob_end in streamer.get_slices(start, end):
+            data = yield streamer.read_blob(i)
+            if producer.stopped:
+                break
+            request.write(data[blob_start:blob_end])
+            streamer.read_ahead_of(i)
+            yield producer.wait()
+        if not producer.stopped:
+            request.unregisterProducer()
+            request.finish()
+
+    @staticmethod
+    def _stream_failed(err, request, producer):
+        log.warning("Failed to stream %s: %s", request.uri, err.getErrorMessage())
+        if producer.stopped or request.finished:
+            return
+        if request.producer is not None:
+            request.unregisterProducer()
+        if request.startedWriting:
+            # the response can't be completed, so the client has to see it was cut short
+            request.loseConnection()
+            return
+        request.setResponseCode(http.SERVICE_UNAVAILABLE)
+        request.setHeader('content-length', '0')
+        request.finish()
@@ -2,6 +2,9 @@ import logging
 import urlparse
 import json
 import inspect
+import hashlib
+import time
+from collections import OrderedDict
 
 from decimal import Decimal
 from zope.interface import implements
@@ -99,21 +102,33 @@ def trap(err, *to_trap):
     err.trap(*to_trap)
 
 
+def jsonrpc_response(obj, id_=None):
+    if isinstance(obj, JSONRPCError):
+        return {"jsonrpc": "2.0", "error": obj.to_dict(), "id": id_}
+    return {"jsonrpc": "2.0", "result": obj, "id": id_}
+
+
 def jsonrpc_dumps_pretty(obj, **kwargs):
+    """Encode a result or JSONRPCError, or a list of responses to a batch request"""
     try:
         id_ = kwargs.pop("id")
     except KeyError:
         id_ = None
 
-    if isinstance(obj, JSONRPCError):
-        data = {"jsonrpc": "2.0", "error": obj.to_dict(), "id": id_}
-    else:
-        data = {"jsonrpc": "2.0", "result": obj, "id": id_}
-
+    data = obj if kwargs.pop("batch", False) else jsonrpc_response(obj, id_)
     return json.dumps(data, cls=jsonrpclib.JSONRPCEncoder, sort_keys=True, indent=2,
                       separators=(',', ': '), **kwargs) + "\n"
 
 
+class JSONRPCCallError(Exception):
+    """A call which can't be made, error is the JSONRPCError to respond with"""
+
+    def __init__(self, error, id_=None):
+        Exception.__init__(self, error.message)
+        self.error = error
+        self.id = id_
+
+
 class JSONRPCServerType(type):
     def __new__(mcs, name, bases, newattrs):
         klass = type.__new__(mcs, name, bases, newattrs)
@@ -149,6 +164,19 @@ class AuthorizedBase(object):
             return f
         return _deprecated_wrapper
 
+    @staticmethod
+    def cached(ttl, invalidated_by=()):
+        """
+        Keep the results of a method for ttl seconds, or until one of the invalidated_by events
+        is passed to invalidate_cache. Responses to cached methods have an ETag, so clients
+        polling them can send If-None-Match and get a 304 when nothing has changed.
+        """
+        def _cached_wrapper(f):
+            f._cache_ttl = ttl
+            f._cache_invalidated_by = tuple(invalidated_by)
+            return f
+        return _cached_wrapper
+
     @staticmethod
     def flags(**kwargs):
         def _flag_wrapper(f):
@@ -185,6 +213,8 @@ class AuthJSONRPCServer(AuthorizedBase):
 
     isLeaf = True
     allowed_during_startup = []
+    # the most results of cached methods kept, the oldest are dropped beyond this
+    MAX_CACHED_RESULTS = 1000
 
     def __init__(self, use_authentication=None):
         self._use_authentication = (
@@ -192,6 +222,10 @@ class AuthJSONRPCServer(AuthorizedBase):
         )
         self.announced_startup = False
         self.sessions = {}
+        # {(method name, encoded args): (expiration time, result)}, oldest first
+        self._result_cache = OrderedDict()
+        self._pending_results = {}  # {(method name, encoded args, generation): [deferreds]}
+        self._cache_generation = 0
 
     def setup(self):
         return NotImplementedError()
@@ -211,7 +245,8 @@ class AuthJSONRPCServer(AuthorizedBase):
         request.write(message)
         request.finish()
 
-    def _render_error(self, failure, request, id_):
+    @staticmethod
+    def _get_error(failure):
         if isinstance(failure, JSONRPCError):
             error = failure
         elif isinstance(failure, Failure):
@@ -226,16 +261,20 @@ class AuthJSONRPCServer(AuthorizedBase):
             error = JSONRPCError(str(failure))
         log.warning("error processing api request: %s\ntraceback: %s", error.message,
                     "\n".join(error.traceback))
-        response_content = jsonrpc_dumps_pretty(error, id=id_)
+        return error
+
+    def _render_error(self, failure, request, id_):
+        response_content = jsonrpc_dumps_pretty(self._get_error(failure), id=id_)
         self._set_headers(request, response_content)
         request.setResponseCode(200)
         self._render_message(request, response_content)
 
     @staticmethod
-    def _handle_dropped_request(result, d, function_name):
-        if not d.called:
-            log.warning("Cancelling dropped api request %s", function_name)
-            d.cancel()
+    def _handle_dropped_request(result, ds, function_name):
+        for d in ds:
+            if not d.called:
+                log.warning("Cancelling dropped api request %s", function_name)
+                d.cancel()
 
     def render(self, request):
         try:
@@ -279,6 +318,171 @@ class AuthJSONRPCServer(AuthorizedBase):
             self._render_error(JSONRPCError(None, JSONRPCError.CODE_PARSE_ERROR), request, None)
             return server.NOT_DONE_YET
 
+        if isinstance(parsed, list):
+            return self._render_batch(request, session_id, parsed, finished_deferred, time_in)
+
+        try:
+            function_name, fn, args_dict, id_, reply_with_next_secret = self._prepare_call(
+                session_id, parsed)
+        except JSONRPCCallError as err:
+            self._render_error(err.error, request, err.id)
+            return server.NOT_DONE_YET
+        if reply_with_next_secret:
+            self._update_session_secret(session_id)
+
+        d = self._call_method(fn, args_dict)
+
+        # finished_deferred will callback when the request is finished
+        # and errback if something went wrong. If the errback is
+        # called, cancel the deferred stack. This is to prevent
+        # request.finish() from being called on a closed request.
+        finished_deferred.addErrback(self._handle_dropped_request, [d], function_name)
+
+        d.addCallback(self._callback_render, request, id_, reply_with_next_secret,
+                      conditional=bool(getattr(fn, '_cache_ttl', None)))
+        # TODO: don't trap RuntimeError, which is presently caught to
+        # handle deferredLists that won't peacefully cancel, namely
+        # get_lbry_files
+        d.addErrback(trap, ConnectionDone, ConnectionLost, defer.CancelledError, RuntimeError)
+        d.addErrback(self._render_error, request, id_)
+        d.addBoth(lambda _: log.debug("%s took %f",
+                                      function_name,
+                                      (utils.now() - time_in).total_seconds()))
+        return server.NOT_DONE_YET
+
+    def _render_batch(self, request, session_id, calls, finished_deferred, time_in):
+        """
+        Make each call of a JSON-RPC 2.0 batch request at once, and respond with their results
+        in the order they were asked for once they have all finished. Every call of a batch is
+        checked against the same session secret, which is then updated once.
+        """
+        if not calls:
+            self._render_error(JSONRPCError(None, JSONRPCError.CODE_INVALID_REQUEST), request,
+                               None)
+            return server.NOT_DONE_YET
+        ds, reply_with_next_secret = self._dispatch_batch(session_id, calls)
+        if reply_with_next_secret:
+            self._update_session_secret(session_id)
+        finished_deferred.addErrback(self._handle_dropped_request, ds, "batch")
+
+        def render_batch(responses):
+            if finished_deferred.called:
+                # the request was dropped
+                return
+            self._callback_render(responses, request, None, reply_with_next_secret, batch=True)
+
+        d = defer.gatherResults(ds)
+        d.addCallback(render_batch)
+        d.addErrback(self._render_error, request, None)
+        d.addBoth(lambda _: log.debug("batch of %i calls took %f", len(calls),
+                                      (utils.now() - time_in).total_seconds()))
+        return server.NOT_DONE_YET
+
+    def _dispatch_batch(self, session_id, calls, check_token=True):
+        """
+        Start each call of a batch, returns a deferred for each call, which fires with its
+        response, and whether any of them were authenticated
+        """
+        ds = []
+        authenticated = False
+        for call in calls:
+            try:
+                function_name, fn, args_dict, id_, needs_auth = self._prepare_call(
+                    session_id, call, check_token)
+            except JSONRPCCallError as err:
+                ds.append(defer.succeed(jsonrpc_response(err.error, err.id)))
+                continue
+            authenticated = authenticated or needs_auth
+            d = self._call_method(fn, args_dict)
+            d.addCallbacks(jsonrpc_response, lambda err, id_: jsonrpc_response(
+                self._get_error(err), id_), callbackArgs=(id_,), errbackArgs=(id_,))
+            ds.append(d)
+        return ds, authenticated
+
+    def _call_method(self, fn, args_dict):
+        """Call an api method, cached methods are only called if their result has expired"""
+        ttl = getattr(fn, '_cache_ttl', None)
+        if not ttl:
+            return defer.maybeDeferred(fn, self, **args_dict)
+        key = (fn.__name__, json.dumps(args_dict, sort_keys=True))
+        cached = self._result_cache.get(key)
+        if cached is not None and cached[0] > time.time():
+            return defer.succeed(cached[1])
+
+        # calls made while the result is being found wait for it
+        d = defer.Deferred()
+        generation = self._cache_generation
+        pending_key = key + (generation,)
+        if pending_key in self._pending_results:
+            self._pending_results[pending_key].append(d)
+            return d
+        self._pending_results[pending_key] = [d]
+
+        def finished(result):
+            if not isinstance(result, Failure) and generation == self._cache_generation:
+                self._cache_result(key, ttl, result)
+            for waiting in self._pending_results.pop(pending_key, []):
+                if waiting.called:
+                    # the request was dropped
+                    continue
+                if isinstance(result, Failure):
+                    waiting.errback(result)
+                else:
+                    waiting.callback(result)
+
+        defer.maybeDeferred(fn, self, **args_dict).addBoth(finished)
+        return d
+
+    def _cache_result(self, key, ttl, result):
+        now = time.time()
+        for cached_key, (expiration, _) in self._result_cache.items():
+            if expiration <= now:
+                del self._result_cache[cached_key]
+        self._result_cache.pop(key, None)
+        self._result_cache[key] = (now + ttl, result)
+        while len(self._result_cache) > self.MAX_CACHED_RESULTS:
+            self._result_cache.popitem(last=False)
+
+    def invalidate_cache(self, *events):
+        """
+        Forget the cached results of the methods invalidated by any of the events, or of every
+        method if no events are given
+        """
+        self._cache_generation += 1
+        for key in list(self._result_cache):
+            invalidated_by = getattr(getattr(self, key[0]), '_cache_invalidated_by', ())
+            if not events or set(events).intersection(invalidated_by):
+                del self._result_cache[key]
+
+    def dispatch_message(self, content):
+        """
+        Make the call, or batch of calls, in a message from a transport other than http, whose
+        client has already been authenticated. Returns a deferred which fires with the encoded
+        response.
+        """
+        try:
+            parsed = jsonrpclib.loads(content)
+        except ValueError:
+            log.warning("Unable to decode request json")
+            return defer.succeed(jsonrpc_dumps_pretty(JSONRPCError(
+                None, JSONRPCError.CODE_PARSE_ERROR)))
+        batch = isinstance(parsed, list)
+        if batch and not parsed:
+            return defer.succeed(jsonrpc_dumps_pretty(JSONRPCError(
+                None, JSONRPCError.CODE_INVALID_REQUEST)))
+        ds, _ = self._dispatch_batch(None, parsed if batch else [parsed], check_token=False)
+        d = defer.gatherResults(ds)
+        d.addCallback(lambda responses: jsonrpc_dumps_pretty(
+            responses if batch else responses[0], default=default_decimal, batch=True))
+        return d
+
+    def _prepare_call(self, session_id, parsed, check_token=True):
+        """
+        Find the method and arguments of a call, and check its authentication token if it
+        needs one. Raises JSONRPCCallError if the call can't be made.
+
+        Returns (function_name, method, args_dict, id, whether the token was checked)
+        """
         id_ = None
         try:
             function_name = parsed.get('method')
@@ -287,60 +491,48 @@ class AuthJSONRPCServer(AuthorizedBase):
             token = parsed.pop('hmac', None)
         except AttributeError as err:
             log.warning(err)
-            self._render_error(
-                JSONRPCError(None, code=JSONRPCError.CODE_INVALID_REQUEST), request, id_
-            )
-            return server.NOT_DONE_YET
+            raise JSONRPCCallError(JSONRPCError(None, code=JSONRPCError.CODE_INVALID_REQUEST),
+                                   id_)
 
-        reply_with_next_secret = False
-        if self._use_authentication:
+        authenticated = False
+        if check_token and self._use_authentication:
             if function_name in self.authorized_functions:
                 try:
                     self._verify_token(session_id, parsed, token)
                 except InvalidAuthenticationToken as err:
                     log.warning("API validation failed")
-                    self._render_error(
-                        JSONRPCError.create_from_exception(
-                            err.message, code=JSONRPCError.CODE_AUTHENTICATION_ERROR,
-                            traceback=format_exc()
-                        ),
-                        request, id_
+                    raise JSONRPCCallError(
+                        JSONRPCError(err.message, code=JSONRPCError.CODE_AUTHENTICATION_ERROR,
+                                     traceback=format_exc()),
+                        id_
                     )
-                    return server.NOT_DONE_YET
-                self._update_session_secret(session_id)
-                reply_with_next_secret = True
+                authenticated = True
 
         try:
             fn = self._get_jsonrpc_method(function_name)
         except UnknownAPIMethodError as err:
             log.warning('Failed to get function %s: %s', function_name, err)
-            self._render_error(
-                JSONRPCError(None, JSONRPCError.CODE_METHOD_NOT_FOUND),
-                request, id_
-            )
-            return server.NOT_DONE_YET
+            raise JSONRPCCallError(JSONRPCError(None, JSONRPCError.CODE_METHOD_NOT_FOUND), id_)
         except NotAllowedDuringStartupError:
             log.warning('Function not allowed during startup: %s', function_name)
-            self._render_error(
+            raise JSONRPCCallError(
                 JSONRPCError("This method is unavailable until the daemon is fully started",
                              code=JSONRPCError.CODE_INVALID_REQUEST),
-                request, id_
+                id_
             )
-            return server.NOT_DONE_YET
 
         if args == EMPTY_PARAMS or args == []:
             args_dict = {}
-            _args, _kwargs = (), {}
         elif isinstance(args, dict):
             args_dict = args
         elif len(args) == 1 and isinstance(args[0], dict):
             # TODO: this is for backwards compatibility. Remove this once API and UI are updated
             # TODO: also delete EMPTY_PARAMS then
             args_dict = args[0]
-            _args, _kwargs = (), args
         else:
             # d = defer.maybeDeferred(function, *args)  # if we want to support positional args too
-            raise ValueError('Args must be a dict')
+            raise JSONRPCCallError(
+                JSONRPCError('Args must be a dict', code=JSONRPCError.CODE_INVALID_PARAMS), id_)
 
         params_error, erroneous_params = self._check_params(fn, args_dict)
         if params_error is not None:
@@ -348,30 +540,10 @@ class AuthJSONRPCServer(AuthorizedBase):
                 params_error, function_name, ', '.join(erroneous_params)
             )
             log.warning(params_error_message)
-            self._render_error(
-                JSONRPCError(params_error_message, code=JSONRPCError.CODE_INVALID_PARAMS),
-                request, id_
-            )
-            return server.NOT_DONE_YET
-
-        d = defer.maybeDeferred(fn, self, **args_dict)
-
-        # finished_deferred will callback when the request is finished
-        # and errback if something went wrong. If the errback is
-        # called, cancel the deferred stack. This is to prevent
-        # request.finish() from being called on a closed request.
-        finished_deferred.addErrback(self._handle_dropped_request, d, function_name)
+            raise JSONRPCCallError(
+                JSONRPCError(params_error_message, code=JSONRPCError.CODE_INVALID_PARAMS), id_)
 
-        d.addCallback(self._callback_render, request, id_, reply_with_next_secret)
-        # TODO: don't trap RuntimeError, which is presently caught to
-        # handle deferredLists that won't peacefully cancel, namely
-        # get_lbry_files
-        d.addErrback(trap, ConnectionDone, ConnectionLost, defer.CancelledError, RuntimeError)
-        d.addErrback(self._render_error, request, id_)
-        d.addBoth(lambda _: log.debug("%s took %f",
-                                      function_name,
-                                      (utils.now() - time_in).total_seconds()))
-        return server.NOT_DONE_YET
+        return function_name, fn, args_dict, id_, authenticated
 
     def _register_user_session(self, session_id):
         """
@@ -486,9 +658,26 @@ class AuthJSONRPCServer(AuthorizedBase):
     def _update_session_secret(self, session_id):
         self.sessions.update({session_id: APIKey.new(name=session_id)})
 
-    def _callback_render(self, result, request, id_, auth_required=False):
+    @staticmethod
+    def _get_etag(result):
+        encoded = json.dumps(result, cls=jsonrpclib.JSONRPCEncoder, sort_keys=True,
+                             default=default_decimal)
+        return '"%s"' % hashlib.sha1(encoded).hexdigest()
+
+    def _callback_render(self, result, request, id_, auth_required=False, batch=False,
+                         conditional=False):
         try:
-            encoded_message = jsonrpc_dumps_pretty(result, id=id_, default=default_decimal)
+            if conditional:
+                etag = self._get_etag(result)
+                request.setHeader("ETag", etag)
+                if_none_match = request.getHeader("If-None-Match") or ''
+                if etag in [tag.strip() for tag in if_none_match.split(',')]:
+                    request.setResponseCode(304)
+                    self._set_headers(request, '', auth_required)
+                    self._render_message(request, '')
+                    return
+            encoded_message = jsonrpc_dumps_pretty(result, id=id_, default=default_decimal,
+                                                   batch=batch)
             request.setResponseCode(200)
             self._set_headers(request, encoded_message, auth_required)
             self._render_message(request, encoded_message)
@@ -0,0 +1,64 @@
+"""
+Optional websocket transport for the api, for clients which call it constantly
+
+Each message is a JSON-RPC request, or a batch of them, and is answered with one message. The
+websocket is opened through the same resource tree as the http api, so when use_auth_http is
+set the client has logged in before the connection is upgraded, and calls made over it don't
+need hmac tokens. This needs autobahn, without it there is no websocket transport.
+
+Browsers let any page open a websocket to any host, so connections are only accepted from the
+origins the http api accepts requests from.
+"""
+
+import logging
+
+try:
+    from autobahn.twisted.resource import WebSocketResource
+    from autobahn.twisted.websocket import WebSocketServerFactory, WebSocketServerProtocol
+    from autobahn.websocket.types import ConnectionDeny
+except ImportError:
+    WebSocketResource = WebSocketServerFactory = ConnectionDeny = None
+    WebSocketServerProtocol = object
+
+log = logging.getLogger(__name__)
+
+
+def websocket_available():
+    return WebSocketResource is not None
+
+
+class JSONRPCWebSocketProtocol(WebSocketServerProtocol):
+    def onConnect(self, request):
+        if not self.factory.api._check_source_of_request(request.origin):
+            log.warning("Refused an api websocket from %s", request.origin)
+            raise ConnectionDeny(ConnectionDeny.FORBIDDEN, "Origin not allowed")
+
+    def onOpen(self):
+        self.pending = []
+
+    def onMessage(self, payload, isBinary):
+        if isBinary:
+            log.warning("Ignoring a binary api message")
+            return
+        d = self.factory.api.dispatch_message(payload)
+        self.pending.append(d)
+
+        def send_response(response):
+            self.pending.remove(d)
+            self.sendMessage(response, False)
+
+        d.addCallback(send_response)
+        d.addErrback(lambda err: log.warning("Failed to answer a websocket api call: %s",
+                                             err.getErrorMessage()))
+
+    def onClose(self, wasClean, code, reason):
+        for d in getattr(self, 'pending', []):
+            d.cancel()
+
+
+def get_websocket_resource(api):
+    """Make a resource which upgrades requests to websockets for calling api"""
+    factory = WebSocketServerFactory()
+    factory.protocol = JSONRPCWebSocketProtocol
+    factory.api = api
+    return WebSocketResource(factory)
@@ -16,6 +16,9 @@ def migrate_db(db_dir, start, end):
         elif current == 4:
             from lbrynet.db_migrator.migrate4to5 import do_migration
             do_migration(db_dir)
+        elif current == 5:
+            from lbrynet.db_migrator.migrate5to6 import do_migration
+            do_migration(db_dir)
         else:
             raise Exception(
                 "DB migration of version {} to {} is not available".format(current, current+1))
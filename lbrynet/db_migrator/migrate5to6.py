@@ -0,0 +1,53 @@
+import sqlite3
+import os
+import json
+import logging
+
+log = logging.getLogger(__name__)
+
+
+def do_migration(db_dir):
+    log.info("Doing the migration")
+    fix_malformed_supports_and_amounts(db_dir)
+    log.info("Migration succeeded")
+
+
+def fix_malformed_supports_and_amounts(db_dir):
+    """
+    Fix the claim cache rows with malformed supports or amounts. Supports were saved as a list
+    of [txid, nout, amount in deweys] instead of a list of {'txid':, 'nout':, 'amount':}, with
+    their claim's amount also in deweys, or as '"[]"' (brackets enclosed by double quotes).
+    These used to be fixed every time the claim was read from the cache.
+    """
+
+    name_metadata = os.path.join(db_dir, "blockchainname.db")
+    if not os.path.isfile(name_metadata):
+        return
+
+    db = sqlite3.connect(name_metadata)
+    cursor = db.cursor()
+    tables = cursor.execute("select name from sqlite_master "
+                            "where type='table' and name='claim_cache'").fetchall()
+    if not tables:
+        db.close()
+        return
+
+    fixed = 0
+    for row_id, supports, amount in cursor.execute("select row_id, supports, amount "
+                                                   "from claim_cache").fetchall():
+        supports = [] if not supports else json.loads(supports)
+        if isinstance(supports, (str, unicode)) and supports == '[]':
+            cursor.execute("update claim_cache set supports=? where row_id=?",
+                           (json.dumps([]), row_id))
+            fixed += 1
+        elif len(supports) > 0 and not isinstance(supports[0], dict):
+            fixed_supports = [
+                {'txid': support[0], 'nout': support[1], 'amount': support[2] / 100000000.0}
+                for support in supports
+            ]
+            cursor.execute("update claim_cache set supports=?, amount=? where row_id=?",
+                           (json.dumps(fixed_supports), amount / 100000000.0, row_id))
+            fixed += 1
+    db.commit()
+    db.close()
+    log.info("Fixed %i malformed claim cache rows", fixed)
@@ -0,0 +1,68 @@
+import errno
+import logging
+import os
+
+from lbrynet.blob.layout import BlobDirLayout, read_shard_depth, write_shard_depth
+from lbrynet.blob.layout import is_shard_name, MAX_SHARD_DEPTH
+
+log = logging.getLogger(__name__)
+
+
+def migrate_blob_dir(blob_dir, shard_depth, is_stopped=None):
+    """
+    Move the blob files in blob_dir to the layout with the given shard depth (0 is flat)
+
+    Blobs are moved one at a time with os.rename, so this is safe to run while the daemon
+    is using the blob directory as long as its BlobDirLayout has the old depth set as the
+    legacy_shard_depth. The new depth is recorded in the blob directory once every blob
+    has been moved, and the migration can be resumed if it's interrupted (is_stopped is
+    checked before each move).
+    """
+
+    current_depth = read_shard_depth(blob_dir)
+    if current_depth == shard_depth:
+        return 0
+    log.info("Migrating blob dir %s from shard depth %i to %i", blob_dir, current_depth,
+             shard_depth)
+    layout = BlobDirLayout(blob_dir, shard_depth)
+    moved = 0
+    for blob_hash, path, _ in list(layout.iter_blob_files()):
+        if is_stopped is not None and is_stopped():
+            log.info("Stopped blob dir migration after moving %i blobs", moved)
+            return moved
+        new_path = layout.path(blob_hash)
+        if path == new_path:
+            continue
+        if os.path.isfile(new_path):
+            # a copy was already written at the new path, the old one is redundant
+            os.remove(path)
+            continue
+        os.rename(path, layout.prepare(blob_hash))
+        moved += 1
+    _remove_empty_shard_dirs(blob_dir)
+    write_shard_depth(blob_dir, shard_depth)
+    log.info("Moved %i blobs", moved)
+    return moved
+
+
+def _remove_empty_shard_dirs(path, depth=0):
+    for name in os.listdir(path):
+        shard_path = os.path.join(path, name)
+        if depth < MAX_SHARD_DEPTH and is_shard_name(name) and os.path.isdir(shard_path):
+            _remove_empty_shard_dirs(shard_path, depth + 1)
+            try:
+                os.rmdir(shard_path)
+            except OSError as err:
+                if err.errno not in (errno.ENOTEMPTY, errno.EEXIST):
+                    raise
+
+
+def run_migration_script():
+    import sys
+    log_format = "(%(asctime)s)[%(filename)s:%(lineno)s] %(funcName)s(): %(message)s"
+    logging.basicConfig(level=logging.INFO, format=log_format)
+    migrate_blob_dir(sys.argv[1], int(sys.argv[2]))
+
+
+if __name__ == "__main__":
+    run_migration_script()
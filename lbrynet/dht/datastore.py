@@ -13,6 +13,8 @@ class DictDataStore(UserDict.DictMixin):
         # Dictionary format:
         # { <key>: (<value>, <lastPublished>, <originallyPublished> <originalPublisherID>) }
         self._dict = {}
+        # { <originalPublisherID>: set(<key>) }
+        self._publishers = {}
 
     def keys(self):
         """ Return a list of the keys in this data store """
@@ -27,8 +29,11 @@ class DictDataStore(UserDict.DictMixin):
             return True
 
         for key in self._dict.keys():
-            unexpired_peers = filter(notExpired, self._dict[key])
+            peers = self._dict[key]
+            unexpired_peers = filter(notExpired, peers)
             self._dict[key] = unexpired_peers
+            if len(unexpired_peers) != len(peers):
+                self._unindexPublishers(key, peers)
 
     def hasPeersForBlob(self, key):
         if key in self._dict and len(self._dict[key]) > 0:
@@ -40,13 +45,35 @@ class DictDataStore(UserDict.DictMixin):
             self._dict[key].append((value, lastPublished, originallyPublished, originalPublisherID))
         else:
             self._dict[key] = [(value, lastPublished, originallyPublished, originalPublisherID)]
+        self._publishers.setdefault(originalPublisherID, set()).add(key)
 
     def getPeersForBlob(self, key):
         if key in self._dict:
             return [val[0] for val in self._dict[key]]
 
     def removePeer(self, value):
-        for key in self._dict:
-            self._dict[key] = [val for val in self._dict[key] if val[0] != value]
+        for key in self._dict.keys():
+            peers = self._dict[key]
+            self._dict[key] = [val for val in peers if val[0] != value]
+            if len(self._dict[key]) != len(peers):
+                self._unindexPublishers(key, peers)
             if not self._dict[key]:
                 del self._dict[key]
+
+    def getPublishers(self):
+        """ Return a list of the ids of the nodes which originally published the stored values """
+        return self._publishers.keys()
+
+    def getBlobsForPublisher(self, originalPublisherID):
+        """ Return a list of the keys which have a value originally published by the given node """
+        return list(self._publishers.get(originalPublisherID, ()))
+
+    def _unindexPublishers(self, key, removed_peers):
+        remaining = set(peer[3] for peer in self._dict.get(key, []))
+        for publisher in set(peer[3] for peer in removed_peers) - remaining:
+            keys = self._publishers.get(publisher)
+            if keys is None:
+                continue
+            keys.discard(key)
+            if not keys:
+                del self._publishers[publisher]
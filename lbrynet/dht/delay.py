@@ -5,13 +5,14 @@ class Delay(object):
     maxToSendDelay = 10 ** -3  # 0.05
     minToSendDelay = 10 ** -5  # 0.01
 
-    def __init__(self, start=0):
+    def __init__(self, start=0, clock=None):
         self._next = start
+        self._clock = clock
 
     # TODO: explain why this logic is like it is. And add tests that
     #       show that it actually does what it needs to do.
     def __call__(self):
-        ts = time.time()
+        ts = self._clock.seconds() if self._clock is not None else time.time()
         delay = 0
         if ts >= self._next:
             delay = self.minToSendDelay
@@ -3,17 +3,18 @@ import datetime
 
 
 class HashWatcher(object):
-    def __init__(self):
+    def __init__(self, clock=None):
+        if clock is None:
+            from twisted.internet import reactor
+            clock = reactor
+        self._clock = clock
         self.ttl = 600
         self.hashes = []
         self.next_tick = None
 
     def tick(self):
-
-        from twisted.internet import reactor
-
         self._remove_old_hashes()
-        self.next_tick = reactor.callLater(10, self.tick)
+        self.next_tick = self._clock.callLater(10, self.tick)
 
     def stop(self):
         if self.next_tick is not None:
@@ -27,6 +27,12 @@ class IDataStore(Interface):
     def removePeer(self, key):
         pass
 
+    def getPublishers(self):
+        pass
+
+    def getBlobsForPublisher(self, originalPublisherID):
+        pass
+
 
 class IRoutingTable(Interface):
     """ Interface for RPC message translators/formatters
@@ -23,6 +23,7 @@ from contact import Contact
 from hashwatcher import HashWatcher
 import logging
 
+from lbrynet.core import metrics
 from lbrynet.core.utils import generate_id
 
 log = logging.getLogger(__name__)
@@ -51,7 +52,7 @@ class Node(object):
 
     def __init__(self, node_id=None, udpPort=4000, dataStore=None,
                  routingTableClass=None, networkProtocol=None,
-                 externalIP=None, peerPort=None):
+                 externalIP=None, peerPort=None, clock=None):
         """
         @param dataStore: The data store to use. This must be class inheriting
                           from the C{DataStore} interface (or providing the
@@ -75,9 +76,13 @@ class Node(object):
         @type networkProtocol: entangled.kademlia.protocol.KademliaProtocol
         @param externalIP: the IP at which this node can be contacted
         @param peerPort: the port at which this node announces it has a blob for
+        @param clock: the provider of callLater used for timeouts and scheduled calls, the
+                      reactor by default. The nodes of a simulated network use its clock
+        @type clock: twisted.internet.interfaces.IReactorTime
         """
         self.node_id = node_id or self._generateID()
         self.port = udpPort
+        self._clock = clock if clock is not None else reactor
         self._listeningPort = None  # object implementing Twisted
         # IListeningPort This will contain a deferred created when
         # joining the network, to enable publishing/retrieving
@@ -87,6 +92,7 @@ class Node(object):
         self._joinDeferred = None
         self.next_refresh_call = None
         self.change_token_lc = task.LoopingCall(self.change_token)
+        self.change_token_lc.clock = self._clock
         # Create k-buckets (for storing contacts)
         if routingTableClass is None:
             self._routingTable = routingtable.OptimizedTreeRoutingTable(self.node_id)
@@ -95,7 +101,7 @@ class Node(object):
 
         # Initialize this node's network access mechanisms
         if networkProtocol is None:
-            self._protocol = protocol.KademliaProtocol(self)
+            self._protocol = protocol.KademliaProtocol(self, clock)
         else:
             self._protocol = networkProtocol
         # Initialize the data storage mechanism used by this node
@@ -115,7 +121,7 @@ class Node(object):
                     self._routingTable.addContact(contact)
         self.externalIP = externalIP
         self.peerPort = peerPort
-        self.hash_watcher = HashWatcher()
+        self.hash_watcher = HashWatcher(self._clock)
 
     def __del__(self):
         if self._listeningPort is not None:
@@ -151,8 +157,8 @@ class Node(object):
         self.change_token_lc.start(constants.tokenSecretChangeInterval)
         #        #TODO: Refresh all k-buckets further away than this node's closest neighbour
         # Start refreshing k-buckets periodically, if necessary
-        self.next_refresh_call = reactor.callLater(constants.checkRefreshInterval,
-                                                   self._refreshNode)
+        self.next_refresh_call = self._clock.callLater(constants.checkRefreshInterval,
+                                                       self._refreshNode)
         self.hash_watcher.tick()
 
     @defer.inlineCallbacks
@@ -654,8 +660,8 @@ class Node(object):
         return outerDf
 
     def _scheduleNextNodeRefresh(self, *args):
-        self.next_refresh_call = reactor.callLater(constants.checkRefreshInterval,
-                                                   self._refreshNode)
+        self.next_refresh_call = self._clock.callLater(constants.checkRefreshInterval,
+                                                       self._refreshNode)
 
     # args put here because _refreshRoutingTable does outerDF.callback(None)
     def _removeExpiredPeers(self, *args):
@@ -695,6 +701,10 @@ class _IterativeFindHelper(object):
         self.prev_closest_node = [None]
         self.find_value_result = {}
         self.slow_node_count = [0]
+        # how many rpcs in a row it took to hear about each contact, the ones in the
+        # starting shortlist are one rpc away
+        self.hops = dict((contact.id, 1) for contact in shortlist)
+        self.find_value_hops = None
 
     def extendShortlist(self, responseTuple):
         """ @type responseMsg: kademlia.msgtypes.ResponseMessage """
@@ -716,16 +726,18 @@ class _IterativeFindHelper(object):
 
         # Now grow extend the (unverified) shortlist with the returned contacts
         result = responseMsg.response
+        hops = self.hops.get(responseMsg.nodeID, 1)
         # TODO: some validation on the result (for guarding against attacks)
         # If we are looking for a value, first see if this result is the value
         # we are looking for before treating it as a list of contact triples
         if self.find_value is True and self.key in result and not 'contacts' in result:
             # We have found the value
             self.find_value_result[self.key] = result[self.key]
+            self.find_value_hops = hops
         else:
             if self.find_value is True:
                 self._setClosestNodeValue(responseMsg, aContact)
-            self._keepSearching(result)
+            self._keepSearching(result, hops)
         return responseMsg.nodeID
 
     def _getActiveContact(self, responseMsg, originAddress):
@@ -738,10 +750,10 @@ class _IterativeFindHelper(object):
             return Contact(
                 responseMsg.nodeID, originAddress[0], originAddress[1], self.node._protocol)
 
-    def _keepSearching(self, result):
+    def _keepSearching(self, result, hops):
         contactTriples = self._getContactTriples(result)
         for contactTriple in contactTriples:
-            self._addIfValid(contactTriple)
+            self._addIfValid(contactTriple, hops)
 
     def _getContactTriples(self, result):
         if self.find_value is True:
@@ -761,12 +773,13 @@ class _IterativeFindHelper(object):
     def _is_closer(self, responseMsg):
         return self.distance.is_closer(responseMsg.nodeID, self.active_contacts[0].id)
 
-    def _addIfValid(self, contactTriple):
+    def _addIfValid(self, contactTriple, hops):
         if isinstance(contactTriple, (list, tuple)) and len(contactTriple) == 3:
             testContact = Contact(
                 contactTriple[0], contactTriple[1], contactTriple[2], self.node._protocol)
             if testContact not in self.shortlist:
                 self.shortlist.append(testContact)
+                self.hops.setdefault(testContact.id, hops + 1)
 
     def removeFromShortlist(self, failure, deadContactID):
         """ @type failure: twisted.python.failure.Failure """
@@ -799,6 +812,7 @@ class _IterativeFindHelper(object):
             del self.pending_iteration_calls[0]
         # See if should continue the search
         if self.key in self.find_value_result:
+            metrics.DHT_LOOKUP_HOPS.labels(self.rpc).observe(self.find_value_hops)
             self.outer_d.callback(self.find_value_result)
             return
         elif len(self.active_contacts) and self.find_value is False:
@@ -808,6 +822,7 @@ class _IterativeFindHelper(object):
                 # Ok, we're done; either we have accumulated k active
                 # contacts or no improvement in closestNode has been
                 # noted
+                self._observeHops()
                 self.outer_d.callback(self.active_contacts)
                 return
 
@@ -827,7 +842,8 @@ class _IterativeFindHelper(object):
         if self._should_lookup_active_calls():
             # Schedule the next iteration if there are any active
             # calls (Kademlia uses loose parallelism)
-            call = reactor.callLater(constants.iterativeLookupDelay, self.searchIteration)
+            call = self.node._clock.callLater(constants.iterativeLookupDelay,
+                                              self.searchIteration)
             self.pending_iteration_calls.append(call)
         # Check for a quick contact response that made an update to the shortList
         elif prevShortlistLength < len(self.shortlist):
@@ -835,8 +851,14 @@ class _IterativeFindHelper(object):
             self.searchIteration()
         else:
             # If no probes were sent, there will not be any improvement, so we're done
+            self._observeHops()
             self.outer_d.callback(self.active_contacts)
 
+    def _observeHops(self):
+        if self.active_contacts:
+            metrics.DHT_LOOKUP_HOPS.labels(self.rpc).observe(
+                self.hops.get(self.active_contacts[0].id, 1))
+
     def _probeContact(self, contact):
         self.active_probes.append(contact.id)
         rpcMethod = getattr(contact, self.rpc)
@@ -5,6 +5,7 @@ import errno
 
 from twisted.internet import protocol, defer, error, reactor, task
 
+from lbrynet.core import metrics
 import constants
 import encoding
 import msgtypes
@@ -21,14 +22,16 @@ class KademliaProtocol(protocol.DatagramProtocol):
 
     msgSizeLimit = constants.udpDatagramMaxSize - 26
 
-    def __init__(self, node):
+    def __init__(self, node, clock=None):
         self._node = node
+        # the reactor, or the clock of a simulated network
+        self._clock = clock if clock is not None else reactor
         self._encoder = encoding.Bencode()
         self._translator = msgformat.DefaultFormat()
         self._sentMessages = {}
         self._partialMessages = {}
         self._partialMessagesProgress = {}
-        self._delay = Delay()
+        self._delay = Delay(clock=self._clock)
         # keep track of outstanding writes so that they
         # can be cancelled on shutdown
         self._call_later_list = {}
@@ -47,6 +50,7 @@ class KademliaProtocol(protocol.DatagramProtocol):
         self._total_bytes_tx = 0
         self._total_bytes_rx = 0
         self._bandwidth_stats_update_lc = task.LoopingCall(self._update_bandwidth_stats)
+        self._bandwidth_stats_update_lc.clock = self._clock
 
     def _update_bandwidth_stats(self):
         recent_rx_history = {}
@@ -166,9 +170,10 @@ class KademliaProtocol(protocol.DatagramProtocol):
         df = defer.Deferred()
         if rawResponse:
             df._rpcRawResponse = True
+        df._rpcSentAt = self._clock.seconds()
 
         # Set the RPC timeout timer
-        timeoutCall = reactor.callLater(constants.rpcTimeout, self._msgTimeout, msg.id)
+        timeoutCall = self._clock.callLater(constants.rpcTimeout, self._msgTimeout, msg.id)
         # Transmit the data
         self._send(encodedMsg, msg.id, (contact.address, contact.port))
         self._sentMessages[msg.id] = (contact.id, df, timeoutCall, method, args)
@@ -237,9 +242,11 @@ class KademliaProtocol(protocol.DatagramProtocol):
             # Find the message that triggered this response
             if message.id in self._sentMessages:
                 # Cancel timeout timer for this RPC
-                df, timeoutCall = self._sentMessages[message.id][1:3]
+                df, timeoutCall, method = self._sentMessages[message.id][1:4]
                 timeoutCall.cancel()
                 del self._sentMessages[message.id]
+                metrics.DHT_RPC_LATENCY.labels(method).observe(
+                    self._clock.seconds() - df._rpcSentAt)
 
                 if hasattr(df, '_rpcRawResponse'):
                     # The RPC requested that the raw response message
@@ -321,7 +328,7 @@ class KademliaProtocol(protocol.DatagramProtocol):
         """Schedule the sending of the next UDP packet """
         delay = self._delay()
         key = object()
-        delayed_call = reactor.callLater(delay, self._write_and_remove, key, txData, address)
+        delayed_call = self._clock.callLater(delay, self._write_and_remove, key, txData, address)
         self._call_later_list[key] = delayed_call
 
     def _write_and_remove(self, key, txData, address):
@@ -409,6 +416,7 @@ class KademliaProtocol(protocol.DatagramProtocol):
             self._msgTimeoutInProgress(messageID, remoteContactID, df, method, args)
             return
         del self._sentMessages[messageID]
+        metrics.DHT_RPC_TIMEOUTS.labels(method).inc()
         # The message's destination node is now considered to be dead;
         # raise an (asynchronous) TimeoutError exception and update the host node
         self._node.removeContact(remoteContactID)
@@ -418,7 +426,8 @@ class KademliaProtocol(protocol.DatagramProtocol):
         # See if any progress has been made; if not, kill the message
         if self._hasProgressBeenMade(messageID):
             # Reset the RPC timeout timer
-            timeoutCall = reactor.callLater(constants.rpcTimeout, self._msgTimeout, messageID)
+            timeoutCall = self._clock.callLater(constants.rpcTimeout, self._msgTimeout,
+                                                messageID)
             self._sentMessages[messageID] = (remoteContactID, df, timeoutCall, method, args)
         else:
             # No progress has been made
@@ -426,6 +435,7 @@ class KademliaProtocol(protocol.DatagramProtocol):
                 del self._partialMessagesProgress[messageID]
             if messageID in self._partialMessages:
                 del self._partialMessages[messageID]
+            metrics.DHT_RPC_TIMEOUTS.labels(method).inc()
             df.errback(TimeoutError(remoteContactID))
 
     def _hasProgressBeenMade(self, messageID):
@@ -0,0 +1,229 @@
+"""
+A simulated network for running thousands of dht nodes in one process
+
+The nodes of a SimulatedNetwork send datagrams through it instead of udp sockets, each one
+delivered to the KademliaProtocol of the node it is addressed to after a latency, or lost, and
+they schedule their timeouts and delayed calls on its SimulatedClock instead of the reactor.
+Time on the clock only passes when the network is run, jumping straight to the next thing to
+happen, so lookups which would take seconds on a real network take as long as the nodes take
+to handle their datagrams.
+"""
+
+import heapq
+import itertools
+import logging
+import random
+
+from twisted.internet import base, defer
+from twisted.python.failure import Failure
+
+from lbrynet.core.utils import generate_id
+from lbrynet.dht.node import Node
+
+log = logging.getLogger(__name__)
+
+DHT_PORT = 4444
+
+
+class SimulatedClock(object):
+    """
+    Provides callLater and seconds like task.Clock, but keeps the pending calls in a heap so
+    scheduling stays cheap with hundreds of thousands of them
+    """
+
+    def __init__(self, start=0.0):
+        self.now = start
+        self._calls = []  # heap of (time, sequence number, DelayedCall)
+        self._sequence = itertools.count()
+
+    def seconds(self):
+        return self.now
+
+    def callLater(self, delay, f, *args, **kwargs):
+        call = base.DelayedCall(self.now + delay, f, args, kwargs, lambda c: None,
+                                self._push, seconds=self.seconds)
+        self._push(call)
+        return call
+
+    def _push(self, call):
+        heapq.heappush(self._calls, (call.time, next(self._sequence), call))
+
+    def getDelayedCalls(self):
+        return [call for _, _, call in self._calls if call.active()]
+
+    def _pop_next(self, until=None):
+        """Remove and return the next call due by until, or None"""
+        while self._calls:
+            scheduled, _, call = self._calls[0]
+            if until is not None and scheduled > until:
+                return None
+            heapq.heappop(self._calls)
+            if not call.active() or scheduled != call.time:
+                # cancelled, or reset to an earlier time and pushed again
+                continue
+            if call.delayed_time:
+                call.activate_delay()
+                self._push(call)
+                continue
+            return call
+        return None
+
+    def run_next(self, until=None):
+        """Run the next call if it is due by until, returns False if there wasn't one"""
+        call = self._pop_next(until)
+        if call is None:
+            if until is not None:
+                self.now = max(self.now, until)
+            return False
+        self.now = max(self.now, call.time)
+        call.called = 1
+        try:
+            call.func(*call.args, **call.kw)
+        except Exception:
+            log.exception("Error running a simulated call to %s", call.func)
+        return True
+
+    def advance(self, amount):
+        """Run everything scheduled for the next amount seconds"""
+        until = self.now + amount
+        while self.run_next(until):
+            pass
+
+
+class SimulatedTransport(object):
+    """Stands in for the udp port of a node on a SimulatedNetwork"""
+
+    def __init__(self, network, address):
+        self.network = network
+        self.address = address
+        self.connected = True
+
+    def write(self, datagram, address):
+        if self.connected:
+            self.network.send(self.address, address, datagram)
+
+    def getHost(self):
+        return self.address
+
+    def stopListening(self):
+        if self.connected:
+            self.connected = False
+            self.network.disconnect(self.address)
+        return defer.succeed(None)
+
+
+class SimulatedNetwork(object):
+    """
+    Dht nodes talking to each other in this process
+
+    @param latency: the seconds it takes a datagram to arrive, chosen uniformly between the
+                    two values of a (minimum, maximum) tuple
+    @param loss: the fraction of datagrams which are lost
+    @param seed: the seed for the latencies, losses and node ids, to repeat a simulation
+    """
+
+    def __init__(self, latency=(0.01, 0.1), loss=0.0, seed=None, clock=None):
+        if not isinstance(latency, (list, tuple)):
+            latency = (latency, latency)
+        self.latency = latency
+        self.loss = loss
+        self.random = random.Random(seed)
+        self.clock = clock or SimulatedClock()
+        self.nodes = {}  # {address: Node}
+        self._host_numbers = itertools.count(1)
+        self.datagrams_sent = 0
+        self.datagrams_lost = 0
+        self.datagrams_undeliverable = 0
+        self.bytes_sent = 0
+
+    def _next_host(self):
+        i = next(self._host_numbers)
+        return '10.%i.%i.%i' % (i >> 16 & 0xff, i >> 8 & 0xff, i & 0xff)
+
+    def add_node(self, node_id=None, **kwargs):
+        """Make a node on the network, it still needs to join it"""
+        node = Node(node_id=node_id or generate_id(self.random.getrandbits(512)),
+                    udpPort=DHT_PORT, externalIP=self._next_host(), clock=self.clock, **kwargs)
+        self.connect(node)
+        return node
+
+    def connect(self, node):
+        address = (node.externalIP, node.port)
+        transport = SimulatedTransport(self, address)
+        node._protocol.transport = transport
+        node._listeningPort = transport
+        self.nodes[address] = node
+
+    def disconnect(self, address):
+        node = self.nodes.pop(address, None)
+        if node is not None:
+            node._protocol.transport = None
+
+    def remove_node(self, node):
+        """Take a node off the network, without it saying goodbye to anyone"""
+        node.stop()
+        protocol = node._protocol
+        for _, _, timeout_call, _, _ in protocol._sentMessages.values():
+            if timeout_call.active():
+                timeout_call.cancel()
+        protocol._sentMessages.clear()
+        for delayed_call in protocol._call_later_list.values():
+            if delayed_call.active():
+                delayed_call.cancel()
+        protocol._call_later_list.clear()
+
+    def send(self, source, destination, datagram):
+        self.datagrams_sent += 1
+        self.bytes_sent += len(datagram)
+        if self.loss and self.random.random() < self.loss:
+            self.datagrams_lost += 1
+            return
+        self.clock.callLater(self.random.uniform(*self.latency), self._deliver, source,
+                             destination, datagram)
+
+    def _deliver(self, source, destination, datagram):
+        node = self.nodes.get(destination)
+        if node is None:
+            self.datagrams_undeliverable += 1
+            return
+        node._protocol.datagramReceived(datagram, source)
+
+    def bootstrap(self, count, interval=0.1):
+        """
+        Add count nodes, one joining every interval seconds through a node already on the
+        network (or the first new one), returns them once they have all joined
+        """
+        seed = next(self.nodes.itervalues(), None)
+        nodes = [self.add_node() for _ in xrange(count)]
+        joining = nodes if seed is not None else nodes[1:]
+        seed = seed or nodes[0]
+        seed_address = [(seed.externalIP, seed.port)]
+        joins = []
+        for i, node in enumerate(joining):
+            d = defer.Deferred()
+            d.addCallback(lambda _, n=node: n.joinNetwork(seed_address))
+            self.clock.callLater(i * interval, d.callback, None)
+            joins.append(d)
+        self.run(defer.DeferredList(joins))
+        return nodes
+
+    def run(self, d, timeout=None):
+        """
+        Run the network until the deferred d fires, then return its result or raise its
+        failure. Raises an exception if there is nothing left to happen, or the simulated
+        timeout passes, first.
+        """
+        results = []
+        d.addBoth(results.append)
+        until = self.clock.seconds() + timeout if timeout is not None else None
+        while not results:
+            if not self.clock.run_next(until):
+                d.cancel()
+                if until is not None:
+                    raise defer.TimeoutError(
+                        "The network didn't finish within %s seconds" % timeout)
+                raise Exception("The network stopped without finishing")
+        result = results[0]
+        if isinstance(result, Failure):
+            result.raiseException()
+        return result
@@ -38,12 +38,13 @@ class ManagedEncryptedFileDownloader(EncryptedFileSaver):
     def __init__(self, rowid, stream_hash, peer_finder, rate_limiter, blob_manager,
                  stream_info_manager, lbry_file_manager, payment_rate_manager, wallet,
                  download_directory, sd_hash=None, key=None, stream_name=None,
-                 suggested_file_name=None):
+                 suggested_file_name=None, save_file=True):
         EncryptedFileSaver.__init__(self, stream_hash, peer_finder,
                                     rate_limiter, blob_manager,
                                     stream_info_manager,
                                     payment_rate_manager, wallet,
-                                    download_directory, key, stream_name, suggested_file_name)
+                                    download_directory, key, stream_name, suggested_file_name,
+                                    save_file)
         self.sd_hash = sd_hash
         self.rowid = rowid
         self.lbry_file_manager = lbry_file_manager
@@ -54,17 +55,19 @@ class ManagedEncryptedFileDownloader(EncryptedFileSaver):
         return self._saving_status
 
     def restore(self, status):
+        """Returns a deferred which fires once a running file has started downloading again"""
         if status == ManagedEncryptedFileDownloader.STATUS_RUNNING:
             # start returns self.finished_deferred
             # which fires when we've finished downloading the file
             # and we don't want to wait for the entire download
-            self.start()
+            return self.start_downloading()
         elif status == ManagedEncryptedFileDownloader.STATUS_STOPPED:
             pass
         elif status == ManagedEncryptedFileDownloader.STATUS_FINISHED:
             self.completed = True
         else:
             raise Exception("Unknown status for stream %s: %s" % (self.stream_hash, status))
+        return defer.succeed(None)
 
     @defer.inlineCallbacks
     def stop(self, err=None, change_status=True):
@@ -122,8 +125,21 @@ class ManagedEncryptedFileDownloader(EncryptedFileSaver):
         return self._save_status()
 
     def _get_progress_manager(self, download_manager):
-        return FullStreamProgressManager(self._finished_downloading,
-                                         self.blob_manager, download_manager)
+        return ManagedStreamProgressManager(self, self._finished_downloading,
+                                            self.blob_manager, download_manager)
+
+
+class ManagedStreamProgressManager(FullStreamProgressManager):
+    """Tells the lbry file manager each time a blob has been written to the file"""
+
+    def __init__(self, lbry_file, finished_callback, blob_manager, download_manager):
+        FullStreamProgressManager.__init__(self, finished_callback, blob_manager,
+                                           download_manager)
+        self.lbry_file = lbry_file
+
+    def _finished_with_blob(self, blob_num):
+        FullStreamProgressManager._finished_with_blob(self, blob_num)
+        self.lbry_file.lbry_file_manager.lbry_file_progressed(self.lbry_file)
 
 
 class ManagedEncryptedFileDownloaderFactory(object):
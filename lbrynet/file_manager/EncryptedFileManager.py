@@ -4,15 +4,21 @@ Keep track of which LBRY Files are downloading and store their LBRY File specifi
 
 import logging
 import os
+import time
 
-from twisted.internet import defer, task, reactor
+from twisted.internet import defer, task, reactor, threads
 from twisted.python.failure import Failure
 
-from lbrynet.reflector.reupload import reflect_stream
+from lbrynet.reflector.reupload import reflect_streams, get_reflector_server
 from lbrynet.core.PaymentRateManager import NegotiatedPaymentRateManager
 from lbrynet.file_manager.EncryptedFileDownloader import ManagedEncryptedFileDownloader
 from lbrynet.file_manager.EncryptedFileDownloader import ManagedEncryptedFileDownloaderFactory
+from lbrynet.file_manager.EncryptedFileRegistry import EncryptedFileRegistry
+from lbrynet.file_manager.EncryptedFileStatusReport import EncryptedFileStatusReport
 from lbrynet.lbry_file.StreamDescriptor import EncryptedFileStreamType, get_sd_info
+from lbrynet.lbry_file.client.EncryptedFileDownloader import get_unused_file_name
+from lbrynet.cryptstream.CryptBlob import CryptBlobInfo
+from lbrynet.cryptstream.client.CryptBlobHandler import CryptBlobHandler
 from lbrynet.cryptstream.client.CryptStreamDownloader import AlreadyStoppedError
 from lbrynet.cryptstream.client.CryptStreamDownloader import CurrentlyStoppingError
 from lbrynet.core.utils import safe_start_looping_call, safe_stop_looping_call
@@ -22,23 +28,61 @@ from lbrynet import conf
 log = logging.getLogger(__name__)
 
 
+class ReflectedStream(object):
+    """What the reflector client needs of a lbry file, made from its info in the registry"""
+
+    def __init__(self, lbry_file_manager, info):
+        self.blob_manager = lbry_file_manager.session.blob_manager
+        self.stream_info_manager = lbry_file_manager.stream_info_manager
+        self.rate_limiter = lbry_file_manager.session.rate_limiter
+        self.stream_hash = info['stream_hash']
+        self.sd_hash = info['sd_hash']
+        self.file_name = info['file_name']
+
+
 class EncryptedFileManager(object):
     """
     Keeps track of currently opened LBRY Files, their options, and
     their LBRY File specific metadata.
+
+    The downloader of a file is only made when the file is asked for, or if it was running
+    when the manager was last stopped. Those are resumed in the background after setup,
+    MAX_CONCURRENT_RESUMES at a time.
+
+    The blobs of each stream and how many of them have been completed are cached for status
+    reports. The number completed is forgotten when a file writes a blob or changes status, or
+    when the blob manager completes or deletes one of the stream's blobs.
+
+    Unless save_files is set downloads are only kept as blobs, without a decrypted copy, and
+    export_lbry_file writes the file when it's wanted.
     """
-    # when reflecting files, reflect up to this many files at a time
-    CONCURRENT_REFLECTS = 5
+
+    MAX_CONCURRENT_RESUMES = 10
+    # the running status a status report gives for each saved status
+    REPORTED_STATUSES = {
+        ManagedEncryptedFileDownloader.STATUS_RUNNING: "running",
+        ManagedEncryptedFileDownloader.STATUS_STOPPED: "stopped",
+        ManagedEncryptedFileDownloader.STATUS_FINISHED: "completed",
+    }
 
     def __init__(self, session, stream_info_manager, sd_identifier, download_directory=None):
 
         self.auto_re_reflect = conf.settings['reflect_uploads']
         self.auto_re_reflect_interval = conf.settings['auto_re_reflect_interval']
+        self.auto_re_reflect_reverify_age = conf.settings['auto_re_reflect_reverify_age']
+        self.save_files = conf.settings['save_files']
         self.session = session
         self.stream_info_manager = stream_info_manager
         # TODO: why is sd_identifier part of the file manager?
         self.sd_identifier = sd_identifier
-        self.lbry_files = []
+        self.registry = EncryptedFileRegistry(self._make_lbry_file)
+        self.payment_rate_manager = None
+        self.stopped = False
+        self._restoring = {}  # {rowid: deferred which fires once the file has been restored}
+        self._stream_blobs = {}  # {stream_hash: ([blob hashes], total bytes)}
+        self._completed_blobs = {}  # {stream_hash: number of completed blobs}
+        self._blob_streams = {}  # {blob_hash: [stream_hash]} for the streams in _stream_blobs
+        self._resuming = None
         if download_directory:
             self.download_directory = download_directory
         else:
@@ -50,9 +94,89 @@ class EncryptedFileManager(object):
     def setup(self):
         yield self.stream_info_manager.setup()
         yield self._add_to_sd_identifier()
+        # blobs can be completed or deleted without a file writing them, by blob_delete, a
+        # reflector server or another stream with the same blob
+        self.session.blob_manager.add_blobs_changed_callback(self._blobs_changed)
         yield self._start_lbry_files()
         log.info("Started file manager")
 
+    @property
+    def lbry_files(self):
+        """Every lbry file, this makes the downloaders of the ones that haven't been yet"""
+        return list(self.registry)
+
+    def find_lbry_files(self, search_by, value):
+        """Get the lbry files with the given rowid, stream_hash, sd_hash, file_name or outpoint"""
+        return self.registry.find(search_by, value)
+
+    def get_lbry_files(self, searches=(), sort_by=None, reverse=False, page=None, page_size=None):
+        """
+        Get the lbry files matching every (search_by, value) in searches, sorted by one of
+        EncryptedFileRegistry.SORT_FIELDS. Only the downloaders of the requested page are made.
+        """
+        rowids = None
+        for search_by, value in searches:
+            matches = set(self.registry.find_rowids(search_by, value))
+            rowids = matches if rowids is None else matches.intersection(rowids)
+        infos = self.registry.get_infos(rowids, sort_by, reverse)
+        if page_size:
+            start = (page or 0) * page_size
+            infos = infos[start:start + page_size]
+        lbry_files = [self.registry.get(info['rowid']) for info in infos]
+        return [lbry_file for lbry_file in lbry_files if lbry_file is not None]
+
+    def get_outpoint(self, lbry_file):
+        info = self.registry.infos.get(lbry_file.rowid)
+        return info['outpoint'] if info is not None else None
+
+    def get_blob_progress(self, lbry_files):
+        """
+        Returns {stream_hash: (total bytes, number of blobs, number of completed blobs)} for the
+        streams of the lbry files
+        """
+        return self._get_stream_progress(set(lbry_file.stream_hash for lbry_file in lbry_files))
+
+    @defer.inlineCallbacks
+    def _get_stream_progress(self, stream_hashes):
+        missing = [stream_hash for stream_hash in stream_hashes
+                   if stream_hash not in self._stream_blobs]
+        if missing:
+            stream_blobs = yield self.stream_info_manager.get_blobs_for_streams(missing)
+            for stream_hash, blobs in stream_blobs.iteritems():
+                self._stream_blobs[stream_hash] = (
+                    [blob_hash for blob_hash, length in blobs if blob_hash is not None],
+                    sum(length for blob_hash, length in blobs)
+                )
+                for blob_hash in self._stream_blobs[stream_hash][0]:
+                    self._blob_streams.setdefault(blob_hash, []).append(stream_hash)
+        progress = {}
+        for stream_hash in stream_hashes:
+            blob_hashes, total_bytes = self._stream_blobs[stream_hash]
+            if stream_hash not in self._completed_blobs:
+                completed = yield self.session.blob_manager.completed_blobs(blob_hashes)
+                self._completed_blobs[stream_hash] = len(completed)
+            progress[stream_hash] = (total_bytes, len(blob_hashes),
+                                     self._completed_blobs[stream_hash])
+        defer.returnValue(progress)
+
+    def lbry_file_progressed(self, lbry_file):
+        self._completed_blobs.pop(lbry_file.stream_hash, None)
+
+    def _blobs_changed(self, blob_hashes):
+        for blob_hash in blob_hashes:
+            for stream_hash in self._blob_streams.get(blob_hash, []):
+                self._completed_blobs.pop(stream_hash, None)
+
+    def _forget_stream_blobs(self, stream_hash):
+        blob_hashes, _ = self._stream_blobs.pop(stream_hash, ([], 0))
+        self._completed_blobs.pop(stream_hash, None)
+        for blob_hash in blob_hashes:
+            stream_hashes = self._blob_streams.get(blob_hash, [])
+            if stream_hash in stream_hashes:
+                stream_hashes.remove(stream_hash)
+            if not stream_hashes:
+                self._blob_streams.pop(blob_hash, None)
+
     def get_lbry_file_status(self, lbry_file):
         return self._get_lbry_file_status(lbry_file.rowid)
 
@@ -61,21 +185,31 @@ class EncryptedFileManager(object):
 
     def change_lbry_file_status(self, lbry_file, status):
         log.debug("Changing status of %s to %s", lbry_file.stream_hash, status)
+        self.lbry_file_progressed(lbry_file)
         return self._change_file_status(lbry_file.rowid, status)
 
+    @defer.inlineCallbacks
     def get_lbry_file_status_reports(self):
-        ds = []
-
-        for lbry_file in self.lbry_files:
-            ds.append(lbry_file.status())
-
-        dl = defer.DeferredList(ds)
-
-        def filter_failures(status_reports):
-            return [status_report for success, status_report in status_reports if success is True]
-
-        dl.addCallback(filter_failures)
-        return dl
+        """Status reports of every lbry file, made without loading the downloaders"""
+        infos = self.registry.get_infos()
+        progress = yield self._get_stream_progress(set(info['stream_hash'] for info in infos))
+        reports = []
+        for info in infos:
+            lbry_file = self.registry.loaded.get(info['rowid'])
+            if lbry_file is None:
+                file_name = info['file_name']
+                status = self.REPORTED_STATUSES.get(info['status'], info['status'])
+            else:
+                file_name = lbry_file.file_name
+                if lbry_file.completed:
+                    status = "completed"
+                elif lbry_file.stopped:
+                    status = "stopped"
+                else:
+                    status = "running"
+            _, num_known, num_completed = progress[info['stream_hash']]
+            reports.append(EncryptedFileStatusReport(file_name, num_completed, num_known, status))
+        defer.returnValue(reports)
 
     def save_sd_blob_hash_to_stream(self, stream_hash, sd_hash):
         return self.stream_info_manager.save_sd_blob_hash_to_stream(stream_hash, sd_hash)
@@ -103,36 +237,60 @@ class EncryptedFileManager(object):
             sd_hash=sd_hash,
             key=key,
             stream_name=stream_name,
-            suggested_file_name=suggested_file_name
+            suggested_file_name=suggested_file_name,
+            save_file=self.save_files
         )
 
+    def _make_lbry_file(self, info, payment_rate_manager=None, download_directory=None):
+        rowid = info['rowid']
+        lbry_file = self._get_lbry_file(rowid, info['stream_hash'],
+                                        payment_rate_manager or self.payment_rate_manager,
+                                        info['sd_hash'], info['key'], info['stream_name'],
+                                        info['suggested_file_name'], download_directory)
+        # restore will raise an Exception if status is unknown
+        d = lbry_file.restore(info['status'])
+
+        def restored(result):
+            self._restoring.pop(rowid, None)
+            return result
+
+        def restore_failed(err):
+            log.warning("Failed to start %i: %s", rowid, err.getErrorMessage())
+
+        if not d.called:
+            self._restoring[rowid] = d
+        d.addBoth(restored)
+        d.addErrback(restore_failed)
+        return lbry_file
+
     @defer.inlineCallbacks
     def _start_lbry_files(self):
-        files_and_options = yield self._get_all_lbry_files()
-        stream_infos = yield self.stream_info_manager._get_all_stream_infos()
         b_prm = self.session.base_payment_rate_manager
-        payment_rate_manager = NegotiatedPaymentRateManager(b_prm, self.session.blob_tracker)
-        log.info("Trying to start %i files", len(stream_infos))
-        for i, (rowid, stream_hash, blob_data_rate, status) in enumerate(files_and_options):
-            if len(files_and_options) > 500 and i % 500 == 0:
-                log.info("Started %i/%i files", i, len(stream_infos))
-            if stream_hash in stream_infos:
-                lbry_file = self._get_lbry_file(rowid, stream_hash, payment_rate_manager,
-                                                stream_infos[stream_hash]['sd_hash'],
-                                                stream_infos[stream_hash]['key'],
-                                                stream_infos[stream_hash]['stream_name'],
-                                                stream_infos[stream_hash]['suggested_file_name'])
-                log.info("initialized file %s", lbry_file.stream_name)
-                try:
-                    # restore will raise an Exception if status is unknown
-                    lbry_file.restore(status)
-                    self.lbry_files.append(lbry_file)
-                except Exception:
-                    log.warning("Failed to start %i", rowid)
-                    continue
-        log.info("Started %i lbry files", len(self.lbry_files))
+        self.payment_rate_manager = NegotiatedPaymentRateManager(b_prm, self.session.blob_tracker)
+        yield self.registry.load(self.stream_info_manager)
+        self._resuming = self._resume_lbry_files()
         if self.auto_re_reflect is True:
-            safe_start_looping_call(self.lbry_file_reflector, self.auto_re_reflect_interval)
+            # the first pass waits an interval, so it doesn't compete with startup
+            safe_start_looping_call(self.lbry_file_reflector, self.auto_re_reflect_interval,
+                                    now=False)
+
+    @defer.inlineCallbacks
+    def _resume_lbry_files(self):
+        rowids = self.registry.get_rowids(ManagedEncryptedFileDownloader.STATUS_RUNNING)
+        if not rowids:
+            defer.returnValue(None)
+        log.info("Resuming %i lbry files", len(rowids))
+        semaphore = defer.DeferredSemaphore(self.MAX_CONCURRENT_RESUMES)
+        yield defer.DeferredList([semaphore.run(self._resume_lbry_file, rowid)
+                                  for rowid in rowids])
+        log.info("Resumed %i lbry files", len(rowids))
+
+    def _resume_lbry_file(self, rowid):
+        # the file may have been asked for, and so restored, already
+        if self.stopped or self.registry.is_loaded(rowid):
+            return None
+        self.registry.get(rowid)
+        return self._restoring.get(rowid)
 
     @defer.inlineCallbacks
     def _stop_lbry_file(self, lbry_file):
@@ -142,7 +300,6 @@ class EncryptedFileManager(object):
                                        count=count - 1)
         try:
             yield lbry_file.stop(change_status=False)
-            self.lbry_files.remove(lbry_file)
         except CurrentlyStoppingError:
             yield wait_for_finished(lbry_file)
         except AlreadyStoppedError:
@@ -151,8 +308,9 @@ class EncryptedFileManager(object):
             defer.returnValue(None)
 
     def _stop_lbry_files(self):
-        log.info("Stopping %i lbry files", len(self.lbry_files))
-        lbry_files = self.lbry_files
+        # files which haven't been made can't be running
+        lbry_files = self.registry.loaded.values()
+        log.info("Stopping %i lbry files", len(lbry_files))
         for lbry_file in lbry_files:
             yield self._stop_lbry_file(lbry_file)
 
@@ -162,18 +320,32 @@ class EncryptedFileManager(object):
         rowid = yield self._save_lbry_file(stream_hash, blob_data_rate)
         stream_metadata = yield get_sd_info(self.stream_info_manager,
                                             stream_hash, False)
-        key = stream_metadata['key']
-        stream_name = stream_metadata['stream_name']
-        suggested_file_name = stream_metadata['suggested_file_name']
-        lbry_file = self._get_lbry_file(rowid, stream_hash, payment_rate_manager, sd_hash, key,
-                                        stream_name, suggested_file_name, download_directory)
-        lbry_file.restore(status or ManagedEncryptedFileDownloader.STATUS_STOPPED)
-        self.lbry_files.append(lbry_file)
+        info = {
+            'rowid': rowid,
+            'stream_hash': stream_hash,
+            'blob_data_rate': blob_data_rate,
+            'status': status or ManagedEncryptedFileDownloader.STATUS_STOPPED,
+            'sd_hash': sd_hash,
+            'key': stream_metadata['key'],
+            'stream_name': stream_metadata['stream_name'],
+            'suggested_file_name': stream_metadata['suggested_file_name'],
+            'outpoint': None,
+        }
+        lbry_file = self._make_lbry_file(info, payment_rate_manager, download_directory)
+        self.registry.add(info, lbry_file)
         defer.returnValue(lbry_file)
 
+    @defer.inlineCallbacks
+    def save_outpoint(self, lbry_file, txid, nout):
+        """Save the outpoint of the claim a lbry file was published or downloaded from"""
+        existing_outpoint = yield self.stream_info_manager.get_file_outpoint(lbry_file.rowid)
+        if not existing_outpoint:
+            yield self.stream_info_manager.save_outpoint_to_file(lbry_file.rowid, txid, nout)
+            self.registry.set_outpoint(lbry_file.rowid, "%s:%i" % (txid, nout))
+
     @defer.inlineCallbacks
     def delete_lbry_file(self, lbry_file, delete_file=False):
-        if lbry_file not in self.lbry_files:
+        if lbry_file not in self.registry:
             raise ValueError("Could not find that LBRY file")
 
         def wait_for_finished(count=2):
@@ -189,7 +361,8 @@ class EncryptedFileManager(object):
         except (AlreadyStoppedError, CurrentlyStoppingError):
             yield wait_for_finished()
 
-        self.lbry_files.remove(lbry_file)
+        self.registry.remove(lbry_file.rowid)
+        self._forget_stream_blobs(lbry_file.stream_hash)
 
         yield self._delete_lbry_file_options(lbry_file.rowid)
 
@@ -213,24 +386,72 @@ class EncryptedFileManager(object):
 
         defer.returnValue(True)
 
+    @defer.inlineCallbacks
+    def export_lbry_file(self, lbry_file, download_directory=None):
+        """
+        Decrypt the blobs of a lbry file to a new file in download_directory, or the file's
+        download directory, and return its path. Every blob of the stream must be complete.
+        """
+        download_directory = download_directory or lbry_file.download_directory
+        blob_infos = yield self.stream_info_manager.get_blobs_for_stream(lbry_file.stream_hash)
+        blobs = []
+        for blob_hash, blob_num, iv, length in blob_infos:
+            if blob_hash is None or not length:
+                continue
+            blob = yield self.session.blob_manager.get_blob(blob_hash, length)
+            if not blob.get_is_verified():
+                raise ValueError("Blob %i of %s is missing, the file can't be exported until it "
+                                 "has finished downloading" % (blob_num, lbry_file.sd_hash))
+            blobs.append((blob, CryptBlobInfo(blob_hash, blob_num, length, iv)))
+
+        def open_file():
+            file_name = get_unused_file_name(download_directory, lbry_file.file_name)
+            return open(os.path.join(download_directory, file_name), 'wb')
+
+        file_handle = yield threads.deferToThread(open_file)
+        blob_handler = CryptBlobHandler(lbry_file.key, file_handle.write)
+        try:
+            for blob, blob_info in blobs:
+                yield blob_handler.handle_blob(blob, blob_info)
+        except Exception:
+            file_handle.close()
+            os.remove(file_handle.name)
+            raise
+        file_handle.close()
+        log.info("Exported %s to %s", lbry_file.sd_hash[:16], file_handle.name)
+        defer.returnValue(file_handle.name)
+
     def toggle_lbry_file_running(self, lbry_file):
         """Toggle whether a stream reader is currently running"""
-        for l in self.lbry_files:
-            if l == lbry_file:
-                return l.toggle_running()
+        if lbry_file in self.registry:
+            return lbry_file.toggle_running()
         return defer.fail(Failure(ValueError("Could not find that LBRY file")))
 
     @defer.inlineCallbacks
     def reflect_lbry_files(self):
-        sem = defer.DeferredSemaphore(self.CONCURRENT_REFLECTS)
-        ds = []
-        for lbry_file in self.lbry_files:
-            ds.append(sem.run(reflect_stream, lbry_file))
-        yield defer.DeferredList(ds)
+        # every file goes to the same reflector server so they can share its connections
+        reflector = "%s:%i" % tuple(get_reflector_server())
+        reflected = yield self.stream_info_manager.get_reflected_streams(
+            reflector, time.time() - self.auto_re_reflect_reverify_age)
+        # reflecting only needs the hashes of a stream, so no downloaders are made for this
+        streams = [ReflectedStream(self, info) for info in self.registry.get_infos()
+                   if info['sd_hash'] not in reflected]
+        if not streams:
+            defer.returnValue(None)
+        log.info("Re-reflecting %i of %i files to %s", len(streams), len(self.registry),
+                 reflector)
+        confirmed = yield reflect_streams(streams, reflector, self.session.rate_limiter)
+        if confirmed:
+            yield self.stream_info_manager.save_reflected_streams(confirmed, reflector,
+                                                                  int(time.time()))
 
     @defer.inlineCallbacks
     def stop(self):
         safe_stop_looping_call(self.lbry_file_reflector)
+        self.session.blob_manager.remove_blobs_changed_callback(self._blobs_changed)
+        self.stopped = True
+        if self._resuming is not None:
+            yield self._resuming
         yield defer.DeferredList(list(self._stop_lbry_files()))
         log.info("Stopped encrypted file manager")
         defer.returnValue(True)
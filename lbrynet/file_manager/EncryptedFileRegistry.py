@@ -0,0 +1,164 @@
+"""
+Index the LBRY Files in the database without making a downloader for each of them
+"""
+
+import binascii
+import logging
+import os
+from collections import OrderedDict
+
+from twisted.internet import defer
+
+log = logging.getLogger(__name__)
+
+
+class EncryptedFileRegistry(object):
+    """
+    The lbry files in the database, indexed by rowid, stream hash, sd hash, file name and claim
+    outpoint
+
+    Files are read from the database a page at a time and kept as small dicts. The
+    ManagedEncryptedFileDownloader of a file is only made, by make_lbry_file(info), the first
+    time the file is asked for.
+    """
+
+    INDEXES = ('stream_hash', 'sd_hash', 'file_name', 'outpoint')
+    SORT_FIELDS = ('rowid', 'stream_hash', 'sd_hash', 'file_name', 'outpoint')
+    PAGE_SIZE = 5000
+
+    def __init__(self, make_lbry_file):
+        self.make_lbry_file = make_lbry_file
+        self.infos = OrderedDict()  # {rowid: info}, in rowid order
+        self.loaded = {}  # {rowid: lbry file}
+        self.indexes = {field: {} for field in self.INDEXES}  # {field: {value: [rowid]}}
+
+    def __len__(self):
+        return len(self.infos)
+
+    def __iter__(self):
+        for rowid in list(self.infos):
+            lbry_file = self.get(rowid)
+            if lbry_file is not None:
+                yield lbry_file
+
+    def __contains__(self, lbry_file):
+        return self.loaded.get(lbry_file.rowid) is lbry_file
+
+    @defer.inlineCallbacks
+    def load(self, stream_info_manager):
+        rowid = 0
+        while True:
+            rows = yield stream_info_manager.get_lbry_file_rows(rowid, self.PAGE_SIZE)
+            for row in rows:
+                self._add_row(row)
+            if len(rows) < self.PAGE_SIZE:
+                break
+            rowid = rows[-1][0]
+        log.info("Found %i lbry files", len(self.infos))
+
+    def _add_row(self, row):
+        (rowid, stream_hash, blob_data_rate, status, sd_hash, key, stream_name,
+         suggested_file_name, txid, nout) = row
+        if rowid in self.infos:
+            log.warning("Duplicate stream %s (sd: %s)", stream_hash, sd_hash[:16])
+            return
+        if sd_hash is None:
+            log.warning("Missing sd hash for %s", stream_hash)
+            return
+        self.add({
+            'rowid': rowid,
+            'stream_hash': stream_hash,
+            'blob_data_rate': blob_data_rate,
+            'status': status,
+            'sd_hash': sd_hash,
+            'key': key,
+            'stream_name': stream_name,
+            'suggested_file_name': suggested_file_name,
+            'outpoint': None if txid is None or nout is None else "%s:%i" % (txid, nout),
+        })
+
+    def add(self, info, lbry_file=None):
+        """Add a file, lbry_file is its downloader if one has already been made"""
+        rowid = info['rowid']
+        if 'file_name' not in info:
+            # the same name EncryptedFileSaver gives the file
+            info['file_name'] = os.path.basename(binascii.unhexlify(info['suggested_file_name']))
+        self.infos[rowid] = info
+        for field in self.INDEXES:
+            if info.get(field) is not None:
+                self.indexes[field].setdefault(info[field], []).append(rowid)
+        if lbry_file is not None:
+            self.loaded[rowid] = lbry_file
+
+    def remove(self, rowid):
+        info = self.infos.pop(rowid, None)
+        self.loaded.pop(rowid, None)
+        if info is None:
+            return
+        for field in self.INDEXES:
+            self._unindex(field, info.get(field), rowid)
+
+    def _unindex(self, field, value, rowid):
+        rowids = self.indexes[field].get(value)
+        if rowids and rowid in rowids:
+            rowids.remove(rowid)
+            if not rowids:
+                del self.indexes[field][value]
+
+    def set_outpoint(self, rowid, outpoint):
+        info = self.infos.get(rowid)
+        if info is None:
+            return
+        self._unindex('outpoint', info['outpoint'], rowid)
+        info['outpoint'] = outpoint
+        self.indexes['outpoint'].setdefault(outpoint, []).append(rowid)
+
+    def is_loaded(self, rowid):
+        return rowid in self.loaded
+
+    def get(self, rowid):
+        """Get the downloader of a file, making it if this is the first time it's asked for"""
+        if rowid in self.loaded:
+            return self.loaded[rowid]
+        if rowid not in self.infos:
+            return None
+        try:
+            lbry_file = self.make_lbry_file(self.infos[rowid])
+        except Exception as err:
+            log.warning("Failed to start %i: %s", rowid, err)
+            self.remove(rowid)
+            return None
+        self.loaded[rowid] = lbry_file
+        return lbry_file
+
+    def find_rowids(self, field, value):
+        """Get the rowids of the files with the given rowid, stream hash, sd hash, file name or
+        outpoint"""
+        if field == 'rowid':
+            return [value] if value in self.infos else []
+        return list(self.indexes[field].get(value, []))
+
+    def find(self, field, value):
+        """Get the downloaders of the files found by find_rowids"""
+        lbry_files = [self.get(rowid) for rowid in self.find_rowids(field, value)]
+        return [lbry_file for lbry_file in lbry_files if lbry_file is not None]
+
+    def get_infos(self, rowids=None, sort_by=None, reverse=False):
+        """Get the infos of the files with the given rowids, or of every file, in rowid order
+        unless sort_by is one of SORT_FIELDS"""
+        if rowids is None:
+            infos = self.infos.values()
+        else:
+            infos = [self.infos[rowid] for rowid in sorted(rowids) if rowid in self.infos]
+        if sort_by is not None and sort_by != 'rowid':
+            if sort_by not in self.SORT_FIELDS:
+                raise ValueError("Can't sort files by %s" % sort_by)
+            infos.sort(key=lambda info: info[sort_by])
+        if reverse:
+            infos.reverse()
+        return infos
+
+    def get_rowids(self, status=None):
+        """Get the rowids of the files, optionally only the ones that were saved with a status"""
+        return [rowid for rowid, info in self.infos.iteritems()
+                if status is None or info['status'] == status]
@@ -0,0 +1,212 @@
+"""
+Read the plain text of a LBRY file straight from its blobs, while it is downloading
+"""
+
+import binascii
+import bisect
+import logging
+from collections import OrderedDict
+from io import BytesIO
+
+from twisted.internet import defer
+from twisted.python.failure import Failure
+
+from lbrynet.blob.blob_file import MAX_BLOB_SIZE
+from lbrynet.core.Error import DownloadDataTimeout
+from lbrynet.cryptstream.CryptBlob import StreamBlobDecryptor
+
+log = logging.getLogger(__name__)
+
+
+class EncryptedFileStreamer(object):
+    """
+    Reads any part of the plain text of a lbry file by decrypting its blobs as they are asked
+    for, rather than from the file the downloader saves, so a stream can be played and seeked
+    before it has finished downloading.
+
+    Blobs which aren't complete are moved to the front of the download, which is started if
+    the file is stopped. The last few decrypted blobs are kept in memory and the complete blobs
+    after the one being read are decrypted ahead of time.
+
+    The exact size of the file is only known once its last blob has been decrypted, until then
+    size is None and max_size is the most it can be.
+    """
+
+    def __init__(self, lbry_file, read_ahead=2, timeout=30):
+        self.lbry_file = lbry_file
+        self.blob_manager = lbry_file.blob_manager
+        self.read_ahead = read_ahead
+        self.timeout = timeout
+        self.blobs = []  # [(blob_hash, blob_num, iv, length)] of the data blobs, in order
+        self.plain_lengths = {}  # {index: length of the plain text of the blob}
+        self.offsets = []  # [offset in the file of the first byte of each blob]
+        self.size = None
+        self.max_size = None
+        self.priority_blob_num = None
+        self._decrypted = OrderedDict()  # {index: plain text}, least recently read first
+        self._decrypting = {}  # {index: [deferreds waiting for the plain text]}
+        self._waiting = {}  # {blob_num: [deferreds waiting for the blob to be downloaded]}
+
+    @property
+    def cache_size(self):
+        return self.read_ahead + 2
+
+    @defer.inlineCallbacks
+    def start(self):
+        """Find the blobs of the stream and where each of them starts in the file"""
+        blob_infos = yield self.lbry_file.stream_info_manager.get_blobs_for_stream(
+            self.lbry_file.stream_hash)
+        self.blobs = [blob_info for blob_info in blob_infos
+                      if blob_info[0] is not None and blob_info[3]]
+        last = len(self.blobs) - 1
+        for i, (_, _, _, length) in enumerate(self.blobs[:-1]):
+            # every blob but the last is filled up to one byte short of the maximum, the size
+            # of the others is only known once they are decrypted
+            if length == MAX_BLOB_SIZE:
+                self.plain_lengths[i] = MAX_BLOB_SIZE - 1
+        self.lbry_file.add_blob_completed_callback(self._blob_completed)
+        self.lbry_file.add_started_callback(self._download_started)
+        unknown = [i for i in range(len(self.blobs)) if i not in self.plain_lengths]
+        if unknown and unknown[-1] == last and \
+                self.blobs[last][0] not in self.blob_manager.verified_blobs:
+            # nothing comes after the last blob, so it doesn't have to be downloaded to start
+            unknown.pop()
+        yield defer.gatherResults([self.read_blob(i) for i in unknown], consumeErrors=True)
+        self.offsets = []
+        offset = 0
+        for i in range(len(self.blobs)):
+            self.offsets.append(offset)
+            offset += self._get_plain_length(i)
+        self.max_size = offset
+        if last < 0 or last in self.plain_lengths:
+            self.size = offset
+
+    @defer.inlineCallbacks
+    def get_size(self):
+        """Get the exact size of the file, waiting for the last blob to be downloaded"""
+        if self.size is None:
+            yield self.read_blob(len(self.blobs) - 1)
+        defer.returnValue(self.size)
+
+    def _get_plain_length(self, i):
+        if i in self.plain_lengths:
+            return self.plain_lengths[i]
+        # aes padding is at least a byte, this is the most plain text the blob can have
+        return self.blobs[i][3] - 1
+
+    def stop(self):
+        self.lbry_file.remove_blob_completed_callback(self._blob_completed)
+        self.lbry_file.remove_started_callback(self._download_started)
+        self._decrypted.clear()
+
+    def get_slices(self, start, end):
+        """
+        Get the [(index, start, end)] slices of the plain text of the blobs that make up the
+        bytes from start to end of the file, inclusive
+        """
+        slices = []
+        i = bisect.bisect_right(self.offsets, start) - 1
+        while i < len(self.blobs) and self.offsets[i] <= end:
+            blob_start = max(start - self.offsets[i], 0)
+            blob_end = min(end - self.offsets[i] + 1, self._get_plain_length(i))
+            if blob_end > blob_start:
+                slices.append((i, blob_start, blob_end))
+            i += 1
+        return slices
+
+    def read_blob(self, i):
+        """Get the plain text of the blob at index i, waiting for it to be downloaded"""
+        if i in self._decrypted:
+            data = self._decrypted.pop(i)
+            self._decrypted[i] = data
+            return defer.succeed(data)
+        d = defer.Deferred()
+        if i not in self._decrypting:
+            self._decrypting[i] = [d]
+            self._decrypt_blob(i).addBoth(self._blob_decrypted, i)
+        else:
+            self._decrypting[i].append(d)
+        return d
+
+    def read_ahead_of(self, i):
+        """Decrypt the complete blobs after the one at index i"""
+        for j in range(i + 1, min(i + 1 + self.read_ahead, len(self.blobs))):
+            if j in self._decrypted or j in self._decrypting:
+                continue
+            if self.blobs[j][0] not in self.blob_manager.verified_blobs:
+                break
+            self.read_blob(j)
+
+    @defer.inlineCallbacks
+    def _decrypt_blob(self, i):
+        blob_hash, blob_num, iv, length = self.blobs[i]
+        blob = yield self.blob_manager.get_blob(blob_hash, length)
+        if not blob.get_is_verified():
+            yield self._wait_for_blob(blob_num)
+        plain_text = BytesIO()
+        decryptor = StreamBlobDecryptor(blob, self.lbry_file.key, binascii.unhexlify(iv), length)
+        yield decryptor.decrypt(plain_text.write)
+        data = plain_text.getvalue()
+        self.plain_lengths[i] = len(data)
+        if i == len(self.blobs) - 1 and self.offsets:
+            self.size = self.max_size = self.offsets[i] + len(data)
+        defer.returnValue(data)
+
+    def _blob_decrypted(self, result, i):
+        if not isinstance(result, Failure):
+            self._decrypted[i] = result
+            while len(self._decrypted) > self.cache_size:
+                self._decrypted.popitem(last=False)
+        for d in self._decrypting.pop(i, []):
+            if isinstance(result, Failure):
+                d.errback(result)
+            else:
+                d.callback(result)
+        if isinstance(result, Failure):
+            log.debug("Failed to read blob %i of %s: %s", i, self.lbry_file.sd_hash[:16],
+                      result.getErrorMessage())
+
+    #  downloading
+
+    def _wait_for_blob(self, blob_num):
+        from twisted.internet import reactor
+        d = defer.Deferred()
+        self._waiting.setdefault(blob_num, []).append(d)
+
+        def timed_out():
+            waiting = self._waiting.get(blob_num, [])
+            if d in waiting:
+                waiting.remove(d)
+                if not waiting:
+                    del self._waiting[blob_num]
+                d.errback(DownloadDataTimeout(self.lbry_file.sd_hash))
+
+        timeout_call = reactor.callLater(self.timeout, timed_out)
+        d.addBoth(self._cancel_timeout, timeout_call)
+        self._prioritize(blob_num)
+        return d
+
+    @staticmethod
+    def _cancel_timeout(result, timeout_call):
+        if timeout_call.active():
+            timeout_call.cancel()
+        return result
+
+    def _prioritize(self, blob_num):
+        self.priority_blob_num = blob_num
+        if self.lbry_file.download_manager is not None:
+            self.lbry_file.download_manager.prioritize_blob(blob_num)
+        elif self.lbry_file.stopped and not (self.lbry_file.starting or self.lbry_file.completed):
+            log.info("Starting %s to stream it", self.lbry_file.sd_hash[:16])
+            d = defer.maybeDeferred(self.lbry_file.start_downloading)
+            d.addErrback(lambda err: log.warning("Failed to start %s: %s",
+                                                 self.lbry_file.sd_hash[:16],
+                                                 err.getErrorMessage()))
+
+    def _download_started(self):
+        if self.priority_blob_num is not None and self.lbry_file.download_manager is not None:
+            self.lbry_file.download_manager.prioritize_blob(self.priority_blob_num)
+
+    def _blob_completed(self, blob_num):
+        for d in self._waiting.pop(blob_num, []):
+            d.callback(blob_num)
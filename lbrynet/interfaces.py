@@ -184,6 +184,43 @@ class IDownloadManager(Interface):
 
         """
 
+    def blob_downloaded(self, blob):
+        """
+        Called when a blob in the stream has finished downloading, so it can be handled without
+        waiting for the progress manager to check for it.
+
+        @param blob: The blob which has been downloaded.
+        @type blob: Blob
+
+        @return: None
+        """
+
+    def add_blob_completed_callback(self, callback):
+        """
+        Add a function to be called with the blob_num of each blob in the stream as it is
+        completed, either by being downloaded or by being found to already be complete.
+
+        @param callback: function which takes a blob_num
+
+        @return: None
+        """
+
+    def add_started_callback(self, callback):
+        """
+        Add a function to be called, without arguments, once the download has started.
+
+        @return: None
+        """
+
+    def prioritize_blob(self, blob_num):
+        """
+        Download the blobs from blob_num to the end of the stream before the blobs ahead of it.
+
+        @param blob_num: the number of the first blob to download
+
+        @return: None
+        """
+
 
 class IConnectionManager(Interface):
     """
@@ -319,23 +356,31 @@ class IRateLimiter(Interface):
     Can keep track of download and upload rates and can throttle objects which implement the
     IRateLimited interface.
     """
-    def report_dl_bytes(self, num_bytes):
+    def report_dl_bytes(self, num_bytes, protocol=None):
         """
         Inform the IRateLimiter that num_bytes have been downloaded.
 
         @param num_bytes: the number of bytes that have been downloaded
         @type num_bytes: integer
 
+        @param protocol: the registered IRateLimited object which downloaded the bytes,
+            if None the bytes only count against the global limit
+        @type protocol: Object implementing IRateLimited
+
         @return: None
         """
 
-    def report_ul_bytes(self, num_bytes):
+    def report_ul_bytes(self, num_bytes, protocol=None):
         """
         Inform the IRateLimiter that num_bytes have been uploaded.
 
         @param num_bytes: the number of bytes that have been uploaded
         @type num_bytes: integer
 
+        @param protocol: the registered IRateLimited object which uploaded the bytes,
+            if None the bytes only count against the global limit
+        @type protocol: Object implementing IRateLimited
+
         @return: None
         """
 
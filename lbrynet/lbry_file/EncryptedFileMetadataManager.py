@@ -5,7 +5,7 @@ from twisted.internet import defer
 from twisted.python.failure import Failure
 from twisted.enterprise import adbapi
 from lbrynet.core.Error import DuplicateStreamHashError, NoSuchStreamHash, NoSuchSDHash
-from lbrynet.core.sqlite_helpers import rerun_if_locked
+from lbrynet.core.sqlite_helpers import rerun_if_locked, in_chunks, placeholders
 from lbrynet.file_manager.EncryptedFileDownloader import ManagedEncryptedFileDownloader
 
 log = logging.getLogger(__name__)
@@ -88,6 +88,9 @@ class DBEncryptedFileMetadataManager(object):
     def get_stream_of_blob(self, blob_hash):
         return self._get_stream_of_blobhash(blob_hash)
 
+    def get_streams_of_blobs(self, blob_hashes):
+        return self._get_streams_of_blobhashes(blob_hashes)
+
     def save_sd_blob_hash_to_stream(self, stream_hash, sd_blob_hash):
         return self._save_sd_blob_hash_to_stream(stream_hash, sd_blob_hash)
 
@@ -97,6 +100,28 @@ class DBEncryptedFileMetadataManager(object):
     def get_stream_hash_for_sd_hash(self, sd_hash):
         return self._get_stream_hash_for_sd_blob_hash(sd_hash)
 
+    def get_blob_hashes_for_sd_hashes(self, sd_hashes):
+        return self._get_blob_hashes_for_sd_hashes(sd_hashes)
+
+    def save_reflected_streams(self, sd_hashes, reflector, timestamp):
+        return self._save_reflected_streams(sd_hashes, reflector, timestamp)
+
+    def get_reflected_streams(self, reflector, reflected_after):
+        return self._get_reflected_streams(reflector, reflected_after)
+
+    def get_blobs_for_streams(self, stream_hashes):
+        """Returns {stream_hash: [(blob_hash, length)]} for the blobs of each stream, in order"""
+        return self._get_blobs_for_streams(stream_hashes)
+
+    def get_lbry_file_rows(self, after_rowid, limit):
+        """
+        Get up to `limit` lbry files with a rowid greater than `after_rowid`, ordered by rowid,
+        as (rowid, stream_hash, blob_data_rate, status, sd_hash, key, stream_name,
+        suggested_file_name, txid, nout) tuples. Files without a stream are skipped, a file with
+        no sd hash or outpoint has None for them.
+        """
+        return self._get_lbry_file_rows(after_rowid, limit)
+
     @staticmethod
     def _create_tables(transaction):
         transaction.execute("create table if not exists lbry_files (" +
@@ -113,11 +138,15 @@ class DBEncryptedFileMetadataManager(object):
                             "    length integer, " +
                             "    foreign key(stream_hash) references lbry_files(stream_hash)" +
                             ")")
+        transaction.execute("create index if not exists lbry_file_blobs_stream_hash " +
+                            "on lbry_file_blobs (stream_hash)")
         transaction.execute("create table if not exists lbry_file_descriptors (" +
                             "    sd_blob_hash TEXT PRIMARY KEY, " +
                             "    stream_hash TEXT, " +
                             "    foreign key(stream_hash) references lbry_files(stream_hash)" +
                             ")")
+        transaction.execute("create index if not exists lbry_file_descriptors_stream_hash " +
+                            "on lbry_file_descriptors (stream_hash)")
         transaction.execute("create table if not exists lbry_file_options (" +
                             "    blob_data_rate real, " +
                             "    status text," +
@@ -130,6 +159,13 @@ class DBEncryptedFileMetadataManager(object):
                             "    n integer, " +
                             "    foreign key(lbry_file) references lbry_files(rowid)"
                             ")")
+        # streams a reflector has confirmed it has every blob of, and when it did
+        transaction.execute("create table if not exists reflected_streams (" +
+                            "    sd_hash text, " +
+                            "    reflector text, " +
+                            "    timestamp integer, " +
+                            "    primary key (sd_hash, reflector)" +
+                            ")")
 
     def _open_db(self):
         # check_same_thread=False is solely to quiet a spurious error that appears to be due
@@ -166,6 +202,10 @@ class DBEncryptedFileMetadataManager(object):
             lambda result: result[0] if result else Failure(NoSuchStreamHash(stream_hash)))
 
         def do_delete(transaction, row_id, s_h):
+            transaction.execute("delete from reflected_streams where sd_hash in (" +
+                                "    select sd_blob_hash from lbry_file_descriptors " +
+                                "    where stream_hash = ?" +
+                                ")", (s_h,))
             transaction.execute("delete from lbry_files where stream_hash = ?", (s_h,))
             transaction.execute("delete from lbry_file_blobs where stream_hash = ?", (s_h,))
             transaction.execute("delete from lbry_file_descriptors where stream_hash = ?", (s_h,))
@@ -292,6 +332,20 @@ class DBEncryptedFileMetadataManager(object):
         d.addCallback(lambda r: r[0][0] if len(r) else None)
         return d
 
+    @rerun_if_locked
+    def _get_streams_of_blobhashes(self, blob_hashes):
+        def get_streams(transaction):
+            streams = {}
+            for chunk in in_chunks(blob_hashes):
+                result = transaction.execute(
+                    "select blob_hash, stream_hash, position from lbry_file_blobs " +
+                    "where blob_hash in (%s)" % placeholders(chunk), chunk)
+                for blob_hash, stream_hash, position in result.fetchall():
+                    # a blob in more than one stream is reported for the first of them
+                    streams.setdefault(blob_hash, (stream_hash, position))
+            return streams
+        return self.db_conn.runInteraction(get_streams)
+
     @rerun_if_locked
     def _save_sd_blob_hash_to_stream(self, stream_hash, sd_blob_hash):
         d = self.db_conn.runOperation("insert or ignore into lbry_file_descriptors values (?, ?)",
@@ -309,6 +363,36 @@ class DBEncryptedFileMetadataManager(object):
         d.addCallback(lambda results: [r[0] for r in results])
         return d
 
+    @rerun_if_locked
+    def _get_blob_hashes_for_sd_hashes(self, sd_hashes):
+        def get_blob_hashes(transaction):
+            blob_hashes = {sd_hash: [] for sd_hash in sd_hashes}
+            for chunk in in_chunks(sd_hashes):
+                result = transaction.execute(
+                    "select d.sd_blob_hash, b.blob_hash from lbry_file_descriptors d, " +
+                    "lbry_file_blobs b where d.sd_blob_hash in (%s) " % placeholders(chunk) +
+                    "and b.stream_hash = d.stream_hash and b.blob_hash is not null " +
+                    "order by b.position", chunk)
+                for sd_hash, blob_hash in result.fetchall():
+                    blob_hashes[sd_hash].append(blob_hash)
+            return blob_hashes
+        return self.db_conn.runInteraction(get_blob_hashes)
+
+    @rerun_if_locked
+    def _save_reflected_streams(self, sd_hashes, reflector, timestamp):
+        def save(transaction):
+            transaction.executemany("insert or replace into reflected_streams values (?, ?, ?)",
+                                    [(sd_hash, reflector, timestamp) for sd_hash in sd_hashes])
+        return self.db_conn.runInteraction(save)
+
+    @rerun_if_locked
+    def _get_reflected_streams(self, reflector, reflected_after):
+        d = self.db_conn.runQuery(
+            "select sd_hash from reflected_streams where reflector = ? and timestamp > ?",
+            (reflector, reflected_after))
+        d.addCallback(lambda results: set(r[0] for r in results))
+        return d
+
     @rerun_if_locked
     def _get_stream_hash_for_sd_blob_hash(self, sd_blob_hash):
         def _handle_result(result):
@@ -343,6 +427,30 @@ class DBEncryptedFileMetadataManager(object):
             "update lbry_file_options set blob_data_rate = ? where rowid = ?",
             (new_rate, rowid))
 
+    @rerun_if_locked
+    def _get_blobs_for_streams(self, stream_hashes):
+        def get_blobs(transaction):
+            blobs = {stream_hash: [] for stream_hash in stream_hashes}
+            for chunk in in_chunks(stream_hashes):
+                result = transaction.execute(
+                    "select stream_hash, blob_hash, length from lbry_file_blobs " +
+                    "where stream_hash in (%s) order by position" % placeholders(chunk), chunk)
+                for stream_hash, blob_hash, length in result.fetchall():
+                    blobs[stream_hash].append((blob_hash, length))
+            return blobs
+        return self.db_conn.runInteraction(get_blobs)
+
+    @rerun_if_locked
+    def _get_lbry_file_rows(self, after_rowid, limit):
+        return self.db_conn.runQuery(
+            "select o.rowid, o.stream_hash, o.blob_data_rate, o.status, d.sd_blob_hash, " +
+            "    f.key, f.stream_name, f.suggested_file_name, m.txid, m.n " +
+            "from lbry_file_options o " +
+            "inner join lbry_files f on f.stream_hash = o.stream_hash " +
+            "left outer join lbry_file_descriptors d on d.stream_hash = o.stream_hash " +
+            "left outer join lbry_file_metadata m on m.lbry_file = o.rowid " +
+            "where o.rowid > ? order by o.rowid limit ?", (after_rowid, limit))
+
     @rerun_if_locked
     def _get_all_lbry_files(self):
         d = self.db_conn.runQuery("select rowid, stream_hash, blob_data_rate, status "
@@ -6,7 +6,7 @@ from lbrynet.lbry_file.StreamDescriptor import save_sd_info
 from lbrynet.cryptstream.client.CryptStreamDownloader import CryptStreamDownloader
 from lbrynet.core.client.StreamProgressManager import FullStreamProgressManager
 from lbrynet.core.StreamDescriptor import StreamMetadata
-from lbrynet.interfaces import IStreamDownloaderFactory
+from lbrynet.interfaces import IStreamDownloaderFactory, IBlobHandler
 from lbrynet.lbry_file.client.EncryptedFileMetadataHandler import EncryptedFileMetadataHandler
 import os
 from twisted.internet import defer, threads
@@ -17,6 +17,36 @@ import traceback
 log = logging.getLogger(__name__)
 
 
+def get_unused_file_name(download_directory, file_name):
+    """Get file_name, or file_name with a number added to it if that file already exists"""
+    if not file_name:
+        file_name = "_"
+    if os.path.exists(os.path.join(download_directory, file_name)):
+        ext_num = 1
+
+        def _get_file_name(ext):
+            if len(file_name.split(".")):
+                fn = ''.join(file_name.split(".")[:-1])
+                file_ext = ''.join(file_name.split(".")[-1])
+                return fn + "-" + str(ext) + "." + file_ext
+            else:
+                return file_name + "_" + str(ext)
+
+        while os.path.exists(os.path.join(download_directory, _get_file_name(ext_num))):
+            ext_num += 1
+
+        file_name = _get_file_name(ext_num)
+    return file_name
+
+
+class BlobsOnlyHandler(object):
+    """Handles the blobs of a stream that isn't saved to a file, they are only kept as blobs"""
+    implements(IBlobHandler)
+
+    def handle_blob(self, blob, blob_info):
+        return defer.succeed(True)
+
+
 class EncryptedFileDownloader(CryptStreamDownloader):
     """Classes which inherit from this class download LBRY files"""
 
@@ -156,11 +186,13 @@ class EncryptedFileDownloaderFactory(object):
 class EncryptedFileSaver(EncryptedFileDownloader):
     def __init__(self, stream_hash, peer_finder, rate_limiter, blob_manager, stream_info_manager,
                  payment_rate_manager, wallet, download_directory, key, stream_name,
-                 suggested_file_name):
+                 suggested_file_name, save_file=True):
         EncryptedFileDownloader.__init__(self, stream_hash, peer_finder, rate_limiter,
                                          blob_manager, stream_info_manager, payment_rate_manager,
                                          wallet, key, stream_name, suggested_file_name)
         self.download_directory = download_directory
+        # if False the stream is only kept as blobs, it can be exported or streamed later
+        self.save_file = save_file
         self.file_name = os.path.basename(self.suggested_file_name)
         self.file_written_to = None
         self.file_handle = None
@@ -182,27 +214,12 @@ class EncryptedFileSaver(EncryptedFileDownloader):
                                          download_manager)
 
     def _setup_output(self):
+        if not self.save_file:
+            return defer.succeed(None)
+
         def open_file():
             if self.file_handle is None:
-                file_name = self.file_name
-                if not file_name:
-                    file_name = "_"
-                if os.path.exists(os.path.join(self.download_directory, file_name)):
-                    ext_num = 1
-
-                    def _get_file_name(ext):
-                        if len(file_name.split(".")):
-                            fn = ''.join(file_name.split(".")[:-1])
-                            file_ext = ''.join(file_name.split(".")[-1])
-                            return fn + "-" + str(ext) + "." + file_ext
-                        else:
-                            return file_name + "_" + str(ext)
-
-                    while os.path.exists(os.path.join(self.download_directory,
-                                                      _get_file_name(ext_num))):
-                        ext_num += 1
-
-                    file_name = _get_file_name(ext_num)
+                file_name = get_unused_file_name(self.download_directory, self.file_name)
                 try:
                     self.file_handle = open(os.path.join(self.download_directory, file_name), 'wb')
                     self.file_written_to = os.path.join(self.download_directory, file_name)
@@ -232,6 +249,11 @@ class EncryptedFileSaver(EncryptedFileDownloader):
                 self.file_handle.write(data)
         return write_func
 
+    def _get_blob_handler(self, download_manager):
+        if not self.save_file:
+            return BlobsOnlyHandler()
+        return EncryptedFileDownloader._get_blob_handler(self, download_manager)
+
     def _delete_from_info_manager(self):
         return self.stream_info_manager.delete_stream(self.stream_hash)
 
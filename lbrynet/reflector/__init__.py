@@ -13,6 +13,14 @@ The server replies with the same version
     'version': int,
 }
 
+If the server is serving as many clients as it can it may wait to reply until it is the
+client's turn, or if too many clients are already waiting it replies with the number of
+seconds to wait before trying again and disconnects:
+{
+    'error': str,
+    'retry_after': int
+}
+
 ############# Stream descriptor requests and responses #############
 (if sending blobs directly this is skipped)
 If the client is reflecting a whole stream, they send a stream descriptor request:
@@ -62,6 +70,48 @@ If the transfer was not successful (False), the blob is re-added to the needed_b
 
 Blob requests continue for each of the blobs the client has queued to send, when completed
 the client disconnects.
+
+############# Batch requests and responses (version 2) #############
+A client which handshakes with version 2 can reflect many streams over one connection. It
+asks about the sd blobs and blobs of a batch of streams at once:
+{
+    'sd_blob_hashes': list,
+    'blob_hashes': list
+}
+
+The server replies with which of them it doesn't have a validated copy of. Each field is a
+base64 encoded bitmap with a bit for every hash in the request, in the same order, starting
+from the most significant bit of the first byte. A set bit means the blob is missing:
+{
+    'missing_sd_blobs': str,
+    'missing_blobs': str
+}
+
+Clients remember which blobs a reflector has told them it has, and don't ask about them again
+for a while.
+
+The client sends each of them with the stream descriptor and blob requests above, but without
+waiting for a send_sd_blob or send_blob response: the blob follows its request immediately,
+and the client may send more blobs before the first ones are acknowledged. The server replies
+once each blob has been received, naming the blob:
+{
+    'received_sd_blob': bool,
+    'sd_blob_hash': str
+}
+{
+    'received_blob': bool,
+    'blob_hash': str
+}
+Once every blob has been acknowledged the client may send another batch request.
+
+A batch request may also include 'check_sd_blob_hashes', a list of sd hashes of streams the
+client wants to know if the server already has in full. The server then adds the ones it has
+the sd blob and every blob of to its reply:
+{
+    'complete_sd_blobs': list
+}
+
+The connection stays open until the client disconnects.
 """
 
 from lbrynet.reflector.server.server import ReflectorServerFactory as ServerFactory
@@ -6,6 +6,7 @@ from twisted.protocols.basic import FileSender
 from twisted.internet.protocol import Protocol, ClientFactory
 from twisted.internet import defer, error
 
+from lbrynet.core.RateLimiter import REFLECTOR_TRAFFIC
 from lbrynet.reflector.common import IncompleteResponse, ReflectorRequestError
 from lbrynet.reflector.common import REFLECTOR_V1, REFLECTOR_V2
 
@@ -13,6 +14,8 @@ log = logging.getLogger(__name__)
 
 
 class EncryptedFileReflectorClient(Protocol):
+    rate_limit_class = REFLECTOR_TRAFFIC
+
     #  Protocol stuff
     def connectionMade(self):
         log.debug("Connected to reflector")
@@ -33,6 +36,10 @@ class EncryptedFileReflectorClient(Protocol):
         self.file_sender = None
         self.producer = None
         self.streaming = False
+        self.upload_throttled = False
+        self.rate_limiter = self.factory.rate_limiter
+        if self.rate_limiter is not None:
+            self.rate_limiter.register_protocol(self)
         d = self.load_descriptor()
         d.addCallback(lambda _: self.send_handshake())
         d.addErrback(
@@ -73,6 +80,8 @@ class EncryptedFileReflectorClient(Protocol):
     def connectionLost(self, reason):
         # make sure blob file readers get closed
         self.set_not_uploading()
+        if self.rate_limiter is not None:
+            self.rate_limiter.unregister_protocol(self)
 
         if reason.check(error.ConnectionDone):
             if not self.needed_blobs:
@@ -98,19 +107,37 @@ class EncryptedFileReflectorClient(Protocol):
     def registerProducer(self, producer, streaming):
         self.producer = producer
         self.streaming = streaming
-        if self.streaming is False:
-            from twisted.internet import reactor
-            reactor.callLater(0, self.producer.resumeProducing)
+        self._resume_producer()
 
     def unregisterProducer(self):
         self.producer = None
 
     def write(self, data):
         self.transport.write(data)
-        if self.producer is not None and self.streaming is False:
+        if self.rate_limiter is not None:
+            self.rate_limiter.report_ul_bytes(len(data), self)
+        self._resume_producer()
+
+    def _resume_producer(self):
+        if self.producer is not None and self.streaming is False and not self.upload_throttled:
             from twisted.internet import reactor
             reactor.callLater(0, self.producer.resumeProducing)
 
+    #  IRateLimited stuff
+
+    def throttle_upload(self):
+        self.upload_throttled = True
+
+    def unthrottle_upload(self):
+        self.upload_throttled = False
+        self._resume_producer()
+
+    def throttle_download(self):
+        self.transport.pauseProducing()
+
+    def unthrottle_download(self):
+        self.transport.resumeProducing()
+
     def get_validated_blobs(self, blobs_in_stream):
         def get_blobs(blobs):
             for (blob, _, _, blob_len) in blobs:
@@ -334,6 +361,10 @@ class EncryptedFileReflectorClientFactory(ClientFactory):
     def stream_hash(self):
         return self._lbry_file.stream_hash
 
+    @property
+    def rate_limiter(self):
+        return getattr(self._lbry_file, 'rate_limiter', None)
+
     @property
     def file_name(self):
         return self._lbry_file.file_name
@@ -0,0 +1,664 @@
+import json
+import logging
+import time
+
+from twisted.protocols.basic import FileSender
+from twisted.internet.protocol import Protocol, ClientFactory
+from twisted.internet import defer, error
+
+from lbrynet.core import utils
+from lbrynet.core.RateLimiter import REFLECTOR_TRAFFIC
+from lbrynet.reflector.common import IncompleteResponse, REFLECTOR_V3, decode_bitmap
+from lbrynet.reflector.client.client import EncryptedFileReflectorClientFactory
+from lbrynet.reflector.client.blob import BlobReflectorClientFactory
+
+log = logging.getLogger(__name__)
+
+_json_decoder = json.JSONDecoder()
+
+
+class StreamReflectJob(object):
+    """Reflect the sd blob and the completed blobs of a lbry file"""
+
+    check_sd_hashes = []
+
+    def __init__(self, lbry_file):
+        self.lbry_file = lbry_file
+        self.blob_manager = lbry_file.blob_manager
+        self.sd_hash = None
+        self.blob_hashes = []
+        self.reflected_blobs = []
+        self.is_complete = False
+        self.failed = False
+        self.finished_deferred = defer.Deferred()
+
+    @property
+    def confirmed(self):
+        """True if the reflector has confirmed it has every blob of the stream"""
+        return self.finished_deferred.called and self.is_complete and not self.failed
+
+    @defer.inlineCallbacks
+    def load(self):
+        stream_info_manager = self.lbry_file.stream_info_manager
+        stream_hash = self.lbry_file.stream_hash
+        sd_hashes = yield stream_info_manager.get_sd_blob_hashes_for_stream(stream_hash)
+        blob_infos = yield stream_info_manager.get_blobs_for_stream(stream_hash)
+        blob_hashes = [blob_hash for blob_hash, _, _, length in blob_infos if blob_hash and length]
+        self.blob_hashes = yield self.blob_manager.completed_blobs(blob_hashes)
+        sd_hashes = yield self.blob_manager.completed_blobs(sd_hashes[:1])
+        self.sd_hash = sd_hashes[0] if sd_hashes else None
+        self.is_complete = self.sd_hash is not None and len(self.blob_hashes) == len(blob_hashes)
+
+    def finish(self):
+        if not self.finished_deferred.called:
+            self.finished_deferred.callback(self.reflected_blobs)
+
+    def get_legacy_factory(self):
+        return EncryptedFileReflectorClientFactory(self.lbry_file)
+
+
+class BlobsReflectJob(object):
+    """Reflect a set of blobs which don't need to belong to the same stream"""
+
+    check_sd_hashes = []
+
+    def __init__(self, blob_manager, blob_hashes):
+        self.blob_manager = blob_manager
+        self.sd_hash = None
+        self.blob_hashes = list(blob_hashes)
+        self.reflected_blobs = []
+        self.failed = False
+        self.finished_deferred = defer.Deferred()
+
+    def load(self):
+        d = self.blob_manager.completed_blobs(self.blob_hashes)
+        d.addCallback(lambda blob_hashes: setattr(self, 'blob_hashes', blob_hashes))
+        return d
+
+    def finish(self):
+        if not self.finished_deferred.called:
+            self.finished_deferred.callback(bool(self.reflected_blobs))
+
+    def get_legacy_factory(self):
+        return BlobReflectorClientFactory(self.blob_manager, self.blob_hashes)
+
+
+class StreamsCheckJob(object):
+    """Ask the reflector which of a set of streams it already has every blob of"""
+
+    def __init__(self, sd_hashes):
+        self.blob_manager = None
+        self.sd_hash = None
+        self.blob_hashes = []
+        self.check_sd_hashes = list(sd_hashes)
+        self.complete_sd_hashes = []
+        self.reflected_blobs = []
+        self.failed = False
+        self.finished_deferred = defer.Deferred()
+
+    def load(self):
+        return defer.succeed(None)
+
+    def finish(self):
+        if not self.finished_deferred.called:
+            self.finished_deferred.callback(self.complete_sd_hashes)
+
+    def get_legacy_factory(self):
+        # older reflectors can't be asked this
+        return None
+
+
+class ReflectorSessionClient(Protocol):
+    """
+    Reflects batches of jobs taken from a ReflectorConnectionPool over one connection
+
+    For each batch the sd blob hashes and blob hashes of every job are sent to the server in
+    a single request and the server replies with bitmaps of the ones it needs. Those are sent
+    back to back, each one right after its descriptor or blob request, with up to
+    MAX_BLOBS_IN_FLIGHT of them waiting to be acknowledged by the server. The blobs the server
+    said it has or acknowledged are saved to the pool's cache at the end of the batch. When the
+    pool has no more jobs the connection is kept open until it has been idle for the pool's
+    idle_timeout.
+    """
+
+    rate_limit_class = REFLECTOR_TRAFFIC
+
+    #  Protocol stuff
+
+    def connectionMade(self):
+        self.pool = self.factory.pool
+        self.response_buff = ''
+        self.received_handshake = False
+        self.busy = True
+        self.jobs = []
+        self.batch_sd_hashes = []
+        self.batch_blob_hashes = []
+        self.confirmed = {}  # {blob_manager: set of blob hashes the server has}
+        self.transfers = []  # [(job, blob_hash, is_sd_blob)] still to be sent in this batch
+        self.in_flight = {}  # {blob_hash: (job, blob, is_sd_blob)} sent or being sent, not acked
+        self.read_handle = None
+        self.file_sender = None
+        self.producer = None
+        self.streaming = False
+        self.upload_throttled = False
+        self.idle_call = None
+        self.retry_after = None
+        self.version_rejected = False
+        self.rate_limiter = self.pool.rate_limiter
+        if self.rate_limiter is not None:
+            self.rate_limiter.register_protocol(self)
+        self.send_request({'version': REFLECTOR_V3})
+
+    def dataReceived(self, data):
+        self.response_buff += data
+        # acknowledgements for pipelined blobs can arrive together
+        while self.response_buff:
+            try:
+                msg, end = self.parse_response(self.response_buff)
+            except IncompleteResponse:
+                return
+            self.response_buff = self.response_buff[end:]
+            d = defer.maybeDeferred(self.handle_response, msg)
+            d.addErrback(self.response_failure_handler)
+
+    def connectionLost(self, reason):
+        self._cancel_idle_timeout()
+        self.set_not_uploading()
+        if self.rate_limiter is not None:
+            self.rate_limiter.unregister_protocol(self)
+        # these jobs didn't make it to the end of their batch
+        jobs, self.jobs = self.jobs, []
+        for job in jobs:
+            job.failed = True
+            job.finish()
+        self.save_confirmed()
+        if not self.received_handshake and self.retry_after is None and \
+                reason.check(error.ConnectionDone):
+            # reflectors close the connection without replying to a version they don't know
+            self.version_rejected = True
+        self.pool.connection_lost(self, reason)
+
+    #  IConsumer stuff
+
+    def registerProducer(self, producer, streaming):
+        self.producer = producer
+        self.streaming = streaming
+        self._resume_producer()
+
+    def unregisterProducer(self):
+        self.producer = None
+
+    def write(self, data):
+        self.transport.write(data)
+        if self.rate_limiter is not None:
+            self.rate_limiter.report_ul_bytes(len(data), self)
+        self._resume_producer()
+
+    def _resume_producer(self):
+        if self.producer is not None and self.streaming is False and not self.upload_throttled:
+            from twisted.internet import reactor
+            reactor.callLater(0, self.producer.resumeProducing)
+
+    #  IRateLimited stuff
+
+    def throttle_upload(self):
+        self.upload_throttled = True
+
+    def unthrottle_upload(self):
+        self.upload_throttled = False
+        self._resume_producer()
+
+    def throttle_download(self):
+        self.transport.pauseProducing()
+
+    def unthrottle_download(self):
+        self.transport.resumeProducing()
+
+    #  batches
+
+    def wake(self):
+        """Start a new batch if this connection is idle"""
+        if self.received_handshake and not self.busy:
+            return self.start_batch()
+
+    def _start_idle_timeout(self):
+        self._cancel_idle_timeout()
+        self.idle_call = utils.call_later(self.pool.idle_timeout, self.transport.loseConnection)
+
+    def _cancel_idle_timeout(self):
+        if self.idle_call is not None and self.idle_call.active():
+            self.idle_call.cancel()
+        self.idle_call = None
+
+    @defer.inlineCallbacks
+    def start_batch(self):
+        self.busy = True
+        self._cancel_idle_timeout()
+        self.jobs = yield self.pool.get_batch()
+        while not self.jobs and self.pool.jobs:
+            self.jobs = yield self.pool.get_batch()
+        if not self.jobs:
+            self.busy = False
+            self._start_idle_timeout()
+            defer.returnValue(None)
+        sd_hashes = [job.sd_hash for job in self.jobs if job.sd_hash is not None]
+        # jobs can share blobs, only ask about each one once
+        blob_hashes = list(set(blob_hash for job in self.jobs for blob_hash in job.blob_hashes))
+        check_sd_hashes = [sd_hash for job in self.jobs for sd_hash in job.check_sd_hashes]
+        log.debug("Asking reflector about %i streams and %i blobs", len(sd_hashes),
+                  len(blob_hashes))
+        self.batch_sd_hashes, self.batch_blob_hashes = sd_hashes, blob_hashes
+        request = {'sd_blob_hashes': sd_hashes, 'blob_hashes': blob_hashes}
+        if check_sd_hashes:
+            request['check_sd_blob_hashes'] = check_sd_hashes
+        self.send_request(request)
+
+    @defer.inlineCallbacks
+    def finish_batch(self):
+        jobs, self.jobs = self.jobs, []
+        log.info("Reflected %i blobs from %i jobs",
+                 sum(len(job.reflected_blobs) for job in jobs), len(jobs))
+        yield self.save_confirmed()
+        for job in jobs:
+            job.finish()
+        yield self.start_batch()
+
+    def save_confirmed(self):
+        confirmed, self.confirmed = self.confirmed, {}
+        return self.pool.blobs_reflected(confirmed)
+
+    def _confirm(self, blob_manager, blob_hashes):
+        if blob_hashes:
+            self.confirmed.setdefault(blob_manager, set()).update(blob_hashes)
+
+    #  requests and responses
+
+    def send_request(self, request_dict):
+        self.write(json.dumps(request_dict))
+
+    def parse_response(self, buff):
+        """Returns the first message in buff and where it ends"""
+        try:
+            return _json_decoder.raw_decode(buff)
+        except ValueError:
+            raise IncompleteResponse()
+
+    def response_failure_handler(self, err):
+        log.warning("An error occurred handling the reflector response: %s", err.getTraceback())
+        self.transport.loseConnection()
+
+    def handle_response(self, response_dict):
+        if not self.received_handshake:
+            return self.handle_handshake_response(response_dict)
+        elif not self.in_flight:
+            return self.handle_batch_response(response_dict)
+        return self.handle_transfer_response(response_dict)
+
+    def handle_handshake_response(self, response_dict):
+        if 'retry_after' in response_dict:
+            self.retry_after = response_dict['retry_after']
+            log.info("Reflector is busy, retrying in %s seconds", self.retry_after)
+            self.transport.loseConnection()
+            return
+        if response_dict.get('version') != REFLECTOR_V3:
+            self.version_rejected = True
+            raise ValueError("I can't handle protocol version {}!".format(
+                response_dict.get('version')))
+        self.received_handshake = True
+        self.pool.connection_ready(self)
+        return self.start_batch()
+
+    def handle_batch_response(self, response_dict):
+        if not self.jobs:
+            raise ValueError("Unexpected response from reflector")
+        if 'missing_sd_blobs' not in response_dict or 'missing_blobs' not in response_dict:
+            raise ValueError("I don't know which blobs to send!")
+        missing_sd_blobs = decode_bitmap(response_dict['missing_sd_blobs'],
+                                         len(self.batch_sd_hashes))
+        missing_blobs = decode_bitmap(response_dict['missing_blobs'], len(self.batch_blob_hashes))
+        send_sd_blobs = set(sd_hash for sd_hash, missing
+                            in zip(self.batch_sd_hashes, missing_sd_blobs) if missing)
+        needed_blobs = set(blob_hash for blob_hash, missing
+                           in zip(self.batch_blob_hashes, missing_blobs) if missing)
+        has_blobs = set(self.batch_blob_hashes).difference(needed_blobs)
+        complete_sd_blobs = set(response_dict.get('complete_sd_blobs', []))
+        self.transfers = []
+        for job in self.jobs:
+            if job.check_sd_hashes:
+                job.complete_sd_hashes = [sd_hash for sd_hash in job.check_sd_hashes
+                                          if sd_hash in complete_sd_blobs]
+            if job.sd_hash in send_sd_blobs:
+                self.transfers.append((job, job.sd_hash, True))
+                send_sd_blobs.remove(job.sd_hash)
+            self._confirm(job.blob_manager, has_blobs.intersection(job.blob_hashes))
+            for blob_hash in job.blob_hashes:
+                # jobs can share blobs, only send each one once
+                if blob_hash in needed_blobs:
+                    self.transfers.append((job, blob_hash, False))
+                    needed_blobs.remove(blob_hash)
+        if self.transfers:
+            log.info("Reflector needs %i blobs", len(self.transfers))
+        return self.send_next_blob()
+
+    @defer.inlineCallbacks
+    def send_next_blob(self):
+        while self.transfers and self.file_sender is None:
+            if len(self.in_flight) >= self.pool.MAX_BLOBS_IN_FLIGHT:
+                defer.returnValue(None)
+            job, blob_hash, is_sd_blob = self.transfers.pop(0)
+            blob = yield job.blob_manager.get_blob(blob_hash)
+            read_handle = None
+            if blob.get_is_verified():
+                read_handle = blob.open_for_reading()
+            if read_handle is None:
+                log.warning("Couldn't open %s to reflect it", blob)
+                job.failed = True
+                continue
+            self.in_flight[blob.blob_hash] = job, blob, is_sd_blob
+            self.read_handle = read_handle
+            if is_sd_blob:
+                self.send_request({'sd_blob_hash': blob.blob_hash, 'sd_blob_size': blob.length})
+            else:
+                self.send_request({'blob_hash': blob.blob_hash, 'blob_size': blob.length})
+            # the blob follows the request right away, the server doesn't reply to it first
+            self.file_sender = FileSender()
+            d = self.file_sender.beginFileTransfer(read_handle, self)
+            d.addCallback(self.blob_sent)
+            d.addErrback(self.response_failure_handler)
+            defer.returnValue(None)
+        if not self.transfers and not self.in_flight and self.file_sender is None:
+            yield self.finish_batch()
+
+    def blob_sent(self, _):
+        self.read_handle.close()
+        self.read_handle = None
+        self.file_sender = None
+        return self.send_next_blob()
+
+    def handle_transfer_response(self, response_dict):
+        if 'received_sd_blob' in response_dict:
+            blob_hash = response_dict.get('sd_blob_hash')
+            received = response_dict['received_sd_blob']
+        elif 'received_blob' in response_dict:
+            blob_hash = response_dict.get('blob_hash')
+            received = response_dict['received_blob']
+        else:
+            raise ValueError("I don't know if the blob made it to the intended destination!")
+        if blob_hash not in self.in_flight:
+            raise ValueError("Reflector acknowledged a blob that wasn't sent: %s" % blob_hash)
+        job, blob, is_sd_blob = self.in_flight.pop(blob_hash)
+        if received:
+            job.reflected_blobs.append(blob.blob_hash)
+            if not is_sd_blob:
+                self._confirm(job.blob_manager, [blob.blob_hash])
+        else:
+            log.warning("Reflector failed to receive %s", blob)
+            job.failed = True
+        return self.send_next_blob()
+
+    def set_not_uploading(self):
+        if self.file_sender is not None:
+            self.file_sender.stopProducing()
+            self.file_sender = None
+        if self.read_handle is not None:
+            self.read_handle.close()
+            self.read_handle = None
+        self.in_flight = {}
+
+
+class ReflectorSessionClientFactory(ClientFactory):
+    protocol = ReflectorSessionClient
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    def buildProtocol(self, addr):
+        p = self.protocol()
+        p.factory = self
+        return p
+
+    def clientConnectionFailed(self, connector, reason):
+        self.pool.connection_failed(reason)
+
+
+class ReflectorConnectionPool(object):
+    """
+    Long lived REFLECTOR_V3 connections to one reflector server
+
+    Streams and blobs queued with reflect_stream and reflect_blobs are split into batches
+    between up to max_connections connections. If the server rejects the REFLECTOR_V3
+    handshake the pool falls back to a REFLECTOR_V2 connection per job for a while. Uploads
+    on the pool's connections are charged to its rate_limiter.
+
+    Blobs the server has said it has are remembered in the blob manager's database and aren't
+    offered to it again until the answer is older than reflected_blob_age seconds.
+    """
+
+    # how many jobs and blob hashes to ask the server about at once
+    MAX_BATCH_JOBS = 100
+    MAX_BATCH_HASHES = 10000
+    # how many blobs a connection may send ahead of the server's acknowledgements
+    MAX_BLOBS_IN_FLIGHT = 8
+    # how long to wait before trying REFLECTOR_V3 again with a server that didn't support it
+    LEGACY_RETRY_INTERVAL = 60 * 60
+
+    def __init__(self, host, port, max_connections=2, idle_timeout=60, rate_limiter=None,
+                 reflected_blob_age=None):
+        self.host = host
+        self.port = port
+        self.reflector = "%s:%i" % (host, port)
+        self.reflected_blob_age = reflected_blob_age
+        self.max_connections = max_connections
+        self.idle_timeout = idle_timeout
+        self.rate_limiter = rate_limiter
+        self.jobs = []
+        self.connections = []
+        self.pending_connections = 0
+        self.legacy_since = None
+        self.retry_call = None
+        self._legacy_semaphore = defer.DeferredSemaphore(max_connections)
+
+    def reflect_stream(self, lbry_file):
+        return self._add_job(StreamReflectJob(lbry_file))
+
+    @defer.inlineCallbacks
+    def reflect_blobs(self, blob_manager, blob_hashes):
+        """Fires with True if any of the blobs were sent to the reflector"""
+        blob_hashes = list(blob_hashes)
+        # a batch holds at most MAX_BATCH_HASHES, so split up long lists of blobs
+        jobs = [BlobsReflectJob(blob_manager, blob_hashes[i:i + self.MAX_BATCH_HASHES])
+                for i in xrange(0, len(blob_hashes), self.MAX_BATCH_HASHES)]
+        results = yield defer.DeferredList([self._add_job(job) for job in jobs],
+                                           consumeErrors=True)
+        for success, result in results:
+            if not success:
+                result.raiseException()
+        defer.returnValue(any(result for _, result in results))
+
+    @defer.inlineCallbacks
+    def check_streams(self, sd_hashes):
+        """Fires with the set of sd hashes of the streams the reflector has every blob of"""
+        sd_hashes = list(sd_hashes)
+        jobs = [StreamsCheckJob(sd_hashes[i:i + self.MAX_BATCH_HASHES])
+                for i in xrange(0, len(sd_hashes), self.MAX_BATCH_HASHES)]
+        results = yield defer.DeferredList([self._add_job(job) for job in jobs],
+                                           consumeErrors=True)
+        complete = set()
+        for success, result in results:
+            if success:
+                complete.update(result)
+        defer.returnValue(complete)
+
+    @defer.inlineCallbacks
+    def reflect_streams(self, lbry_files):
+        """
+        Reflect the lbry files the reflector doesn't already have all of, fires with the sd
+        hashes of the streams it has confirmed it has every blob of
+        """
+        complete = yield self.check_streams([lbry_file.sd_hash for lbry_file in lbry_files
+                                             if lbry_file.sd_hash])
+        jobs = [StreamReflectJob(lbry_file) for lbry_file in lbry_files
+                if lbry_file.sd_hash not in complete]
+        if complete:
+            log.info("Reflector already has %i of %i streams", len(complete), len(lbry_files))
+        yield defer.DeferredList([self._add_job(job) for job in jobs], consumeErrors=True)
+        complete.update(job.sd_hash for job in jobs if job.confirmed)
+        defer.returnValue(complete)
+
+    def close(self):
+        if self.retry_call is not None and self.retry_call.active():
+            self.retry_call.cancel()
+        self.retry_call = None
+        for protocol in list(self.connections):
+            protocol.transport.loseConnection()
+
+    @property
+    def is_legacy(self):
+        if self.legacy_since is None:
+            return False
+        if time.time() - self.legacy_since > self.LEGACY_RETRY_INTERVAL:
+            self.legacy_since = None
+            return False
+        return True
+
+    def _add_job(self, job):
+        self.jobs.append(job)
+        self._dispatch()
+        return job.finished_deferred
+
+    def _dispatch(self):
+        if self.retry_call is not None:
+            # the server is busy
+            return
+        if self.is_legacy:
+            jobs, self.jobs = self.jobs, []
+            for job in jobs:
+                self._legacy_semaphore.run(self._reflect_legacy, job)
+            return
+        for protocol in list(self.connections):
+            if not self.jobs:
+                return
+            protocol.wake()
+        connected = len(self.connections) + self.pending_connections
+        if self.jobs and connected < self.max_connections:
+            self._connect()
+
+    def _connect(self):
+        from twisted.internet import reactor
+        log.debug("Connecting to reflector %s:%i", self.host, self.port)
+        self.pending_connections += 1
+        reactor.connectTCP(self.host, self.port, ReflectorSessionClientFactory(self))
+
+    def _reflect_legacy(self, job):
+        from twisted.internet import reactor
+        factory = job.get_legacy_factory()
+        if factory is None:
+            job.finish()
+            return None
+        reactor.connectTCP(self.host, self.port, factory)
+        # return the factory's deferred, returning the job's would hand its result to the
+        # semaphore instead of whoever queued the job
+        factory.finished_deferred.chainDeferred(job.finished_deferred)
+        return factory.finished_deferred
+
+    @defer.inlineCallbacks
+    def get_batch(self):
+        """Take the next jobs off the queue and load the hashes to offer for them"""
+        jobs, self.jobs = self.jobs[:self.MAX_BATCH_JOBS], self.jobs[self.MAX_BATCH_JOBS:]
+        results = yield defer.DeferredList([job.load() for job in jobs], consumeErrors=True)
+        loaded = []
+        for job, (success, result) in zip(jobs, results):
+            if not success:
+                log.warning("Failed to load blobs to reflect: %s", result.getErrorMessage())
+                job.failed = True
+                job.finished_deferred.errback(result)
+            else:
+                loaded.append(job)
+        yield self._skip_reflected_blobs(loaded)
+        batch, next_batch, num_hashes = [], [], 0
+        for job in loaded:
+            job_hashes = len(job.blob_hashes) + len(job.check_sd_hashes) + 1
+            if batch and num_hashes + job_hashes > self.MAX_BATCH_HASHES:
+                next_batch.append(job)
+            else:
+                batch.append(job)
+                num_hashes += job_hashes
+        self.jobs = next_batch + self.jobs
+        defer.returnValue(batch)
+
+    @defer.inlineCallbacks
+    def _skip_reflected_blobs(self, jobs):
+        """Don't offer blobs the server recently said it has"""
+        reflected_after = None
+        if self.reflected_blob_age is not None:
+            reflected_after = time.time() - self.reflected_blob_age
+        jobs_by_blob_manager = {}
+        for job in jobs:
+            if job.blob_hashes:
+                jobs_by_blob_manager.setdefault(job.blob_manager, []).append(job)
+        for blob_manager, jobs in jobs_by_blob_manager.iteritems():
+            blob_hashes = set(blob_hash for job in jobs for blob_hash in job.blob_hashes)
+            try:
+                reflected = yield blob_manager.get_reflected_blobs(blob_hashes, self.reflector,
+                                                                   reflected_after)
+            except Exception as err:
+                log.warning("Failed to look up the blobs %s has: %s", self.reflector, err)
+                continue
+            if reflected:
+                log.debug("Skipping %i blobs %s already has", len(reflected), self.reflector)
+            for job in jobs:
+                job.blob_hashes = [blob_hash for blob_hash in job.blob_hashes
+                                   if blob_hash not in reflected]
+
+    def blobs_reflected(self, confirmed):
+        """Remember the blobs the server has, confirmed is {blob_manager: blob hashes}"""
+        timestamp = time.time()
+        ds = []
+        for blob_manager, blob_hashes in confirmed.iteritems():
+            d = blob_manager.save_reflected_blobs(blob_hashes, self.reflector, timestamp)
+            d.addErrback(lambda err: log.warning("Failed to save the blobs %s has: %s",
+                                                 self.reflector, err.getErrorMessage()))
+            ds.append(d)
+        return defer.DeferredList(ds)
+
+    def connection_ready(self, protocol):
+        self.pending_connections -= 1
+        self.connections.append(protocol)
+
+    def connection_failed(self, reason):
+        self.pending_connections -= 1
+        log.warning("Failed to connect to reflector %s:%i: %s", self.host, self.port,
+                    reason.getErrorMessage())
+        self._fail_jobs(reason)
+
+    def _fail_jobs(self, reason):
+        """Fail the queued jobs if there is no connection left to reflect them"""
+        if not self.connections and not self.pending_connections:
+            jobs, self.jobs = self.jobs, []
+            for job in jobs:
+                job.failed = True
+                job.finished_deferred.errback(reason)
+
+    def _retry(self):
+        self.retry_call = None
+        self._dispatch()
+
+    def connection_lost(self, protocol, reason):
+        if protocol in self.connections:
+            self.connections.remove(protocol)
+        else:
+            self.pending_connections -= 1
+        if protocol.retry_after is not None:
+            if self.retry_call is None:
+                self.retry_call = utils.call_later(protocol.retry_after, self._retry)
+        elif protocol.version_rejected:
+            log.info("Reflector %s:%i doesn't support multi-stream sessions", self.host,
+                     self.port)
+            self.legacy_since = time.time()
+        elif not protocol.received_handshake:
+            # a network error or a timeout, not a reason to stop using sessions
+            log.warning("Lost the connection to reflector %s:%i before the handshake: %s",
+                        self.host, self.port, reason.getErrorMessage())
+            self._fail_jobs(reason)
+            return
+        self._dispatch()
@@ -1,5 +1,28 @@
+import base64
+
 REFLECTOR_V1 = 0
 REFLECTOR_V2 = 1
+REFLECTOR_V3 = 2
+
+
+def encode_bitmap(flags):
+    """
+    Pack a list of bools into a base64 string, the first flag is the most significant bit of
+    the first byte
+    """
+    bitmap = bytearray((len(flags) + 7) // 8)
+    for i, flag in enumerate(flags):
+        if flag:
+            bitmap[i // 8] |= 0x80 >> (i % 8)
+    return base64.b64encode(str(bitmap))
+
+
+def decode_bitmap(encoded, length):
+    """Unpack the first `length` flags of a bitmap made by encode_bitmap"""
+    bitmap = bytearray(base64.b64decode(encoded))
+    if len(bitmap) != (length + 7) // 8:
+        raise ValueError("Expected a bitmap of %i flags, got %i bytes" % (length, len(bitmap)))
+    return [bool(bitmap[i // 8] & (0x80 >> (i % 8))) for i in xrange(length)]
 
 
 class ReflectorClientVersionError(Exception):
@@ -3,6 +3,10 @@ import random
 from twisted.internet import reactor, defer
 from lbrynet import conf
 from lbrynet.reflector import ClientFactory, BlobClientFactory
+from lbrynet.reflector.client.session import ReflectorConnectionPool
+
+# {(host, port, rate_limiter): ReflectorConnectionPool}
+_connection_pools = {}
 
 
 def _is_ip(host):
@@ -43,25 +47,50 @@ def _reflect_blobs(blob_manager, blob_hashes, reflector_server):
     defer.returnValue(result)
 
 
-def reflect_stream(lbry_file, reflector_server=None):
+def get_reflector_server(reflector_server=None):
     if reflector_server:
         if len(reflector_server.split(":")) == 2:
             host, port = tuple(reflector_server.split(":"))
-            reflector_server = host, int(port)
-        else:
-            reflector_server = reflector_server, 5566
-    else:
-        reflector_server = random.choice(conf.settings['reflector_servers'])
-    return _reflect_stream(lbry_file, reflector_server)
+            return host, int(port)
+        return reflector_server, 5566
+    return random.choice(conf.settings['reflector_servers'])
 
 
-def reflect_blob_hashes(blob_hashes, blob_manager, reflector_server=None):
-    if reflector_server:
-        if len(reflector_server.split(":")) == 2:
-            host, port = tuple(reflector_server.split(":"))
-            reflector_server = host, int(port)
-        else:
-            reflector_server = reflector_server, 5566
-    else:
-        reflector_server = random.choice(conf.settings['reflector_servers'])
-    return _reflect_blobs(blob_manager, blob_hashes, reflector_server)
+def get_connection_pool(reflector_server, rate_limiter=None):
+    """
+    Get the pool of persistent connections to a (host, port) reflector server whose uploads
+    are charged to rate_limiter, each rate limiter has its own pool
+    """
+    host, port = reflector_server
+    key = (host, port, rate_limiter)
+    if key not in _connection_pools:
+        _connection_pools[key] = ReflectorConnectionPool(
+            host, port, rate_limiter=rate_limiter,
+            reflected_blob_age=conf.settings['auto_re_reflect_reverify_age'])
+    return _connection_pools[key]
+
+
+def close_connection_pools():
+    for pool in _connection_pools.itervalues():
+        pool.close()
+    _connection_pools.clear()
+
+
+def reflect_stream(lbry_file, reflector_server=None, rate_limiter=None):
+    reflector_server = get_reflector_server(reflector_server)
+    return get_connection_pool(reflector_server, rate_limiter).reflect_stream(lbry_file)
+
+
+def reflect_streams(lbry_files, reflector_server=None, rate_limiter=None):
+    """
+    Reflect many streams to the same reflector server, sharing its connections. Fires with
+    the sd hashes of the streams the reflector has confirmed it has every blob of.
+    """
+    pool = get_connection_pool(get_reflector_server(reflector_server), rate_limiter)
+    return pool.reflect_streams(lbry_files)
+
+
+def reflect_blob_hashes(blob_hashes, blob_manager, reflector_server=None, rate_limiter=None):
+    reflector_server = get_reflector_server(reflector_server)
+    return get_connection_pool(reflector_server, rate_limiter).reflect_blobs(blob_manager,
+                                                                            blob_hashes)
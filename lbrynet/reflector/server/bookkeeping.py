@@ -0,0 +1,157 @@
+import logging
+
+from twisted.internet import defer
+from twisted.python.failure import Failure
+from lbrynet.core.Error import NoSuchSDHash
+from lbrynet.core.StreamDescriptor import BlobStreamDescriptorReader
+from lbrynet.lbry_file.StreamDescriptor import save_sd_info
+
+log = logging.getLogger(__name__)
+
+
+class BlobBookkeeper(object):
+    """
+    Records the blobs received by a reflector server
+
+    The server acknowledges a blob as soon as it has been verified and written to the blob
+    directory. The database work for it (adding it to the blobs table, deciding if it should be
+    announced and saving the stream of an sd blob) is queued here and done in batches shared by
+    every connection, so sqlite latency doesn't limit how fast clients can upload. Received
+    blobs are added to the blob manager's verified blob index right away.
+    """
+
+    def __init__(self, blob_manager, stream_info_manager, lbry_file_manager, batch_size=200):
+        self.blob_manager = blob_manager
+        self.stream_info_manager = stream_info_manager
+        self.lbry_file_manager = lbry_file_manager
+        self.batch_size = batch_size
+        self._queue = []  # [(blob, is_sd_blob, deferred)]
+        self._processing = False
+        self._waiting_for_empty = []
+
+    def __len__(self):
+        return len(self._queue)
+
+    def add(self, blob, is_sd_blob):
+        """Queue a received blob, returns a deferred that fires once it has been recorded"""
+        self.blob_manager.verified_blobs.add(blob.blob_hash)
+        d = defer.Deferred()
+        self._queue.append((blob, is_sd_blob, d))
+        if not self._processing:
+            self._process()
+        return d
+
+    def wait_for_empty(self):
+        if not self._processing:
+            return defer.succeed(None)
+        d = defer.Deferred()
+        self._waiting_for_empty.append(d)
+        return d
+
+    @defer.inlineCallbacks
+    def _process(self):
+        self._processing = True
+        while self._queue:
+            batch = self._queue[:self.batch_size]
+            self._queue = self._queue[self.batch_size:]
+            try:
+                failed = yield self._record(batch)
+            except Exception:
+                err = Failure()
+                log.error("Failed to record %i received blobs: %s", len(batch),
+                          err.getTraceback())
+                for _, _, d in batch:
+                    d.errback(err)
+            else:
+                for blob, _, d in batch:
+                    if blob.blob_hash in failed:
+                        d.errback(failed[blob.blob_hash])
+                    else:
+                        d.callback(None)
+        self._processing = False
+        waiting, self._waiting_for_empty = self._waiting_for_empty, []
+        for d in waiting:
+            d.callback(None)
+
+    @defer.inlineCallbacks
+    def _record(self, batch):
+        """
+        Record a batch of received blobs, returns {blob_hash: Failure} for the sd blobs whose
+        streams couldn't be saved
+        """
+        failed = {}
+        blobs = [blob for blob, is_sd_blob, _ in batch if not is_sd_blob]
+        # sd blobs first, so the head blobs of their streams in the batch are announced
+        for blob, is_sd_blob, _ in batch:
+            if is_sd_blob:
+                try:
+                    yield self._record_sd_blob(blob)
+                except Exception:
+                    failed[blob.blob_hash] = Failure()
+                    log.error("Failed to record the stream of received sd blob %s: %s", blob,
+                              failed[blob.blob_hash].getTraceback())
+                    # it's still a blob we have
+                    blobs.append(blob)
+        if not blobs:
+            defer.returnValue(failed)
+        streams = yield self.stream_info_manager.get_streams_of_blobs(
+            [blob.blob_hash for blob in blobs])
+        head_blobs = {blob_hash: stream_hash
+                      for blob_hash, (stream_hash, position) in streams.iteritems()
+                      if position == 0}
+        yield self.blob_manager.blobs_completed(blobs, should_announce=head_blobs)
+        for stream_hash in head_blobs.itervalues():
+            # if we already have the sd blob, set it to be announced now that we know it's
+            # a sd blob
+            sd_hashes = yield self.stream_info_manager.get_sd_blob_hashes_for_stream(stream_hash)
+            for sd_hash in sd_hashes:
+                yield self.check_sd_blob_announce(sd_hash)
+        log.debug("Recorded %i received blobs", len(batch))
+        defer.returnValue(failed)
+
+    @defer.inlineCallbacks
+    def _record_sd_blob(self, sd_blob):
+        sd_info = yield BlobStreamDescriptorReader(sd_blob).get_info()
+        yield save_sd_info(self.stream_info_manager, sd_info)
+        yield self.stream_info_manager.save_sd_blob_hash_to_stream(sd_info['stream_hash'],
+                                                                   sd_blob.blob_hash)
+        yield self.lbry_file_manager.add_lbry_file(sd_info['stream_hash'], sd_blob.blob_hash)
+        yield self.blob_manager.blob_completed(sd_blob, should_announce=True)
+        # if we already have the head blob, set it to be announced now that we know it's
+        # a head blob
+        yield self.check_head_blob_announce(sd_info['stream_hash'])
+
+    @defer.inlineCallbacks
+    def check_head_blob_announce(self, stream_hash):
+        blob_infos = yield self.stream_info_manager.get_blobs_for_stream(stream_hash)
+        blob_hash, blob_num, blob_iv, blob_length = blob_infos[0]
+        if blob_hash in self.blob_manager.blobs:
+            head_blob = self.blob_manager.blobs[blob_hash]
+            if head_blob.get_is_verified():
+                should_announce = yield self.blob_manager.get_should_announce(blob_hash)
+                if should_announce == 0:
+                    yield self.blob_manager.set_should_announce(blob_hash, 1)
+                    log.info("Discovered previously completed head blob (%s), "
+                             "setting it to be announced", blob_hash[:8])
+        defer.returnValue(None)
+
+    @defer.inlineCallbacks
+    def check_sd_blob_announce(self, sd_hash):
+        if sd_hash in self.blob_manager.blobs:
+            sd_blob = self.blob_manager.blobs[sd_hash]
+            if sd_blob.get_is_verified():
+                should_announce = yield self.blob_manager.get_should_announce(sd_hash)
+                if should_announce == 0:
+                    yield self.blob_manager.set_should_announce(sd_hash, 1)
+                    log.info("Discovered previously completed sd blob (%s), "
+                             "setting it to be announced", sd_hash[:8])
+                    try:
+                        yield self.stream_info_manager.get_stream_hash_for_sd_hash(sd_hash)
+                    except NoSuchSDHash:
+                        log.info("Adding blobs to stream")
+                        sd_info = yield BlobStreamDescriptorReader(sd_blob).get_info()
+                        yield save_sd_info(self.stream_info_manager, sd_info)
+                        yield self.stream_info_manager.save_sd_blob_hash_to_stream(
+                            sd_info['stream_hash'],
+                            sd_hash)
+        defer.returnValue(None)
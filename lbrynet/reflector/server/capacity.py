@@ -0,0 +1,192 @@
+import logging
+
+from twisted.internet import defer, task
+from lbrynet.core.RateLimiter import BandwidthScheduler
+
+log = logging.getLogger(__name__)
+
+
+class ReflectorCapacity(object):
+    """
+    Admission control and ingest throttling for a reflector server
+
+    At most `max_connections` clients are served at once, and no more than
+    `max_connections_per_host` from one host. Clients over the limit wait in a queue of up to
+    `max_queued_connections`, which is served in order of how few connections their host
+    already has. Clients that don't fit in the queue are told when to retry. Blobs being
+    received are buffered in memory until they are written to disk, so once more than
+    `max_inflight_bytes` are buffered, the connections using more than their share aren't
+    read from after the blob they are sending until enough blobs have been saved. A blob is
+    never paused part way through, its bytes are only freed once all of it has arrived.
+    Incoming data is also limited to `max_write_rate` bytes per second, split between the
+    clients that are uploading.
+    """
+
+    # seconds a rejected client is told to wait before retrying, per full round of queued clients
+    RETRY_AFTER = 30
+    TICK_INTERVAL = 0.1
+    # smoothing of the reported ingest rate
+    RATE_ALPHA = 0.2
+
+    def __init__(self, max_connections=None, max_queued_connections=None,
+                 max_connections_per_host=None, max_inflight_bytes=None, max_write_rate=None):
+        self.max_connections = max_connections
+        self.max_queued_connections = max_queued_connections
+        self.max_connections_per_host = max_connections_per_host
+        self.max_inflight_bytes = max_inflight_bytes
+        self.active = []
+        self.queue = []  # [(protocol, deferred)]
+        self.inflight = {}  # {protocol: bytes of the blobs it is uploading which aren't saved}
+        self.inflight_bytes = 0
+        self.paused = []
+        self.writes = BandwidthScheduler('throttle_download', 'unthrottle_download',
+                                         max_write_rate)
+        self.rejected_connections = 0
+        self.ingest_rate = 0.0
+        self._tick_call = None
+        self._last_tick = None
+        self._ingest_bytes_since_tick = 0
+
+    def start(self):
+        from twisted.internet import reactor
+        self._last_tick = reactor.seconds()
+        self._tick_call = task.LoopingCall(self._tick)
+        self._tick_call.start(self.TICK_INTERVAL, now=False)
+
+    def stop(self):
+        if self._tick_call is not None and self._tick_call.running:
+            self._tick_call.stop()
+        self._tick_call = None
+
+    def _tick(self):
+        from twisted.internet import reactor
+        now = reactor.seconds()
+        elapsed = now - self._last_tick
+        self._last_tick = now
+        if elapsed > 0:
+            rate = self._ingest_bytes_since_tick / elapsed
+            self.ingest_rate += self.RATE_ALPHA * (rate - self.ingest_rate)
+        self._ingest_bytes_since_tick = 0
+        self.writes.tick(elapsed)
+
+    def get_metrics(self):
+        return {
+            'active_connections': len(self.active),
+            'queued_connections': len(self.queue),
+            'rejected_connections': self.rejected_connections,
+            'active_uploads': len([p for p in self.active if p.receiving_blob]),
+            'inflight_bytes': self.inflight_bytes,
+            'paused_connections': len(self.paused) + len(self.writes.throttled),
+            'ingest_bytes_per_second': int(self.ingest_rate),
+            'total_ingest_bytes': self.writes.total_bytes,
+        }
+
+    #  admission
+
+    def _host_connections(self, host):
+        return len([p for p in self.active if p.peer.host == host])
+
+    def _has_room(self, protocol):
+        if self.max_connections is not None and len(self.active) >= self.max_connections:
+            return False
+        if self.max_connections_per_host is not None:
+            return self._host_connections(protocol.peer.host) < self.max_connections_per_host
+        return True
+
+    def admit(self, protocol):
+        """
+        Returns a deferred that fires once the protocol may be served, or None if the server is
+        too busy to queue it
+        """
+        if not self.queue and self._has_room(protocol):
+            self._activate(protocol)
+            return defer.succeed(True)
+        if self.max_queued_connections is not None and \
+                len(self.queue) >= self.max_queued_connections:
+            self.rejected_connections += 1
+            return None
+        d = defer.Deferred()
+        self.queue.append((protocol, d))
+        # there may be room for this host even though others are waiting
+        self._admit_waiting()
+        if not d.called:
+            log.debug("Queued reflector client %s, %i waiting", protocol.peer.host,
+                      len(self.queue))
+        return d
+
+    def retry_after(self):
+        rounds = 1 + len(self.queue) // max(self.max_connections or 1, 1)
+        return self.RETRY_AFTER * rounds
+
+    def _activate(self, protocol):
+        self.active.append(protocol)
+        self.writes.register(protocol)
+
+    def _admit_waiting(self):
+        while self.queue:
+            candidates = [(self._host_connections(protocol.peer.host), i)
+                          for i, (protocol, _) in enumerate(self.queue)
+                          if self._has_room(protocol)]
+            if not candidates:
+                return
+            protocol, d = self.queue.pop(min(candidates)[1])
+            self._activate(protocol)
+            d.callback(True)
+
+    def release(self, protocol):
+        """Forget a protocol whose connection was lost"""
+        for i, (queued, _) in enumerate(self.queue):
+            if queued is protocol:
+                del self.queue[i]
+                break
+        if protocol in self.active:
+            self.active.remove(protocol)
+        self.writes.unregister(protocol)
+        if protocol in self.paused:
+            self.paused.remove(protocol)
+        self.inflight_bytes -= self.inflight.pop(protocol, 0)
+        self._resume_paused()
+        self._admit_waiting()
+
+    #  in flight bytes and ingest rate
+
+    def report_ingest(self, protocol, num_bytes):
+        self._ingest_bytes_since_tick += num_bytes
+        self.writes.report(num_bytes, protocol)
+
+    def _over_limit(self, protocol):
+        if self.max_inflight_bytes is None:
+            return False
+        if self.inflight_bytes > self.max_inflight_bytes:
+            return True
+        # once half the budget is in use, a client may not buffer more than its share
+        fair_share = self.max_inflight_bytes / max(len(self.active), 1)
+        return self.inflight_bytes > self.max_inflight_bytes / 2 and \
+            self.inflight.get(protocol, 0) > fair_share
+
+    def reserve(self, protocol, num_bytes):
+        self.inflight[protocol] = self.inflight.get(protocol, 0) + num_bytes
+        self.inflight_bytes += num_bytes
+
+    def blob_received(self, protocol):
+        """
+        Called once a protocol has read all of a blob, before it reads anything else. If too
+        much is in flight it is paused until enough blobs have been saved.
+        """
+        if protocol not in self.paused and self._over_limit(protocol):
+            self.paused.append(protocol)
+            protocol.throttle_receiving()
+
+    def free(self, protocol, num_bytes):
+        if protocol in self.inflight:
+            self.inflight[protocol] -= num_bytes
+            self.inflight_bytes -= num_bytes
+            if not self.inflight[protocol]:
+                del self.inflight[protocol]
+        self._resume_paused()
+
+    def _resume_paused(self):
+        for protocol in list(self.paused):
+            if not self._over_limit(protocol):
+                self.paused.remove(protocol)
+                protocol.unthrottle_receiving()
@@ -3,17 +3,23 @@ import json
 from twisted.python import failure
 from twisted.internet import error, defer
 from twisted.internet.protocol import Protocol, ServerFactory
+from lbrynet import conf
 from lbrynet.core.utils import is_valid_blobhash
+from lbrynet.blob.blob_file import MAX_BLOB_SIZE
 from lbrynet.core.Error import DownloadCanceledError, InvalidBlobHashError, NoSuchSDHash
 from lbrynet.core.StreamDescriptor import BlobStreamDescriptorReader
 from lbrynet.lbry_file.StreamDescriptor import save_sd_info
-from lbrynet.reflector.common import REFLECTOR_V1, REFLECTOR_V2
+from lbrynet.reflector.common import REFLECTOR_V1, REFLECTOR_V2, REFLECTOR_V3, encode_bitmap
 from lbrynet.reflector.common import ReflectorRequestError, ReflectorClientVersionError
+from lbrynet.reflector.server.bookkeeping import BlobBookkeeper
+from lbrynet.reflector.server.capacity import ReflectorCapacity
 
 
 log = logging.getLogger(__name__)
 
 MAXIMUM_QUERY_SIZE = 200
+# most blob hashes a REFLECTOR_V3 client may ask about in one request
+MAXIMUM_BATCH_SIZE = 20000
 SEND_SD_BLOB = 'send_sd_blob'
 SEND_BLOB = 'send_blob'
 RECEIVED_SD_BLOB = 'received_sd_blob'
@@ -24,6 +30,13 @@ BLOB_SIZE = 'blob_size'
 BLOB_HASH = 'blob_hash'
 SD_BLOB_SIZE = 'sd_blob_size'
 SD_BLOB_HASH = 'sd_blob_hash'
+SD_BLOB_HASHES = 'sd_blob_hashes'
+BLOB_HASHES = 'blob_hashes'
+MISSING_SD_BLOBS = 'missing_sd_blobs'
+MISSING_BLOBS = 'missing_blobs'
+CHECK_SD_BLOB_HASHES = 'check_sd_blob_hashes'
+COMPLETE_SD_BLOBS = 'complete_sd_blobs'
+RETRY_AFTER = 'retry_after'
 
 
 class ReflectorServer(Protocol):
@@ -39,14 +52,64 @@ class ReflectorServer(Protocol):
         self.peer_version = None
         self.receiving_blob = False
         self.incoming_blob = None
+        self.incoming_blob_response_key = None
+        # the reply to a pipelined blob which is being discarded instead of written
+        self.discarded_blob_received = None
+        self.blob_bytes_left = 0
         self.blob_finished_d = None
         self.request_buff = ""
+        # data read before the transport was paused for having too much in flight
+        self.held_data = ""
+        self.bookkeeper = self.factory.bookkeeper
+        self.capacity = self.factory.capacity
+        self._pause_reasons = set()
 
         self.blob_writer = None
 
+        d = self.capacity.admit(self)
+        if d is None:
+            retry_after = self.capacity.retry_after()
+            log.info("Reflector is too busy for %s, asking it to retry in %i seconds",
+                     self.peer.host, retry_after)
+            self.send_response({'error': 'reflector is busy', RETRY_AFTER: retry_after})
+            self.transport.loseConnection()
+        elif not d.called:
+            # don't read the handshake until it's our turn
+            self._pause('queued')
+            d.addCallback(lambda _: self._resume('queued'))
+
     def connectionLost(self, reason=failure.Failure(error.ConnectionDone())):
+        if self.receiving_blob:
+            self.close_blob()
+        self.capacity.release(self)
         log.info("Reflector upload from %s finished" % self.peer.host)
 
+    def _pause(self, reason):
+        if not self._pause_reasons:
+            self.transport.pauseProducing()
+        self._pause_reasons.add(reason)
+
+    def _resume(self, reason):
+        if reason in self._pause_reasons:
+            self._pause_reasons.remove(reason)
+            if not self._pause_reasons:
+                self.transport.resumeProducing()
+
+    def throttle_download(self):
+        self._pause('write rate')
+
+    def unthrottle_download(self):
+        self._resume('write rate')
+
+    def throttle_receiving(self):
+        self._pause('memory')
+
+    def unthrottle_receiving(self):
+        self._resume('memory')
+        if self.held_data:
+            data, self.held_data = self.held_data, ""
+            self.dataReceived(data)
+
     def handle_error(self, err):
         log.error(err.getTraceback())
         self.transport.loseConnection()
@@ -61,86 +124,48 @@ class ReflectorServer(Protocol):
     def clean_up_failed_upload(self, err, blob):
         log.warning("Failed to receive %s", blob)
         if err.check(DownloadCanceledError):
-            self.blob_manager.delete_blobs([blob.blob_hash])
+            # another connection may have finished uploading the same blob first
+            if not blob.get_is_verified():
+                self.blob_manager.delete_blobs([blob.blob_hash])
         else:
             log.exception(err)
 
-    @defer.inlineCallbacks
     def check_head_blob_announce(self, stream_hash):
-        blob_infos = yield self.stream_info_manager.get_blobs_for_stream(stream_hash)
-        blob_hash, blob_num, blob_iv, blob_length = blob_infos[0]
-        if blob_hash in self.blob_manager.blobs:
-            head_blob = self.blob_manager.blobs[blob_hash]
-            if head_blob.get_is_verified():
-                should_announce = yield self.blob_manager.get_should_announce(blob_hash)
-                if should_announce == 0:
-                    yield self.blob_manager.set_should_announce(blob_hash, 1)
-                    log.info("Discovered previously completed head blob (%s), "
-                             "setting it to be announced", blob_hash[:8])
-        defer.returnValue(None)
+        return self.bookkeeper.check_head_blob_announce(stream_hash)
 
-    @defer.inlineCallbacks
     def check_sd_blob_announce(self, sd_hash):
-        if sd_hash in self.blob_manager.blobs:
-            sd_blob = self.blob_manager.blobs[sd_hash]
-            if sd_blob.get_is_verified():
-                should_announce = yield self.blob_manager.get_should_announce(sd_hash)
-                if should_announce == 0:
-                    yield self.blob_manager.set_should_announce(sd_hash, 1)
-                    log.info("Discovered previously completed sd blob (%s), "
-                             "setting it to be announced", sd_hash[:8])
-                    try:
-                        yield self.stream_info_manager.get_stream_hash_for_sd_hash(sd_hash)
-                    except NoSuchSDHash:
-                        log.info("Adding blobs to stream")
-                        sd_info = yield BlobStreamDescriptorReader(sd_blob).get_info()
-                        yield save_sd_info(self.stream_info_manager, sd_info)
-                        yield self.stream_info_manager.save_sd_blob_hash_to_stream(
-                            sd_info['stream_hash'],
-                            sd_hash)
-        defer.returnValue(None)
+        return self.bookkeeper.check_sd_blob_announce(sd_hash)
 
     @defer.inlineCallbacks
     def _on_completed_blob(self, blob, response_key):
-        should_announce = False
-        if response_key == RECEIVED_SD_BLOB:
-            sd_info = yield BlobStreamDescriptorReader(blob).get_info()
-            yield save_sd_info(self.stream_info_manager, sd_info)
-            yield self.stream_info_manager.save_sd_blob_hash_to_stream(sd_info['stream_hash'],
-                                                                       blob.blob_hash)
-            yield self.lbry_file_manager.add_lbry_file(sd_info['stream_hash'], blob.blob_hash)
-            should_announce = True
-
-            # if we already have the head blob, set it to be announced now that we know it's
-            # a head blob
-            d = self.check_head_blob_announce(sd_info['stream_hash'])
-
-        else:
-            d = defer.succeed(None)
-            stream_hash = yield self.stream_info_manager.get_stream_of_blob(blob.blob_hash)
-            if stream_hash is not None:
-                blob_num = yield self.stream_info_manager._get_blob_num_by_hash(stream_hash,
-                                                                                blob.blob_hash)
-                if blob_num == 0:
-                    should_announce = True
-                    sd_hashes = yield self.stream_info_manager.get_sd_blob_hashes_for_stream(
-                        stream_hash)
-
-                    # if we already have the sd blob, set it to be announced now that we know it's
-                    # a sd blob
-                    for sd_hash in sd_hashes:
-                        d.addCallback(lambda _: self.check_sd_blob_announce(sd_hash))
-
-        yield self.blob_manager.blob_completed(blob, should_announce=should_announce)
-        yield self.close_blob()
-        yield d
+        is_sd_blob = response_key == RECEIVED_SD_BLOB
+        if is_sd_blob:
+            # make sure it really is a stream descriptor before accepting it
+            yield BlobStreamDescriptorReader(blob).get_info()
+        # the blob is verified, once it's safely on disk recording it can happen in the background
+        yield blob.sync()
+        d = self.bookkeeper.add(blob, is_sd_blob)
+        d.addErrback(self._on_failed_bookkeeping, blob)
         log.info("Received %s", blob)
-        yield self.send_response({response_key: True})
+        yield self.send_blob_response(response_key, blob, True)
+
+    @staticmethod
+    def _on_failed_bookkeeping(err, blob):
+        # the bookkeeper has logged why, the blob is still on disk and in the verified blob index
+        log.debug("Failed to record received %s: %s", blob, err.getErrorMessage())
 
     @defer.inlineCallbacks
-    def _on_failed_blob(self, err, response_key):
-        yield self.clean_up_failed_upload(err, self.incoming_blob)
-        yield self.send_response({response_key: False})
+    def _on_failed_blob(self, err, blob, response_key):
+        yield self.clean_up_failed_upload(err, blob)
+        yield self.send_blob_response(response_key, blob, False)
+
+    def send_blob_response(self, response_key, blob, received):
+        response = {response_key: received}
+        if self.peer_version == REFLECTOR_V3:
+            # responses to pipelined blobs say which blob they are about
+            response[SD_BLOB_HASH if response_key == RECEIVED_SD_BLOB else BLOB_HASH] = \
+                blob.blob_hash
+        return self.send_response(response)
 
     def handle_incoming_blob(self, response_key):
         """
@@ -151,15 +176,44 @@ class ReflectorServer(Protocol):
         """
 
         blob = self.incoming_blob
+        self.blob_bytes_left = blob.get_length()
         self.blob_writer, self.blob_finished_d = blob.open_for_writing(self.peer)
+        # the blob is held in memory until it has been written to disk
+        self.capacity.reserve(self, blob.get_length())
+        self.blob_finished_d.addBoth(self._free_blob_bytes, blob.get_length())
         self.blob_finished_d.addCallback(self._on_completed_blob, response_key)
-        self.blob_finished_d.addErrback(self._on_failed_blob, response_key)
+        self.blob_finished_d.addErrback(self._on_failed_blob, blob, response_key)
+
+    def _free_blob_bytes(self, result, num_bytes):
+        self.capacity.free(self, num_bytes)
+        return result
+
+    def write_blob_data(self, data):
+        """Write data to the incoming blob, returns what is left over after the end of it"""
+        data, extra_data = data[:self.blob_bytes_left], data[self.blob_bytes_left:]
+        self.blob_bytes_left -= len(data)
+        self.capacity.report_ingest(self, len(data))
+        if self.blob_writer is not None:
+            self.blob_writer.write(data)
+        if not self.blob_bytes_left:
+            if self.blob_writer is None:
+                # we already had the pipelined blob, or couldn't take it
+                self.send_blob_response(self.incoming_blob_response_key, self.incoming_blob,
+                                        self.discarded_blob_received)
+            # the next request may arrive before the blob has been saved
+            self.close_blob()
+            self.capacity.blob_received(self)
+        return extra_data
 
     def close_blob(self):
-        self.blob_writer.close()
+        if self.blob_writer is not None:
+            self.blob_writer.close()
         self.blob_writer = None
         self.blob_finished_d = None
         self.incoming_blob = None
+        self.incoming_blob_response_key = None
+        self.discarded_blob_received = None
+        self.blob_bytes_left = 0
         self.receiving_blob = False
 
     ####################
@@ -167,19 +221,24 @@ class ReflectorServer(Protocol):
     ####################
 
     def dataReceived(self, data):
-        if self.receiving_blob:
-            self.blob_writer.write(data)
-        else:
+        while data:
+            if self.receiving_blob:
+                data = self.write_blob_data(data)
+                continue
+            if 'memory' in self._pause_reasons:
+                # too much is in flight, the next request waits until enough has been saved
+                self.held_data += data
+                return
             log.debug('Not yet recieving blob, data needs further processing')
             self.request_buff += data
             msg, extra_data = self._get_valid_response(self.request_buff)
-            if msg is not None:
-                self.request_buff = ''
-                d = self.handle_request(msg)
-                d.addErrback(self.handle_error)
-                if self.receiving_blob and extra_data:
-                    log.debug('Writing extra data to blob')
-                    self.blob_writer.write(extra_data)
+            if msg is None:
+                return
+            self.request_buff = ''
+            d = self.handle_request(msg)
+            d.addErrback(self.handle_error)
+            # REFLECTOR_V3 clients send blobs and further requests without waiting for replies
+            data = extra_data
 
     def _get_valid_response(self, response_msg):
         extra_data = None
@@ -220,12 +279,34 @@ class ReflectorServer(Protocol):
             raise InvalidBlobHashError(request_dict[BLOB_HASH])
         return True
 
+    def is_batch_request(self, request_dict):
+        if self.peer_version != REFLECTOR_V3:
+            return False
+        if SD_BLOB_HASHES not in request_dict or BLOB_HASHES not in request_dict:
+            return False
+        blob_hashes = request_dict[SD_BLOB_HASHES] + request_dict[BLOB_HASHES]
+        blob_hashes += request_dict.get(CHECK_SD_BLOB_HASHES, [])
+        if len(blob_hashes) > MAXIMUM_BATCH_SIZE:
+            raise ReflectorRequestError("Too many blobs in request")
+        for blob_hash in blob_hashes:
+            if not is_valid_blobhash(blob_hash):
+                raise InvalidBlobHashError(blob_hash)
+        return True
+
     def handle_request(self, request_dict):
         if self.need_handshake():
             return self.handle_handshake(request_dict)
+        if self.is_batch_request(request_dict):
+            return self.handle_batch_request(request_dict)
         if self.is_descriptor_request(request_dict):
+            if self.peer_version == REFLECTOR_V3:
+                return self.handle_pipelined_blob_request(
+                    request_dict[SD_BLOB_HASH], request_dict[SD_BLOB_SIZE], RECEIVED_SD_BLOB)
             return self.handle_descriptor_request(request_dict)
         if self.is_blob_request(request_dict):
+            if self.peer_version == REFLECTOR_V3:
+                return self.handle_pipelined_blob_request(
+                    request_dict[BLOB_HASH], request_dict[BLOB_SIZE], RECEIVED_BLOB)
             return self.handle_blob_request(request_dict)
         raise ReflectorRequestError("Invalid request")
 
@@ -245,7 +326,7 @@ class ReflectorServer(Protocol):
         if VERSION not in request_dict:
             raise ReflectorRequestError("Client should send version")
 
-        if int(request_dict[VERSION]) not in [REFLECTOR_V1, REFLECTOR_V2]:
+        if int(request_dict[VERSION]) not in [REFLECTOR_V1, REFLECTOR_V2, REFLECTOR_V3]:
             raise ReflectorClientVersionError("Unknown version: %i" % int(request_dict[VERSION]))
 
 
@@ -340,18 +421,66 @@ class ReflectorServer(Protocol):
         return self.get_unvalidated_blobs_in_stream(decoded_sd_blob)
 
     def get_unvalidated_blobs_in_stream(self, sd_blob):
-        dl = defer.DeferredList(list(self._iter_unvalidated_blobs_in_stream(sd_blob)),
-                                consumeErrors=True)
-        dl.addCallback(lambda needed: [blob[1] for blob in needed if blob[1]])
-        return dl
-
-    def _iter_unvalidated_blobs_in_stream(self, sd_blob):
-        for blob in sd_blob['blobs']:
-            if 'blob_hash' in blob and 'length' in blob:
-                blob_hash, blob_len = blob['blob_hash'], blob['length']
-                d = self.blob_manager.get_blob(blob_hash, blob_len)
-                d.addCallback(lambda blob: blob_hash if not blob.get_is_verified() else None)
-                yield d
+        blob_hashes = [blob['blob_hash'] for blob in sd_blob['blobs']
+                       if 'blob_hash' in blob and 'length' in blob]
+        return self.blob_manager.missing_blobs(blob_hashes)
+
+    @defer.inlineCallbacks
+    def handle_batch_request(self, request_dict):
+        """
+        A REFLECTOR_V3 client asks which of the sd blobs and blobs it has the server needs:
+        {
+            'sd_blob_hashes': list,
+            'blob_hashes': list
+        }
+
+        The server replies with which of them it doesn't have a validated copy of, as base64
+        encoded bitmaps in the order of the hashes in the request (see encode_bitmap):
+        {
+            'missing_sd_blobs': str,
+            'missing_blobs': str
+        }
+
+        The client then sends them with descriptor and blob requests.
+
+        The client may also include 'check_sd_blob_hashes', a list of sd hashes of streams it
+        isn't sending blob hashes for, in which case the server adds 'complete_sd_blobs', the
+        ones it has the sd blob and every blob of, to its reply.
+        """
+
+        sd_blob_hashes = request_dict[SD_BLOB_HASHES]
+        blob_hashes = request_dict[BLOB_HASHES]
+        send_sd_blobs = yield self.blob_manager.missing_blobs(sd_blob_hashes)
+        needed_blobs = yield self.blob_manager.missing_blobs(blob_hashes)
+        send_sd_blobs, needed_blobs = set(send_sd_blobs), set(needed_blobs)
+        # make sure sd blobs we already have are marked as such for announcement
+        for sd_hash in set(sd_blob_hashes).difference(send_sd_blobs):
+            yield self.check_sd_blob_announce(sd_hash)
+        log.debug("Client needs to send %i of %i sd blobs and %i of %i blobs",
+                  len(send_sd_blobs), len(sd_blob_hashes), len(needed_blobs), len(blob_hashes))
+        response = {
+            MISSING_SD_BLOBS: encode_bitmap([h in send_sd_blobs for h in sd_blob_hashes]),
+            MISSING_BLOBS: encode_bitmap([h in needed_blobs for h in blob_hashes]),
+        }
+        if CHECK_SD_BLOB_HASHES in request_dict:
+            response[COMPLETE_SD_BLOBS] = yield self.get_complete_streams(
+                request_dict[CHECK_SD_BLOB_HASHES])
+        self.send_response(response)
+
+    @defer.inlineCallbacks
+    def get_complete_streams(self, sd_hashes):
+        """Returns the sd hashes of the streams we have the sd blob and all the blobs of"""
+        sd_hashes = yield self.blob_manager.completed_blobs(sd_hashes)
+        stream_blobs = yield self.stream_info_manager.get_blob_hashes_for_sd_hashes(sd_hashes)
+        missing = yield self.blob_manager.missing_blobs(
+            [blob_hash for blob_hashes in stream_blobs.itervalues() for blob_hash in blob_hashes])
+        missing = set(missing)
+        complete = []
+        for sd_hash in sd_hashes:
+            blob_hashes = stream_blobs.get(sd_hash)
+            if blob_hashes and missing.isdisjoint(blob_hashes):
+                complete.append(sd_hash)
+        defer.returnValue(complete)
 
     def handle_blob_request(self, request_dict):
         """
@@ -397,16 +526,82 @@ class ReflectorServer(Protocol):
             d = defer.succeed({SEND_BLOB: True})
         return d
 
+    def handle_pipelined_blob_request(self, blob_hash, blob_size, response_key):
+        """
+        A REFLECTOR_V3 client sends a blob right after its descriptor or blob request, without
+        waiting for a send_sd_blob or send_blob response, and may send more before the first
+        one is acknowledged. The server replies once each blob has been received:
+        {
+            'received_blob': bool,
+            'blob_hash': str
+        }
+        or for sd blobs
+        {
+            'received_sd_blob': bool,
+            'sd_blob_hash': str
+        }
+        """
+
+        if not 0 < blob_size <= MAX_BLOB_SIZE:
+            raise ReflectorRequestError("Invalid blob size: %s" % blob_size)
+        # the blob data may already be in the buffer, so the blob has to be ready to receive
+        # it before this returns. get_blob doesn't touch the database, its deferred has fired.
+        d = self.blob_manager.get_blob(blob_hash, blob_size)
+        d.addCallback(self._receive_pipelined_blob, blob_size, response_key)
+        return d
+
+    def _receive_pipelined_blob(self, blob, blob_size, response_key):
+        # the client sends the blob whatever the reply is going to be, so a blob which can't
+        # be received is read and discarded before replying that it wasn't
+        if blob.get_is_verified():
+            log.debug("Already have %s, discarding it", blob)
+            received = True
+        elif self.peer in blob.writers or not blob.set_length(blob_size):
+            log.warning("Can't receive %s from %s, discarding it", blob, self.peer)
+            received = False
+        else:
+            received = None
+        self.incoming_blob = blob
+        self.incoming_blob_response_key = response_key
+        self.receiving_blob = True
+        if received is None:
+            self.handle_incoming_blob(response_key)
+        else:
+            self.discarded_blob_received = received
+            self.blob_bytes_left = blob_size
+
 
 class ReflectorServerFactory(ServerFactory):
     protocol = ReflectorServer
 
-    def __init__(self, peer_manager, blob_manager, stream_info_manager, lbry_file_manager):
+    def __init__(self, peer_manager, blob_manager, stream_info_manager, lbry_file_manager,
+                 capacity=None):
         self.peer_manager = peer_manager
         self.blob_manager = blob_manager
         self.stream_info_manager = stream_info_manager
         self.lbry_file_manager = lbry_file_manager
         self.protocol_version = REFLECTOR_V2
+        self.bookkeeper = BlobBookkeeper(blob_manager, stream_info_manager, lbry_file_manager)
+        if capacity is None:
+            capacity = ReflectorCapacity(
+                max_connections=conf.settings['reflector_server_max_connections'] or None,
+                max_queued_connections=conf.settings['reflector_server_max_queued_connections'],
+                max_connections_per_host=(
+                    conf.settings['reflector_server_max_connections_per_host'] or None),
+                max_inflight_bytes=conf.settings['reflector_server_max_inflight_bytes'] or None,
+                max_write_rate=conf.settings['reflector_server_max_write_rate'] or None)
+        self.capacity = capacity
+
+    def startFactory(self):
+        self.capacity.start()
+
+    def stopFactory(self):
+        self.capacity.stop()
+
+    def get_metrics(self):
+        metrics = self.capacity.get_metrics()
+        metrics['bookkeeping_queue'] = len(self.bookkeeper)
+        return metrics
 
     def buildProtocol(self, addr):
         log.debug('Creating a protocol for %s', addr)
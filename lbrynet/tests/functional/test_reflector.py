@@ -74,6 +74,10 @@ class TestReflector(unittest.TestCase):
 
         ## Setup reflector server classes ##
         self.server_db_dir, self.server_blob_dir = mk_db_and_blob_dir()
+        # the reflector server and the server's lbry file manager share a blob manager, like
+        # they do in the daemon
+        self.server_blob_manager = BlobManager.DiskBlobManager(
+                                    hash_announcer, self.server_blob_dir, self.server_db_dir)
         self.server_session = Session.Session(
             conf.settings['data_rate'],
             db_dir=self.server_db_dir,
@@ -81,6 +85,7 @@ class TestReflector(unittest.TestCase):
             peer_finder=peer_finder,
             hash_announcer=hash_announcer,
             blob_dir=self.server_blob_dir,
+            blob_manager=self.server_blob_manager,
             peer_port=5553,
             use_upnp=False,
             wallet=wallet,
@@ -88,8 +93,6 @@ class TestReflector(unittest.TestCase):
             external_ip="127.0.0.1"
         )
 
-        self.server_blob_manager = BlobManager.DiskBlobManager(
-                                    hash_announcer, self.server_blob_dir, self.server_db_dir)
         self.server_stream_info_manager = \
             EncryptedFileMetadataManager.DBEncryptedFileMetadataManager(self.server_db_dir)
 
@@ -102,7 +105,6 @@ class TestReflector(unittest.TestCase):
         d.addCallback(lambda _: EncryptedFileOptions.add_lbry_file_to_sd_identifier(sd_identifier))
         d.addCallback(lambda _: self.lbry_file_manager.setup())
         d.addCallback(lambda _: self.server_session.setup())
-        d.addCallback(lambda _: self.server_blob_manager.setup())
         d.addCallback(lambda _: self.server_stream_info_manager.setup())
         d.addCallback(lambda _: self.server_lbry_file_manager.setup())
 
@@ -164,7 +166,6 @@ class TestReflector(unittest.TestCase):
         d.addCallback(lambda _: self.stream_info_manager.stop())
 
         ## Close server classes ##
-        d.addCallback(lambda _: self.server_blob_manager.stop())
         d.addCallback(lambda _: self.server_lbry_file_manager.stop())
         d.addCallback(lambda _: self.server_session.shut_down())
         d.addCallback(lambda _: self.server_stream_info_manager.stop())
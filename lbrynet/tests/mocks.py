@@ -1,6 +1,12 @@
+import binascii
 import io
+import os
 
 from Crypto.PublicKey import RSA
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives.ciphers import Cipher, modes
+from cryptography.hazmat.primitives.ciphers.algorithms import AES
+from cryptography.hazmat.primitives.padding import PKCS7
 from twisted.internet import defer
 
 from lbrynet.core import PTCWallet
@@ -18,6 +24,99 @@ class FakeLBRYFile(object):
         self.stream_hash = stream_hash
         self.file_name = 'fake_lbry_file'
 
+
+def encrypt(data, key, iv):
+    padder = PKCS7(AES.block_size).padder()
+    encryptor = Cipher(AES(key), modes.CBC(iv), backend=default_backend()).encryptor()
+    return encryptor.update(padder.update(data) + padder.finalize()) + encryptor.finalize()
+
+
+class FakeBlob(object):
+    def __init__(self, blob_hash, data, verified):
+        self.blob_hash = blob_hash
+        self.data = data
+        self.verified = verified
+
+    def get_is_verified(self):
+        return self.verified
+
+    def open_for_reading(self):
+        return io.BytesIO(self.data)
+
+
+class FakeBlobManager(object):
+    def __init__(self):
+        self.blobs = {}
+
+    @property
+    def verified_blobs(self):
+        return [blob_hash for blob_hash, blob in self.blobs.iteritems() if blob.verified]
+
+    def get_blob(self, blob_hash, length=None):
+        return defer.succeed(self.blobs[blob_hash])
+
+
+class FakeStreamInfoManager(object):
+    def __init__(self, blob_infos):
+        self.blob_infos = blob_infos
+
+    def get_blobs_for_stream(self, stream_hash):
+        return defer.succeed(self.blob_infos)
+
+
+class FakeDownloadManager(object):
+    def __init__(self):
+        self.priority_blob_num = None
+
+    def prioritize_blob(self, blob_num):
+        self.priority_blob_num = blob_num
+
+
+class FakeDownloadingLBRYFile(object):
+    """
+    A lbry file of in memory blobs encrypted from plain_text, blob_size bytes of it per blob.
+    Only the blobs in downloaded are verified, the others are completed with complete_blob.
+    """
+
+    def __init__(self, plain_text, blob_size, downloaded):
+        self.sd_hash = 'ab' * 48
+        self.stream_hash = 'cd' * 48
+        self.file_name = 'fake_lbry_file'
+        self.key = os.urandom(16)
+        self.blob_manager = FakeBlobManager()
+        blob_infos = []
+        for blob_num, start in enumerate(range(0, len(plain_text), blob_size)):
+            iv = os.urandom(16)
+            data = encrypt(plain_text[start:start + blob_size], self.key, iv)
+            blob_hash = str(blob_num) * 96
+            self.blob_manager.blobs[blob_hash] = FakeBlob(blob_hash, data,
+                                                          blob_num in downloaded)
+            blob_infos.append((blob_hash, blob_num, binascii.hexlify(iv), len(data)))
+        # the stream terminator
+        blob_infos.append((None, len(blob_infos), binascii.hexlify(os.urandom(16)), 0))
+        self.stream_info_manager = FakeStreamInfoManager(blob_infos)
+        self.download_manager = FakeDownloadManager()
+        self.blob_completed_callbacks = []
+        self.started_callbacks = []
+
+    def add_blob_completed_callback(self, callback):
+        self.blob_completed_callbacks.append(callback)
+
+    def remove_blob_completed_callback(self, callback):
+        self.blob_completed_callbacks.remove(callback)
+
+    def add_started_callback(self, callback):
+        self.started_callbacks.append(callback)
+
+    def remove_started_callback(self, callback):
+        self.started_callbacks.remove(callback)
+
+    def complete_blob(self, blob_num):
+        self.blob_manager.blobs[str(blob_num) * 96].verified = True
+        for callback in self.blob_completed_callbacks:
+            callback(blob_num)
+
+
 class Node(object):
     def __init__(self, *args, **kwargs):
         pass
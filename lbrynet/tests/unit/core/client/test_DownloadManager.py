@@ -0,0 +1,83 @@
+from twisted.trial import unittest
+from twisted.internet import defer
+
+from lbrynet.core.BlobInfo import BlobInfo
+from lbrynet.core.client.DownloadManager import DownloadManager
+
+
+class FakeBlob(object):
+    def __init__(self, blob_hash, verified=False):
+        self.blob_hash = blob_hash
+        self.verified = verified
+
+    def get_is_verified(self):
+        return self.verified
+
+
+class FakeBlobManager(object):
+    def __init__(self, blobs):
+        self.blobs = blobs
+
+    def get_blob(self, blob_hash, length=None):
+        return defer.succeed(self.blobs[blob_hash])
+
+
+class FakeBlobInfoFinder(object):
+    def __init__(self, blob_infos):
+        self.blob_infos = blob_infos
+
+    def get_initial_blobs(self):
+        return defer.succeed(self.blob_infos)
+
+
+class FakeManager(object):
+    def __init__(self):
+        self.downloaded = []
+
+    def start(self):
+        return defer.succeed(True)
+
+    def stop(self):
+        return defer.succeed(True)
+
+    def blob_downloaded(self, blob, blob_num):
+        self.downloaded.append(blob_num)
+
+
+class DownloadManagerEventsTest(unittest.TestCase):
+    def setUp(self):
+        self.blobs = {'a': FakeBlob('a', verified=True), 'b': FakeBlob('b'), 'c': FakeBlob('c')}
+        self.download_manager = DownloadManager(FakeBlobManager(self.blobs))
+        self.download_manager.blob_info_finder = FakeBlobInfoFinder(
+            [BlobInfo('a', 0, 10), BlobInfo('b', 1, 10), BlobInfo('c', 2, 10)])
+        self.download_manager.progress_manager = FakeManager()
+        self.download_manager.connection_manager = FakeManager()
+        self.started = []
+        self.completed = []
+        self.download_manager.add_started_callback(lambda: self.started.append(True))
+        self.download_manager.add_blob_completed_callback(self.completed.append)
+
+    @defer.inlineCallbacks
+    def test_blob_completed_events(self):
+        yield self.download_manager.start_downloading()
+        self.assertEqual([True], self.started)
+        # the blob which was already complete
+        self.assertEqual([0], self.completed)
+
+        self.blobs['c'].verified = True
+        self.download_manager.blob_downloaded(self.blobs['c'])
+        self.assertEqual([2], self.download_manager.progress_manager.downloaded)
+        self.assertEqual([0, 2], self.completed)
+
+        # each blob is only reported once
+        self.download_manager.blob_downloaded(self.blobs['c'])
+        self.download_manager.blob_downloaded(FakeBlob('not in the stream', verified=True))
+        self.assertEqual([0, 2], self.completed)
+
+    @defer.inlineCallbacks
+    def test_prioritize_blob(self):
+        yield self.download_manager.start_downloading()
+        self.download_manager.progress_manager.needed_blobs = lambda: [self.blobs['b'],
+                                                                       self.blobs['c']]
+        self.download_manager.prioritize_blob(2)
+        self.assertEqual([self.blobs['c'], self.blobs['b']], self.download_manager.needed_blobs())
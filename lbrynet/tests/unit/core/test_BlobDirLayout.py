@@ -0,0 +1,110 @@
+import os
+import shutil
+import tempfile
+
+from twisted.trial import unittest
+from twisted.internet import defer
+
+from lbrynet import conf
+from lbrynet.blob import BlobFile
+from lbrynet.blob.layout import BlobDirLayout, read_shard_depth
+from lbrynet.core.BlobManager import DiskBlobManager
+from lbrynet.core.HashAnnouncer import DummyHashAnnouncer
+from lbrynet.db_migrator.migrate_blob_dir import migrate_blob_dir
+from lbrynet.tests.util import random_lbry_hash
+
+
+class BlobDirLayoutTest(unittest.TestCase):
+    def setUp(self):
+        self.blob_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.blob_dir)
+
+    def _write_blobs(self, layout, count):
+        blob_hashes = [random_lbry_hash() for _ in range(count)]
+        for blob_hash in blob_hashes:
+            with open(layout.prepare(blob_hash), 'wb') as blob_file:
+                blob_file.write('x')
+        return blob_hashes
+
+    def test_sharded_path(self):
+        layout = BlobDirLayout(self.blob_dir, 2)
+        blob_hash = random_lbry_hash()
+        self.assertEqual(os.path.join(self.blob_dir, blob_hash[:2], blob_hash[2:4], blob_hash),
+                         layout.path(blob_hash))
+        self.assertEqual(os.path.join(self.blob_dir, blob_hash),
+                         BlobDirLayout(self.blob_dir).path(blob_hash))
+
+    def test_scan_finds_blobs_at_any_depth(self):
+        flat = self._write_blobs(BlobDirLayout(self.blob_dir), 3)
+        sharded = self._write_blobs(BlobDirLayout(self.blob_dir, 2), 3)
+        open(os.path.join(self.blob_dir, 'not_a_blob'), 'w').close()
+        self.assertEqual(set(flat + sharded), set(BlobDirLayout(self.blob_dir).scan()))
+
+    def test_legacy_lookup(self):
+        blob_hash = self._write_blobs(BlobDirLayout(self.blob_dir), 1)[0]
+        self.assertIsNone(BlobDirLayout(self.blob_dir, 2).find(blob_hash))
+        layout = BlobDirLayout(self.blob_dir, 2, legacy_shard_depth=0)
+        self.assertEqual(os.path.join(self.blob_dir, blob_hash), layout.find(blob_hash))
+        blob = BlobFile(self.blob_dir, blob_hash, layout=layout)
+        self.assertTrue(blob.verified)
+
+    @defer.inlineCallbacks
+    def test_blob_made_during_migration(self):
+        blob_hash = self._write_blobs(BlobDirLayout(self.blob_dir), 1)[0]
+        layout = BlobDirLayout(self.blob_dir, 2, legacy_shard_depth=0)
+        blob = BlobFile(self.blob_dir, blob_hash, layout=layout)
+        self.assertEqual(os.path.join(self.blob_dir, blob_hash), blob.file_path)
+        migrate_blob_dir(self.blob_dir, 2)
+        layout.legacy_shard_depth = None
+
+        reader = blob.open_for_reading()
+        self.assertEqual('x', reader.read())
+        reader.close()
+        yield blob.delete()
+        self.assertEqual({}, layout.scan())
+
+    def test_migration(self):
+        blob_hashes = self._write_blobs(BlobDirLayout(self.blob_dir), 10)
+        self.assertEqual(10, migrate_blob_dir(self.blob_dir, 2))
+        self.assertEqual(2, read_shard_depth(self.blob_dir))
+        layout = BlobDirLayout(self.blob_dir, 2)
+        for blob_hash in blob_hashes:
+            self.assertTrue(os.path.isfile(layout.path(blob_hash)))
+        self.assertEqual(0, migrate_blob_dir(self.blob_dir, 2))
+
+        # and back to flat, the empty shard directories are removed
+        self.assertEqual(10, migrate_blob_dir(self.blob_dir, 0))
+        self.assertEqual(0, read_shard_depth(self.blob_dir))
+        self.assertEqual(set(blob_hashes + ['.layout']), set(os.listdir(self.blob_dir)))
+
+
+class ShardedBlobManagerTest(unittest.TestCase):
+    def setUp(self):
+        conf.initialize_settings()
+        conf.settings['blob_dir_shard_depth'] = 2
+        self.blob_dir = tempfile.mkdtemp()
+        self.db_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.blob_dir)
+        shutil.rmtree(self.db_dir)
+        conf.settings = None
+
+    @defer.inlineCallbacks
+    def test_blob_manager_migrates_flat_blob_dir(self):
+        blob_hash = random_lbry_hash()
+        with open(os.path.join(self.blob_dir, blob_hash), 'wb') as blob_file:
+            blob_file.write('x')
+        blob_manager = DiskBlobManager(DummyHashAnnouncer(), self.blob_dir, self.db_dir)
+        yield blob_manager.setup()
+        blob = yield blob_manager.get_blob(blob_hash)
+        self.assertTrue(blob.verified)
+        yield blob_manager._layout_migration
+        self.assertIsNone(blob_manager.layout.legacy_shard_depth)
+        self.assertEqual(blob_manager.layout.path(blob_hash), blob_manager.layout.find(blob_hash))
+        reader = blob.open_for_reading()
+        self.assertEqual('x', reader.read())
+        reader.close()
+        yield blob_manager.stop()
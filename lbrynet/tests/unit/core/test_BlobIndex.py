@@ -0,0 +1,20 @@
+from twisted.trial import unittest
+
+from lbrynet.core.BlobIndex import VerifiedBlobIndex
+from lbrynet.tests.util import random_lbry_hash
+
+
+class VerifiedBlobIndexTest(unittest.TestCase):
+    def test_add_and_remove(self):
+        index = VerifiedBlobIndex()
+        blob_hashes = [random_lbry_hash() for _ in range(10)]
+        index.load(blob_hashes[:5])
+        for blob_hash in blob_hashes[5:]:
+            index.add(blob_hash)
+        index.remove(blob_hashes[0])
+        self.assertEqual(9, len(index))
+        self.assertEqual(blob_hashes[1:3], index.filter_verified(blob_hashes[:3]))
+        self.assertEqual(blob_hashes[:1], index.filter_missing(blob_hashes[:3]))
+        for blob_hash in blob_hashes[1:]:
+            self.assertIn(blob_hash, index)
+        self.assertNotIn(blob_hashes[0], index)
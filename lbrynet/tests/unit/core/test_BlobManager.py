@@ -133,3 +133,48 @@ class BlobManagerTest(unittest.TestCase):
         count = yield self.bm.count_should_announce_blobs()
         self.assertEqual(0, count)
 
+
+    @defer.inlineCallbacks
+    def test_completed_blobs_uses_index(self):
+        blob_hash = yield self._create_and_add_blob()
+        missing_hash = random_lbry_hash()
+        self.bm.blobs.clear()
+        completed = yield self.bm.completed_blobs([blob_hash, missing_hash])
+        self.assertEqual([blob_hash], completed)
+        missing = yield self.bm.missing_blobs([blob_hash, missing_hash])
+        self.assertEqual([missing_hash], missing)
+        # answering shouldn't have loaded either blob
+        self.assertEqual({}, self.bm.blobs)
+
+        # the index is rebuilt from the database on startup
+        self.bm.stop()
+        self.bm = DiskBlobManager(DummyHashAnnouncer(), self.blob_dir, self.db_dir)
+        yield self.bm.setup()
+        self.assertTrue(self.bm.is_blob_verified(blob_hash))
+
+        yield self.bm.delete_blobs([blob_hash])
+        self.assertFalse(self.bm.is_blob_verified(blob_hash))
+
+    @defer.inlineCallbacks
+    def test_get_reflected_blobs(self):
+        yield self.bm.setup()
+        blob_hashes = [random_lbry_hash() for _ in range(1500)]
+        yield self.bm.save_reflected_blobs(blob_hashes[:1000], 'reflector', 100)
+        yield self.bm.save_reflected_blobs(blob_hashes[1000:1200], 'reflector', 200)
+        yield self.bm.save_reflected_blobs(blob_hashes[1200:], 'other reflector', 200)
+        reflected = yield self.bm.get_reflected_blobs(blob_hashes, 'reflector')
+        self.assertEqual(set(blob_hashes[:1200]), reflected)
+        reflected = yield self.bm.get_reflected_blobs(blob_hashes, 'reflector', 150)
+        self.assertEqual(set(blob_hashes[1000:1200]), reflected)
+
+    @defer.inlineCallbacks
+    def test_blobs_changed_callback(self):
+        changed = []
+        self.bm.add_blobs_changed_callback(changed.extend)
+        blob_hash = yield self._create_and_add_blob()
+        self.assertEqual([blob_hash], changed)
+        yield self.bm.delete_blobs([blob_hash])
+        self.assertEqual([blob_hash, blob_hash], changed)
+        self.bm.remove_blobs_changed_callback(changed.extend)
+        yield self._create_and_add_blob()
+        self.assertEqual(2, len(changed))
@@ -0,0 +1,128 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+
+from twisted.trial import unittest
+from twisted.internet import defer
+
+from lbrynet import conf
+from lbrynet.core.BlobManager import DiskBlobManager
+from lbrynet.core.HashAnnouncer import DummyHashAnnouncer
+from lbrynet.core.cryptoutils import get_lbry_hash_obj
+from lbrynet.tests.util import random_lbry_hash
+
+
+def make_blob_file(blob_dir, data):
+    hashsum = get_lbry_hash_obj()
+    hashsum.update(data)
+    blob_hash = hashsum.hexdigest()
+    with open(os.path.join(blob_dir, blob_hash), 'wb') as blob_file:
+        blob_file.write(data)
+    return blob_hash
+
+
+class BlobScrubberTest(unittest.TestCase):
+    @defer.inlineCallbacks
+    def setUp(self):
+        conf.initialize_settings()
+        self.blob_dir = tempfile.mkdtemp()
+        self.db_dir = tempfile.mkdtemp()
+        self.bm = DiskBlobManager(DummyHashAnnouncer(), self.blob_dir, self.db_dir)
+        self.scrubber = self.bm.scrubber
+        self.scrubber.max_bytes_per_second = None
+        yield self.bm.setup()
+
+    @defer.inlineCallbacks
+    def tearDown(self):
+        yield self.bm.stop()
+        shutil.rmtree(self.blob_dir)
+        shutil.rmtree(self.db_dir)
+        conf.settings = None
+
+    @defer.inlineCallbacks
+    def _add_blob(self, data):
+        blob_hash = make_blob_file(self.blob_dir, data)
+        yield self.bm._add_completed_blob(blob_hash, len(data), 0, False)
+        self.bm.verified_blobs.add(blob_hash)
+        defer.returnValue(blob_hash)
+
+    @defer.inlineCallbacks
+    def test_reconcile(self):
+        good = yield self._add_blob('good')
+        missing = yield self._add_blob('missing')
+        os.remove(os.path.join(self.blob_dir, missing))
+        truncated = yield self._add_blob('truncated')
+        with open(os.path.join(self.blob_dir, truncated), 'wb') as blob_file:
+            blob_file.write('trunc')
+        orphan = make_blob_file(self.blob_dir, 'orphan')
+        bad_orphan = random_lbry_hash()
+        with open(os.path.join(self.blob_dir, bad_orphan), 'wb') as blob_file:
+            blob_file.write('garbage')
+
+        yield self.scrubber.reconcile()
+        blob_lengths = yield self.bm.get_all_blob_lengths()
+        self.assertEqual({good: 4, orphan: 6}, blob_lengths)
+        self.assertEqual(set([good, orphan]), set(self.bm.verified_blobs))
+        self.assertEqual(set([good, orphan]), set(self.bm.layout.scan()))
+
+    @defer.inlineCallbacks
+    def test_reconcile_blob_completed_while_reconciling(self):
+        good = yield self._add_blob('good')
+        scan, get_all_blob_lengths = self.bm.layout.scan, self.bm.get_all_blob_lengths
+        completed = []
+
+        def complete_blob(result):
+            # a download finishes between reading the database and scanning the blob directory
+            if not completed:
+                completed.append(make_blob_file(self.blob_dir, 'completed'))
+                db = sqlite3.connect(self.bm.db_file)
+                with db:
+                    db.execute("insert into blobs (blob_hash, blob_length) values (?, 9)",
+                               (completed[0],))
+                db.close()
+            return result
+
+        self.bm.layout.scan = lambda: complete_blob(scan())
+        self.bm.get_all_blob_lengths = lambda: get_all_blob_lengths().addCallback(complete_blob)
+        missing, _, _ = yield self.scrubber.reconcile()
+
+        self.assertEqual([], missing)
+        blob_lengths = yield get_all_blob_lengths()
+        self.assertEqual({good: 4, completed[0]: 9}, blob_lengths)
+
+    @defer.inlineCallbacks
+    def test_reconcile_during_layout_migration(self):
+        blob_hash = yield self._add_blob('being moved')
+        moving_path = os.path.join(self.db_dir, blob_hash)
+        os.rename(os.path.join(self.blob_dir, blob_hash), moving_path)
+        self.bm._layout_migration = migration = defer.Deferred()
+
+        reconciling = self.scrubber.reconcile()
+        self.assertFalse(reconciling.called)
+        os.rename(moving_path, os.path.join(self.blob_dir, blob_hash))
+        self.bm._layout_migration = None
+        migration.callback(None)
+        missing, _, _ = yield reconciling
+
+        self.assertEqual([], missing)
+        blob_lengths = yield self.bm.get_all_blob_lengths()
+        self.assertEqual({blob_hash: 11}, blob_lengths)
+
+    @defer.inlineCallbacks
+    def test_verify_blobs(self):
+        good = yield self._add_blob('good')
+        corrupt = yield self._add_blob('corrupt')
+        with open(os.path.join(self.blob_dir, corrupt), 'wb') as blob_file:
+            blob_file.write('CORRUPT')
+
+        verified, corrupted = yield self.scrubber.verify_blobs()
+        self.assertEqual((1, 1), (verified, corrupted))
+        self.assertFalse(self.bm.is_blob_verified(corrupt))
+        self.assertFalse(os.path.isfile(os.path.join(self.blob_dir, corrupt)))
+
+        # the good blob was just verified, so it isn't due again
+        to_verify = yield self.bm.get_blobs_to_verify(verified_before=0)
+        self.assertEqual([], to_verify)
+        to_verify = yield self.bm.get_blobs_to_verify()
+        self.assertEqual([good], to_verify)
@@ -0,0 +1,103 @@
+import shutil
+import tempfile
+
+from twisted.trial import unittest
+from twisted.internet import defer
+
+from lbrynet import conf
+from lbrynet.core.Peer import Peer, DecayingAverage
+from lbrynet.core.PeerManager import PeerManager
+
+
+class DecayingAverageTest(unittest.TestCase):
+    def test_first_sample_is_the_value(self):
+        average = DecayingAverage(half_life=60)
+        self.assertEqual(None, average.get())
+        average.update(10.0, now=0)
+        self.assertEqual(10.0, average.get())
+
+    def test_old_samples_decay(self):
+        fresh = DecayingAverage(half_life=60)
+        fresh.update(10.0, now=0)
+        fresh.update(20.0, now=1)
+        stale = DecayingAverage(half_life=60)
+        stale.update(10.0, now=0)
+        stale.update(20.0, now=600)
+        self.assertTrue(10.0 < fresh.get() < stale.get() < 20.0)
+
+
+class PeerScoreTest(unittest.TestCase):
+    def test_backoff_grows_with_failures(self):
+        peer = Peer('1.2.3.4', 3333)
+        peer.report_down()
+        first = peer.attempt_connection_at
+        peer.report_down()
+        self.assertTrue(peer.attempt_connection_at > first)
+        self.assertFalse(peer.is_available())
+        peer.report_up()
+        self.assertTrue(peer.is_available())
+        self.assertEqual(0, peer.down_count)
+
+    def test_small_transfers_are_ignored(self):
+        peer = Peer('1.2.3.4', 3333)
+        peer.report_transfer(100, 1.0)
+        self.assertEqual(None, peer.throughput.get())
+        peer.report_transfer(2 ** 20, 1.0)
+        self.assertEqual(2 ** 20, peer.throughput.get())
+
+    def test_latency_lowers_expected_throughput(self):
+        near = Peer('1.2.3.4', 3333)
+        far = Peer('5.6.7.8', 3333)
+        for peer in (near, far):
+            peer.report_transfer(2 ** 20, 1.0)
+        near.report_connect_latency(0.01)
+        far.report_connect_latency(2.0)
+        self.assertTrue(near.expected_throughput(1.0) > far.expected_throughput(1.0))
+
+
+class PeerSelectionTest(unittest.TestCase):
+    def setUp(self):
+        conf.initialize_settings()
+
+    def tearDown(self):
+        conf.settings = None
+
+    def test_fastest_peers_are_chosen(self):
+        from lbrynet.core.client.ConnectionManager import ConnectionManager
+        connection_manager = ConnectionManager(None, None, [], [])
+        connection_manager.peer_exploration_rate = 0.0
+        peers = [Peer('127.0.0.1', port) for port in range(3333, 3343)]
+        for i, peer in enumerate(peers):
+            peer.report_transfer(2 ** 20 * (i + 1), 1.0)
+        chosen = connection_manager.return_best_peers_not_connected_to(peers, 3)
+        self.assertEqual(list(reversed(peers[-3:])), chosen)
+
+
+class PeerManagerPersistenceTest(unittest.TestCase):
+    def setUp(self):
+        self.db_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.db_dir)
+
+    @defer.inlineCallbacks
+    def test_measurements_survive_restart(self):
+        peer_manager = PeerManager(self.db_dir)
+        yield peer_manager.setup()
+        peer = peer_manager.get_peer('1.2.3.4', 3333)
+        peer.report_up()
+        peer.report_transfer(2 ** 20, 2.0)
+        peer.report_connect_latency(0.5)
+        yield peer_manager.stop()
+
+        peer_manager = PeerManager(self.db_dir)
+        yield peer_manager.setup()
+        peer = peer_manager.get_peer('1.2.3.4', 3333)
+        self.assertEqual(2 ** 19, peer.throughput.get())
+        self.assertEqual(0.5, peer.connect_latency.get())
+        yield peer_manager.stop()
+
+    def test_get_peer_returns_same_object(self):
+        peer_manager = PeerManager()
+        self.assertIs(peer_manager.get_peer('1.2.3.4', 3333),
+                      peer_manager.get_peer('1.2.3.4', 3333))
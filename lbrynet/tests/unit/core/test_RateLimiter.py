@@ -0,0 +1,106 @@
+from twisted.trial import unittest
+
+from lbrynet.core.RateLimiter import RateLimiter, TokenBucket, REFLECTOR_TRAFFIC
+
+
+class FakePeer(object):
+    def __init__(self, host):
+        self.host = host
+
+
+class FakeProtocol(object):
+    def __init__(self, host='1.2.3.4', rate_limit_class=None):
+        self.peer = FakePeer(host)
+        if rate_limit_class is not None:
+            self.rate_limit_class = rate_limit_class
+        self.upload_throttled = False
+        self.download_throttled = False
+
+    def throttle_upload(self):
+        self.upload_throttled = True
+
+    def unthrottle_upload(self):
+        self.upload_throttled = False
+
+    def throttle_download(self):
+        self.download_throttled = True
+
+    def unthrottle_download(self):
+        self.download_throttled = False
+
+
+class TokenBucketTest(unittest.TestCase):
+    def test_unlimited_bucket_is_never_empty(self):
+        bucket = TokenBucket()
+        bucket.consume(10 ** 9)
+        self.assertFalse(bucket.is_empty())
+
+    def test_refill_is_capped_at_burst(self):
+        bucket = TokenBucket(100, burst_seconds=1)
+        bucket.consume(150)
+        self.assertTrue(bucket.is_empty())
+        bucket.refill(1)
+        self.assertFalse(bucket.is_empty())
+        bucket.refill(10)
+        self.assertEqual(100, bucket.tokens)
+
+
+class RateLimiterTest(unittest.TestCase):
+    def test_only_the_heavy_connection_is_throttled(self):
+        rate_limiter = RateLimiter(max_dl_bytes=1000)
+        heavy, light = FakeProtocol('1.1.1.1'), FakeProtocol('2.2.2.2')
+        rate_limiter.register_protocol(heavy)
+        rate_limiter.register_protocol(light)
+        rate_limiter.report_dl_bytes(100, light)
+        rate_limiter.report_dl_bytes(1000, heavy)
+        self.assertTrue(heavy.download_throttled)
+        self.assertFalse(light.download_throttled)
+        self.assertEqual(1100, rate_limiter.total_dl_bytes)
+
+    def test_throttled_connection_resumes_after_refill(self):
+        rate_limiter = RateLimiter(max_ul_bytes=1000)
+        protocol = FakeProtocol()
+        rate_limiter.register_protocol(protocol)
+        rate_limiter.report_ul_bytes(600, protocol)
+        self.assertTrue(protocol.upload_throttled)
+        rate_limiter.upload.tick(0.1)
+        self.assertTrue(protocol.upload_throttled)
+        rate_limiter.upload.tick(1.0)
+        self.assertFalse(protocol.upload_throttled)
+
+    def test_busy_connections_share_the_limit_by_weight(self):
+        rate_limiter = RateLimiter(max_ul_bytes=4000)
+        peer_upload = FakeProtocol('1.1.1.1')
+        reflector_upload = FakeProtocol('2.2.2.2', REFLECTOR_TRAFFIC)
+        for protocol in (peer_upload, reflector_upload):
+            rate_limiter.register_protocol(protocol)
+            rate_limiter.report_ul_bytes(1, protocol)
+        rate_limiter.upload.tick(0.1)
+        self.assertEqual(3000, rate_limiter.upload.shares[peer_upload].rate)
+        self.assertEqual(1000, rate_limiter.upload.shares[reflector_upload].rate)
+
+    def test_per_peer_limit(self):
+        rate_limiter = RateLimiter(max_peer_dl_bytes=1000)
+        first, second = FakeProtocol('1.1.1.1'), FakeProtocol('1.1.1.1')
+        other = FakeProtocol('2.2.2.2')
+        for protocol in (first, second, other):
+            rate_limiter.register_protocol(protocol)
+        rate_limiter.report_dl_bytes(400, first)
+        rate_limiter.report_dl_bytes(400, other)
+        self.assertFalse(first.download_throttled)
+        self.assertFalse(other.download_throttled)
+        rate_limiter.report_dl_bytes(200, second)
+        self.assertTrue(second.download_throttled)
+        rate_limiter.unregister_protocol(first)
+        rate_limiter.unregister_protocol(second)
+        self.assertNotIn('1.1.1.1', rate_limiter.download.peer_buckets)
+
+    def test_removing_the_limit_unthrottles(self):
+        rate_limiter = RateLimiter(max_dl_bytes=10)
+        protocol = FakeProtocol()
+        rate_limiter.register_protocol(protocol)
+        rate_limiter.report_dl_bytes(100, protocol)
+        self.assertTrue(protocol.download_throttled)
+        rate_limiter.set_dl_limit(None)
+        rate_limiter.download.tick(0.1)
+        self.assertFalse(protocol.download_throttled)
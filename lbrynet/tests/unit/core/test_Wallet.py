@@ -8,9 +8,12 @@ from collections import defaultdict
 from twisted.trial import unittest
 from twisted.internet import threads, defer
 
+from lbrynet import conf
 from lbrynet.core.Error import InsufficientFundsError
 from lbrynet.core.Wallet import Wallet, LBRYumWallet, ReservedPoints, InMemoryStorage
+from lbrynet.core.Wallet import SqliteStorage, DecodedClaimCache
 from lbryum.commands import Commands
+from lbryschema.claim import ClaimDict
 
 
 test_metadata = {
@@ -259,3 +262,122 @@ class WalletTest(unittest.TestCase):
         # no keyring available, so ValueError is expected
         with self.assertRaises(ValueError):
             wallet.encrypt_wallet("secret2", True)
+
+
+class ResolvingWallet(Wallet):
+    def __init__(self, storage):
+        Wallet.__init__(self, storage)
+        self.requests = []
+        self.hold_results = False
+        self.held_results = []
+
+    def _get_values_for_uris(self, page, page_size, *uris):
+        self.requests.append(uris)
+        results = {}
+        for i, uri in enumerate(uris):
+            if uri == 'unclaimed':
+                results[uri] = {'error': 'name is not claimed', 'name': uri}
+                continue
+            results[uri] = {'claim': {
+                'claim_id': uri.encode('hex').ljust(40, '0'),
+                'name': uri,
+                'txid': 'a' * 64,
+                'nout': i,
+                'value': ClaimDict.load_dict(test_claim_dict).serialized.encode('hex'),
+                'claim_sequence': 1,
+                'address': 'address',
+                'height': 1,
+                'amount': 1.0,
+                'supports': [],
+                'has_signature': False
+            }}
+        if self.hold_results:
+            d = defer.Deferred()
+            self.held_results.append((d, results))
+            return d
+        return defer.succeed(results)
+
+
+class ResolveTest(unittest.TestCase):
+    @defer.inlineCallbacks
+    def setUp(self):
+        conf.initialize_settings()
+        self.db_dir = tempfile.mkdtemp()
+        self.wallet = ResolvingWallet(SqliteStorage(self.db_dir))
+        yield self.wallet._storage.load()
+
+    def tearDown(self):
+        self.wallet._storage.db.close()
+        shutil.rmtree(self.db_dir)
+
+    @defer.inlineCallbacks
+    def test_only_resolve_uncached_uris(self):
+        result = yield self.wallet.resolve('one', 'two', 'unclaimed')
+        self.assertEqual([('one', 'two', 'unclaimed')], self.wallet.requests)
+        self.assertEqual('one', result['one']['claim']['name'])
+        self.assertIn('error', result['unclaimed'])
+
+        result = yield self.wallet.resolve('one', 'two', 'three')
+        self.assertEqual(('three', ), self.wallet.requests[-1])
+        self.assertEqual(['one', 'three', 'two'], sorted(result))
+        self.assertEqual(test_claim_dict['claimType'], result['two']['claim']['value']['claimType'])
+        self.assertEqual(result['two']['claim']['claim_id'], 'two'.encode('hex').ljust(40, '0'))
+
+        yield self.wallet.resolve('one', check_cache=False)
+        self.assertEqual(('one', ), self.wallet.requests[-1])
+
+    @defer.inlineCallbacks
+    def test_keep_decoded_claims(self):
+        claim_id = 'one'.encode('hex').ljust(40, '0')
+        storage = self.wallet._storage
+        yield self.wallet.resolve('one')
+        self.assertNotIn(claim_id, storage.claim_cache)
+        yield self.wallet.resolve('one')
+        self.assertIn(claim_id, storage.claim_cache)
+        cached = yield storage.get_cached_claim(claim_id)
+        self.assertEqual('one', cached['name'])
+        # a newly resolved claim replaces the decoded one
+        yield self.wallet.resolve('one', check_cache=False)
+        self.assertNotIn(claim_id, storage.claim_cache)
+
+    @defer.inlineCallbacks
+    def test_resolve_in_batches(self):
+        self.wallet.RESOLVE_BATCH_SIZE = 2
+        result = yield self.wallet.resolve('one', 'two', 'three')
+        self.assertEqual([('one', 'two'), ('three', )], self.wallet.requests)
+        self.assertEqual(3, len(result))
+
+    @defer.inlineCallbacks
+    def test_coalesce_resolves(self):
+        self.wallet.hold_results = True
+        d1 = self.wallet.resolve('one', 'two', check_cache=False)
+        d2 = self.wallet.resolve('two', 'three', check_cache=False)
+        self.assertEqual([('one', 'two'), ('three', )], self.wallet.requests)
+        for d, results in self.wallet.held_results:
+            d.callback(results)
+        first = yield d1
+        second = yield d2
+        self.assertEqual(['one', 'two'], sorted(first))
+        self.assertEqual(['three', 'two'], sorted(second))
+        self.assertEqual(first['two'], second['two'])
+
+
+class DecodedClaimCacheTest(unittest.TestCase):
+    def test_drop_least_recently_used(self):
+        cache = DecodedClaimCache(2, 60)
+        cache.add('a', 1)
+        cache.add('b', 2)
+        self.assertEqual(1, cache.get('a'))
+        cache.add('c', 3)
+        self.assertEqual(2, len(cache))
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(1, cache.get('a'))
+        self.assertEqual(3, cache.get('c'))
+        cache.remove('a')
+        self.assertIsNone(cache.get('a'))
+
+    def test_drop_expired(self):
+        cache = DecodedClaimCache(2, -1)
+        cache.add('a', 1)
+        self.assertIsNone(cache.get('a'))
+        self.assertNotIn('a', cache)
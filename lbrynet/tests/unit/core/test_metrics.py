@@ -0,0 +1,70 @@
+from twisted.trial import unittest
+from twisted.internet import task
+
+from lbrynet.core import metrics
+
+
+class MetricsTest(unittest.TestCase):
+    def setUp(self):
+        self.registry = metrics.Registry()
+
+    def test_counter_and_gauge(self):
+        counter = metrics.Counter('test_total', 'A counter', labels=('method',),
+                                  registry=self.registry)
+        gauge = metrics.Gauge('test_gauge', 'A gauge', registry=self.registry)
+        counter.labels('store').inc()
+        counter.labels('store').inc(2)
+        counter.labels('ping').inc()
+        gauge.set(5)
+        gauge.dec()
+        self.assertEqual(
+            '# HELP test_total A counter\n'
+            '# TYPE test_total counter\n'
+            'test_total{method="ping"} 1\n'
+            'test_total{method="store"} 3\n'
+            '# HELP test_gauge A gauge\n'
+            '# TYPE test_gauge gauge\n'
+            'test_gauge 4\n', self.registry.render())
+        self.assertRaises(ValueError, counter.labels)
+
+    def test_histogram(self):
+        histogram = metrics.Histogram('test_seconds', 'A histogram', buckets=(1, .1),
+                                      registry=self.registry)
+        for value in (.05, .5, .5, 3):
+            histogram.observe(value)
+        self.assertEqual(
+            '# HELP test_seconds A histogram\n'
+            '# TYPE test_seconds histogram\n'
+            'test_seconds_bucket{le="0.1"} 1\n'
+            'test_seconds_bucket{le="1"} 3\n'
+            'test_seconds_bucket{le="+Inf"} 4\n'
+            'test_seconds_sum 4.05\n'
+            'test_seconds_count 4\n', self.registry.render())
+
+    def test_collector(self):
+        gauge = metrics.Gauge('test_peer', 'A labelled gauge', labels=('peer',),
+                              registry=self.registry)
+        peers = {'1.2.3.4:3333': 10, 'a "quoted" peer': 20}
+
+        def collect():
+            gauge.clear()
+            for peer, value in peers.iteritems():
+                gauge.labels(peer).set(value)
+
+        self.registry.add_collector(collect)
+        self.assertIn('test_peer{peer="a \\"quoted\\" peer"} 20\n', self.registry.render())
+        del peers['a "quoted" peer']
+        self.assertNotIn('quoted', self.registry.render())
+
+    def test_reactor_lag(self):
+        clock = task.Clock()
+        monitor = metrics.ReactorLagMonitor(interval=1, clock=clock)
+        lag = metrics.REACTOR_LAG.labels()
+        count, total = lag.count, lag.sum
+        monitor.start()
+        clock.advance(1)
+        clock.advance(1.5)
+        self.assertEqual(count + 2, lag.count)
+        self.assertAlmostEqual(total + .5, lag.sum)
+        monitor.stop()
+        self.assertEqual([], clock.getDelayedCalls())
@@ -0,0 +1,79 @@
+import threading
+import time
+
+from twisted.trial import unittest
+from twisted.internet import defer, task
+
+from lbrynet.core.reactor_monitor import SlowCallMonitor, profile_reactor, qualified_name
+
+
+def block():
+    time.sleep(0.1)
+
+
+class SlowCallMonitorTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = task.Clock()
+        self.monitor = SlowCallMonitor(threshold=0.05)
+        self.original_add_callbacks = defer.Deferred.addCallbacks
+        self.addCleanup(self.monitor.uninstall)
+
+    def install(self):
+        # installed by the test rather than in setUp, otherwise the test itself runs in a
+        # callback trial added after setUp, and only that outermost call would be timed
+        self.monitor.install(self.clock)
+
+    def test_slow_callback(self):
+        self.install()
+
+        def block_and_sample():
+            block()
+            # the sampler thread may not have had a turn yet
+            self.monitor.sample_stack()
+
+        d = defer.Deferred()
+        d.addCallback(lambda _: None)
+        d.addCallback(lambda _: block_and_sample())
+        d.callback(None)
+        self.assertEqual(1, len(self.monitor.slow_calls))
+        slow_call = self.monitor.slow_calls[0]
+        self.assertIn('<lambda>', slow_call['name'])
+        self.assertTrue(slow_call['seconds'] >= 0.1)
+        self.assertTrue([line for line in slow_call['stack'] if 'in block' in line])
+
+    def test_slow_call_later(self):
+        self.install()
+        self.clock.callLater(1, block)
+        self.clock.callLater(2, lambda: None)
+        self.clock.advance(2)
+        self.assertEqual(1, len(self.monitor.slow_calls))
+        self.assertIn('test_reactor_monitor.block', self.monitor.slow_calls[0]['name'])
+
+    def test_uninstall(self):
+        self.install()
+        self.monitor.uninstall()
+        self.assertEqual(self.original_add_callbacks, defer.Deferred.addCallbacks)
+        self.clock.callLater(1, block)
+        self.clock.advance(1)
+        self.assertEqual(0, len(self.monitor.slow_calls))
+
+    def test_reinstall(self):
+        self.install()
+        sampler = self.monitor._sampler
+        self.monitor.uninstall()
+        self.assertFalse(sampler.is_alive())
+        self.install()
+        self.assertTrue(self.monitor._sampler.is_alive())
+        self.assertEqual(1, len([t for t in threading.enumerate()
+                                 if t.name == 'slow call sampler']))
+
+    def test_qualified_name(self):
+        self.assertTrue(qualified_name(self.monitor.install).startswith(
+            'lbrynet.core.reactor_monitor.SlowCallMonitor.install ('))
+
+
+class ProfileReactorTest(unittest.TestCase):
+    @defer.inlineCallbacks
+    def test_profile(self):
+        stats = yield profile_reactor(0.01, limit=5)
+        self.assertIn('function calls', stats)
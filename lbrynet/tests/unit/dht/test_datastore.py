@@ -104,6 +104,25 @@ class DictDataStoreTest(unittest.TestCase):
             'DataStore deleted an unexpired value! Value %s, publish time %s, current time %s' %
             ('val4', str(now), str(now)))
 
+    def testPublisherIndex(self):
+        now = int(time.time())
+        td = lbrynet.dht.constants.dataExpireTimeout + 100
+        for key, value in self.cases:
+            self.ds.addPeerToBlob(key, value, now, now, 'node1')
+        self.ds.addPeerToBlob(self.cases[3][0], 'test7', now - td, now - td, 'node2')
+        self.assertEqual(set(['node1', 'node2']), set(self.ds.getPublishers()))
+        self.assertEqual(set(key for key, _ in self.cases),
+                         set(self.ds.getBlobsForPublisher('node1')))
+        self.assertEqual([self.cases[3][0]], self.ds.getBlobsForPublisher('node2'))
+
+        self.ds.removeExpiredPeers()
+        self.assertEqual(['node1'], self.ds.getPublishers())
+        self.assertEqual([], self.ds.getBlobsForPublisher('node2'))
+
+        self.ds.removePeer('test4')
+        self.assertEqual(set([self.cases[0][0], self.cases[4][0]]),
+                         set(self.ds.getBlobsForPublisher('node1')))
+
 #        # First write with fake values
 #        for key, value in self.cases:
 #            except Exception:
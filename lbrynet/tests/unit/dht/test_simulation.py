@@ -0,0 +1,78 @@
+from twisted.internet import defer
+from twisted.trial import unittest
+
+from lbrynet.dht import constants
+from lbrynet.dht.simulation import SimulatedClock, SimulatedNetwork
+
+
+class SimulatedClockTest(unittest.TestCase):
+    def test_calls_run_in_order(self):
+        clock = SimulatedClock()
+        calls = []
+        clock.callLater(2, calls.append, 2)
+        clock.callLater(1, calls.append, 1)
+        cancelled = clock.callLater(1.5, calls.append, 1.5)
+        cancelled.cancel()
+        clock.advance(1)
+        self.assertEqual(calls, [1])
+        self.assertEqual(clock.seconds(), 1)
+        clock.advance(5)
+        self.assertEqual(calls, [1, 2])
+        self.assertEqual(clock.seconds(), 6)
+        self.assertEqual(clock.getDelayedCalls(), [])
+
+    def test_reset_and_delay(self):
+        clock = SimulatedClock()
+        calls = []
+        earlier = clock.callLater(5, calls.append, 'earlier')
+        later = clock.callLater(1, calls.append, 'later')
+        earlier.reset(0.5)
+        later.delay(2)
+        clock.advance(1)
+        self.assertEqual(calls, ['earlier'])
+        clock.advance(2)
+        self.assertEqual(calls, ['earlier', 'later'])
+
+
+class SimulatedNetworkTest(unittest.TestCase):
+    def setUp(self):
+        self.network = SimulatedNetwork(seed=0)
+        self.nodes = self.network.bootstrap(40)
+
+    def test_bootstrap(self):
+        self.assertEqual(len(self.network.nodes), 40)
+        for node in self.nodes:
+            self.assertTrue(node.contacts)
+
+    def test_find_node(self):
+        node = self.nodes[-1]
+        target = self.nodes[0]
+        contacts = self.network.run(node.iterativeFindNode(target.node_id))
+        self.assertLessEqual(len(contacts), constants.k)
+        self.assertEqual(contacts[0].id, target.node_id)
+
+    def test_announce_and_find_peers(self):
+        announcer, finder = self.nodes[3], self.nodes[-3]
+        announcer.peerPort = 3333
+        blob_hash = '1' * 48
+        self.network.run(announcer.announceHaveBlob(blob_hash))
+        peers = self.network.run(finder.getPeersForBlob(blob_hash))
+        self.assertEqual(peers, [(announcer.externalIP, 3333)])
+
+    def test_lookup_with_removed_nodes(self):
+        removed = self.nodes[10:20]
+        for node in removed:
+            self.network.remove_node(node)
+        self.assertEqual(len(self.network.nodes), 30)
+        # the other nodes still know about the removed ones, their datagrams go nowhere
+        contacts = self.network.run(self.nodes[-1].iterativeFindNode(removed[0].node_id))
+        self.assertTrue(contacts)
+        removed_ids = set(node.node_id for node in removed)
+        self.assertFalse(removed_ids.intersection(contact.id for contact in contacts))
+        self.assertGreater(self.network.datagrams_undeliverable, 0)
+
+    def test_loss(self):
+        self.network.loss = 1.0
+        with self.assertRaises(defer.TimeoutError):
+            self.network.run(self.nodes[0].iterativeFindNode(self.nodes[1].node_id), timeout=1)
+        self.assertGreater(self.network.datagrams_lost, 0)
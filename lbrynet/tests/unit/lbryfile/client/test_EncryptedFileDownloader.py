@@ -1,7 +1,7 @@
 import os.path
 from twisted.trial import unittest
 from twisted.internet import defer
-from lbrynet.lbry_file.client.EncryptedFileDownloader import EncryptedFileSaver
+from lbrynet.lbry_file.client.EncryptedFileDownloader import EncryptedFileSaver, BlobsOnlyHandler
 
 
 
@@ -32,3 +32,14 @@ class TestEncryptedFileSaver(unittest.TestCase):
         yield saver._setup_output()
         self.assertTrue(os.path.isfile(file_name))
         saver._close_output()
+
+    @defer.inlineCallbacks
+    def test_blobs_only(self):
+        file_name = 'encrypted_file_saver_test.tmp'
+        file_name_hex = file_name.encode('hex')
+        saver = EncryptedFileSaver('', None, None, None, None, None, None, '.', '',
+                                   file_name_hex, file_name_hex, save_file=False)
+        yield saver._setup_output()
+        self.assertFalse(os.path.isfile(file_name))
+        self.assertIsInstance(saver._get_blob_handler(None), BlobsOnlyHandler)
+        yield saver._close_output()
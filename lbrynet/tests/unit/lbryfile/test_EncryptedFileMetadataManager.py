@@ -76,3 +76,67 @@ class DBEncryptedFileMetadataManagerTest(unittest.TestCase):
         yield self.manager.delete_stream(stream_hash)
         out = yield self.manager.check_if_stream_exists(stream_hash)
         self.assertFalse(out)
+
+    @defer.inlineCallbacks
+    def test_reflected_streams(self):
+        yield self.manager.setup()
+        stream_hash = random_lbry_hash()
+        sd_hash = random_lbry_hash()
+        blobs = [CryptBlobInfo(random_lbry_hash(), 0, 10, 1),
+                 CryptBlobInfo(random_lbry_hash(), 1, 10, 1)]
+        yield self.manager.save_stream(stream_hash, 'file_name', 'key', 'sug_file_name', blobs)
+        yield self.manager.save_sd_blob_hash_to_stream(stream_hash, sd_hash)
+
+        out = yield self.manager.get_blob_hashes_for_sd_hashes([sd_hash])
+        self.assertEqual({sd_hash: [blob.blob_hash for blob in blobs]}, out)
+        # more sd hashes than fit in one query
+        unknown_sd_hashes = [random_lbry_hash() for _ in range(1500)]
+        out = yield self.manager.get_blob_hashes_for_sd_hashes(unknown_sd_hashes + [sd_hash])
+        self.assertEqual(1501, len(out))
+        self.assertEqual([blob.blob_hash for blob in blobs], out[sd_hash])
+        self.assertEqual([], out[unknown_sd_hashes[0]])
+
+        yield self.manager.save_reflected_streams([sd_hash], 'reflector:5566', 100)
+        out = yield self.manager.get_reflected_streams('reflector:5566', 50)
+        self.assertEqual({sd_hash}, out)
+        out = yield self.manager.get_reflected_streams('reflector:5566', 100)
+        self.assertEqual(set(), out)
+        out = yield self.manager.get_reflected_streams('other:5566', 50)
+        self.assertEqual(set(), out)
+
+        # deleting the stream forgets it was reflected
+        yield self.manager.delete_stream(stream_hash)
+        out = yield self.manager.get_reflected_streams('reflector:5566', 50)
+        self.assertEqual(set(), out)
+
+    @defer.inlineCallbacks
+    def test_get_blobs_for_streams(self):
+        yield self.manager.setup()
+        streams = {}
+        for _ in range(2):
+            stream_hash = random_lbry_hash()
+            blobs = [CryptBlobInfo(random_lbry_hash(), 1, 20, 1),
+                     CryptBlobInfo(random_lbry_hash(), 0, 10, 1),
+                     CryptBlobInfo(None, 2, 0, 1)]
+            yield self.manager.save_stream(stream_hash, 'file_name', 'key', 'sug_file_name',
+                                           blobs)
+            streams[stream_hash] = [(blobs[1].blob_hash, 10), (blobs[0].blob_hash, 20),
+                                    (None, 0)]
+        unknown_stream_hash = random_lbry_hash()
+        out = yield self.manager.get_blobs_for_streams(list(streams) + [unknown_stream_hash])
+        streams[unknown_stream_hash] = []
+        self.assertEqual(streams, out)
+
+    @defer.inlineCallbacks
+    def test_get_streams_of_blobs(self):
+        yield self.manager.setup()
+        stream_hash = random_lbry_hash()
+        blobs = [CryptBlobInfo(random_lbry_hash(), 0, 10, 1),
+                 CryptBlobInfo(random_lbry_hash(), 1, 10, 1)]
+        yield self.manager.save_stream(stream_hash, 'file_name', 'key', 'sug_file_name', blobs)
+        # more blob hashes than fit in one query
+        unknown_blob_hashes = [random_lbry_hash() for _ in range(1500)]
+        out = yield self.manager.get_streams_of_blobs(
+            unknown_blob_hashes + [blob.blob_hash for blob in blobs])
+        self.assertEqual({blobs[0].blob_hash: (stream_hash, 0),
+                          blobs[1].blob_hash: (stream_hash, 1)}, out)
@@ -1,9 +1,15 @@
+import os
+import shutil
+import tempfile
+
 from twisted.internet import defer
 from twisted.trial import unittest
 from lbrynet import conf
 from lbrynet.file_manager.EncryptedFileDownloader import ManagedEncryptedFileDownloader
+from lbrynet.file_manager import EncryptedFileManager as file_manager
 from lbrynet.file_manager.EncryptedFileManager import EncryptedFileManager
 from lbrynet.lbry_file.EncryptedFileMetadataManager import DBEncryptedFileMetadataManager
+from lbrynet.tests import mocks
 from lbrynet.tests.util import random_lbry_hash
 
 
@@ -40,3 +46,104 @@ class TestEncryptedFileManager(unittest.TestCase):
         yield manager._change_file_status(rowid, ManagedEncryptedFileDownloader.STATUS_RUNNING)
         out = yield manager._get_lbry_file_status(rowid)
         self.assertEqual(out, ManagedEncryptedFileDownloader.STATUS_RUNNING)
+
+    @defer.inlineCallbacks
+    def test_export_lbry_file(self):
+        class MocSession(object):
+            pass
+
+        download_directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, download_directory)
+        plain_text = os.urandom(3000)
+        lbry_file = mocks.FakeDownloadingLBRYFile(plain_text, 1000, downloaded=(0, 1))
+        lbry_file.file_name = 'exported.tmp'
+        lbry_file.download_directory = download_directory
+        session = MocSession()
+        session.blob_manager = lbry_file.blob_manager
+        manager = EncryptedFileManager(session, lbry_file.stream_info_manager, None,
+                                       download_directory)
+
+        # the last blob hasn't been downloaded
+        yield self.assertFailure(manager.export_lbry_file(lbry_file), ValueError)
+        lbry_file.complete_blob(2)
+        path = yield manager.export_lbry_file(lbry_file)
+        self.assertEqual(os.path.join(download_directory, 'exported.tmp'), path)
+        with open(path, 'rb') as exported:
+            self.assertEqual(plain_text, exported.read())
+
+    @defer.inlineCallbacks
+    def test_files_arent_loaded_to_reflect_or_report_on(self):
+        class MocSession(object):
+            pass
+
+        class MocBlobManager(object):
+            def completed_blobs(self, blob_hashes):
+                return defer.succeed(blob_hashes[:1])
+
+        class MocStreamInfoManager(object):
+            def get_blobs_for_streams(self, stream_hashes):
+                return defer.succeed({stream_hash: [('1' * 96, 10), ('2' * 96, 10), (None, 0)]
+                                      for stream_hash in stream_hashes})
+
+            def get_reflected_streams(self, reflector, reflected_after):
+                return defer.succeed(['5' * 96])
+
+        session = MocSession()
+        session.blob_manager = MocBlobManager()
+        session.rate_limiter = None
+        manager = EncryptedFileManager(session, MocStreamInfoManager(), None, '.')
+        statuses = [ManagedEncryptedFileDownloader.STATUS_FINISHED,
+                    ManagedEncryptedFileDownloader.STATUS_STOPPED]
+        for rowid, status in enumerate(statuses, 1):
+            manager.registry.add({'rowid': rowid, 'stream_hash': str(rowid) * 96,
+                                  'sd_hash': str(rowid + 4) * 96, 'status': status,
+                                  'file_name': 'file_%i' % rowid, 'outpoint': None})
+
+        reports = yield manager.get_lbry_file_status_reports()
+        self.assertEqual([('file_1', 1, 2, 'completed'), ('file_2', 1, 2, 'stopped')],
+                         [(report.name, report.num_completed, report.num_known,
+                           report.running_status) for report in reports])
+
+        reflected = []
+
+        def reflect_streams(streams, reflector, rate_limiter):
+            reflected.extend(streams)
+            return defer.succeed(set())
+
+        self.patch(file_manager, 'reflect_streams', reflect_streams)
+        yield manager.reflect_lbry_files()
+        # the first file has already been reflected
+        self.assertEqual([('2' * 96, '6' * 96)],
+                         [(stream.stream_hash, stream.sd_hash) for stream in reflected])
+        self.assertEqual({}, manager.registry.loaded)
+
+    @defer.inlineCallbacks
+    def test_blob_progress_follows_the_blob_manager(self):
+        class MocSession(object):
+            pass
+
+        class MocBlobManager(object):
+            completed = set()
+
+            def completed_blobs(self, blob_hashes):
+                return defer.succeed([b for b in blob_hashes if b in self.completed])
+
+        class MocStreamInfoManager(object):
+            def get_blobs_for_streams(self, stream_hashes):
+                return defer.succeed({stream_hash: [('1' * 96, 10), ('2' * 96, 10), (None, 0)]
+                                      for stream_hash in stream_hashes})
+
+        class MocLbryFile(object):
+            stream_hash = 'a' * 96
+
+        session = MocSession()
+        session.blob_manager = MocBlobManager()
+        manager = EncryptedFileManager(session, MocStreamInfoManager(), None, '.')
+        progress = yield manager.get_blob_progress([MocLbryFile()])
+        self.assertEqual({'a' * 96: (20, 2, 0)}, progress)
+
+        # a blob of the stream was completed by something other than its file
+        session.blob_manager.completed.add('2' * 96)
+        manager._blobs_changed(['2' * 96])
+        progress = yield manager.get_blob_progress([MocLbryFile()])
+        self.assertEqual({'a' * 96: (20, 2, 1)}, progress)
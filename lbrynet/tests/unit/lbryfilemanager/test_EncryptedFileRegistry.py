@@ -0,0 +1,104 @@
+import binascii
+
+from twisted.internet import defer
+from twisted.trial import unittest
+from lbrynet.cryptstream.CryptBlob import CryptBlobInfo
+from lbrynet.file_manager.EncryptedFileDownloader import ManagedEncryptedFileDownloader
+from lbrynet.file_manager.EncryptedFileRegistry import EncryptedFileRegistry
+from lbrynet.lbry_file.EncryptedFileMetadataManager import DBEncryptedFileMetadataManager
+from lbrynet.tests.util import mk_db_and_blob_dir, rm_db_and_blob_dir, random_lbry_hash
+
+
+class FakeLbryFile(object):
+    def __init__(self, info):
+        self.rowid = info['rowid']
+        self.stream_hash = info['stream_hash']
+
+
+class TestEncryptedFileRegistry(unittest.TestCase):
+    @defer.inlineCallbacks
+    def setUp(self):
+        self.db_dir, self.blob_dir = mk_db_and_blob_dir()
+        self.stream_info_manager = DBEncryptedFileMetadataManager(self.db_dir)
+        yield self.stream_info_manager.setup()
+        self.made = []
+        self.registry = EncryptedFileRegistry(self._make_lbry_file)
+        self.registry.PAGE_SIZE = 2
+
+    @defer.inlineCallbacks
+    def tearDown(self):
+        yield self.stream_info_manager.stop()
+        rm_db_and_blob_dir(self.db_dir, self.blob_dir)
+
+    def _make_lbry_file(self, info):
+        if info['status'] not in (ManagedEncryptedFileDownloader.STATUS_STOPPED,
+                                  ManagedEncryptedFileDownloader.STATUS_FINISHED):
+            raise Exception("Unknown status")
+        self.made.append(info['rowid'])
+        return FakeLbryFile(info)
+
+    @defer.inlineCallbacks
+    def _add_file(self, status=ManagedEncryptedFileDownloader.STATUS_STOPPED, sd_hash=True,
+                  file_name='file_name'):
+        stream_hash = random_lbry_hash()
+        file_name = binascii.hexlify(file_name)
+        yield self.stream_info_manager.save_stream(
+            stream_hash, file_name, 'key', file_name,
+            [CryptBlobInfo(random_lbry_hash(), 0, 13, 1)])
+        if sd_hash:
+            sd_hash = random_lbry_hash()
+            yield self.stream_info_manager.save_sd_blob_hash_to_stream(stream_hash, sd_hash)
+        rowid = yield self.stream_info_manager._save_lbry_file(stream_hash, 0)
+        yield self.stream_info_manager._change_file_status(rowid, status)
+        defer.returnValue((rowid, stream_hash, sd_hash))
+
+    @defer.inlineCallbacks
+    def test_load_lazily(self):
+        files = []
+        for i in range(5):
+            f = yield self._add_file(file_name='file_%i.mp4' % i)
+            files.append(f)
+        yield self._add_file(sd_hash=False)
+        yield self.stream_info_manager.save_outpoint_to_file(files[3][0], 'aa' * 32, 1)
+        yield self.registry.load(self.stream_info_manager)
+
+        self.assertEqual(5, len(self.registry))
+        self.assertEqual([], self.made)
+        rowid, stream_hash, sd_hash = files[2]
+        by_sd_hash = self.registry.find('sd_hash', sd_hash)
+        self.assertEqual([rowid], [lbry_file.rowid for lbry_file in by_sd_hash])
+        self.assertEqual(by_sd_hash, self.registry.find('stream_hash', stream_hash))
+        self.assertEqual(by_sd_hash, self.registry.find('rowid', rowid))
+        self.assertEqual(by_sd_hash, self.registry.find('file_name', 'file_2.mp4'))
+        self.assertEqual([rowid], self.made)
+        by_outpoint = self.registry.find('outpoint', '%s:1' % ('aa' * 32))
+        self.assertEqual([files[3][0]], [lbry_file.rowid for lbry_file in by_outpoint])
+
+        self.assertEqual([f[0] for f in files], [lbry_file.rowid for lbry_file in self.registry])
+        self.registry.remove(rowid)
+        self.assertEqual([], self.registry.find('sd_hash', sd_hash))
+        self.assertEqual(4, len(self.registry))
+
+    @defer.inlineCallbacks
+    def test_drop_files_which_fail_to_start(self):
+        rowid, _, sd_hash = yield self._add_file(status='unknown')
+        yield self.registry.load(self.stream_info_manager)
+        self.assertEqual([rowid], self.registry.get_rowids('unknown'))
+        self.assertEqual([], self.registry.find('sd_hash', sd_hash))
+        self.assertEqual(0, len(self.registry))
+
+    @defer.inlineCallbacks
+    def test_sort_files(self):
+        rowids = []
+        for name in ('b.mp4', 'c.mp4', 'a.mp4'):
+            rowid, _, _ = yield self._add_file(file_name=name)
+            rowids.append(rowid)
+        yield self.registry.load(self.stream_info_manager)
+
+        self.assertEqual(rowids, [info['rowid'] for info in self.registry.get_infos()])
+        by_name = self.registry.get_infos(sort_by='file_name')
+        self.assertEqual(['a.mp4', 'b.mp4', 'c.mp4'], [info['file_name'] for info in by_name])
+        by_name = self.registry.get_infos(rowids[:2], sort_by='file_name', reverse=True)
+        self.assertEqual(['c.mp4', 'b.mp4'], [info['file_name'] for info in by_name])
+        self.assertRaises(ValueError, self.registry.get_infos, sort_by='key')
+        self.assertEqual([], self.made)
@@ -0,0 +1,71 @@
+import os
+
+from twisted.internet import defer
+from twisted.trial import unittest
+
+from lbrynet.file_manager.EncryptedFileStreamer import EncryptedFileStreamer
+from lbrynet.tests import mocks
+
+
+class EncryptedFileStreamerTest(unittest.TestCase):
+    def setUp(self):
+        self.plain_text = os.urandom(3000)
+        # the last blob hasn't been downloaded
+        self.lbry_file = mocks.FakeDownloadingLBRYFile(self.plain_text, 1000, downloaded=(0, 1))
+        self.blob_manager = self.lbry_file.blob_manager
+        self.streamer = EncryptedFileStreamer(self.lbry_file, read_ahead=1, timeout=5)
+
+    @defer.inlineCallbacks
+    def read(self, start, end):
+        data = ''
+        for i, blob_start, blob_end in self.streamer.get_slices(start, end):
+            blob = yield self.streamer.read_blob(i)
+            data += blob[blob_start:blob_end]
+        defer.returnValue(data)
+
+    @defer.inlineCallbacks
+    def test_read_while_downloading(self):
+        yield self.streamer.start()
+        # the size of the last blob is only known once it's downloaded
+        self.assertIsNone(self.streamer.size)
+        self.assertEqual(2000 + self.streamer.blobs[2][3] - 1, self.streamer.max_size)
+        self.assertIsNone(self.lbry_file.download_manager.priority_blob_num)
+        size = self.streamer.get_size()
+        self.assertFalse(size.called)
+        self.assertEqual(2, self.lbry_file.download_manager.priority_blob_num)
+        self.lbry_file.complete_blob(2)
+        size = yield size
+        self.assertEqual(3000, size)
+        self.assertEqual(3000, self.streamer.max_size)
+
+        data = yield self.read(0, 2999)
+        self.assertEqual(self.plain_text, data)
+        data = yield self.read(999, 2001)
+        self.assertEqual(self.plain_text[999:2002], data)
+        self.assertEqual([(2, 500, 1000)], self.streamer.get_slices(2500, 5000))
+        # only a few decrypted blobs are kept
+        self.assertTrue(len(self.streamer._decrypted) <= self.streamer.cache_size)
+
+        self.streamer.stop()
+        self.assertEqual([], self.lbry_file.blob_completed_callbacks)
+        self.assertEqual([], self.lbry_file.started_callbacks)
+
+    @defer.inlineCallbacks
+    def test_read_before_size_is_known(self):
+        yield self.streamer.start()
+        self.assertIsNone(self.streamer.size)
+        # the whole file can be read, the last slice is cut short by the padding of its blob
+        slices = self.streamer.get_slices(0, self.streamer.max_size - 1)
+        self.assertEqual([0, 1, 2], [i for i, _, _ in slices])
+        read = self.read(0, self.streamer.max_size - 1)
+        self.lbry_file.complete_blob(2)
+        data = yield read
+        self.assertEqual(self.plain_text, data)
+        self.assertEqual(3000, self.streamer.size)
+
+    @defer.inlineCallbacks
+    def test_size_of_downloaded_file(self):
+        self.blob_manager.blobs['2' * 96].verified = True
+        yield self.streamer.start()
+        self.assertEqual(3000, self.streamer.size)
+        self.assertEqual(3000, self.streamer.max_size)
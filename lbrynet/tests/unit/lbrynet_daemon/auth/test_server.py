@@ -1,8 +1,13 @@
+import json
+from io import BytesIO
+
 import mock
+from twisted.internet import defer
 from twisted.trial import unittest
+from twisted.web.test.requesthelper import DummyRequest
 
 from lbrynet.tests.mocks import mock_conf_settings
-from lbrynet.daemon.auth import server
+from lbrynet.daemon.auth import server, websocket
 
 
 class AuthJSONRPCServerTest(unittest.TestCase):
@@ -64,3 +69,139 @@ class AuthJSONRPCServerTest(unittest.TestCase):
         # note the ports don't match
         request.getHeader = mock.Mock(return_value='http://example.com:1235')
         self.assertFalse(self.server._check_header_source(request, 'Origin'))
+
+
+class WebSocketOriginTest(unittest.TestCase):
+    def setUp(self):
+        if not websocket.websocket_available():
+            raise unittest.SkipTest("autobahn isn't installed")
+        self.protocol = websocket.JSONRPCWebSocketProtocol()
+        self.protocol.factory = mock.Mock()
+        self.protocol.factory.api = server.AuthJSONRPCServer(use_authentication=False)
+
+    def test_foreign_origin_is_refused(self):
+        mock_conf_settings(self, {'api_host': 'localhost', 'api_port': 1234})
+        request = mock.Mock(origin='http://example.com')
+        self.assertRaises(websocket.ConnectionDeny, self.protocol.onConnect, request)
+
+    def test_api_and_allowed_origins_are_accepted(self):
+        mock_conf_settings(self, {'api_host': 'localhost', 'api_port': 1234,
+                                  'allowed_origin': 'http://example.com:8080'})
+        for origin in ['http://localhost:1234', 'http://example.com:8080', None]:
+            self.protocol.onConnect(mock.Mock(origin=origin))
+
+
+class BatchAPI(server.AuthJSONRPCServer):
+    allowed_during_startup = ['double', 'slow', 'fail', 'count']
+
+    def __init__(self):
+        server.AuthJSONRPCServer.__init__(self, use_authentication=False)
+        self.slow_result = defer.Deferred()
+        self.calls = 0
+
+    @server.AuthJSONRPCServer.cached(60, invalidated_by=('counted',))
+    def jsonrpc_count(self):
+        self.calls += 1
+        return self.calls
+
+    def jsonrpc_double(self, x):
+        return x * 2
+
+    @server.AuthJSONRPCServer.cached(10)
+    def jsonrpc_square(self, x):
+        return x * x
+
+    def jsonrpc_slow(self):
+        return self.slow_result
+
+    def jsonrpc_fail(self):
+        raise Exception("failed")
+
+
+class BatchRequestTest(unittest.TestCase):
+    def setUp(self):
+        mock_conf_settings(self)
+        self.server = BatchAPI()
+
+    def test_batch_request(self):
+        calls = [
+            {'method': 'slow', 'params': {}, 'id': 1},
+            {'method': 'double', 'params': {'x': 2}, 'id': 2},
+            {'method': 'fail', 'params': {}, 'id': 3},
+            {'method': 'missing', 'params': {}, 'id': 4},
+        ]
+        request = DummyRequest([''])
+        request.content = BytesIO(json.dumps(calls))
+        self.server.render(request)
+        # the other calls are made while the first one is waiting
+        self.assertEqual([], request.written)
+        self.server.slow_result.callback('done')
+        responses = json.loads(''.join(request.written))
+        self.assertEqual([1, 2, 3, 4], [response['id'] for response in responses])
+        self.assertEqual('done', responses[0]['result'])
+        self.assertEqual(4, responses[1]['result'])
+        self.assertEqual('failed', responses[2]['error']['message'])
+        self.assertEqual(server.JSONRPCError.CODE_METHOD_NOT_FOUND,
+                         responses[3]['error']['code'])
+
+    @defer.inlineCallbacks
+    def test_dispatch_message(self):
+        response = yield self.server.dispatch_message(
+            json.dumps({'method': 'double', 'params': {'x': 3}, 'id': 1}))
+        self.assertEqual(6, json.loads(response)['result'])
+        self.server.slow_result.callback(None)
+        response = yield self.server.dispatch_message(
+            json.dumps([{'method': 'double', 'params': {'x': 3}, 'id': 1},
+                        {'method': 'slow', 'id': 2}]))
+        self.assertEqual([6, None], [r['result'] for r in json.loads(response)])
+        response = yield self.server.dispatch_message('[]')
+        self.assertEqual(server.JSONRPCError.CODE_INVALID_REQUEST,
+                         json.loads(response)['error']['code'])
+
+
+class ResultCacheTest(unittest.TestCase):
+    def setUp(self):
+        mock_conf_settings(self)
+        self.server = BatchAPI()
+
+    def call(self, etag=None):
+        request = DummyRequest([''])
+        request.content = BytesIO(json.dumps({'method': 'count', 'params': {}, 'id': 1}))
+        if etag is not None:
+            request.requestHeaders.setRawHeaders('If-None-Match', [etag])
+        self.server.render(request)
+        return request
+
+    def test_cached_result(self):
+        request = self.call()
+        self.assertEqual(1, json.loads(''.join(request.written))['result'])
+        etag = request.responseHeaders.getRawHeaders('ETag')[0]
+        self.assertEqual(1, json.loads(''.join(self.call().written))['result'])
+
+        # nothing changed, so there's no need to send the result again
+        request = self.call(etag)
+        self.assertEqual(304, request.responseCode)
+        self.assertEqual('', ''.join(request.written))
+
+        self.server.invalidate_cache('something else')
+        self.assertEqual(304, self.call(etag).responseCode)
+        self.server.invalidate_cache('counted')
+        request = self.call(etag)
+        self.assertEqual(2, json.loads(''.join(request.written))['result'])
+        self.assertNotEqual(etag, request.responseHeaders.getRawHeaders('ETag')[0])
+
+    def test_old_results_are_dropped(self):
+        now = [1000.0]
+        self.patch(server.time, 'time', lambda: now[0])
+        self.server.MAX_CACHED_RESULTS = 3
+        for x in range(4):
+            self.server._call_method(BatchAPI.jsonrpc_square, {'x': x})
+        # only the most recent results are kept
+        self.assertEqual([1, 2, 3], [json.loads(args)['x']
+                                     for _, args in self.server._result_cache])
+
+        # expired results are dropped when another is cached
+        now[0] += 11
+        self.server._call_method(BatchAPI.jsonrpc_square, {'x': 5})
+        self.assertEqual([('jsonrpc_square', json.dumps({'x': 5}))],
+                         list(self.server._result_cache))
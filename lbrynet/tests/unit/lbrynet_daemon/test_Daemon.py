@@ -9,6 +9,9 @@ from lbryschema.decode import smart_decode
 from lbrynet import conf
 from lbrynet.core import Session, PaymentRateManager, Wallet
 from lbrynet.daemon.Daemon import Daemon as LBRYDaemon
+from lbrynet.dht.contact import Contact
+from lbrynet.dht.datastore import DictDataStore
+from lbrynet.dht.routingtable import TreeRoutingTable
 
 from lbrynet.tests import util
 from lbrynet.tests.mocks import mock_conf_settings, FakeNetwork
@@ -121,3 +124,62 @@ class TestJsonRpc(trial.unittest.TestCase):
         d = defer.maybeDeferred(self.test_daemon.jsonrpc_help, command='status')
         d.addCallback(lambda result: self.assertSubstring('daemon status', result['help']))
         # self.assertSubstring('daemon status', d.result)
+
+
+class TestDebugProfile(trial.unittest.TestCase):
+    def setUp(self):
+        mock_conf_settings(self)
+        util.resetTime(self)
+        self.test_daemon = get_test_daemon()
+
+    def test_profile_is_only_saved_in_the_data_dir(self):
+        for file_name in ('/tmp/profile', '../profile', 'logs/profile', '..'):
+            d = self.test_daemon.jsonrpc_debug_profile(duration=0.01, file_name=file_name)
+            self.failureResultOf(d, Exception)
+        self.assertFalse(self.test_daemon._profiling)
+
+
+class TestRoutingTable(trial.unittest.TestCase):
+    def setUp(self):
+        mock_conf_settings(self)
+        util.resetTime(self)
+        self.test_daemon = get_test_daemon()
+        dht_node = self.test_daemon.session.dht_node = mock.Mock()
+        dht_node.node_id = '\x00' * 48
+        dht_node._routingTable = TreeRoutingTable(dht_node.node_id)
+        dht_node._dataStore = DictDataStore()
+        # enough contacts to split the first bucket in two
+        for i in range(1, 10):
+            contact = Contact(chr(16 * i) * 48, '1.2.3.%i' % i, 4444, None)
+            dht_node._routingTable.addContact(contact)
+        now = util.DEFAULT_ISO_TIME
+        dht_node._dataStore.addPeerToBlob('a' * 48, 'peer', now, now, chr(16) * 48)
+        dht_node._dataStore.addPeerToBlob('b' * 48, 'peer', now, now, chr(16) * 48)
+        dht_node._dataStore.addPeerToBlob('b' * 48, 'peer', now, now, chr(144) * 48)
+
+    @defer.inlineCallbacks
+    def test_routing_table_get(self):
+        with mock.patch('lbrynet.daemon.Daemon.ROUTING_TABLE_CHUNK_SIZE', 2):
+            result = yield self.test_daemon.jsonrpc_routing_table_get()
+        self.assertEqual([0, 1], sorted(result['buckets']))
+        self.assertEqual(7, len(result['buckets'][0]))
+        self.assertEqual(9, len(result['contacts']))
+        self.assertEqual(sorted(['a' * 48, 'b' * 48]),
+                         sorted(blob_hash.decode('hex') for blob_hash in result['blob_hashes']))
+        self.assertEqual({'address': '1.2.3.9', 'node_id': (chr(144) * 48).encode('hex'),
+                          'blobs': [('b' * 48).encode('hex')]}, result['buckets'][1][1])
+
+    @defer.inlineCallbacks
+    def test_routing_table_get_filtered(self):
+        result = yield self.test_daemon.jsonrpc_routing_table_get(bucket=1)
+        self.assertEqual([1], result['buckets'].keys())
+        self.assertEqual([('b' * 48).encode('hex')], result['blob_hashes'])
+
+        result = yield self.test_daemon.jsonrpc_routing_table_get(
+            node_id=(chr(16) * 48).encode('hex'))
+        self.assertEqual([(chr(16) * 48).encode('hex')], result['contacts'])
+        self.assertEqual(2, len(result['buckets'][0][0]['blobs']))
+
+        result = yield self.test_daemon.jsonrpc_routing_table_get(page=1, page_size=4)
+        self.assertEqual([(chr(16 * i) * 48).encode('hex') for i in range(5, 9)],
+                         result['contacts'])
@@ -25,6 +25,7 @@ class MocDownloader(object):
         self.num_completed = 0
         self.num_known = 1
         self.running_status = ManagedEncryptedFileDownloader.STATUS_RUNNING
+        self.blob_completed_callbacks = []
 
     @defer.inlineCallbacks
     def status(self):
@@ -32,6 +33,17 @@ class MocDownloader(object):
             self.name, self.num_completed, self.num_known, self.running_status)
         defer.returnValue(out)
 
+    def add_blob_completed_callback(self, callback):
+        self.blob_completed_callbacks.append(callback)
+
+    def add_started_callback(self, callback):
+        pass
+
+    def complete_blob(self, blob_num):
+        self.num_completed += 1
+        for callback in self.blob_completed_callbacks:
+            callback(blob_num)
+
     def start(self):
         return self.finish_deferred
 
@@ -50,6 +62,7 @@ def moc_download_sd_blob(self):
 def moc_download(self, sd_blob, name, key_fee):
     self.pay_key_fee(key_fee, name)
     self.downloader = MocDownloader()
+    self.downloader.add_blob_completed_callback(self._blob_completed)
     self.downloader.start()
 
 def moc_pay_key_fee(self, key_fee, name):
@@ -153,8 +166,7 @@ class GetStreamTests(unittest.TestCase):
         stream_info = None
         start = getstream.start(stream_info, name)
 
-        getstream.downloader.num_completed = 1
-        self.clock.advance(1)
+        getstream.downloader.complete_blob(0)
 
         downloader, f_deferred = yield start
         self.assertTrue(getstream.pay_key_fee_called)
@@ -0,0 +1,50 @@
+import mock
+from twisted.trial import unittest
+from twisted.web.test.requesthelper import DummyRequest
+
+from lbrynet.core import metrics
+from lbrynet.core.Peer import Peer
+from lbrynet.core.RateLimiter import RateLimiter
+from lbrynet.daemon.MetricsResource import MetricsResource
+
+
+class FakeProtocol(object):
+    def __init__(self, peer):
+        self.peer = peer
+
+    def throttle_download(self):
+        pass
+
+    def throttle_upload(self):
+        pass
+
+
+class MetricsResourceTest(unittest.TestCase):
+    def setUp(self):
+        self.daemon = mock.Mock()
+        self.daemon.session.dht_node = None
+        self.daemon.session.hash_announcer.hash_queue_size.return_value = 7
+        self.daemon.session.rate_limiter = RateLimiter()
+        self.daemon.reflector_server_port = None
+        self.resource = MetricsResource(self.daemon)
+        self.addCleanup(metrics.REGISTRY.remove_collector, self.resource.collect)
+
+    def test_render(self):
+        fast_peer, new_peer = Peer('1.2.3.4', 3333), Peer('1.2.3.5', 3333)
+        fast_peer.report_transfer(2 ** 20, 1.0)
+        rate_limiter = self.daemon.session.rate_limiter
+        rate_limiter.register_protocol(FakeProtocol(fast_peer))
+        rate_limiter.register_protocol(FakeProtocol(new_peer))
+        rate_limiter.report_dl_bytes(100)
+
+        request = DummyRequest([''])
+        body = self.resource.render_GET(request)
+        self.assertTrue(request.responseHeaders.getRawHeaders('content-type')[0].startswith(
+            'text/plain'))
+        self.assertIn('lbrynet_dht_announce_queue 7\n', body)
+        self.assertIn('lbrynet_peer_connections 2\n', body)
+        self.assertIn('lbrynet_peer_bytes_total{direction="received"} 100\n', body)
+        self.assertIn('lbrynet_peer_throughput_bytes_per_second{peer="1.2.3.4:3333"} 1048576\n',
+                      body)
+        self.assertNotIn('1.2.3.5', body)
+        self.assertIn('# TYPE lbrynet_reactor_lag_seconds histogram\n', body)
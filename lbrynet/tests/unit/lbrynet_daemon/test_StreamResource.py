@@ -0,0 +1,137 @@
+from twisted.internet import defer
+from twisted.trial import unittest
+from twisted.web.test.requesthelper import DummyRequest
+
+from lbrynet import conf
+from lbrynet.daemon.auth.server import AuthJSONRPCServer
+from lbrynet.daemon.StreamResource import parse_byte_range, StreamProducer, StreamResource
+
+
+class ParseByteRangeTest(unittest.TestCase):
+    def test_ranges(self):
+        self.assertEqual((0, 99), parse_byte_range('bytes=0-99', 1000))
+        self.assertEqual((500, 999), parse_byte_range('bytes=500-', 1000))
+        self.assertEqual((900, 999), parse_byte_range('bytes=-100', 1000))
+        self.assertEqual((0, 999), parse_byte_range('bytes=-5000', 1000))
+        self.assertEqual((990, 999), parse_byte_range('bytes=990-5000', 1000))
+
+    def test_whole_file(self):
+        self.assertIsNone(parse_byte_range(None, 1000))
+        self.assertIsNone(parse_byte_range('bytes=0-1,5-6', 1000))
+        self.assertIsNone(parse_byte_range('items=0-1', 1000))
+        self.assertIsNone(parse_byte_range('bytes=a-b', 1000))
+
+    def test_unsatisfiable(self):
+        self.assertRaises(ValueError, parse_byte_range, 'bytes=1000-', 1000)
+        self.assertRaises(ValueError, parse_byte_range, 'bytes=10-5', 1000)
+        self.assertRaises(ValueError, parse_byte_range, 'bytes=-0', 1000)
+
+
+class StreamRequest(DummyRequest):
+    def __init__(self, range_header=None, postpath=None):
+        DummyRequest.__init__(self, postpath or [''])
+        self.producer = None
+        if range_header is not None:
+            self.requestHeaders.setRawHeaders('range', [range_header])
+
+    def registerProducer(self, producer, streaming):
+        # DummyRequest keeps resuming the producer until it's unregistered
+        self.producer = producer
+
+    def unregisterProducer(self):
+        self.producer = None
+
+
+class FakeLBRYFile(object):
+    file_name = 'video.mp4'
+
+
+class FakeStreamer(object):
+    """A file of two blobs, the size of the last one isn't known until it's been read"""
+
+    def __init__(self):
+        self.lbry_file = FakeLBRYFile()
+        self.blobs = ['first', 'last']
+        self.size = None
+        self.max_size = 5 + 15
+        self.stopped = False
+
+    def get_slices(self, start, end):
+        return [(0, 0, 5), (1, 0, 15)]
+
+    def read_blob(self, i):
+        if i == 1:
+            self.size = 9
+        return defer.succeed(self.blobs[i])
+
+    def get_size(self):
+        self.size = 9
+        return defer.succeed(self.size)
+
+    def read_ahead_of(self, i):
+        pass
+
+    def stop(self):
+        self.stopped = True
+
+
+class StreamResourceTest(unittest.TestCase):
+    def setUp(self):
+        self.resource = StreamResource(None)
+
+    def _add_streamer(self, sd_hash):
+        self.resource.streamers[sd_hash] = FakeStreamer()
+        return self.resource._use_streamer(sd_hash)
+
+    def test_only_idle_streamers_are_stopped(self):
+        self.resource.MAX_STREAMERS = 1
+        first = self._add_streamer('a')
+        second = self._add_streamer('b')
+        self.resource._stop_idle_streamers()
+        self.assertEqual(['a', 'b'], list(self.resource.streamers))
+        # once the first one isn't being read it makes room for the second
+        self.resource._release_streamer('a')
+        self.assertTrue(first.stopped)
+        self.assertEqual(['b'], list(self.resource.streamers))
+        self.resource._release_streamer('b')
+        self.assertFalse(second.stopped)
+
+    @defer.inlineCallbacks
+    def test_stream_of_unknown_size(self):
+        request = StreamRequest()
+        yield self.resource._write_stream(request, StreamProducer(), FakeStreamer())
+        # the response code is left at 200
+        self.assertIsNone(request.responseCode)
+        self.assertIsNone(request.responseHeaders.getRawHeaders('content-length'))
+        self.assertEqual('firstlast', ''.join(request.written))
+
+    @defer.inlineCallbacks
+    def test_range_waits_for_the_size(self):
+        request = StreamRequest('bytes=2-')
+        streamer = FakeStreamer()
+        streamer.get_slices = lambda start, end: [(0, start, 5), (1, 0, end - 5 + 1)]
+        yield self.resource._write_stream(request, StreamProducer(), streamer)
+        self.assertEqual(206, request.responseCode)
+        self.assertEqual(['bytes 2-8/9'], request.responseHeaders.getRawHeaders('content-range'))
+        self.assertEqual(['7'], request.responseHeaders.getRawHeaders('content-length'))
+        self.assertEqual('rstlast', ''.join(request.written))
+
+    def test_requests_from_other_origins_are_refused(self):
+        conf.initialize_settings()
+        self.addCleanup(setattr, conf, 'settings', None)
+        self.resource.daemon = AuthJSONRPCServer(use_authentication=False)
+        streamer = FakeStreamer()
+        self.resource.streamers['a'] = streamer
+
+        request = StreamRequest(postpath=['a'])
+        request.requestHeaders.setRawHeaders('referer', ['http://example.com/page'])
+        self.assertEqual('', self.resource.render_GET(request))
+        self.assertEqual(403, request.responseCode)
+        self.assertEqual([], request.written)
+
+        request = StreamRequest(postpath=['a'])
+        request.requestHeaders.setRawHeaders(
+            'origin', ['http://localhost:%i' % conf.settings['api_port']])
+        self.resource.render_GET(request)
+        self.assertIsNone(request.responseCode)
+        self.assertEqual('firstlast', ''.join(request.written))
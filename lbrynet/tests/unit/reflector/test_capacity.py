@@ -0,0 +1,105 @@
+from twisted.trial import unittest
+
+from lbrynet.core.Peer import Peer
+from lbrynet.reflector.server.capacity import ReflectorCapacity
+
+
+class FakeProtocol(object):
+    def __init__(self, host):
+        self.peer = Peer(host, 3333)
+        self.receiving_blob = False
+        self.receiving_throttled = False
+        self.download_throttled = False
+
+    def throttle_receiving(self):
+        self.receiving_throttled = True
+
+    def unthrottle_receiving(self):
+        self.receiving_throttled = False
+
+    def throttle_download(self):
+        self.download_throttled = True
+
+    def unthrottle_download(self):
+        self.download_throttled = False
+
+
+class ReflectorCapacityTest(unittest.TestCase):
+    def test_admission_queue(self):
+        capacity = ReflectorCapacity(max_connections=2, max_queued_connections=2)
+        a1, a2, b1, c1, d1 = [FakeProtocol(host) for host in ('a', 'a', 'b', 'c', 'd')]
+        self.assertTrue(capacity.admit(a1).called)
+        self.assertTrue(capacity.admit(b1).called)
+        waiting_a2 = capacity.admit(a2)
+        waiting_c1 = capacity.admit(c1)
+        self.assertFalse(waiting_a2.called)
+        self.assertFalse(waiting_c1.called)
+        # the queue is full
+        self.assertIsNone(capacity.admit(d1))
+        self.assertEqual(1, capacity.rejected_connections)
+        self.assertEqual(2 * ReflectorCapacity.RETRY_AFTER, capacity.retry_after())
+
+        # the host without a connection goes first
+        capacity.release(b1)
+        self.assertTrue(waiting_c1.called)
+        self.assertFalse(waiting_a2.called)
+        capacity.release(c1)
+        self.assertTrue(waiting_a2.called)
+        self.assertEqual([a1, a2], capacity.active)
+        self.assertEqual([], capacity.queue)
+
+    def test_connections_per_host(self):
+        capacity = ReflectorCapacity(max_connections=3, max_connections_per_host=1)
+        a1, a2, b1 = [FakeProtocol(host) for host in ('a', 'a', 'b')]
+        self.assertTrue(capacity.admit(a1).called)
+        waiting_a2 = capacity.admit(a2)
+        self.assertFalse(waiting_a2.called)
+        # another host doesn't have to wait behind it
+        self.assertTrue(capacity.admit(b1).called)
+        capacity.release(a1)
+        self.assertTrue(waiting_a2.called)
+        # a queued client that disconnects is forgotten
+        a3 = FakeProtocol('a')
+        self.assertFalse(capacity.admit(a3).called)
+        capacity.release(a3)
+        self.assertEqual([], capacity.queue)
+
+    def test_inflight_bytes(self):
+        capacity = ReflectorCapacity(max_inflight_bytes=100)
+        p1, p2 = FakeProtocol('a'), FakeProtocol('b')
+        capacity.admit(p1)
+        capacity.admit(p2)
+
+        capacity.reserve(p1, 40)
+        capacity.reserve(p2, 20)
+        capacity.blob_received(p1)
+        self.assertFalse(p1.receiving_throttled)
+        # over half the budget and over its share of it, but a blob isn't paused part way
+        capacity.reserve(p1, 20)
+        self.assertFalse(p1.receiving_throttled)
+        capacity.blob_received(p1)
+        self.assertTrue(p1.receiving_throttled)
+        capacity.blob_received(p2)
+        self.assertFalse(p2.receiving_throttled)
+        capacity.reserve(p2, 30)
+        capacity.blob_received(p2)
+        self.assertTrue(p2.receiving_throttled)
+        self.assertEqual(110, capacity.get_metrics()['inflight_bytes'])
+
+        capacity.free(p2, 50)
+        self.assertFalse(p2.receiving_throttled)
+        self.assertTrue(p1.receiving_throttled)
+        capacity.free(p1, 40)
+        self.assertFalse(p1.receiving_throttled)
+        capacity.release(p1)
+        self.assertEqual(0, capacity.inflight_bytes)
+
+    def test_write_rate(self):
+        capacity = ReflectorCapacity(max_write_rate=1000)
+        protocol = FakeProtocol('a')
+        capacity.admit(protocol)
+        capacity.report_ingest(protocol, 2000)
+        self.assertTrue(protocol.download_throttled)
+        capacity.writes.tick(2)
+        self.assertFalse(protocol.download_throttled)
+        self.assertEqual(2000, capacity.get_metrics()['total_ingest_bytes'])
@@ -0,0 +1,16 @@
+from twisted.trial import unittest
+
+from lbrynet.reflector.common import encode_bitmap, decode_bitmap
+
+
+class BitmapTest(unittest.TestCase):
+    def test_round_trip(self):
+        for flags in ([], [True], [False] * 8, [True, False, True] * 7):
+            self.assertEqual(flags, decode_bitmap(encode_bitmap(flags), len(flags)))
+
+    def test_bit_order(self):
+        self.assertEqual('gAE=', encode_bitmap([True] + [False] * 14 + [True]))
+
+    def test_wrong_length(self):
+        with self.assertRaises(ValueError):
+            decode_bitmap(encode_bitmap([True] * 9), 8)
@@ -0,0 +1,198 @@
+import json
+
+from twisted.trial import unittest
+from twisted.internet import defer, address, reactor
+from twisted.test import proto_helpers
+
+from lbrynet import conf
+from lbrynet.core.BlobManager import DiskBlobManager
+from lbrynet.core.HashAnnouncer import DummyHashAnnouncer
+from lbrynet.core.PeerManager import PeerManager
+from lbrynet.core.cryptoutils import get_lbry_hash_obj
+from lbrynet.lbry_file.EncryptedFileMetadataManager import DBEncryptedFileMetadataManager
+from lbrynet.reflector.common import REFLECTOR_V3
+from lbrynet.reflector.server.capacity import ReflectorCapacity
+from lbrynet.reflector.server.server import ReflectorServerFactory
+from lbrynet.tests.util import mk_db_and_blob_dir, rm_db_and_blob_dir
+
+
+def _blob_hash(data):
+    h = get_lbry_hash_obj()
+    h.update(data)
+    return h.hexdigest()
+
+
+class PipelinedReflectorServerTest(unittest.TestCase):
+    @defer.inlineCallbacks
+    def setUp(self):
+        conf.initialize_settings()
+        self.db_dir, self.blob_dir = mk_db_and_blob_dir()
+        self.blob_manager = DiskBlobManager(DummyHashAnnouncer(), self.blob_dir, self.db_dir)
+        yield self.blob_manager.setup()
+        self.stream_info_manager = DBEncryptedFileMetadataManager(self.db_dir)
+        yield self.stream_info_manager.setup()
+        self.factory = ReflectorServerFactory(PeerManager(), self.blob_manager,
+                                              self.stream_info_manager, None)
+        self.protocol = self.factory.buildProtocol(address.IPv4Address('TCP', '127.0.0.1', 0))
+        self.transport = proto_helpers.StringTransport()
+        self.protocol.makeConnection(self.transport)
+
+    @defer.inlineCallbacks
+    def tearDown(self):
+        yield self.blob_manager.stop()
+        yield self.stream_info_manager.stop()
+        rm_db_and_blob_dir(self.db_dir, self.blob_dir)
+        conf.settings = None
+
+    def _responses(self):
+        responses, buff = [], self.transport.value()
+        decoder = json.JSONDecoder()
+        while buff:
+            response, end = decoder.raw_decode(buff)
+            responses.append(response)
+            buff = buff[end:]
+        self.transport.clear()
+        return responses
+
+    @defer.inlineCallbacks
+    def _wait_for_responses(self, count):
+        responses = []
+        for _ in range(100):
+            responses.extend(self._responses())
+            if len(responses) >= count:
+                break
+            d = defer.Deferred()
+            reactor.callLater(0.01, d.callback, None)
+            yield d
+        defer.returnValue(responses)
+
+    @defer.inlineCallbacks
+    def test_pipelined_blobs(self):
+        self.protocol.dataReceived(json.dumps({'version': REFLECTOR_V3}))
+        self.assertEqual([{'version': REFLECTOR_V3}], self._responses())
+
+        existing = 'already have this one'
+        creator = self.blob_manager.get_blob_creator()
+        creator.write(existing)
+        yield creator.close()
+        yield self.blob_manager.creator_finished(creator, False)
+        blobs = ['first blob', existing, 'last blob']
+
+        # every blob in one packet, without waiting for responses
+        data = ''
+        for blob_data in blobs:
+            data += json.dumps({'blob_hash': _blob_hash(blob_data), 'blob_size': len(blob_data)})
+            data += blob_data
+        self.protocol.dataReceived(data)
+
+        responses = yield self._wait_for_responses(3)
+        self.assertItemsEqual(
+            [{'received_blob': True, 'blob_hash': _blob_hash(blob_data)} for blob_data in blobs],
+            responses)
+        self.assertFalse(self.protocol.receiving_blob)
+        missing = yield self.blob_manager.missing_blobs([_blob_hash(b) for b in blobs])
+        self.assertEqual([], missing)
+
+        # the database bookkeeping happens in the background
+        yield self.factory.bookkeeper.wait_for_empty()
+        blob_lengths = yield self.blob_manager.get_all_blob_lengths()
+        for blob_data in blobs:
+            self.assertEqual(len(blob_data), blob_lengths[_blob_hash(blob_data)])
+
+    @defer.inlineCallbacks
+    def test_pipelined_bad_blob(self):
+        self.protocol.dataReceived(json.dumps({'version': REFLECTOR_V3}))
+        self._responses()
+        blob_hash = _blob_hash('the real data')
+        self.protocol.dataReceived(json.dumps({'blob_hash': blob_hash, 'blob_size': 13}))
+        self.protocol.dataReceived('not the data!')
+        responses = yield self._wait_for_responses(1)
+        self.assertEqual([{'received_blob': False, 'blob_hash': blob_hash}], responses)
+        missing = yield self.blob_manager.missing_blobs([blob_hash])
+        self.assertEqual([blob_hash], missing)
+
+    @defer.inlineCallbacks
+    def test_pipelined_blob_with_the_wrong_length(self):
+        self.protocol.dataReceived(json.dumps({'version': REFLECTOR_V3}))
+        self._responses()
+        blob_data = 'the real data'
+        blob_hash = _blob_hash(blob_data)
+        # the blob is being downloaded with its length from its stream
+        yield self.blob_manager.get_blob(blob_hash, len(blob_data))
+        # a length of None, like a blob looked up without knowing it, is fine
+        unknown_length = 'unknown length'
+        yield self.blob_manager.get_blob(_blob_hash(unknown_length))
+
+        data = json.dumps({'blob_hash': blob_hash, 'blob_size': 4}) + 'the '
+        data += json.dumps({'blob_hash': _blob_hash(unknown_length),
+                            'blob_size': len(unknown_length)}) + unknown_length
+        self.protocol.dataReceived(data)
+        responses = yield self._wait_for_responses(2)
+        self.assertEqual([{'received_blob': False, 'blob_hash': blob_hash},
+                          {'received_blob': True, 'blob_hash': _blob_hash(unknown_length)}],
+                         responses)
+        missing = yield self.blob_manager.missing_blobs([blob_hash, _blob_hash(unknown_length)])
+        self.assertEqual([blob_hash], missing)
+        yield self.factory.bookkeeper.wait_for_empty()
+
+    @defer.inlineCallbacks
+    def test_bad_sd_blob_in_bookkeeping_batch(self):
+        blobs = []
+        for blob_data in ['first blob', 'not a stream descriptor', 'last blob']:
+            creator = self.blob_manager.get_blob_creator()
+            creator.write(blob_data)
+            blob_hash = yield creator.close()
+            blob = yield self.blob_manager.get_blob(blob_hash, len(blob_data))
+            blobs.append(blob)
+        bookkeeper = self.factory.bookkeeper
+        first = bookkeeper.add(blobs[0], False)
+        # these two are recorded in the same batch, after the first one
+        bad_sd = bookkeeper.add(blobs[1], True)
+        last = bookkeeper.add(blobs[2], False)
+        yield first
+        yield last
+        yield self.assertFailure(bad_sd, Exception)
+        blob_lengths = yield self.blob_manager.get_all_blob_lengths()
+        for blob in blobs:
+            self.assertEqual(blob.length, blob_lengths[blob.blob_hash])
+
+    @defer.inlineCallbacks
+    def test_clients_over_max_inflight_bytes(self):
+        blob_size = 100
+        self.factory.capacity = ReflectorCapacity(max_inflight_bytes=2 * blob_size)
+        clients = []
+        for i in range(4):
+            transport = proto_helpers.StringTransport(
+                peerAddress=address.IPv4Address('TCP', '127.0.0.%i' % (i + 1), 3333))
+            protocol = self.factory.buildProtocol(transport.getPeer())
+            protocol.makeConnection(transport)
+            protocol.dataReceived(json.dumps({'version': REFLECTOR_V3}))
+            blob_data = str(i) * blob_size
+            data = json.dumps({'blob_hash': _blob_hash(blob_data), 'blob_size': blob_size})
+            clients.append((protocol, transport, blob_data, data + blob_data))
+
+        # every client starts sending its blob before any of them finishes
+        for i, (protocol, transport, blob_data, data) in enumerate(clients):
+            protocol.dataReceived(data[:-blob_size / 2])
+            clients[i] = (protocol, transport, blob_data, data[-blob_size / 2:])
+        self.assertEqual(4 * blob_size, self.factory.capacity.inflight_bytes)
+
+        # a paused transport isn't read from
+        for _ in range(100):
+            for i, (protocol, transport, blob_data, data) in enumerate(clients):
+                if data and transport.producerState == 'producing':
+                    protocol.dataReceived(data)
+                    clients[i] = (protocol, transport, blob_data, '')
+            if not any(client[3] for client in clients) and \
+                    not self.factory.capacity.inflight_bytes:
+                break
+            d = defer.Deferred()
+            reactor.callLater(0.01, d.callback, None)
+            yield d
+
+        missing = yield self.blob_manager.missing_blobs(
+            [_blob_hash(client[2]) for client in clients])
+        self.assertEqual([], missing)
+        self.assertEqual(0, self.factory.capacity.inflight_bytes)
+        self.assertEqual([], self.factory.capacity.paused)
+        yield self.factory.bookkeeper.wait_for_empty()
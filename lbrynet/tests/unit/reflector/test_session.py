@@ -0,0 +1,204 @@
+from twisted.trial import unittest
+from twisted.internet import defer, error, reactor
+
+from lbrynet import conf
+from lbrynet.core.BlobManager import DiskBlobManager
+from lbrynet.core.HashAnnouncer import DummyHashAnnouncer
+from lbrynet.core.PeerManager import PeerManager
+from lbrynet.cryptstream.CryptBlob import CryptBlobInfo
+from lbrynet.lbry_file.EncryptedFileMetadataManager import DBEncryptedFileMetadataManager
+from lbrynet.reflector.common import REFLECTOR_V3, ReflectorClientVersionError
+from lbrynet.reflector import reupload
+from lbrynet.reflector.client.session import ReflectorConnectionPool
+from lbrynet.reflector.server.server import ReflectorServer, ReflectorServerFactory
+from lbrynet.tests.util import mk_db_and_blob_dir, rm_db_and_blob_dir, random_lbry_hash
+
+
+class V2ReflectorServer(ReflectorServer):
+    def handle_handshake(self, request_dict):
+        if int(request_dict['version']) == REFLECTOR_V3:
+            raise ReflectorClientVersionError("Unknown version: %i" % REFLECTOR_V3)
+        return ReflectorServer.handle_handshake(self, request_dict)
+
+
+class DroppingReflectorServer(ReflectorServer):
+    def handle_handshake(self, request_dict):
+        # like a connection reset by the network
+        self.transport.abortConnection()
+        return defer.succeed(None)
+
+
+class ReflectorSessionTest(unittest.TestCase):
+    @defer.inlineCallbacks
+    def setUp(self):
+        conf.initialize_settings()
+        self.client_dirs = mk_db_and_blob_dir()
+        self.server_dirs = mk_db_and_blob_dir()
+        self.client_blob_manager = DiskBlobManager(DummyHashAnnouncer(), self.client_dirs[1],
+                                                   self.client_dirs[0])
+        self.server_blob_manager = DiskBlobManager(DummyHashAnnouncer(), self.server_dirs[1],
+                                                   self.server_dirs[0])
+        yield self.client_blob_manager.setup()
+        yield self.server_blob_manager.setup()
+        self.server_stream_info_manager = DBEncryptedFileMetadataManager(self.server_dirs[0])
+        yield self.server_stream_info_manager.setup()
+        self.server_factory = ReflectorServerFactory(PeerManager(), self.server_blob_manager,
+                                                     self.server_stream_info_manager, None)
+        self.port = reactor.listenTCP(0, self.server_factory, interface='127.0.0.1')
+        self.pool = ReflectorConnectionPool('127.0.0.1', self.port.getHost().port,
+                                            idle_timeout=0.1)
+
+    @defer.inlineCallbacks
+    def tearDown(self):
+        self.pool.close()
+        yield self.port.stopListening()
+        # let the connections close
+        yield self._sleep(0.2)
+        yield self.client_blob_manager.stop()
+        yield self.server_blob_manager.stop()
+        yield self.server_stream_info_manager.stop()
+        rm_db_and_blob_dir(*self.client_dirs)
+        rm_db_and_blob_dir(*self.server_dirs)
+        conf.settings = None
+
+    def _sleep(self, seconds):
+        d = defer.Deferred()
+        reactor.callLater(seconds, d.callback, None)
+        return d
+
+    @defer.inlineCallbacks
+    def _make_blobs(self, count, blob_manager=None):
+        blob_manager = blob_manager or self.client_blob_manager
+        blob_hashes = []
+        for i in range(count):
+            creator = blob_manager.get_blob_creator()
+            creator.write("blob data %i" % i)
+            yield creator.close()
+            yield blob_manager.creator_finished(creator, False)
+            blob_hashes.append(creator.blob_hash)
+        defer.returnValue(blob_hashes)
+
+    @defer.inlineCallbacks
+    def test_reflect_blobs_over_one_connection(self):
+        self.pool.max_connections = 1
+        blob_hashes = yield self._make_blobs(6)
+        results = yield defer.DeferredList([
+            self.pool.reflect_blobs(self.client_blob_manager, blob_hashes[:3]),
+            self.pool.reflect_blobs(self.client_blob_manager, blob_hashes[2:]),
+        ])
+        self.assertEqual([(True, True), (True, True)], results)
+        missing = yield self.server_blob_manager.missing_blobs(blob_hashes)
+        self.assertEqual([], missing)
+        self.assertEqual(1, len(self.pool.connections))
+
+        # the server already has these, nothing is sent
+        result = yield self.pool.reflect_blobs(self.client_blob_manager, blob_hashes)
+        self.assertFalse(result)
+        self.assertFalse(self.pool.is_legacy)
+
+    @defer.inlineCallbacks
+    def test_check_streams(self):
+        sd_hash, blob_hash = yield self._make_blobs(2, self.server_blob_manager)
+        stream_hash = random_lbry_hash()
+        yield self.server_stream_info_manager.save_stream(
+            stream_hash, 'file_name', 'key', 'file_name', [CryptBlobInfo(blob_hash, 0, 13, 1)])
+        yield self.server_stream_info_manager.save_sd_blob_hash_to_stream(stream_hash, sd_hash)
+        # the server has the sd blob of this stream, but not its blob
+        partial_stream_hash = random_lbry_hash()
+        yield self.server_stream_info_manager.save_stream(
+            partial_stream_hash, 'file_name', 'key', 'file_name',
+            [CryptBlobInfo(random_lbry_hash(), 0, 13, 1)])
+        yield self.server_stream_info_manager.save_sd_blob_hash_to_stream(partial_stream_hash,
+                                                                          blob_hash)
+
+        complete = yield self.pool.check_streams([sd_hash, blob_hash, random_lbry_hash()])
+        self.assertEqual({sd_hash}, complete)
+
+    @defer.inlineCallbacks
+    def test_retries_busy_reflector(self):
+        capacity = self.server_factory.capacity
+        capacity.max_connections = capacity.max_queued_connections = 0
+        blob_hashes = yield self._make_blobs(2)
+        d = self.pool.reflect_blobs(self.client_blob_manager, blob_hashes)
+        while self.pool.retry_call is None:
+            yield self._sleep(0.01)
+        self.assertFalse(d.called)
+        self.assertFalse(self.pool.is_legacy)
+
+        self.assertEqual(1, capacity.rejected_connections)
+        capacity.max_connections = capacity.max_queued_connections = None
+        self.pool.retry_call.cancel()
+        self.pool._retry()
+        result = yield d
+        self.assertTrue(result)
+
+    @defer.inlineCallbacks
+    def test_falls_back_to_v2(self):
+        self.server_factory.protocol = V2ReflectorServer
+        blob_hashes = yield self._make_blobs(2)
+        result = yield self.pool.reflect_blobs(self.client_blob_manager, blob_hashes)
+        self.assertTrue(result)
+        self.assertTrue(self.pool.is_legacy)
+        # older servers can't be asked which streams they have
+        complete = yield self.pool.check_streams(blob_hashes)
+        self.assertEqual(set(), complete)
+        self.flushLoggedErrors(ReflectorClientVersionError)
+        missing = yield self.server_blob_manager.missing_blobs(blob_hashes)
+        self.assertEqual([], missing)
+
+    @defer.inlineCallbacks
+    def test_connection_errors_dont_fall_back_to_v2(self):
+        self.server_factory.protocol = DroppingReflectorServer
+        blob_hashes = yield self._make_blobs(2)
+        with self.assertRaises(error.ConnectionLost):
+            yield self.pool.reflect_blobs(self.client_blob_manager, blob_hashes)
+        self.assertFalse(self.pool.is_legacy)
+
+        self.server_factory.protocol = ReflectorServer
+        result = yield self.pool.reflect_blobs(self.client_blob_manager, blob_hashes)
+        self.assertTrue(result)
+        self.assertFalse(self.pool.is_legacy)
+
+    def test_connection_pool_per_rate_limiter(self):
+        rate_limiter = object()
+        pool = reupload.get_connection_pool(('127.0.0.1', 5566), rate_limiter)
+        self.addCleanup(reupload.close_connection_pools)
+        self.assertIs(pool, reupload.get_connection_pool(('127.0.0.1', 5566), rate_limiter))
+        self.assertIs(rate_limiter, pool.rate_limiter)
+        other_pool = reupload.get_connection_pool(('127.0.0.1', 5566))
+        self.assertIsNot(pool, other_pool)
+        self.assertIsNone(other_pool.rate_limiter)
+
+    @defer.inlineCallbacks
+    def test_remembers_blobs_the_reflector_has(self):
+        blob_hashes = yield self._make_blobs(3)
+        result = yield self.pool.reflect_blobs(self.client_blob_manager, blob_hashes[:2])
+        self.assertTrue(result)
+        reflected = yield self.client_blob_manager.get_reflected_blobs(blob_hashes,
+                                                                       self.pool.reflector)
+        self.assertEqual(set(blob_hashes[:2]), reflected)
+
+        # the reflector lost a blob, but we aren't going to ask about it again for a while
+        yield self.server_blob_manager.delete_blobs(blob_hashes[:1])
+        result = yield self.pool.reflect_blobs(self.client_blob_manager, blob_hashes[:2])
+        self.assertFalse(result)
+        missing = yield self.server_blob_manager.missing_blobs(blob_hashes)
+        self.assertEqual([blob_hashes[0], blob_hashes[2]], missing)
+
+        self.pool.reflected_blob_age = -1
+        result = yield self.pool.reflect_blobs(self.client_blob_manager, blob_hashes)
+        self.assertTrue(result)
+        missing = yield self.server_blob_manager.missing_blobs(blob_hashes)
+        self.assertEqual([], missing)
+
+    @defer.inlineCallbacks
+    def test_splits_up_long_lists_of_blobs(self):
+        self.pool.MAX_BATCH_HASHES = 2
+        blob_hashes = yield self._make_blobs(5)
+        result = yield self.pool.reflect_blobs(self.client_blob_manager, blob_hashes)
+        self.assertTrue(result)
+        missing = yield self.server_blob_manager.missing_blobs(blob_hashes)
+        self.assertEqual([], missing)
+        reflected = yield self.client_blob_manager.get_reflected_blobs(blob_hashes,
+                                                                       self.pool.reflector)
+        self.assertEqual(set(blob_hashes), reflected)